@@ -1,10 +1,28 @@
 from django.contrib import admin
-from django.utils.html import format_html
+from django.urls import reverse
+from django.utils.html import format_html, format_html_join
 from django.utils import timezone
-from .models import UserHacker, Enterprise
+from .models import AdminConfig, UserHacker, Enterprise, Program, ProgrammeFacette, Report, TacheMasse
+from . import miniatures, taches
+from .admin_rapide import AdminListeRapideMixin
+
+
+def action_en_masse(nom):
+    """Action admin qui confie les lignes sélectionnées à une TacheMasse"""
+    def action(modeladmin, request, queryset):
+        tache = taches.lancer(nom, queryset.values_list('pk', flat=True), demandeur_id=request.user.pk)
+        modeladmin.message_user(request, format_html(
+            '{} élément(s) en cours de traitement : <a href="{}">suivre la tâche #{}</a>',
+            tache.total, reverse('admin:accounts_tachemasse_change', args=(tache.pk,)), tache.pk,
+        ))
+
+    action.__name__ = nom
+    action.short_description = taches.ACTIONS[nom]['libelle']
+    return action
+
 
 @admin.register(UserHacker)
-class UserHackerAdmin(admin.ModelAdmin):
+class UserHackerAdmin(AdminListeRapideMixin, admin.ModelAdmin):
     list_display = (
         'email',
         'prenom',
@@ -19,16 +37,28 @@ class UserHackerAdmin(admin.ModelAdmin):
     search_fields = ('email', 'nom', 'prenom', 'telephone')
     list_filter = ('verifiee', 'statut', 'date_creation')
 
-    readonly_fields = ('cni_preview',)
+    # Soldes : projections du grand livre (accounts.grand_livre)
+    readonly_fields = ('cni_preview', 'solde_credit', 'revenus_totaux')
+
+    actions = [action_en_masse('valider_hackers'), action_en_masse('suspendre_hackers')]
 
     def cni_preview(self, obj):
         if obj.cni_image:
             image_url = '/media/' + obj.cni_image
 
+            # Miniature dans la page, original seulement au clic : celle enregistrée
+            # au téléversement, sinon générée à la demande
+            if obj.cni_miniature:
+                apercu_url = '/media/' + obj.cni_miniature
+            elif miniatures.disponible():
+                apercu_url = reverse('miniature', args=(160, obj.cni_image))
+            else:
+                return format_html('<a href="{}" target="_blank">🪪 Voir la CIN</a>', image_url)
+
             return format_html(
                 '''
                 <a href="{}" target="_blank">
-                    <img src="{}" style="
+                    <img src="{}" loading="lazy" style="
                         max-height: 80px;
                         border: 1px solid #ccc;
                         border-radius: 4px;
@@ -37,7 +67,7 @@ class UserHackerAdmin(admin.ModelAdmin):
                 </a>
                 ''',
                 image_url,
-                image_url
+                apercu_url
             )
         return "Aucune image"
 
@@ -45,7 +75,7 @@ class UserHackerAdmin(admin.ModelAdmin):
 
 
 @admin.register(Enterprise)
-class EnterpriseAdmin(admin.ModelAdmin):
+class EnterpriseAdmin(AdminListeRapideMixin, admin.ModelAdmin):
     list_display = (
         'nom_legal',
         'email_entreprise',
@@ -68,6 +98,9 @@ class EnterpriseAdmin(admin.ModelAdmin):
         'date_creation',
         'date_activation',
         'date_modification',
+        # Soldes : projections du grand livre (accounts.grand_livre)
+        'solde_budget',
+        'solde_depense',
     )
 
     # Organisation de la page détail
@@ -97,6 +130,12 @@ class EnterpriseAdmin(admin.ModelAdmin):
                 'registre_commerce_preview',
             )
         }),
+        ('Soldes', {
+            'fields': (
+                'solde_budget',
+                'solde_depense',
+            )
+        }),
         ('Statut et validation', {
             'fields': (
                 'statut',
@@ -119,11 +158,79 @@ class EnterpriseAdmin(admin.ModelAdmin):
 
     registre_commerce_preview.short_description = "Registre de commerce"
 
-    # Action admin pour valider
-    actions = ['valider_compte']
+    # Validation en arrière-plan (date d'activation, journal, notification)
+    actions = [action_en_masse('valider_entreprises')]
+
+
+class ProgrammeFacetteInline(admin.TabularInline):
+    model = ProgrammeFacette
+    raw_id_fields = ('facette',)
+    extra = 0
+
+
+@admin.register(Program)
+class ProgramAdmin(AdminListeRapideMixin, admin.ModelAdmin):
+    list_display = ('nom', 'statut', 'visibilite', 'budget_total', 'date_creation')
+    search_fields = ('nom',)
+    list_filter = ('statut', 'visibilite')
+    raw_id_fields = ('enterprise',)
+    # Soldes : projections du grand livre (accounts.grand_livre) ; budget_total reste modifiable
+    readonly_fields = ('budget_restant', 'budget_depense')
+    inlines = [ProgrammeFacetteInline]
+
+    actions = [action_en_masse('suspendre_programmes'), action_en_masse('retarifer_programmes')]
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # Nouvelle grille des primes : rapports en cours retarifés hors de la requête
+        if change and {'recompenses_config', 'montant_minimum_bug'} & set(form.changed_data):
+            taches.lancer('retarifer_programmes', [obj.pk], demandeur_id=request.user.pk)
+
+
+@admin.register(Report)
+class ReportAdmin(AdminListeRapideMixin, admin.ModelAdmin):
+    list_display = ('numero_reference', 'titre', 'statut', 'severite_label', 'date_soumission')
+    search_fields = ('numero_reference', 'titre')
+    list_filter = ('statut', 'severite_label')
+    raw_id_fields = ('program', 'hacker')
+
+    actions = [action_en_masse('rejeter_rapports')]
+
+
+@admin.register(AdminConfig)
+class AdminConfigAdmin(admin.ModelAdmin):
+    # Valeur vérifiée selon son type (AdminConfig.clean) ; prise en compte par
+    # tous les processus après commit (voir accounts.configuration)
+    list_display = ('cle', 'valeur', 'type_valeur', 'date_modification')
+    search_fields = ('cle',)
+
+
+@admin.register(TacheMasse)
+class TacheMasseAdmin(admin.ModelAdmin):
+    list_display = ('id', 'action', 'statut', 'progression', 'reussis', 'echecs', 'date_creation', 'date_fin')
+    list_filter = ('statut', 'action')
+    fields = (
+        'action', 'statut', 'progression', 'total', 'traites', 'reussis', 'echecs',
+        'erreurs_detail', 'demandeur_id', 'date_creation', 'date_debut', 'date_fin',
+    )
+    readonly_fields = fields
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def progression(self, obj):
+        return f"{taches.progression(obj)} %"
+
+    progression.short_description = "Avancement"
 
-    def valider_compte(self, request, queryset):
-        updated = queryset.update(verifiee=True, statut='actif')
-        self.message_user(request, f"{updated} entreprise(s) validée(s).")
+    def erreurs_detail(self, obj):
+        if not obj.erreurs:
+            return "Aucune"
+        return format_html_join(
+            '', '<div>#{} : {}</div>', sorted(obj.erreurs.items(), key=lambda erreur: int(erreur[0])),
+        )
 
-    valider_compte.short_description = "Valider les comptes sélectionnés"
+    erreurs_detail.short_description = "Échecs par élément"
@@ -0,0 +1,186 @@
+"""
+Listes de l'admin sur de grandes tables (AdminListeRapideMixin).
+
+- Nombre de lignes : sans filtre, estimation tirée des statistiques de la
+  table (MySQL information_schema, PostgreSQL pg_class, SQLite
+  sqlite_stat1 après ANALYZE) dès qu'elle dépasse ADMIN_SEUIL_ESTIMATION ;
+  avec filtre ou recherche, COUNT(*) borné à ce seuil. Pas de second
+  COUNT(*) sur la table entière (show_full_result_count).
+- Pagination par curseur : dans l'ordre par défaut (clé primaire
+  décroissante), la page suivante est lue avec `pk < dernier id` (paramètre
+  `apres`) au lieu d'un OFFSET ; un tri choisi par l'utilisateur revient à
+  la pagination numérotée.
+- Recherche : `mode_recherche` 'prefixe' (LIKE 'terme%', servi par les
+  index), 'exact' ou 'contient' (LIKE '%terme%', parcours complet).
+- Affichage (GET) lu sur la réplique si BASE_REPLIQUE est configurée
+  (voir accounts.routeurs) ; les actions (POST) restent sur le primaire.
+- `budget_requetes` : nombre max de requêtes SQL pour afficher une page de
+  la liste, vérifié par les tests pour chaque ModelAdmin enregistré.
+"""
+from django.conf import settings
+from django.contrib.admin.views.main import ChangeList
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+from .routeurs import lecture_replique
+
+
+APRES_VAR = 'apres'
+PREFIXES_RECHERCHE = {'prefixe': '^', 'exact': '=', 'contient': ''}
+
+
+def seuil_estimation():
+    return getattr(settings, 'ADMIN_SEUIL_ESTIMATION', 10000)
+
+
+# ---------------------------------------------------------------------------
+# Estimation du nombre de lignes
+# ---------------------------------------------------------------------------
+
+def _estimation_mysql(curseur, table):
+    curseur.execute(
+        "SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+        [table],
+    )
+    ligne = curseur.fetchone()
+    return ligne[0] if ligne else None
+
+
+def _estimation_postgresql(curseur, table):
+    curseur.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)", [table])
+    ligne = curseur.fetchone()
+    # -1 : table jamais analysée
+    return ligne[0] if ligne and ligne[0] >= 0 else None
+
+
+def _estimation_sqlite(curseur, table):
+    curseur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+    if curseur.fetchone() is None:
+        return None
+    curseur.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1", [table])
+    ligne = curseur.fetchone()
+    return int(ligne[0].split()[0]) if ligne else None
+
+
+ESTIMATIONS = {
+    'mysql': _estimation_mysql,
+    'postgresql': _estimation_postgresql,
+    'sqlite': _estimation_sqlite,
+}
+
+
+def estimation_lignes(modele, using='default'):
+    """Nombre de lignes de la table d'après ses statistiques, None si inconnu"""
+    connexion = connections[using]
+    estimation = ESTIMATIONS.get(connexion.vendor)
+    if estimation is None:
+        return None
+    with connexion.cursor() as curseur:
+        return estimation(curseur, modele._meta.db_table)
+
+
+class PaginateurEstime(Paginator):
+    """`count` estimé (table entière) ou borné au seuil (liste filtrée) ; `estime` l'indique"""
+    estime = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        seuil = seuil_estimation()
+        if not queryset.query.where:
+            estimation = estimation_lignes(queryset.model, queryset.db)
+            if estimation is not None and estimation >= seuil:
+                self.estime = True
+                return estimation
+        nombre = queryset.order_by()[:seuil + 1].count()
+        if nombre > seuil:
+            self.estime = True
+            return seuil
+        return nombre
+
+
+# ---------------------------------------------------------------------------
+# Liste
+# ---------------------------------------------------------------------------
+
+class ListeCurseur(ChangeList):
+    def __init__(self, request, *args, **kwargs):
+        try:
+            self.apres = int(request.GET.get(APRES_VAR, ''))
+        except ValueError:
+            self.apres = None
+        self.url_page_suivante = None
+        super().__init__(request, *args, **kwargs)
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(APRES_VAR, None)
+        return lookup_params
+
+    def get_query_string(self, new_params=None, remove=None):
+        # Filtres, tris et recherche repartent de la première page
+        if not new_params or APRES_VAR not in new_params:
+            remove = [*(remove or []), APRES_VAR]
+        return super().get_query_string(new_params, remove)
+
+    @property
+    def pagination_curseur(self):
+        return list(self.queryset.query.order_by) == ['-pk']
+
+    def get_results(self, request):
+        if not self.pagination_curseur or self.show_all:
+            return super().get_results(request)
+
+        paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        queryset = self.queryset
+        if self.apres is not None:
+            queryset = queryset.filter(pk__lt=self.apres)
+        lignes = list(queryset[:self.list_per_page + 1])
+        if len(lignes) > self.list_per_page:
+            lignes = lignes[:self.list_per_page]
+            self.url_page_suivante = self.get_query_string({APRES_VAR: lignes[-1].pk})
+
+        self.result_count = paginator.count
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.full_result_count = None
+        self.result_list = lignes
+        self.can_show_all = False
+        self.multi_page = self.url_page_suivante is not None or self.apres is not None
+        self.paginator = paginator
+
+    @property
+    def url_premiere_page(self):
+        return self.get_query_string(remove=[APRES_VAR])
+
+    @property
+    def compte_estime(self):
+        return getattr(self.paginator, 'estime', False)
+
+
+class AdminListeRapideMixin:
+    paginator = PaginateurEstime
+    show_full_result_count = False
+    mode_recherche = 'prefixe'
+    budget_requetes = 5
+
+    def get_changelist(self, request, **kwargs):
+        return ListeCurseur
+
+    def changelist_view(self, request, extra_context=None):
+        if request.method != 'GET':
+            return super().changelist_view(request, extra_context)
+        with lecture_replique():
+            response = super().changelist_view(request, extra_context)
+            # Rendu dans le bloc : le gabarit lit encore (relations, filtres)
+            if hasattr(response, 'render'):
+                response.render()
+        return response
+
+    def get_search_fields(self, request):
+        prefixe = PREFIXES_RECHERCHE[self.mode_recherche]
+        return [
+            champ if champ[:1] in '^=@$' else prefixe + champ
+            for champ in super().get_search_fields(request)
+        ]
@@ -0,0 +1,164 @@
+"""
+Authentification des hackers et des entreprises.
+
+- Une seule requête : le compte est lu avec `.only()` (colonnes utiles à la
+  connexion et à la session), la date de dernière connexion est écrite par
+  un UPDATE ciblé, jamais par save().
+- Ré-hachage transparent : si le hash stocké n'utilise pas le hasher
+  préféré (réglage AUTH_HASHER_COMPTES, premier de PASSWORD_HASHERS par
+  défaut) ou ses paramètres actuels, il est remplacé dans le même UPDATE.
+- Limitation des échecs en cache, par email et par adresse IP : au-delà du
+  seuil, la tentative est refusée sans requête ni calcul de hash. Les emails
+  inconnus sont aussi mémorisés un court instant.
+
+Réglages (settings) :
+    AUTH_HASHER_COMPTES     algorithme préféré ('default')
+    AUTH_ECHECS_MAX         échecs tolérés par email (5)
+    AUTH_ECHECS_MAX_IP      échecs tolérés par adresse IP (20)
+    AUTH_FENETRE_ECHECS     durée du blocage, en secondes (300)
+    AUTH_DUREE_INCONNUS     mémorisation des emails inconnus, en secondes (60)
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from django.core.cache import cache
+from django.utils import timezone
+
+from .journal import adresse_ip
+from .models import Enterprise, UserHacker
+
+
+def hasher_prefere():
+    return getattr(settings, 'AUTH_HASHER_COMPTES', 'default')
+
+
+def _empreinte(valeur):
+    # Clés de cache sûres quel que soit le backend (memcached : pas d'espaces)
+    return hashlib.sha256(valeur.strip().lower().encode()).hexdigest()[:32]
+
+
+class BackendCompte:
+    """
+    verifier(request, email, mot_de_passe) → (compte, erreur) ;
+    erreur vaut None en cas de succès, sinon 'bloque', 'inconnu',
+    'mot_de_passe', 'statut' ou 'non_verifie' (compte renseigné pour ces
+    deux dernières). Ce n'est pas un backend d'authentification Django
+    (pas de méthode authenticate) : il ne doit pas figurer dans
+    AUTHENTICATION_BACKENDS.
+    """
+    modele = None
+    type_compte = None
+    champ_email = None
+    champs = ()
+
+    # -- Limitation des échecs --------------------------------------------
+
+    def _cles_echecs(self, email, request):
+        cles = {f"auth:echecs:{self.type_compte}:{_empreinte(email)}": getattr(settings, 'AUTH_ECHECS_MAX', 5)}
+        ip = adresse_ip(request)
+        if ip:
+            cles[f"auth:echecs:ip:{ip}"] = getattr(settings, 'AUTH_ECHECS_MAX_IP', 20)
+        return cles
+
+    def bloque(self, email, request=None):
+        cles = self._cles_echecs(email, request)
+        echecs = cache.get_many(list(cles))
+        return any(echecs.get(cle, 0) >= seuil for cle, seuil in cles.items())
+
+    def _echec(self, email, request):
+        fenetre = getattr(settings, 'AUTH_FENETRE_ECHECS', 300)
+        for cle in self._cles_echecs(email, request):
+            cache.add(cle, 0, fenetre)
+            try:
+                cache.incr(cle)
+            except ValueError:
+                cache.set(cle, 1, fenetre)
+
+    def reinitialiser_echecs(self, email):
+        cache.delete(f"auth:echecs:{self.type_compte}:{_empreinte(email)}")
+
+    # -- Emails inconnus ----------------------------------------------------
+
+    def _cle_inconnu(self, email):
+        return f"auth:inconnu:{self.type_compte}:{_empreinte(email)}"
+
+    def oublier_inconnu(self, email):
+        """À appeler à la création d'un compte (voir accounts.signals)"""
+        cache.delete(self._cle_inconnu(email))
+
+    # -- Authentification -------------------------------------------------
+
+    def verifier_statut(self, compte):
+        return None
+
+    def verifier(self, request, email=None, mot_de_passe=None):
+        if not email or mot_de_passe is None:
+            return None, 'inconnu'
+        if self.bloque(email, request):
+            return None, 'bloque'
+        if cache.get(self._cle_inconnu(email)):
+            self._echec(email, request)
+            return None, 'inconnu'
+
+        compte = self.modele.objects.only(*self.champs).filter(**{self.champ_email: email}).first()
+        if compte is None:
+            cache.set(self._cle_inconnu(email), True, getattr(settings, 'AUTH_DUREE_INCONNUS', 60))
+            self._echec(email, request)
+            return None, 'inconnu'
+
+        nouveau_hash = []
+        if not check_password(
+            mot_de_passe, compte.mot_de_passe_hash,
+            setter=lambda brut: nouveau_hash.append(make_password(brut, hasher=hasher_prefere())),
+            preferred=hasher_prefere(),
+        ):
+            self._echec(email, request)
+            return None, 'mot_de_passe'
+
+        erreur = self.verifier_statut(compte)
+        if erreur:
+            return compte, erreur
+
+        self.reinitialiser_echecs(email)
+        champs = {'date_derniere_connexion': timezone.now()}
+        if nouveau_hash:
+            champs['mot_de_passe_hash'] = nouveau_hash[0]
+        self.modele.objects.filter(pk=compte.pk).update(**champs)
+        for champ, valeur in champs.items():
+            setattr(compte, champ, valeur)
+        return compte, None
+
+
+class BackendHacker(BackendCompte):
+    modele = UserHacker
+    type_compte = 'hacker'
+    champ_email = 'email'
+    champs = ('id', 'email', 'prenom', 'nom', 'mot_de_passe_hash', 'statut', 'verifiee')
+
+    def verifier_statut(self, compte):
+        if compte.statut != 'actif':
+            return 'statut'
+        if not compte.verifiee:
+            return 'non_verifie'
+
+
+class BackendEntreprise(BackendCompte):
+    modele = Enterprise
+    type_compte = 'enterprise'
+    champ_email = 'email_entreprise'
+    champs = ('id', 'email_entreprise', 'nom_legal', 'mot_de_passe_hash', 'statut', 'verifiee')
+
+    def verifier_statut(self, compte):
+        if not compte.verifiee:
+            return 'non_verifie'
+
+
+BACKENDS = {
+    'hacker': BackendHacker(),
+    'enterprise': BackendEntreprise(),
+}
+
+
+def authentifier(type_compte, request, email, mot_de_passe):
+    return BACKENDS[type_compte].verifier(request, email=email, mot_de_passe=mot_de_passe)
@@ -0,0 +1,239 @@
+"""
+Catalogue des programmes publics actifs, filtrable par facettes (types de
+vulnérabilités, domaines et sévérités acceptés).
+
+Les facettes sont des lignes normalisées de la table `facettes`, reliées
+aux programmes par `programs_facettes` (index (facette, programme)) : plus
+de chaînes séparées par des virgules ni de LIKE '%xss%'. Une facette
+'domaine' est une entrée de périmètre entière (https://api.x.dz/v1,
+x.dz:8443) : seule la casse est normalisée.
+
+Le catalogue est servi depuis un instantané versionné, comme le classement :
+programmes affichables et listes de programmes par facette, construits en
+deux requêtes, partagés via le cache Django et gardés en mémoire par
+processus. Filtrer et compter les facettes est alors une intersection
+d'ensembles en mémoire, sans requête. La version est incrémentée après
+commit par toute modification d'un programme ou de ses facettes
+(accounts.signals, `definir_facettes`, actions en masse).
+"""
+import re
+import time
+import unicodedata
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils import timezone
+
+from .models import Facette, Program, ProgrammeFacette
+
+
+CLE_VERSION = 'catalogue:version'
+CLE_INSTANTANE = 'catalogue:instantane:{version}'
+
+TYPES = ('vulnerabilite', 'domaine', 'severite')
+COLONNES = ('id', 'nom', 'slug', 'enterprise_id', 'budget_total', 'montant_minimum_bug', 'date_creation')
+
+SEVERITES = {
+    'critique': 'Critique', 'critical': 'Critique',
+    'elevee': 'Élevée', 'haute': 'Élevée', 'high': 'Élevée',
+    'moyenne': 'Moyenne', 'medium': 'Moyenne',
+    'basse': 'Basse', 'faible': 'Basse', 'low': 'Basse',
+}
+
+_SEPARATEURS = re.compile(r'[,;|\n]+')
+
+# Instantané local au processus : (version, instantané)
+_local = {'version': None}
+
+
+# ---------------------------------------------------------------------------
+# Normalisation
+# ---------------------------------------------------------------------------
+
+def _sans_accents(texte):
+    return ''.join(c for c in unicodedata.normalize('NFKD', texte) if not unicodedata.combining(c))
+
+
+def _slug(texte):
+    return re.sub(r'[^a-z0-9]+', '-', _sans_accents(texte).lower()).strip('-')
+
+
+def _domaine(texte):
+    # Entrée de périmètre gardée entière : schéma, port et chemin restreignent
+    # la portée (accounts.perimetre), les retirer l'élargirait
+    domaine = texte.strip().lower()
+    if '/' not in domaine and ':' not in domaine:
+        domaine = domaine.rstrip('.')
+    return domaine or None
+
+
+def normaliser(type_facette, texte):
+    """(valeur, libellé) d'une facette saisie, None si elle est vide"""
+    libelle = ' '.join(texte.split())
+    if type_facette == 'domaine':
+        valeur = _domaine(libelle)
+        return (valeur, valeur) if valeur else None
+    if type_facette == 'severite':
+        canonique = SEVERITES.get(_slug(libelle))
+        if canonique:
+            return canonique, canonique
+    valeur = _slug(libelle)
+    return (valeur, libelle) if valeur else None
+
+
+def decouper(type_facette, texte):
+    """Facettes normalisées (sans doublon) d'une liste saisie « XSS, SQLi ; IDOR »"""
+    facettes = {}
+    for morceau in _SEPARATEURS.split(texte or ''):
+        facette = normaliser(type_facette, morceau)
+        if facette is not None:
+            facettes.setdefault(facette[0], facette[1])
+    return facettes
+
+
+# ---------------------------------------------------------------------------
+# Écriture
+# ---------------------------------------------------------------------------
+
+@transaction.atomic
+def definir_facettes(program, type_facette, valeurs):
+    """Remplace les facettes `type_facette` du programme (textes saisis, ou une chaîne à découper)"""
+    if isinstance(valeurs, str):
+        voulues = decouper(type_facette, valeurs)
+    else:
+        voulues = {}
+        for texte in valeurs:
+            facette = normaliser(type_facette, texte)
+            if facette is not None:
+                voulues.setdefault(*facette)
+
+    Facette.objects.bulk_create(
+        [Facette(type_facette=type_facette, valeur=valeur, libelle=libelle) for valeur, libelle in voulues.items()],
+        ignore_conflicts=True,
+    )
+    facette_ids = set(
+        Facette.objects.filter(type_facette=type_facette, valeur__in=voulues).values_list('pk', flat=True)
+    )
+    liens = ProgrammeFacette.objects.filter(program=program, facette__type_facette=type_facette)
+    actuelles = set(liens.values_list('facette_id', flat=True))
+    liens.exclude(facette_id__in=facette_ids).delete()
+    ProgrammeFacette.objects.bulk_create(
+        [ProgrammeFacette(program_id=program.pk, facette_id=pk) for pk in facette_ids - actuelles],
+        ignore_conflicts=True,
+    )
+    if facette_ids != actuelles:
+        # Nouvelle date : le périmètre compilé du programme (accounts.perimetre) est périmé
+        program.date_modification = timezone.now()
+        Program.objects.filter(pk=program.pk).update(date_modification=program.date_modification)
+        transaction.on_commit(invalider_catalogue)
+
+
+# ---------------------------------------------------------------------------
+# Instantané
+# ---------------------------------------------------------------------------
+
+def version_catalogue():
+    version = cache.get(CLE_VERSION)
+    if version is None:
+        # Départ horodaté : un cache vidé ne réutilise pas d'anciens numéros
+        cache.add(CLE_VERSION, time.time_ns() // 1000, timeout=None)
+        version = cache.get(CLE_VERSION)
+    return version
+
+
+def invalider_catalogue():
+    try:
+        cache.incr(CLE_VERSION)
+    except ValueError:
+        version_catalogue()
+
+
+def _construire():
+    # Primaire : gardé pour toute la version (voir accounts.routeurs)
+    programmes = (
+        Program.objects.using(DEFAULT_DB_ALIAS)
+        .filter(statut='actif', visibilite='public')
+        .order_by('-date_creation', '-id')
+        .values(*COLONNES)
+    )
+    programmes = list(programmes)
+    ids = {programme['id'] for programme in programmes}
+    facettes = {}
+    par_facette = {}
+    liens = (
+        ProgrammeFacette.objects.using(DEFAULT_DB_ALIAS)
+        .filter(program__statut='actif', program__visibilite='public')
+        .values_list('program_id', 'facette_id', 'facette__type_facette', 'facette__valeur', 'facette__libelle')
+    )
+    for program_id, facette_id, type_facette, valeur, libelle in liens:
+        if program_id not in ids:
+            continue
+        facettes[facette_id] = (type_facette, valeur, libelle)
+        par_facette.setdefault(facette_id, set()).add(program_id)
+
+    par_programme = {}
+    for facette_id, programmes_facette in par_facette.items():
+        type_facette, valeur, libelle = facettes[facette_id]
+        for program_id in programmes_facette:
+            par_programme.setdefault(program_id, {}).setdefault(type_facette, []).append(libelle)
+    for programme in programmes:
+        programme['facettes'] = {
+            type_facette: sorted(libelles) for type_facette, libelles in par_programme.get(programme['id'], {}).items()
+        }
+    return {
+        'programmes': programmes,
+        'facettes': facettes,
+        'par_facette': par_facette,
+        'index': {(type_facette, valeur): pk for pk, (type_facette, valeur, _) in facettes.items()},
+    }
+
+
+def instantane():
+    version = version_catalogue()
+    if _local['version'] == version:
+        return version, _local['instantane']
+
+    cle = CLE_INSTANTANE.format(version=version)
+    resultat = cache.get(cle)
+    if resultat is None:
+        resultat = _construire()
+        cache.set(cle, resultat, timeout=24 * 3600)
+    _local.update(version=version, instantane=resultat)
+    return version, resultat
+
+
+def catalogue(filtres=None, apres=None, limite=50):
+    """
+    Programmes ayant toutes les facettes demandées ({type: [textes]}) et
+    nombre de programmes par facette dans ce résultat :
+    {'programmes', 'total', 'facettes', 'suivant', 'version'}.
+    """
+    version, donnees = instantane()
+    retenus = None
+    for type_facette, textes in (filtres or {}).items():
+        for texte in textes:
+            facette = normaliser(type_facette, texte)
+            pk = donnees['index'].get((type_facette, facette[0])) if facette else None
+            programmes = donnees['par_facette'].get(pk, set())
+            retenus = set(programmes) if retenus is None else retenus & programmes
+
+    liste = donnees['programmes'] if retenus is None else [p for p in donnees['programmes'] if p['id'] in retenus]
+    debut = 0
+    if apres is not None:
+        debut = next((rang + 1 for rang, p in enumerate(liste) if p['id'] == apres), len(liste))
+    page = liste[debut:debut + limite]
+
+    comptes = {type_facette: {} for type_facette in TYPES}
+    for pk, programmes in donnees['par_facette'].items():
+        nombre = len(programmes) if retenus is None else len(programmes & retenus)
+        if nombre:
+            type_facette, valeur, libelle = donnees['facettes'][pk]
+            comptes[type_facette][valeur] = {'libelle': libelle, 'programmes': nombre}
+
+    return {
+        'programmes': page,
+        'total': len(liste),
+        'facettes': comptes,
+        'suivant': page[-1]['id'] if debut + limite < len(liste) else None,
+        'version': version,
+    }
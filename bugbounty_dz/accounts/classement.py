@@ -0,0 +1,137 @@
+"""
+Lecture du classement : pages et rang personnel servis depuis un instantané
+du top-N précalculé et versionné.
+
+L'instantané est construit une seule fois par version (une requête), partagé
+via le cache Django et gardé en mémoire par processus. La version n'est
+incrémentée que par le moteur du classement (accounts.leaderboard) lorsqu'il
+écrit de nouvelles positions ou modifie une ligne affichée dans le top-N.
+
+Pagination par curseur : `apres` est la dernière position déjà affichée.
+"""
+import time
+from bisect import bisect_right
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+from .models import Leaderboard
+
+
+CLE_VERSION = 'classement:version'
+CLE_INSTANTANE = 'classement:top:{version}'
+
+COLONNES = (
+    'position', 'hacker_id', 'hacker__prenom', 'hacker__nom',
+    'points_total', 'bugs_acceptes', 'badge',
+)
+
+# Instantané local au processus : (version, entrées, positions, index hacker_id → rang)
+_local = {'version': None}
+
+
+def taille_top():
+    return getattr(settings, 'CLASSEMENT_TOP_N', 1000)
+
+
+def version_classement():
+    version = cache.get(CLE_VERSION)
+    if version is None:
+        # Départ horodaté : un cache vidé ne réutilise pas d'anciens numéros
+        cache.add(CLE_VERSION, time.time_ns() // 1000, timeout=None)
+        version = cache.get(CLE_VERSION)
+    return version
+
+
+def invalider_classement():
+    """Appelé par le moteur après écriture de nouvelles positions"""
+    try:
+        cache.incr(CLE_VERSION)
+    except ValueError:
+        version_classement()
+
+
+def _entree(ligne):
+    position, hacker_id, prenom, nom, points, acceptes, badge = ligne
+    return {
+        'position': position,
+        'hacker_id': hacker_id,
+        'nom': f"{prenom} {nom}",
+        'points': points,
+        'bugs_acceptes': acceptes,
+        'badge': badge,
+    }
+
+
+def _requete():
+    return Leaderboard.objects.filter(position__isnull=False).order_by('position').values_list(*COLONNES)
+
+
+def instantane():
+    """Top-N courant : (version, entrées, positions, index par hacker)"""
+    version = version_classement()
+    if _local['version'] == version:
+        return _local['instantane']
+
+    cle = CLE_INSTANTANE.format(version=version)
+    entrees = cache.get(cle)
+    if entrees is None:
+        # Sur le primaire : gardé pour toute la version, un instantané lu sur
+        # une réplique en retard resterait périmé jusqu'à la suivante
+        requete = _requete().using(DEFAULT_DB_ALIAS).filter(position__lte=taille_top())
+        entrees = [_entree(ligne) for ligne in requete]
+        cache.set(cle, entrees, timeout=24 * 3600)
+
+    resultat = (
+        version,
+        entrees,
+        [entree['position'] for entree in entrees],
+        {entree['hacker_id']: rang for rang, entree in enumerate(entrees)},
+    )
+    _local.update(version=version, instantane=resultat)
+    return resultat
+
+
+def page_classement(apres=0, limite=50):
+    """Page suivant la position `apres` : {'entrees', 'suivant', 'version'}"""
+    version, entrees, positions, _ = instantane()
+    debut = bisect_right(positions, apres)
+    page = entrees[debut:debut + limite]
+
+    # Au-delà du top-N : parcours indexé sur `position`
+    if len(page) < limite and len(entrees) >= taille_top():
+        depuis = page[-1]['position'] if page else apres
+        page = page + [
+            _entree(ligne)
+            for ligne in _requete().filter(position__gt=depuis)[:limite - len(page)]
+        ]
+
+    return {
+        'entrees': page,
+        'suivant': page[-1]['position'] if len(page) == limite else None,
+        'version': version,
+    }
+
+
+def rang_hacker(hacker_id, voisins=2):
+    """Rang du hacker et ses voisins immédiats, ou None s'il n'est pas classé"""
+    version, entrees, _, index = instantane()
+    rang = index.get(hacker_id)
+    complet = len(entrees) < taille_top()
+    if rang is not None and (complet or rang + voisins < len(entrees)):
+        autour = entrees[max(rang - voisins, 0):rang + voisins + 1]
+        return {'moi': entrees[rang], 'voisins': autour, 'version': version}
+
+    # Hors top-N : recherche indexée (hacker_id unique, puis plage de positions)
+    position = Leaderboard.objects.filter(hacker_id=hacker_id).values_list('position', flat=True).first()
+    if position is None:
+        return None
+    autour = [
+        _entree(ligne)
+        for ligne in _requete().filter(position__range=(position - voisins, position + voisins))
+    ]
+    moi = next((entree for entree in autour if entree['hacker_id'] == hacker_id), None)
+    if moi is None:
+        return None
+    return {'moi': moi, 'voisins': autour, 'version': version}
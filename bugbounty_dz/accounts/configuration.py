@@ -0,0 +1,123 @@
+"""
+Configuration de la plateforme (table admin_config), typée et gardée en
+mémoire par processus.
+
+Toutes les lignes sont lues en une requête et converties selon
+`type_valeur` (integer → int, decimal → Decimal, json → objet, string ou
+vide → str). Les lectures sont servies depuis un dict du processus : pas de
+requête SQL sur le chemin chaud. Une valeur illisible est ignorée (le
+défaut de l'appelant s'applique) et signalée dans les logs.
+
+Invalidation entre processus : un numéro de version est publié dans le
+cache partagé (settings.CACHES, Redis : un cache local au processus ne
+verrait pas les autres workers) à chaque save()/delete() d'une
+AdminConfig (après commit, voir accounts.signals). Chaque processus compare sa version à celle du
+cache au plus une fois toutes les CONFIGURATION_INTERVALLE secondes, et
+recharge la table si elle a changé. Une modification par queryset.update()
+doit appeler `invalider_configuration()`.
+
+Réglages (settings) :
+    CONFIGURATION_INTERVALLE    délai max de prise en compte dans les autres processus, en secondes (1)
+"""
+import json
+import logging
+import threading
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+from .models import AdminConfig
+
+
+logger = logging.getLogger(__name__)
+
+CLE_VERSION = 'configuration:version'
+
+CONVERSIONS = {
+    'integer': int,
+    'decimal': Decimal,
+    'json': json.loads,
+    'string': str,
+}
+
+# Valeurs courantes du processus : version, {cle: valeur typée}, dernière vérification
+_local = {'version': None, 'valeurs': {}, 'verifie': None}
+_verrou = threading.Lock()
+
+
+class ValeurInvalide(ValueError):
+    pass
+
+
+def convertir(valeur, type_valeur):
+    """Valeur typée d'une ligne ; ValeurInvalide si elle ne correspond pas au type"""
+    if valeur is None:
+        return None
+    try:
+        return CONVERSIONS.get(type_valeur, str)(valeur)
+    except (ValueError, InvalidOperation) as e:
+        raise ValeurInvalide(f"{valeur!r} n'est pas de type {type_valeur}") from e
+
+
+def version_configuration():
+    version = cache.get(CLE_VERSION)
+    if version is None:
+        # Départ horodaté : un cache vidé ne réutilise pas d'anciens numéros
+        cache.add(CLE_VERSION, time.time_ns() // 1000, timeout=None)
+        version = cache.get(CLE_VERSION)
+    return version
+
+
+def invalider_configuration():
+    """Nouvelle version : tous les processus rechargent la table"""
+    try:
+        cache.incr(CLE_VERSION)
+    except ValueError:
+        version_configuration()
+    _local['verifie'] = None
+
+
+def _charger():
+    valeurs = {}
+    # Primaire : une réplique en retard figerait l'ancienne valeur pour toute la version
+    lignes = AdminConfig.objects.using(DEFAULT_DB_ALIAS).values_list('cle', 'valeur', 'type_valeur')
+    for cle, valeur, type_valeur in lignes:
+        try:
+            valeurs[cle] = convertir(valeur, type_valeur)
+        except ValeurInvalide as e:
+            logger.warning("Configuration '%s' ignorée : %s", cle, e)
+    return valeurs
+
+
+def _valeurs():
+    verifie = _local['verifie']
+    if verifie is not None and time.monotonic() - verifie < getattr(settings, 'CONFIGURATION_INTERVALLE', 1):
+        return _local['valeurs']
+
+    version = version_configuration()
+    if version != _local['version']:
+        with _verrou:
+            if version != _local['version']:
+                _local.update(valeurs=_charger(), version=version)
+    _local['verifie'] = time.monotonic()
+    return _local['valeurs']
+
+
+def valeur(cle, defaut=None):
+    """Valeur typée de `cle` (partagée : ne pas modifier un objet json), `defaut` si absente"""
+    resultat = _valeurs().get(cle)
+    return defaut if resultat is None else resultat
+
+
+def valeurs():
+    """Copie de toute la configuration typée"""
+    return dict(_valeurs())
+
+
+def vider():
+    """Oublie la configuration du processus (tests)"""
+    with _verrou:
+        _local.update(version=None, valeurs={}, verifie=None)
@@ -0,0 +1,273 @@
+"""
+Sévérité CVSS (v3.0 / v3.1, métriques de base) et prime proposée des
+rapports.
+
+- `analyser(vecteur)` : poids des métriques d'un vecteur
+  « CVSS:3.1/AV:N/AC:L/PR:N/UI:N/S:U/C:H/I:H/A:H », mémorisés (lru_cache) ;
+  les métriques temporelles et environnementales sont ignorées.
+- `bareme(recompenses_config, minimum)` : compile la grille de primes d'un
+  programme en une table de 101 montants, un par score (0.0 à 10.0 par pas
+  de 0.1), mémorisée par contenu. Clés : sévérités (« Critique », « high »…,
+  voir catalogue.SEVERITES) ; valeurs : montant fixe, ou {"min", "max"} /
+  [min, max] interpolé sur la plage de scores de la sévérité. Le montant
+  minimum du programme (montant_minimum_bug) sert de plancher.
+- `evaluer(vecteurs, table)` : scores, sévérités et montants d'un lot de
+  vecteurs, en un passage vectorisé avec NumPy (chaque vecteur distinct
+  n'est calculé qu'une fois) ; boucle Python équivalente sans NumPy.
+- `tarifer(rapports, program)` : applique l'évaluation aux rapports
+  (severite_cvss, severite_label, montant_propose) et renvoie ceux qui
+  changent, à écrire par bulk_update (voir taches.retarifer_programmes).
+
+Un rapport enregistré avec un nouveau vecteur est noté au pre_save
+(accounts.signals) ; les tables dérivées suivent par rapport_modifie.
+"""
+import json
+import math
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from functools import lru_cache
+
+from . import catalogue
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+PREFIXES = {'CVSS:3.0': False, 'CVSS:3.1': True}
+
+# Poids des métriques de base (spécification CVSS v3.1, section 7.4)
+POIDS = {
+    'AV': {'N': 0.85, 'A': 0.62, 'L': 0.55, 'P': 0.2},
+    'AC': {'L': 0.77, 'H': 0.44},
+    'PR': {'N': 0.85, 'L': 0.62, 'H': 0.27},
+    'UI': {'N': 0.85, 'R': 0.62},
+    'S': {'U': False, 'C': True},
+    'C': {'H': 0.56, 'L': 0.22, 'N': 0.0},
+    'I': {'H': 0.56, 'L': 0.22, 'N': 0.0},
+    'A': {'H': 0.56, 'L': 0.22, 'N': 0.0},
+}
+# Privilèges requis quand la portée change
+PR_PORTEE_CHANGEE = {'N': 0.85, 'L': 0.68, 'H': 0.5}
+
+# Sévérité → (score min, score max) en dixièmes ; 0.0 : aucune sévérité
+PLAGES = {
+    'Basse': (1, 39),
+    'Moyenne': (40, 69),
+    'Élevée': (70, 89),
+    'Critique': (90, 100),
+}
+LIBELLES = [None] + [
+    libelle for dixieme in range(1, 101)
+    for libelle, (debut, fin) in PLAGES.items() if debut <= dixieme <= fin
+]
+
+CENTIME = Decimal('0.01')
+SCORES = [Decimal(dixieme).scaleb(-1) for dixieme in range(101)]
+
+
+class VecteurInvalide(ValueError):
+    pass
+
+
+class BaremeInvalide(ValueError):
+    pass
+
+
+def vectorise():
+    return np is not None
+
+
+# ---------------------------------------------------------------------------
+# Vecteurs
+# ---------------------------------------------------------------------------
+
+@lru_cache(maxsize=4096)
+def analyser(vecteur):
+    """
+    (v3.1, portée changée, AV, AC, PR, UI, C, I, A) : poids du vecteur ;
+    VecteurInvalide si une métrique de base manque ou est inconnue.
+    """
+    prefixe, _, reste = (vecteur or '').strip().partition('/')
+    if prefixe not in PREFIXES:
+        raise VecteurInvalide(f"Version CVSS non reconnue : {vecteur!r}")
+    valeurs = {}
+    for morceau in reste.split('/'):
+        metrique, _, valeur = morceau.partition(':')
+        if metrique not in POIDS:
+            continue
+        if metrique in valeurs or valeur not in POIDS[metrique]:
+            raise VecteurInvalide(f"Métrique {metrique} invalide : {vecteur!r}")
+        valeurs[metrique] = valeur
+    manquantes = set(POIDS) - set(valeurs)
+    if manquantes:
+        raise VecteurInvalide(f"Métriques manquantes ({', '.join(sorted(manquantes))}) : {vecteur!r}")
+
+    change = POIDS['S'][valeurs['S']]
+    pr = (PR_PORTEE_CHANGEE if change else POIDS['PR'])[valeurs['PR']]
+    return (
+        PREFIXES[prefixe], change,
+        POIDS['AV'][valeurs['AV']], POIDS['AC'][valeurs['AC']], pr, POIDS['UI'][valeurs['UI']],
+        POIDS['C'][valeurs['C']], POIDS['I'][valeurs['I']], POIDS['A'][valeurs['A']],
+    )
+
+
+def _dixiemes(poids):
+    """Score de base en dixièmes (0 à 100)"""
+    v31, change, av, ac, pr, ui, c, i, a = poids
+    iss = 1 - (1 - c) * (1 - i) * (1 - a)
+    if change:
+        impact = 7.52 * (iss - 0.029) - 3.25 * (iss - 0.02) ** 15
+    else:
+        impact = 6.42 * iss
+    if impact <= 0:
+        return 0
+    base = min((1.08 if change else 1.0) * (impact + 8.22 * av * ac * pr * ui), 10)
+    if not v31:
+        return math.ceil(base * 10)
+    # Arrondi supérieur v3.1 (annexe A), insensible aux erreurs de flottants
+    entier = round(base * 100000)
+    return entier // 10000 + (entier % 10000 != 0)
+
+
+def _dixiemes_numpy(poids):
+    colonnes = np.array(poids, dtype=float).T
+    v31, change, av, ac, pr, ui, c, i, a = colonnes
+    change = change.astype(bool)
+    iss = 1 - (1 - c) * (1 - i) * (1 - a)
+    impact = np.where(change, 7.52 * (iss - 0.029) - 3.25 * np.power(iss - 0.02, 15), 6.42 * iss)
+    base = np.minimum(np.where(change, 1.08, 1.0) * (impact + 8.22 * av * ac * pr * ui), 10)
+    entier = np.rint(base * 100000).astype(np.int64)
+    dixiemes = np.where(
+        v31.astype(bool), entier // 10000 + (entier % 10000 != 0), np.ceil(base * 10).astype(np.int64),
+    )
+    return np.where(impact <= 0, 0, dixiemes)
+
+
+def score(vecteur):
+    """Score de base (Decimal à une décimale) ; VecteurInvalide"""
+    return SCORES[_dixiemes(analyser(vecteur))]
+
+
+def libelle(score_cvss):
+    """Sévérité (Report.SEVERITE_CHOICES) d'un score, None pour 0.0"""
+    return LIBELLES[int(Decimal(score_cvss) * 10)]
+
+
+# ---------------------------------------------------------------------------
+# Barème
+# ---------------------------------------------------------------------------
+
+def _montant(valeur):
+    try:
+        montant = Decimal(str(valeur)).quantize(CENTIME, ROUND_HALF_UP)
+    except (InvalidOperation, ValueError, TypeError):
+        raise BaremeInvalide(f"Montant invalide : {valeur!r}")
+    if not montant.is_finite() or montant < 0:
+        raise BaremeInvalide(f"Montant invalide : {valeur!r}")
+    return montant
+
+
+def _bornes(valeur):
+    if isinstance(valeur, dict):
+        if 'min' not in valeur and 'max' not in valeur:
+            raise BaremeInvalide(f"Plage sans min ni max : {valeur!r}")
+        minimum = _montant(valeur.get('min', valeur.get('max')))
+        maximum = _montant(valeur.get('max', valeur.get('min')))
+    elif isinstance(valeur, (list, tuple)):
+        if len(valeur) != 2:
+            raise BaremeInvalide(f"Plage attendue [min, max] : {valeur!r}")
+        minimum, maximum = _montant(valeur[0]), _montant(valeur[1])
+    else:
+        minimum = maximum = _montant(valeur)
+    if minimum > maximum:
+        raise BaremeInvalide(f"Plage inversée : {valeur!r}")
+    return minimum, maximum
+
+
+@lru_cache(maxsize=1024)
+def _compiler(config, minimum):
+    centimes = [None] * 101
+    plancher = _montant(minimum) if minimum is not None else Decimal(0)
+    for cle, valeur in json.loads(config).items():
+        severite = (catalogue.normaliser('severite', cle) or (None,))[0]
+        if severite not in PLAGES:
+            raise BaremeInvalide(f"Sévérité inconnue : {cle!r}")
+        bas, haut = _bornes(valeur)
+        debut, fin = PLAGES[severite]
+        for dixieme in range(debut, fin + 1):
+            montant = bas + (haut - bas) * (dixieme - debut) / (fin - debut)
+            centimes[dixieme] = int(max(montant, plancher).quantize(CENTIME, ROUND_HALF_UP) * 100)
+    return tuple(centimes)
+
+
+def bareme(recompenses_config, minimum=None):
+    """
+    Table des primes en centimes, indexée par score en dixièmes (None : pas
+    de prime) ; BaremeInvalide si la grille est mal formée.
+    """
+    if not recompenses_config:
+        return (None,) * 101
+    if not isinstance(recompenses_config, dict):
+        raise BaremeInvalide("La grille des primes doit être un objet JSON")
+    config = json.dumps(recompenses_config, sort_keys=True, default=str)
+    return _compiler(config, None if minimum is None else str(minimum))
+
+
+# ---------------------------------------------------------------------------
+# Évaluation en lot
+# ---------------------------------------------------------------------------
+
+def evaluer(vecteurs, table):
+    """
+    (score, sévérité, montant) pour chaque vecteur, None pour un vecteur
+    absent ou invalide.
+    """
+    index = {}
+    codes = [index.setdefault(vecteur, len(index)) for vecteur in vecteurs]
+    poids, valides = [], []
+    for vecteur in index:
+        try:
+            poids.append(analyser(vecteur))
+            valides.append(True)
+        except VecteurInvalide:
+            valides.append(False)
+
+    if not poids:
+        dixiemes = []
+    elif np is not None:
+        dixiemes = _dixiemes_numpy(poids).tolist()
+    else:
+        dixiemes = [_dixiemes(p) for p in poids]
+
+    # Une entrée par vecteur distinct, puis report par code
+    resultats, suivant = [], iter(dixiemes)
+    for valide in valides:
+        if not valide:
+            resultats.append(None)
+            continue
+        dixieme = next(suivant)
+        centimes = table[dixieme]
+        resultats.append((
+            SCORES[dixieme], LIBELLES[dixieme],
+            None if centimes is None else Decimal(centimes).scaleb(-2),
+        ))
+    return [resultats[code] for code in codes]
+
+
+CHAMPS = ('severite_cvss', 'severite_label', 'montant_propose')
+
+
+def tarifer(rapports, program):
+    """
+    Note et tarife les rapports (vecteur_cvss renseigné) d'un même programme
+    selon sa grille ; renvoie les rapports dont un champ de CHAMPS a changé.
+    """
+    table = bareme(program.recompenses_config, program.montant_minimum_bug)
+    modifies = []
+    for rapport, resultat in zip(rapports, evaluer([r.vecteur_cvss for r in rapports], table)):
+        if resultat is None or tuple(getattr(rapport, champ) for champ in CHAMPS) == resultat:
+            continue
+        rapport.severite_cvss, rapport.severite_label, rapport.montant_propose = resultat
+        modifies.append(rapport)
+    return modifies
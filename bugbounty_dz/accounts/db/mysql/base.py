@@ -0,0 +1,12 @@
+"""
+Backend MySQL avec pool de connexions (voir accounts.db.pool).
+
+    DATABASES = {'default': {'ENGINE': 'accounts.db.mysql', ..., 'POOL': {'TAILLE': 10}}}
+"""
+from django.db.backends.mysql import base
+
+from ..pool import ConnexionsPooleesMixin
+
+
+class DatabaseWrapper(ConnexionsPooleesMixin, base.DatabaseWrapper):
+    pass
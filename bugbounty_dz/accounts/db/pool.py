@@ -0,0 +1,271 @@
+"""
+Pool de connexions en processus, par alias de base de données.
+
+Avec CONN_MAX_AGE = 0, Django ouvre une connexion au premier accès d'une
+requête et la ferme à la fin (signal request_finished). Le backend
+`accounts.db.mysql` (ConnexionsPooleesMixin) remplace l'ouverture par un
+emprunt au pool et la fermeture par une restitution : la connexion TCP,
+l'authentification et l'initialisation de session ne sont payées qu'une
+fois par connexion et non à chaque requête.
+
+- Taille bornée : au-delà de TAILLE connexions empruntées, on attend qu'une
+  connexion soit rendue, ATTENTE secondes au plus (PoolEpuise ensuite).
+- Vérification sans aller-retour par requête : une connexion n'est
+  « pinguée » à l'emprunt que si elle est restée inactive plus de
+  VERIFIER_APRES secondes (le serveur a pu la couper : wait_timeout,
+  redémarrage). Les erreurs en cours de requête restent gérées par Django
+  (errors_occurred → is_usable() en fin de requête).
+- Renouvellement : une connexion plus vieille que DUREE_MAX secondes est
+  fermée à l'emprunt (à garder sous le wait_timeout du serveur).
+- Seules les connexions rendues hors transaction, en autocommit et sans
+  erreur reviennent dans le pool ; les autres sont fermées.
+- Après un fork (workers gunicorn en --preload), le processus enfant
+  repart d'un pool vide : les sockets du parent ne sont jamais partagés.
+
+Réglages (DATABASES[alias]['POOL']) :
+    TAILLE            connexions max par processus (10)
+    ATTENTE           attente max d'une connexion libre, en secondes (5)
+    VERIFIER_APRES    inactivité au-delà de laquelle on vérifie, en secondes (30)
+    DUREE_MAX         âge max d'une connexion, en secondes (3600)
+
+`metriques()` : état de chaque pool (empruntées, inactives, attentes,
+échecs), exposé aux membres du staff par la vue `etat_pool`.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+from django.db.utils import OperationalError
+
+
+class PoolEpuise(OperationalError):
+    pass
+
+
+class Pool:
+    def __init__(self, alias, taille=10, attente=5.0, verifier_apres=30.0, duree_max=3600.0):
+        self.alias = alias
+        self.taille = taille
+        self.attente = attente
+        self.verifier_apres = verifier_apres
+        self.duree_max = duree_max
+        self.pid = os.getpid()
+        self._condition = threading.Condition()
+        # (connexion, date de création, date de restitution), la plus récemment rendue à droite
+        self._inactives = deque()
+        self._creations = {}
+        self.en_cours = 0
+        self.creees = 0
+        self.reutilisees = 0
+        self.attentes = 0
+        self.attente_totale = 0.0
+        self.attente_max = 0.0
+        self.echecs_ouverture = 0
+        self.verifications = 0
+        self.echecs_verification = 0
+        self.epuisements = 0
+
+    def acquerir(self, ouvrir, valider, fermer):
+        """
+        (connexion, reprise) : connexion inactive (vérifiée si besoin) ou
+        nouvelle via `ouvrir()` ; PoolEpuise si aucune ne se libère à temps.
+        """
+        debut = time.monotonic()
+        with self._condition:
+            attendu = False
+            while not self._inactives and self.en_cours >= self.taille:
+                restant = self.attente - (time.monotonic() - debut)
+                if restant <= 0:
+                    self.epuisements += 1
+                    raise PoolEpuise(
+                        f"Pool '{self.alias}' épuisé : {self.taille} connexion(s) empruntée(s) depuis {self.attente} s"
+                    )
+                attendu = True
+                self._condition.wait(restant)
+            if attendu:
+                duree = time.monotonic() - debut
+                self.attentes += 1
+                self.attente_totale += duree
+                self.attente_max = max(self.attente_max, duree)
+            entree = self._inactives.pop() if self._inactives else None
+            self.en_cours += 1
+
+        try:
+            if entree is not None:
+                connexion = self._reprendre(entree, valider, fermer)
+                if connexion is not None:
+                    return connexion, True
+            connexion = ouvrir()
+        except BaseException:
+            with self._condition:
+                self.en_cours -= 1
+                self.echecs_ouverture += 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self.creees += 1
+            self._creations[id(connexion)] = time.monotonic()
+        return connexion, False
+
+    def _reprendre(self, entree, valider, fermer):
+        connexion, creation, restitution = entree
+        maintenant = time.monotonic()
+        if maintenant - creation > self.duree_max:
+            _fermer(fermer, connexion)
+            return None
+        if maintenant - restitution > self.verifier_apres:
+            with self._condition:
+                self.verifications += 1
+            if not valider(connexion):
+                with self._condition:
+                    self.echecs_verification += 1
+                _fermer(fermer, connexion)
+                return None
+        with self._condition:
+            self.reutilisees += 1
+            self._creations[id(connexion)] = creation
+        return connexion
+
+    def rendre(self, connexion):
+        with self._condition:
+            creation = self._creations.pop(id(connexion), time.monotonic())
+            self._inactives.append((connexion, creation, time.monotonic()))
+            self.en_cours -= 1
+            self._condition.notify()
+
+    def jeter(self, connexion, fermer):
+        """Connexion empruntée mais inutilisable : fermée, sa place libérée"""
+        with self._condition:
+            self._creations.pop(id(connexion), None)
+            self.en_cours -= 1
+            self._condition.notify()
+        _fermer(fermer, connexion)
+
+    def vider(self, fermer):
+        """Ferme les connexions inactives"""
+        with self._condition:
+            inactives, self._inactives = list(self._inactives), deque()
+        for connexion, _, _ in inactives:
+            _fermer(fermer, connexion)
+        return len(inactives)
+
+    def metriques(self):
+        with self._condition:
+            return {
+                'taille': self.taille,
+                'en_cours': self.en_cours,
+                'inactives': len(self._inactives),
+                'creees': self.creees,
+                'reutilisees': self.reutilisees,
+                'attentes': self.attentes,
+                'attente_moyenne_ms': round(1000 * self.attente_totale / self.attentes, 3) if self.attentes else 0.0,
+                'attente_max_ms': round(1000 * self.attente_max, 3),
+                'echecs_ouverture': self.echecs_ouverture,
+                'verifications': self.verifications,
+                'echecs_verification': self.echecs_verification,
+                'epuisements': self.epuisements,
+            }
+
+
+def _fermer(fermer, connexion):
+    try:
+        fermer(connexion)
+    except Exception:
+        pass
+
+
+_pools = {}
+_verrou = threading.Lock()
+
+OPTIONS = {
+    'TAILLE': 'taille',
+    'ATTENTE': 'attente',
+    'VERIFIER_APRES': 'verifier_apres',
+    'DUREE_MAX': 'duree_max',
+}
+
+
+def pool(alias, reglages=None):
+    """Pool de l'alias dans ce processus (créé au premier appel)"""
+    existant = _pools.get(alias)
+    if existant is not None and existant.pid == os.getpid():
+        return existant
+    with _verrou:
+        existant = _pools.get(alias)
+        if existant is None or existant.pid != os.getpid():
+            options = {OPTIONS[cle]: valeur for cle, valeur in (reglages or {}).items() if cle in OPTIONS}
+            existant = _pools[alias] = Pool(alias, **options)
+        return existant
+
+
+def oublier(alias):
+    """Retire le pool de l'alias (les connexions inactives restent à fermer par l'appelant)"""
+    with _verrou:
+        return _pools.pop(alias, None)
+
+
+def metriques():
+    return {alias: p.metriques() for alias, p in list(_pools.items()) if p.pid == os.getpid()}
+
+
+class ConnexionsPooleesMixin:
+    """
+    À placer devant le DatabaseWrapper d'un backend : get_new_connection
+    emprunte au pool, _close rend la connexion. Une connexion reprise garde
+    l'état de session posé à sa création (autocommit, init_connection_state).
+    """
+    _reprise = False
+
+    @property
+    def pool(self):
+        return pool(self.alias, self.settings_dict.get('POOL'))
+
+    def connect(self):
+        try:
+            super().connect()
+        finally:
+            self._reprise = False
+
+    def get_new_connection(self, conn_params):
+        connexion, self._reprise = self.pool.acquerir(
+            lambda: super(ConnexionsPooleesMixin, self).get_new_connection(conn_params),
+            self.connexion_valide,
+            self.fermer_connexion,
+        )
+        return connexion
+
+    def _set_autocommit(self, autocommit):
+        # Les connexions ne reviennent au pool qu'en autocommit
+        if self._reprise and autocommit:
+            return
+        super()._set_autocommit(autocommit)
+
+    def init_connection_state(self):
+        if self._reprise:
+            return
+        super().init_connection_state()
+
+    def _close(self):
+        connexion = self.connection
+        if self.in_atomic_block or not self.autocommit or self.errors_occurred:
+            self.pool.jeter(connexion, self.fermer_connexion)
+        else:
+            self.pool.rendre(connexion)
+
+    def connexion_valide(self, connexion):
+        ping = getattr(connexion, 'ping', None)
+        try:
+            if ping is not None:
+                ping()
+            else:
+                curseur = connexion.cursor()
+                curseur.execute("SELECT 1")
+                curseur.close()
+        except self.Database.Error:
+            return False
+        return True
+
+    def fermer_connexion(self, connexion):
+        with self.wrap_database_errors:
+            connexion.close()
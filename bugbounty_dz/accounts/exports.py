@@ -0,0 +1,122 @@
+"""
+Exports CSV / NDJSON des rapports et des transactions, produits au fil de
+l'eau sans charger la table en mémoire.
+
+Le parcours se fait par pages de clé (`id > dernier id`, ORDER BY id) : chaque
+page est une requête bornée, lue par `.iterator(chunk_size=...)` en tuples
+(`values_list`, sans instancier de modèles). Borner chaque requête compte
+sur MySQL, dont le client charge tout le résultat d'une requête en mémoire
+(pas de curseur côté serveur). La mémoire reste donc proportionnelle à
+`taille_lot`, pas au nombre de lignes exportées.
+
+Le générateur `exporter()` produit des morceaux de texte (un par page) :
+il alimente aussi bien un StreamingHttpResponse qu'un fichier.
+"""
+import csv
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Report, Transaction
+
+
+TAILLE_LOT = 2000
+
+# Débuts de cellule interprétés comme une formule par Excel et LibreOffice
+DEBUTS_FORMULE = ('=', '+', '-', '@', '\t', '\r')
+
+EXPORTS = {
+    'rapports': {
+        'modele': Report,
+        'colonnes': (
+            'id', 'numero_reference', 'program_id', 'program__nom', 'hacker_id', 'titre',
+            'type_vulnerabilite', 'severite_label', 'severite_cvss', 'statut',
+            'montant_propose', 'montant_final', 'date_soumission', 'date_tri',
+            'date_acceptance', 'date_paiement',
+        ),
+        'entreprise': 'program__enterprise_id',
+    },
+    'transactions': {
+        'modele': Transaction,
+        'colonnes': (
+            'id', 'hacker_id', 'report_id', 'type_transaction', 'montant_brut',
+            'commission_plateforme', 'montant_net', 'statut', 'numero_compte_masque',
+            'date_creation', 'date_completion',
+        ),
+        'entreprise': 'report__program__enterprise_id',
+    },
+}
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+class ExportErreur(Exception):
+    """Export ou format inconnu"""
+
+
+def requete(nom, enterprise_id=None, using=None, **filtres):
+    """QuerySet de l'export `nom`, limité à une entreprise si demandé"""
+    if nom not in EXPORTS:
+        raise ExportErreur(f"Export inconnu : {nom}")
+    export = EXPORTS[nom]
+    queryset = export['modele'].objects.using(using).filter(**filtres)
+    if enterprise_id is not None:
+        queryset = queryset.filter(**{export['entreprise']: enterprise_id})
+    return queryset
+
+
+def lignes(queryset, colonnes, taille_lot=TAILLE_LOT):
+    """Pages de tuples, par clé croissante sur `id` (première colonne)"""
+    dernier = 0
+    while True:
+        page = list(
+            queryset.filter(pk__gt=dernier)
+            .order_by('pk')
+            .values_list(*colonnes)[:taille_lot]
+            .iterator(chunk_size=taille_lot)
+        )
+        if not page:
+            return
+        yield page
+        if len(page) < taille_lot:
+            return
+        dernier = page[-1][0]
+
+
+class _Tampon:
+    """Pseudo-fichier : csv.writer renvoie directement la ligne écrite"""
+    def write(self, valeur):
+        return valeur
+
+
+def _cellule(valeur):
+    # Texte saisi par les utilisateurs (titres) : pas de formule à l'ouverture
+    # dans un tableur
+    if isinstance(valeur, str) and valeur.startswith(DEBUTS_FORMULE):
+        return "'" + valeur
+    return valeur
+
+
+def _csv(pages, colonnes):
+    ecrivain = csv.writer(_Tampon())
+    yield ecrivain.writerow(colonnes)
+    for page in pages:
+        yield ''.join(ecrivain.writerow([_cellule(valeur) for valeur in ligne]) for ligne in page)
+
+
+def _ndjson(pages, colonnes):
+    encodeur = DjangoJSONEncoder(ensure_ascii=False)
+    for page in pages:
+        yield ''.join(encodeur.encode(dict(zip(colonnes, ligne))) + '\n' for ligne in page)
+
+
+def exporter(nom, format='csv', enterprise_id=None, taille_lot=TAILLE_LOT, using=None, **filtres):
+    """Générateur de morceaux de texte (un par page) pour l'export `nom`"""
+    if format not in FORMATS:
+        raise ExportErreur(f"Format inconnu : {format}")
+    queryset = requete(nom, enterprise_id, using, **filtres)
+    colonnes = EXPORTS[nom]['colonnes']
+    pages = lignes(queryset, colonnes, taille_lot)
+    return _csv(pages, colonnes) if format == 'csv' else _ndjson(pages, colonnes)
@@ -0,0 +1,17 @@
+"""Expressions SQL partagées par les services qui écrivent en masse."""
+from django.db.models import Case, DecimalField, Value, When
+
+
+def valeur_par_ligne(champ, valeurs, output_field=None):
+    """
+    Valeur propre à chaque ligne d'un UPDATE groupé : {clé: valeur} devient
+    CASE champ WHEN clé THEN valeur ... END (une seule valeur : littéral).
+    """
+    output_field = output_field or DecimalField(max_digits=15, decimal_places=2)
+    if len(valeurs) == 1:
+        (valeur,) = valeurs.values()
+        return Value(valeur, output_field=output_field)
+    return Case(
+        *[When(**{champ: cle}, then=Value(valeur)) for cle, valeur in valeurs.items()],
+        output_field=output_field,
+    )
@@ -0,0 +1,319 @@
+"""
+Grand livre en partie double : source des soldes des hackers, programmes
+et entreprises.
+
+- Écritures en ajout seul (table `grand_livre`) : un mouvement est un
+  ensemble de lignes (compte, montant signé) de somme nulle, inséré en un
+  bulk_create. Un crédit ne modifie aucune ligne existante : plus de ligne
+  chaude mise à jour par chaque paiement.
+- Soldes arrêtés (table `grand_livre_soldes`) : `arreter_soldes()`,
+  lancée périodiquement (commande `arreter_grand_livre`), enregistre le
+  solde de chaque compte mouvementé depuis l'arrêté précédent, à une
+  date antérieure de GRAND_LIVRE_DELAI_ARRETE secondes à maintenant (les
+  transactions encore ouvertes ne doivent pas avoir d'écriture plus
+  ancienne).
+- Solde d'un compte, à une date ou maintenant : dernier arrêté à cette
+  date (recherche dans l'index (compte, date_arret)) plus les écritures
+  suivantes (index (compte, date_ecriture)), soit au plus l'activité
+  depuis le dernier arrêté, quelle que soit la longueur de l'historique.
+- Projections : les colonnes UserHacker.solde_credit / revenus_totaux,
+  Program.budget_restant / budget_depense et Enterprise.solde_budget /
+  solde_depense sont des copies des soldes, réécrites après commit par
+  lots (accounts.tampon) pour les comptes mouvementés, par un UPDATE qui
+  calcule lui-même le solde. Elles peuvent être en retard : les décisions
+  (budget suffisant) lisent le grand livre. Lecture seule dans l'admin ;
+  un save() complet d'une de ces lignes relance sa projection
+  (accounts.signals).
+
+Comptes : 'hacker:<id>', 'programme:<id>', 'entreprise:<id>',
+'plateforme:commissions', et 'externe:<nature>' pour les contreparties hors
+plateforme (dotations des programmes, reprise des soldes existants).
+
+Réglages (settings) :
+    GRAND_LIVRE_DELAI_ARRETE     âge min des écritures arrêtées, en secondes (300)
+    GRAND_LIVRE_TAILLE_LOT       comptes par lot de projection (500)
+    GRAND_LIVRE_INTERVALLE       délai max avant projection, en secondes (1.0)
+    GRAND_LIVRE_ARRIERE_PLAN     False pour projeter dans le thread appelant (tests)
+"""
+import threading
+import uuid
+from collections import defaultdict, namedtuple
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import CharField, DecimalField, Max, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce, Concat
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .middleware import invalider_compte
+from .models import EcritureGrandLivre, Enterprise, Program, SoldeGrandLivre, UserHacker
+from .tampon import TamponEcriture
+
+
+COMMISSIONS = 'plateforme:commissions'
+ZERO = Decimal('0.00')
+
+# Type de compte → (modèle, {colonne projetée: mesure du solde}, type pour invalider_compte)
+PROJECTIONS = {
+    'hacker': (UserHacker, {'solde_credit': 'solde', 'revenus_totaux': 'entrees'}, 'hacker'),
+    'programme': (Program, {'budget_restant': 'solde', 'budget_depense': 'sorties'}, None),
+    'entreprise': (Enterprise, {'solde_budget': 'solde', 'solde_depense': 'sorties'}, 'enterprise'),
+}
+
+Solde = namedtuple('Solde', 'solde entrees sorties')
+SOLDE_NUL = Solde(ZERO, ZERO, ZERO)
+# Antérieure à toute écriture : « depuis l'arrêté » d'un compte jamais arrêté
+ORIGINE = datetime(2000, 1, 1, tzinfo=dt_timezone.utc)
+
+# Comptes par requête de solde (une condition par compte)
+TAILLE_REQUETE = 500
+
+_tampon = None
+_verrou = threading.Lock()
+
+
+class MouvementDesequilibre(ValueError):
+    pass
+
+
+def compte(type_compte, pk):
+    return f"{type_compte}:{pk}"
+
+
+# ---------------------------------------------------------------------------
+# Écriture
+# ---------------------------------------------------------------------------
+
+def mouvement(nature, lignes, report_id=None):
+    """
+    Lignes d'un mouvement, non enregistrées ; `lignes` : [(compte, montant)].
+    MouvementDesequilibre si leur somme n'est pas nulle.
+    """
+    lignes = [(compte_, Decimal(str(montant))) for compte_, montant in lignes if montant]
+    if sum(montant for _, montant in lignes) != 0:
+        raise MouvementDesequilibre(f"Mouvement {nature} déséquilibré : {lignes}")
+    identifiant = uuid.uuid4()
+    return [
+        EcritureGrandLivre(
+            mouvement=identifiant, compte=compte_, montant=montant, nature=nature, report_id=report_id,
+        )
+        for compte_, montant in lignes
+    ]
+
+
+def passer(mouvements, using=DEFAULT_DB_ALIAS):
+    """Enregistre des mouvements (listes renvoyées par `mouvement`) en un INSERT"""
+    ecritures = [ecriture for lignes in mouvements for ecriture in lignes]
+    if not ecritures:
+        return []
+    maintenant = timezone.now()
+    for ecriture in ecritures:
+        ecriture.date_ecriture = maintenant
+    EcritureGrandLivre.objects.using(using).bulk_create(ecritures, batch_size=500)
+    comptes = {ecriture.compte for ecriture in ecritures}
+    transaction.on_commit(lambda: projeter(comptes), using=using)
+    return ecritures
+
+
+def doter_programme(program, montant, using=DEFAULT_DB_ALIAS):
+    """Budget ajouté au programme (montant négatif : retiré)"""
+    return passer([mouvement('dotation', [
+        (compte('programme', program.pk), montant),
+        ('externe:dotations', -Decimal(str(montant))),
+    ])], using=using)
+
+
+# ---------------------------------------------------------------------------
+# Lecture
+# ---------------------------------------------------------------------------
+
+def _soldes(comptes, date, using):
+    arretes = SoldeGrandLivre.objects.using(using).filter(compte__in=comptes)
+    derniers = SoldeGrandLivre.objects.using(using).filter(compte=OuterRef('compte'))
+    if date is not None:
+        arretes = arretes.filter(date_arret__lte=date)
+        derniers = derniers.filter(date_arret__lte=date)
+    arretes = arretes.filter(
+        date_arret=Subquery(derniers.order_by('-date_arret').values('date_arret')[:1])
+    ).values_list('compte', 'date_arret', 'solde', 'entrees', 'sorties')
+
+    resultat, depuis, apres = {}, {}, Q()
+    for compte_, date_arret, solde, entrees, sorties in arretes:
+        resultat[compte_] = Solde(solde, entrees, sorties)
+        depuis[compte_] = date_arret
+    for compte_ in comptes:
+        if compte_ in depuis:
+            apres |= Q(compte=compte_, date_ecriture__gt=depuis[compte_])
+        else:
+            apres |= Q(compte=compte_)
+
+    ecritures = EcritureGrandLivre.objects.using(using).filter(apres)
+    if date is not None:
+        ecritures = ecritures.filter(date_ecriture__lte=date)
+    queue = (
+        ecritures.values('compte').order_by()
+        .annotate(
+            solde=Sum('montant'),
+            entrees=Sum('montant', filter=Q(montant__gt=0)),
+            sorties=Sum('montant', filter=Q(montant__lt=0)),
+        )
+    )
+    for ligne in queue:
+        base = resultat.get(ligne['compte'], SOLDE_NUL)
+        resultat[ligne['compte']] = Solde(
+            base.solde + ligne['solde'],
+            base.entrees + (ligne['entrees'] or ZERO),
+            base.sorties - (ligne['sorties'] or ZERO),
+        )
+    return resultat
+
+
+def soldes(comptes, date=None, using=DEFAULT_DB_ALIAS):
+    """{compte: Solde} à `date` (incluse) ou maintenant ; Solde nul pour un compte sans écriture"""
+    comptes = sorted(set(comptes))
+    resultat = {}
+    for debut in range(0, len(comptes), TAILLE_REQUETE):
+        resultat.update(_soldes(comptes[debut:debut + TAILLE_REQUETE], date, using))
+    return {compte_: resultat.get(compte_, SOLDE_NUL) for compte_ in comptes}
+
+
+def solde(compte_, date=None, using=DEFAULT_DB_ALIAS):
+    return soldes([compte_], date, using)[compte_]
+
+
+# ---------------------------------------------------------------------------
+# Soldes arrêtés
+# ---------------------------------------------------------------------------
+
+def delai_arrete():
+    return getattr(settings, 'GRAND_LIVRE_DELAI_ARRETE', 300)
+
+
+@transaction.atomic
+def arreter_soldes(date=None):
+    """Arrête à `date` le solde des comptes mouvementés depuis l'arrêté précédent ; renvoie leur nombre"""
+    date = date or timezone.now() - timedelta(seconds=delai_arrete())
+    precedent = SoldeGrandLivre.objects.aggregate(date=Max('date_arret'))['date']
+    if precedent is not None and date <= precedent:
+        return 0
+    ecritures = EcritureGrandLivre.objects.filter(date_ecriture__lte=date)
+    if precedent is not None:
+        ecritures = ecritures.filter(date_ecriture__gt=precedent)
+    comptes = set(ecritures.values_list('compte', flat=True).distinct())
+    arretes = [
+        SoldeGrandLivre(compte=compte_, date_arret=date, **solde_._asdict())
+        for compte_, solde_ in soldes(comptes, date).items()
+    ]
+    SoldeGrandLivre.objects.bulk_create(arretes, batch_size=1000)
+    return len(arretes)
+
+
+# ---------------------------------------------------------------------------
+# Projections
+# ---------------------------------------------------------------------------
+
+def _mesure(type_compte, mesure):
+    """
+    Expression SQL d'une mesure du solde de la ligne courante (OuterRef('pk')) :
+    dernier arrêté plus écritures suivantes, lus au moment de l'UPDATE.
+    """
+    compte_ = Concat(Value(f"{type_compte}:"), Cast(OuterRef('pk'), CharField()))
+    arrete = SoldeGrandLivre.objects.filter(compte=compte_).order_by('-date_arret')
+    depuis = Coalesce(
+        Subquery(SoldeGrandLivre.objects.filter(compte=OuterRef('compte')).order_by('-date_arret').values('date_arret')[:1]),
+        Value(ORIGINE),
+    )
+    agregat = {
+        'solde': Sum('montant'),
+        'entrees': Sum('montant', filter=Q(montant__gt=0)),
+        'sorties': Sum('montant', filter=Q(montant__lt=0)),
+    }[mesure]
+    queue = (
+        EcritureGrandLivre.objects.filter(compte=compte_)
+        .filter(date_ecriture__gt=depuis)
+        .order_by().values('compte').annotate(total=agregat).values('total')
+    )
+    sortie = DecimalField(max_digits=15, decimal_places=2)
+    base = Coalesce(Subquery(arrete.values(mesure)[:1]), Value(ZERO), output_field=sortie)
+    suite = Coalesce(Subquery(queue), Value(ZERO), output_field=sortie)
+    return base - suite if mesure == 'sorties' else base + suite
+
+
+def projeter_maintenant(comptes):
+    """
+    Réécrit les colonnes projetées des comptes ; renvoie le nombre de lignes.
+    Le solde est calculé dans l'UPDATE même : deux projections concurrentes
+    d'un compte écrivent chacune le solde courant, jamais un solde lu avant.
+    """
+    par_type = defaultdict(set)
+    for compte_ in comptes:
+        type_compte, _, pk = compte_.partition(':')
+        if type_compte in PROJECTIONS:
+            par_type[type_compte].add(int(pk))
+
+    total = 0
+    for type_compte, pks in par_type.items():
+        modele, colonnes, type_invalidation = PROJECTIONS[type_compte]
+        valeurs = {colonne: _mesure(type_compte, mesure) for colonne, mesure in colonnes.items()}
+        pks = sorted(pks)
+        for debut in range(0, len(pks), TAILLE_REQUETE):
+            total += modele.objects.filter(pk__in=pks[debut:debut + TAILLE_REQUETE]).update(**valeurs)
+        if type_invalidation:
+            for pk in pks:
+                invalider_compte(type_invalidation, pk)
+    return total
+
+
+def compte_instance(instance):
+    """Compte du grand livre d'un hacker, programme ou entreprise (None sinon)"""
+    for type_compte, (modele, _, _) in PROJECTIONS.items():
+        if isinstance(instance, modele):
+            return compte(type_compte, instance.pk)
+    return None
+
+
+def colonnes_projetees(modele):
+    for projete, colonnes, _ in PROJECTIONS.values():
+        if projete is modele:
+            return set(colonnes)
+    return set()
+
+
+def _ecrire(lot):
+    projeter_maintenant(set().union(*lot))
+
+
+def tampon():
+    global _tampon
+    if _tampon is None:
+        with _verrou:
+            if _tampon is None:
+                _tampon = TamponEcriture(
+                    _ecrire,
+                    nom='grand_livre',
+                    taille_lot=getattr(settings, 'GRAND_LIVRE_TAILLE_LOT', 500),
+                    intervalle=getattr(settings, 'GRAND_LIVRE_INTERVALLE', 1.0),
+                    arriere_plan=getattr(settings, 'GRAND_LIVRE_ARRIERE_PLAN', True),
+                )
+    return _tampon
+
+
+@receiver(setting_changed)
+def _reinitialiser(setting, **kwargs):
+    global _tampon
+    if setting.startswith('GRAND_LIVRE_') and _tampon is not None:
+        _tampon.arreter()
+        _tampon = None
+
+
+def projeter(comptes):
+    """Met en file la projection des comptes (après commit)"""
+    tampon().ajouter(frozenset(comptes))
+
+
+def vider():
+    return tampon().vider()
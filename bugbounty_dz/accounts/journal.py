@@ -0,0 +1,86 @@
+"""
+Journal d'activité (LogActivite) écrit hors du chemin des requêtes.
+
+`journaliser()` ne fait qu'ajouter l'entrée à un tampon en mémoire, au
+commit de la transaction en cours (une action annulée n'est pas journalisée) ;
+un thread l'écrit ensuite par bulk_create (voir accounts.tampon). La date de
+l'action est fixée au moment de l'appel, pas à l'écriture.
+
+Réglages (settings) :
+    JOURNAL_TAILLE_LOT       entrées par INSERT (500)
+    JOURNAL_INTERVALLE       délai max avant écriture, en secondes (1.0)
+    JOURNAL_CAPACITE         taille max de la file (10000)
+    JOURNAL_ATTENTE_MAX      attente max si la file est pleine (0 : abandon immédiat)
+    JOURNAL_ARRIERE_PLAN     False pour écrire dans le thread appelant (tests)
+"""
+import threading
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import LogActivite
+from .tampon import TamponEcriture
+
+
+_tampon = None
+_verrou = threading.Lock()
+
+
+def _ecrire(entrees):
+    LogActivite.objects.bulk_create([LogActivite(**entree) for entree in entrees])
+
+
+def tampon():
+    global _tampon
+    if _tampon is None:
+        with _verrou:
+            if _tampon is None:
+                _tampon = TamponEcriture(
+                    _ecrire,
+                    nom='journal',
+                    taille_lot=getattr(settings, 'JOURNAL_TAILLE_LOT', 500),
+                    intervalle=getattr(settings, 'JOURNAL_INTERVALLE', 1.0),
+                    capacite=getattr(settings, 'JOURNAL_CAPACITE', 10000),
+                    attente_max=getattr(settings, 'JOURNAL_ATTENTE_MAX', 0.0),
+                    arriere_plan=getattr(settings, 'JOURNAL_ARRIERE_PLAN', True),
+                )
+    return _tampon
+
+
+def adresse_ip(request):
+    return request.META.get('REMOTE_ADDR') if request is not None else None
+
+
+@receiver(setting_changed)
+def _reinitialiser(setting, **kwargs):
+    global _tampon
+    if setting.startswith('JOURNAL_') and _tampon is not None:
+        _tampon.arreter()
+        _tampon = None
+
+
+def journaliser(action, user_id=None, user_type=None, description=None,
+                entite_type=None, entite_id=None, request=None, ip_address=None):
+    """Enregistre une action au commit de la transaction en cours"""
+    entree = {
+        'action': action,
+        'user_id': user_id,
+        'user_type': user_type,
+        'description': description,
+        'entite_type': entite_type,
+        'entite_id': entite_id,
+        'ip_address': ip_address or adresse_ip(request),
+        'date_action': timezone.now(),
+    }
+    transaction.on_commit(lambda: tampon().ajouter(entree))
+
+
+def vider():
+    return tampon().vider()
+
+
+def statistiques():
+    return tampon().statistiques()
@@ -0,0 +1,307 @@
+"""
+Moteur incrémental du classement des hackers.
+
+Chaque changement de statut / sévérité d'un rapport, ou chaque transaction
+complétée, est traduit en delta appliqué uniquement à la ligne Leaderboard du
+hacker concerné. Les positions ne sont réattribuées que sur la plage de rangs
+réellement traversée par ce hacker.
+
+Ordre du classement : points_total décroissant, puis hacker_id croissant.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .classement import invalider_classement, taille_top
+from .expressions import valeur_par_ligne
+from .models import Leaderboard, Report, Transaction
+
+
+STATUTS_ACCEPTES = ('accepte', 'en_correction', 'corrige', 'paye', 'publie')
+TYPES_REVENU = ('paiement_bug', 'bonus')
+
+# Compteur par sévérité (rapports acceptés uniquement)
+CHAMPS_SEVERITE = {
+    'Critique': 'bugs_critiques',
+    'Élevée': 'bugs_eleves',
+    'Moyenne': 'bugs_moyens',
+    'Basse': 'bugs_bas',
+}
+POINTS_SEVERITE = {
+    'bugs_critiques': 50,
+    'bugs_eleves': 20,
+    'bugs_moyens': 10,
+    'bugs_bas': 5,
+}
+# Rapport accepté sans sévérité renseignée
+POINTS_SANS_SEVERITE = 2
+
+SEUILS_BADGE = (
+    (2000, 'maître'),
+    (500, 'expert'),
+    (100, 'confirmé'),
+    (0, 'novice'),
+)
+
+COMPTEURS = ('bugs_soumis', 'bugs_acceptes') + tuple(CHAMPS_SEVERITE.values())
+CHAMPS_COMPARES = COMPTEURS + (
+    'revenu_total', 'taux_acceptation', 'points_total', 'badge', 'position',
+)
+
+ZERO = Decimal('0.00')
+
+
+# ---------------------------------------------------------------------------
+# Calculs purs
+# ---------------------------------------------------------------------------
+
+def contribution_rapport(statut, severite):
+    """Compteurs apportés par un rapport dans l'état (statut, severite)"""
+    delta = {'bugs_soumis': 1}
+    if statut in STATUTS_ACCEPTES:
+        delta['bugs_acceptes'] = 1
+        champ = CHAMPS_SEVERITE.get(severite)
+        if champ:
+            delta[champ] = 1
+    return delta
+
+
+def contribution_transaction(statut, type_transaction, montant):
+    """Revenu apporté par une transaction dans un état donné"""
+    if statut == 'completee' and type_transaction in TYPES_REVENU:
+        return montant or ZERO
+    return ZERO
+
+
+def difference(avant, apres):
+    """Écart non nul, champ par champ, entre deux dicts de compteurs"""
+    delta = dict(apres)
+    for champ, valeur in avant.items():
+        delta[champ] = delta.get(champ, 0) - valeur
+    return {champ: valeur for champ, valeur in delta.items() if valeur}
+
+
+def calculer_points(compteurs):
+    points = sum(compteurs.get(champ, 0) * poids for champ, poids in POINTS_SEVERITE.items())
+    sans_severite = compteurs.get('bugs_acceptes', 0) - sum(
+        compteurs.get(champ, 0) for champ in POINTS_SEVERITE
+    )
+    return points + sans_severite * POINTS_SANS_SEVERITE
+
+
+def calculer_taux(acceptes, soumis):
+    if not soumis:
+        return ZERO
+    return (Decimal(acceptes * 100) / Decimal(soumis)).quantize(Decimal('0.01'))
+
+
+def calculer_badge(points):
+    for seuil, badge in SEUILS_BADGE:
+        if points >= seuil:
+            return badge
+
+
+def _cle_tri(hacker_id, points):
+    return (-points, hacker_id)
+
+
+# ---------------------------------------------------------------------------
+# Mises à jour incrémentales
+# ---------------------------------------------------------------------------
+
+def appliquer_rapport(hacker_id, avant, apres):
+    """
+    Applique la transition d'un rapport au classement.
+
+    `avant` / `apres` sont des tuples (statut, severite_label), ou None quand
+    le rapport vient d'être créé / vient d'être supprimé.
+    """
+    delta = difference(
+        contribution_rapport(*avant) if avant else {},
+        contribution_rapport(*apres) if apres else {},
+    )
+    if delta:
+        _appliquer(hacker_id, delta, creer=apres is not None)
+
+
+def appliquer_revenus(revenus):
+    """
+    Applique des deltas de revenu : {hacker_id: Decimal}. Le revenu n'entre
+    ni dans les points ni dans la position : un seul UPDATE suffit pour les
+    lignes existantes.
+    """
+    revenus = {hacker_id: montant for hacker_id, montant in revenus.items() if montant}
+    if not revenus:
+        return
+    existants = set(
+        Leaderboard.objects.filter(hacker_id__in=revenus).values_list('hacker_id', flat=True)
+    )
+    if existants:
+        Leaderboard.objects.filter(hacker_id__in=existants).update(
+            revenu_total=F('revenu_total') + valeur_par_ligne(
+                'hacker_id', {hacker_id: revenus[hacker_id] for hacker_id in existants}
+            )
+        )
+    for hacker_id in sorted(set(revenus) - existants):
+        if revenus[hacker_id] > 0:
+            _appliquer(hacker_id, {}, revenu=revenus[hacker_id])
+
+
+def _appliquer(hacker_id, delta, revenu=ZERO, creer=True):
+    with transaction.atomic():
+        qs = Leaderboard.objects.select_for_update()
+        if creer:
+            ligne, cree = qs.get_or_create(hacker_id=hacker_id)
+        else:
+            ligne = qs.filter(hacker_id=hacker_id).first()
+            cree = False
+            if ligne is None:
+                return
+
+        points_avant = None if cree else ligne.points_total
+        for champ, valeur in delta.items():
+            setattr(ligne, champ, getattr(ligne, champ) + valeur)
+        ligne.revenu_total = (ligne.revenu_total or ZERO) + revenu
+        ligne.points_total = calculer_points({c: getattr(ligne, c) for c in COMPTEURS})
+        ligne.taux_acceptation = calculer_taux(ligne.bugs_acceptes, ligne.bugs_soumis)
+        ligne.badge = calculer_badge(ligne.points_total)
+        ligne.save(update_fields=list(delta) + [
+            'revenu_total', 'points_total', 'taux_acceptation', 'badge', 'date_maj',
+        ])
+
+        position_avant = ligne.position
+        positions_ecrites, position = _reclasser(hacker_id, points_avant, ligne.points_total)
+        # Colonnes affichées par l'instantané du top-N (accounts.classement),
+        # à l'ancien comme au nouveau rang
+        affichage_modifie = (
+            any(rang is not None and rang <= taille_top() for rang in (position_avant, position))
+            and ('bugs_acceptes' in delta or points_avant != ligne.points_total)
+        )
+        if positions_ecrites or affichage_modifie:
+            transaction.on_commit(invalider_classement)
+
+
+def _reclasser(hacker_id, points_avant, points_apres):
+    """
+    Réattribue les positions sur la seule plage de rangs entre l'ancienne et
+    la nouvelle place du hacker. `points_avant` vaut None pour une nouvelle
+    ligne : tout ce qui est classé derrière elle se décale. Renvoie
+    (positions écrites, nouvelle position du hacker ou None si inchangée).
+    """
+    if points_avant == points_apres:
+        return False, None
+
+    haut = points_apres if points_avant is None else max(points_avant, points_apres)
+    bas = None if points_avant is None else min(points_avant, points_apres)
+
+    debut = Leaderboard.objects.filter(
+        Q(points_total__gt=haut) | Q(points_total=haut, hacker_id__lt=hacker_id)
+    ).count() + 1
+
+    plage = Q(points_total__lt=haut) | Q(points_total=haut, hacker_id__gte=hacker_id)
+    if bas is not None:
+        plage &= Q(points_total__gt=bas) | Q(points_total=bas, hacker_id__lte=hacker_id)
+
+    lignes = list(Leaderboard.objects.filter(plage).order_by('-points_total', 'hacker_id').only(
+        'id', 'hacker_id', 'points_total', 'position'
+    ))
+    ecrites = _ecrire_positions(lignes, debut)
+    return ecrites, next((ligne.position for ligne in lignes if ligne.hacker_id == hacker_id), None)
+
+
+def _ecrire_positions(lignes, debut=1):
+    a_modifier = []
+    for position, ligne in enumerate(lignes, start=debut):
+        if ligne.position != position:
+            ligne.position = position
+            a_modifier.append(ligne)
+    if a_modifier:
+        Leaderboard.objects.bulk_update(a_modifier, ['position'], batch_size=500)
+    return bool(a_modifier)
+
+
+# ---------------------------------------------------------------------------
+# Recalcul complet
+# ---------------------------------------------------------------------------
+
+def calculer_classement_complet():
+    """Recalcule le classement depuis `reports` et `transactions` : {hacker_id: champs}"""
+    acceptes = Q(statut__in=STATUTS_ACCEPTES)
+    agregats = {
+        'bugs_soumis': Count('id'),
+        'bugs_acceptes': Count('id', filter=acceptes),
+    }
+    for severite, champ in CHAMPS_SEVERITE.items():
+        agregats[champ] = Count('id', filter=acceptes & Q(severite_label=severite))
+
+    etat = {}
+    for ligne in Report.objects.order_by().values('hacker_id').annotate(**agregats):
+        etat[ligne.pop('hacker_id')] = ligne
+
+    revenus = (
+        Transaction.objects
+        .filter(statut='completee', type_transaction__in=TYPES_REVENU)
+        .order_by()
+        .values('hacker_id')
+        .annotate(total=Sum(Coalesce('montant_net', Value(ZERO), output_field=DecimalField())))
+    )
+    for ligne in revenus:
+        etat.setdefault(ligne['hacker_id'], {})['revenu_total'] = ligne['total']
+
+    # Les lignes existantes sans activité restent classées (à zéro)
+    for hacker_id in Leaderboard.objects.values_list('hacker_id', flat=True):
+        etat.setdefault(hacker_id, {})
+
+    for champs in etat.values():
+        for champ in COMPTEURS:
+            champs.setdefault(champ, 0)
+        champs['revenu_total'] = (champs.get('revenu_total') or ZERO).quantize(Decimal('0.01'))
+        champs['points_total'] = calculer_points(champs)
+        champs['taux_acceptation'] = calculer_taux(champs['bugs_acceptes'], champs['bugs_soumis'])
+        champs['badge'] = calculer_badge(champs['points_total'])
+
+    ordre = sorted(etat, key=lambda h: _cle_tri(h, etat[h]['points_total']))
+    for position, hacker_id in enumerate(ordre, start=1):
+        etat[hacker_id]['position'] = position
+    return etat
+
+
+def comparer_classement(etat=None):
+    """Écarts entre la table leaderboard et un recalcul complet"""
+    if etat is None:
+        etat = calculer_classement_complet()
+    ecarts = []
+    actuel = {
+        ligne['hacker_id']: ligne
+        for ligne in Leaderboard.objects.values('hacker_id', *CHAMPS_COMPARES)
+    }
+    for hacker_id, attendu in etat.items():
+        ligne = actuel.get(hacker_id)
+        for champ in CHAMPS_COMPARES:
+            valeur = ligne[champ] if ligne else None
+            if valeur != attendu[champ]:
+                ecarts.append((hacker_id, champ, valeur, attendu[champ]))
+    return ecarts
+
+
+@transaction.atomic
+def reconstruire_classement(etat=None):
+    """Réécrit toute la table leaderboard à partir d'un recalcul complet"""
+    if etat is None:
+        etat = calculer_classement_complet()
+    existants = {ligne.hacker_id: ligne for ligne in Leaderboard.objects.select_for_update()}
+    a_creer, a_modifier = [], []
+    for hacker_id, champs in etat.items():
+        ligne = existants.get(hacker_id)
+        if ligne is None:
+            a_creer.append(Leaderboard(hacker_id=hacker_id, **champs))
+            continue
+        for champ, valeur in champs.items():
+            setattr(ligne, champ, valeur)
+        a_modifier.append(ligne)
+    Leaderboard.objects.bulk_create(a_creer, batch_size=500)
+    Leaderboard.objects.bulk_update(a_modifier, CHAMPS_COMPARES, batch_size=500)
+    transaction.on_commit(invalider_classement)
+    return len(a_creer), len(a_modifier)
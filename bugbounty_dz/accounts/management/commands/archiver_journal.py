@@ -0,0 +1,57 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import LogActivite, LogActiviteArchive
+
+
+CHAMPS = (
+    'id', 'user_id', 'user_type', 'action', 'description',
+    'entite_type', 'entite_id', 'ip_address', 'date_action',
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Déplace les logs d'activité plus anciens que --jours vers "
+        "logs_activite_archive, par tranches d'id, pour garder la table "
+        "logs_activite petite."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jours', type=int, default=90, help="Âge minimum des logs archivés.")
+        parser.add_argument('--lot', type=int, default=5000, help="Lignes déplacées par transaction.")
+        parser.add_argument(
+            '--sans-archive',
+            action='store_true',
+            help="Supprime les logs anciens sans les copier dans l'archive.",
+        )
+
+    def handle(self, *args, **options):
+        limite = timezone.now() - timedelta(days=options['jours'])
+        anciens = LogActivite.objects.filter(date_action__lt=limite).order_by('id')
+        total = 0
+        dernier_id = 0
+
+        while True:
+            with transaction.atomic():
+                lignes = list(anciens.filter(id__gt=dernier_id).values(*CHAMPS)[:options['lot']])
+                if not lignes:
+                    break
+                ids = [ligne['id'] for ligne in lignes]
+                if not options['sans_archive']:
+                    LogActiviteArchive.objects.bulk_create(
+                        [LogActiviteArchive(**ligne) for ligne in lignes],
+                        ignore_conflicts=True,
+                    )
+                LogActivite.objects.filter(id__in=ids).delete()
+            total += len(ids)
+            dernier_id = ids[-1]
+            self.stdout.write(f"  {total} log(s) traités (jusqu'à l'id {dernier_id})")
+
+        verbe = "supprimé(s)" if options['sans_archive'] else "archivé(s)"
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} log(s) antérieurs au {limite:%Y-%m-%d} {verbe}."
+        ))
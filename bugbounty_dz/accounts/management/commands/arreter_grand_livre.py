@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.utils.dateparse import parse_datetime
+
+from accounts import grand_livre
+from accounts.models import EcritureGrandLivre
+
+
+class Command(BaseCommand):
+    help = (
+        "Arrête les soldes du grand livre (comptes mouvementés depuis l'arrêté "
+        "précédent), à lancer périodiquement : le calcul d'un solde ne relit que "
+        "les écritures postérieures au dernier arrêté. Avec --projeter, réécrit "
+        "aussi les colonnes de solde de tous les comptes projetés."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date',
+            help="Date d'arrêté (ISO 8601) ; par défaut maintenant moins GRAND_LIVRE_DELAI_ARRETE.",
+        )
+        parser.add_argument('--projeter', action='store_true', help="Réécrit toutes les colonnes projetées.")
+
+    def handle(self, *args, **options):
+        date = parse_datetime(options['date']) if options['date'] else None
+        arretes = grand_livre.arreter_soldes(date)
+        self.stdout.write(self.style.SUCCESS(f"{arretes} solde(s) arrêté(s)."))
+
+        if options['projeter']:
+            comptes = EcritureGrandLivre.objects.values_list('compte', flat=True).distinct().iterator()
+            lignes = grand_livre.projeter_maintenant(set(comptes))
+            self.stdout.write(self.style.SUCCESS(f"{lignes} ligne(s) projetée(s)."))
@@ -0,0 +1,83 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+
+from accounts.authentification import BACKENDS, hasher_prefere
+from accounts.models import UserHacker
+
+
+class Command(BaseCommand):
+    help = (
+        "Banc d'essai des connexions hacker : connexions réussies par seconde et "
+        "par worker, puis rafale de mauvais mots de passe (limitation des échecs). "
+        "Les comptes créés sont supprimés."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--connexions', type=int, default=40, help="Connexions réussies par worker.")
+        parser.add_argument('--rafale', type=int, default=500, help="Tentatives échouées par worker.")
+
+    def handle(self, *args, **options):
+        mot_de_passe = "Bench-connexion-1"
+        suffixe = str(time.time_ns())
+        hash_ = make_password(mot_de_passe, hasher=hasher_prefere())
+        hackers = [
+            UserHacker.objects.create(
+                email=f"bench{suffixe}-{n}@bench.dz", telephone=f"c{suffixe[-10:]}{n}", nom="Bench",
+                prenom=str(n), date_naissance=date(2000, 1, 1), adresse="-", cni_numero=f"c{suffixe}{n}",
+                mot_de_passe_hash=hash_, statut='actif', verifiee=True,
+            )
+            for n in range(options['workers'])
+        ]
+        backend = BACKENDS['hacker']
+        fabrique = RequestFactory()
+
+        def connexions(hacker, n):
+            request = fabrique.post('/hacker/login/', REMOTE_ADDR=f"10.0.{n // 250}.{n % 250}")
+            try:
+                debut = time.perf_counter()
+                for _ in range(options['connexions']):
+                    _, erreur = backend.verifier(request, email=hacker.email, mot_de_passe=mot_de_passe)
+                    if erreur:
+                        raise CommandError(f"Connexion refusée : {erreur}")
+                return time.perf_counter() - debut
+            finally:
+                connection.close()
+
+        def rafale(hacker, n):
+            request = fabrique.post('/hacker/login/', REMOTE_ADDR=f"10.1.{n // 250}.{n % 250}")
+            try:
+                debut = time.perf_counter()
+                bloquees = 0
+                for _ in range(options['rafale']):
+                    _, erreur = backend.verifier(request, email=hacker.email, mot_de_passe="faux")
+                    bloquees += erreur == 'bloque'
+                backend.reinitialiser_echecs(hacker.email)
+                return time.perf_counter() - debut, bloquees
+            finally:
+                connection.close()
+
+        try:
+            with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+                durees = list(executor.map(connexions, hackers, range(len(hackers))))
+                rafales = list(executor.map(rafale, hackers, range(len(hackers))))
+        finally:
+            UserHacker.objects.filter(pk__in=[h.pk for h in hackers]).delete()
+
+        par_worker = sum(options['connexions'] / duree for duree in durees) / len(durees)
+        self.stdout.write(self.style.SUCCESS(
+            f"Hasher {hash_.split('$')[0]} : {par_worker:.1f} connexions/s par worker, "
+            f"{par_worker * len(durees):.1f} connexions/s au total ({options['workers']} worker(s))."
+        ))
+        tentatives = sum(options['rafale'] / duree for duree, _ in rafales) / len(rafales)
+        bloquees = sum(b for _, b in rafales)
+        self.stdout.write(self.style.SUCCESS(
+            f"Rafale de mauvais mots de passe : {tentatives:.0f} tentatives/s par worker, "
+            f"{bloquees}/{options['rafale'] * len(rafales)} refusées sans requête ni hash."
+        ))
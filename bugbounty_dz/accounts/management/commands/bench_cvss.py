@@ -0,0 +1,69 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts import cvss
+
+
+GRILLE = {
+    'Critique': {'min': 3000, 'max': 5000},
+    'Élevée': {'min': 1000, 'max': 2500},
+    'Moyenne': [300, 800],
+    'Basse': 100,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Micro-banc d'essai de la notation CVSS : vecteurs synthétiques tarifés "
+        "un rapport à la fois (analyse, score et grille recalculés à chaque fois) "
+        "contre l'évaluation en lot (vecteurs mémorisés, grille compilée, "
+        "calcul vectorisé avec NumPy s'il est installé)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rapports', type=int, default=50000)
+        parser.add_argument('--graine', type=int, default=1)
+
+    def handle(self, *args, **options):
+        hasard = random.Random(options['graine'])
+        vecteurs = [self.vecteur(hasard) for _ in range(options['rapports'])]
+
+        echantillon = vecteurs[:max(len(vecteurs) // 10, 1)]
+        debut = time.perf_counter()
+        unitaires = [self.unitaire(vecteur) for vecteur in echantillon]
+        unitaire = time.perf_counter() - debut
+
+        cvss.analyser.cache_clear()
+        cvss._compiler.cache_clear()
+        debut = time.perf_counter()
+        lot = cvss.evaluer(vecteurs, cvss.bareme(GRILLE, 50))
+        duree_lot = time.perf_counter() - debut
+
+        ecarts = sum(a != b for a, b in zip(unitaires, lot))
+        self.stdout.write(
+            f"{len(vecteurs)} rapport(s), {len(set(vecteurs))} vecteur(s) distinct(s), "
+            f"NumPy {'oui' if cvss.vectorise() else 'non'}"
+        )
+        self.stdout.write(f"un à la fois           {unitaire / len(echantillon) * 1e6:10.2f} µs/rapport "
+                          f"(échantillon de {len(echantillon)}, {ecarts} écart(s))")
+        self.stdout.write(f"lot                    {duree_lot / len(lot) * 1e6:10.2f} µs/rapport")
+
+    def vecteur(self, hasard):
+        metriques = [
+            f"{metrique}:{hasard.choice(sorted(valeurs))}"
+            for metrique, valeurs in cvss.POIDS.items()
+        ]
+        return f"CVSS:3.{hasard.choice((0, 1))}/" + '/'.join(metriques)
+
+    def unitaire(self, vecteur):
+        """Référence : ni mémorisation ni grille compilée"""
+        poids = cvss.analyser.__wrapped__(vecteur)
+        dixieme = cvss._dixiemes(poids)
+        table = cvss._compiler.__wrapped__(cvss.json.dumps(GRILLE, sort_keys=True), '50')
+        centimes = table[dixieme]
+        return (
+            cvss.SCORES[dixieme], cvss.LIBELLES[dixieme],
+            None if centimes is None else cvss.Decimal(centimes).scaleb(-2),
+        )
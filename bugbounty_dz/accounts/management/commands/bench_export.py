@@ -0,0 +1,78 @@
+import time
+import tracemalloc
+from datetime import date
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from accounts.exports import EXPORTS, TAILLE_LOT, exporter
+from accounts.models import Transaction, UserHacker
+
+
+class Command(BaseCommand):
+    help = (
+        "Banc d'essai de l'export en flux : pour chaque volume, mesure le pic "
+        "mémoire (tracemalloc) et le débit de l'export des transactions, comparés "
+        "à un chargement complet du QuerySet. Les données sont créées dans une "
+        "transaction annulée à la fin."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lignes', type=int, nargs='+', default=[10000, 100000])
+        parser.add_argument('--format', choices=('csv', 'ndjson'), default='csv')
+        parser.add_argument('--taille-lot', type=int, default=TAILLE_LOT)
+        parser.add_argument('--sans-comparaison', action='store_true', help="Ne pas mesurer le chargement complet.")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            hacker = UserHacker.objects.create(
+                email=f"bench{time.time_ns()}@bench.dz", telephone=f"b{time.time_ns() % 10**10}",
+                nom="Bench", prenom="Export", date_naissance=date(2000, 1, 1), adresse="-",
+                cni_numero=f"bench{time.time_ns()}", mot_de_passe_hash="!",
+            )
+            existantes = 0
+            for volume in sorted(options['lignes']):
+                self.completer(hacker, volume - existantes)
+                existantes = volume
+                self.mesurer(hacker, volume, options)
+            transaction.set_rollback(True)
+
+    def completer(self, hacker, nombre):
+        montant = Decimal('100.00')
+        for debut in range(0, nombre, 5000):
+            Transaction.objects.bulk_create([
+                Transaction(
+                    hacker=hacker, type_transaction='bonus', montant_brut=montant,
+                    commission_plateforme=Decimal('0.00'), montant_net=montant, statut='completee',
+                )
+                for _ in range(min(5000, nombre - debut))
+            ])
+
+    def mesurer(self, hacker, volume, options):
+        tracemalloc.start()
+        debut = time.perf_counter()
+        octets = 0
+        for morceau in exporter(
+            'transactions', options['format'], taille_lot=options['taille_lot'], hacker_id=hacker.pk,
+        ):
+            octets += len(morceau)
+        duree = time.perf_counter() - debut
+        _, pic = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        ligne = (
+            f"{volume:>10} lignes : flux {pic / 2**20:7.2f} Mo de pic, "
+            f"{volume / duree:,.0f} lignes/s, {octets / 2**20:.1f} Mo écrits"
+        )
+
+        if not options['sans_comparaison']:
+            tracemalloc.start()
+            complet = list(
+                Transaction.objects.filter(hacker=hacker).values_list(*EXPORTS['transactions']['colonnes'])
+            )
+            _, pic_complet = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            del complet
+            ligne += f" · chargement complet {pic_complet / 2**20:7.2f} Mo de pic"
+
+        self.stdout.write(ligne)
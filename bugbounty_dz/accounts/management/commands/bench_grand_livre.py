@@ -0,0 +1,108 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, transaction
+from django.db.models import F
+
+from accounts import grand_livre
+from accounts.models import EcritureGrandLivre, UserHacker
+
+
+class Command(BaseCommand):
+    help = (
+        "Banc d'essai des crédits concurrents sur un même compte (ligne chaude) : "
+        "UPDATE solde_credit = solde_credit + x (ancien chemin) contre un mouvement "
+        "ajouté au grand livre (INSERT), puis projection des colonnes. Vérifie les "
+        "soldes obtenus ; les données créées sont supprimées."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--credits', type=int, default=2000)
+        parser.add_argument('--comptes', type=int, default=1, help="Hackers crédités (1 : une seule ligne chaude).")
+        parser.add_argument('--montant', type=Decimal, default=Decimal('10.00'))
+
+    def handle(self, *args, **options):
+        hackers = self.preparer(options['comptes'])
+        try:
+            scenarios = (("UPDATE de la ligne", self.crediter_ligne), ("grand livre (INSERT)", self.crediter_grand_livre))
+            for libelle, crediter in scenarios:
+                duree = self.mesurer(crediter, hackers, options)
+                projection = 0.0
+                if crediter == self.crediter_grand_livre:
+                    debut = time.perf_counter()
+                    grand_livre.tampon().arreter()
+                    projection = time.perf_counter() - debut
+                self.stdout.write(
+                    f"{libelle:<24} {options['credits'] / duree:8.0f} crédits/s "
+                    f"({options['workers']} worker(s), {len(hackers)} compte(s))"
+                    + (f", projection vidée en {projection * 1000:.0f} ms" if projection else "")
+                )
+                self.verifier(hackers, options, grand_livre_seul=crediter == self.crediter_grand_livre)
+        finally:
+            EcritureGrandLivre.objects.filter(compte__in=[grand_livre.compte('hacker', h) for h in hackers]).delete()
+            EcritureGrandLivre.objects.filter(compte='externe:bench').delete()
+            UserHacker.objects.filter(pk__in=hackers).delete()
+        self.stdout.write(self.style.SUCCESS("Soldes vérifiés : aucune mise à jour perdue."))
+
+    def preparer(self, nombre):
+        suffixe = str(time.time_ns())
+        return [
+            UserHacker.objects.create(
+                email=f"bench{suffixe}-{n}@bench.dz", telephone=f"g{suffixe[-10:]}{n}", nom="Bench",
+                prenom=str(n), date_naissance=date(2000, 1, 1), adresse="-", cni_numero=f"g{suffixe}{n}",
+                mot_de_passe_hash="!",
+            ).pk
+            for n in range(nombre)
+        ]
+
+    def crediter_ligne(self, hacker_id, montant):
+        with transaction.atomic():
+            UserHacker.objects.filter(pk=hacker_id).update(
+                solde_credit=F('solde_credit') + montant, revenus_totaux=F('revenus_totaux') + montant,
+            )
+
+    def crediter_grand_livre(self, hacker_id, montant):
+        with transaction.atomic():
+            grand_livre.passer([grand_livre.mouvement('bonus', [
+                (grand_livre.compte('hacker', hacker_id), montant),
+                ('externe:bench', -montant),
+            ])])
+
+    def mesurer(self, crediter, hackers, options):
+        def travailler(indices):
+            try:
+                for n in indices:
+                    for essai in range(50):
+                        try:
+                            crediter(hackers[n % len(hackers)], options['montant'])
+                            break
+                        except OperationalError:
+                            # SQLite : base verrouillée par un autre worker
+                            if connection.vendor != 'sqlite' or essai == 49:
+                                raise
+                            time.sleep(0.005 * (essai + 1))
+            finally:
+                connection.close()
+
+        parts = [range(i, options['credits'], options['workers']) for i in range(options['workers'])]
+        debut = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            for futur in [executor.submit(travailler, part) for part in parts]:
+                futur.result()
+        return time.perf_counter() - debut
+
+    def verifier(self, hackers, options, grand_livre_seul):
+        """Colonnes (UPDATE, ou projection du grand livre) égales au total crédité"""
+        total = options['montant'] * options['credits']
+        colonnes = sum(UserHacker.objects.filter(pk__in=hackers).values_list('solde_credit', flat=True))
+        if grand_livre_seul:
+            soldes = grand_livre.soldes(grand_livre.compte('hacker', h) for h in hackers)
+            credit = sum(solde.solde for solde in soldes.values())
+            if credit != total:
+                raise CommandError(f"Grand livre : {credit} crédités, attendu {total}")
+        if colonnes != total:
+            raise CommandError(f"Colonnes solde_credit : {colonnes}, attendu {total}")
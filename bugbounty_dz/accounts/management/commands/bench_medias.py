@@ -0,0 +1,66 @@
+import os
+import tempfile
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory, override_settings
+from django.views.static import serve
+
+from accounts.views import MediaProtegeView
+
+
+class Command(BaseCommand):
+    help = (
+        "Banc d'essai du service des médias : django.views.static.serve (ancien "
+        "chemin, DEBUG seulement) contre la vue protégée, en FileResponse et avec "
+        "X-Accel-Redirect. Mesure le débit à travers Python (sans wsgi.file_wrapper) "
+        "et les octets que le worker Python doit transmettre lui-même."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--taille', type=int, default=8, help="Taille du fichier, en Mo.")
+        parser.add_argument('--requetes', type=int, default=50)
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as media:
+            os.makedirs(os.path.join(media, 'cni'))
+            nom = 'cni/bench.jpg'
+            with open(os.path.join(media, nom), 'wb') as fichier:
+                fichier.write(os.urandom(options['taille'] * 1024 * 1024))
+
+            fabrique = RequestFactory()
+            staff = User(username="bench", is_staff=True, is_active=True)
+            vue = MediaProtegeView.as_view()
+
+            def protege(request):
+                request.user = staff
+                request.session = {}
+                return vue(request, nom=nom)
+
+            scenarios = (
+                ("static.serve", {}, lambda request: serve(request, nom, document_root=media)),
+                ("protégé / FileResponse", {}, protege),
+                ("protégé / X-Accel-Redirect", {'MEDIAS_ENVOI': 'x-accel-redirect'}, protege),
+            )
+            for libelle, reglages, servir in scenarios:
+                with override_settings(MEDIA_ROOT=media, **reglages):
+                    octets, duree = self.mesurer(fabrique, servir, options['requetes'])
+                self.stdout.write(
+                    f"{libelle:<28} {duree / options['requetes'] * 1000:8.2f} ms/requête, "
+                    f"{octets / options['requetes'] / 1024 / 1024:6.2f} Mo transmis par Python, "
+                    f"{octets / duree / 1024 / 1024 if octets else 0:8.0f} Mo/s"
+                )
+
+    def mesurer(self, fabrique, servir, nombre):
+        octets = 0
+        debut = time.perf_counter()
+        for _ in range(nombre):
+            response = servir(fabrique.get('/media/'))
+            if response.streaming:
+                for morceau in response.streaming_content:
+                    octets += len(morceau)
+            else:
+                octets += len(response.content)
+            response.close()
+        return octets, time.perf_counter() - debut
@@ -0,0 +1,115 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, transaction
+from django.db.models import Sum
+
+from accounts import grand_livre
+from accounts.models import Enterprise, Program, Report, Transaction, UserHacker
+from accounts.paiements import payer_rapports
+
+
+class Command(BaseCommand):
+    help = (
+        "Banc d'essai des paiements concurrents : plusieurs workers paient en "
+        "parallèle des rapports du même programme, puis les soldes sont "
+        "vérifiés (aucune mise à jour perdue). Les données créées sont supprimées."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--rapports', type=int, default=400)
+        parser.add_argument('--hackers', type=int, default=20)
+        parser.add_argument('--lot', type=int, default=1, help="Rapports payés par appel (mode lot si > 1).")
+        parser.add_argument('--montant', type=Decimal, default=Decimal('100.00'))
+
+    def handle(self, *args, **options):
+        rapports, enterprise, hackers = self.preparer(options)
+        lots = [rapports[i:i + options['lot']] for i in range(0, len(rapports), options['lot'])]
+
+        def travailler(lots_worker):
+            try:
+                for lot in lots_worker:
+                    for essai in range(50):
+                        try:
+                            payer_rapports(lot)
+                            break
+                        except OperationalError:
+                            # SQLite : base verrouillée par un autre worker
+                            if connection.vendor != 'sqlite' or essai == 49:
+                                raise
+                            time.sleep(0.01 * (essai + 1))
+            finally:
+                connection.close()
+
+        parts = [lots[i::options['workers']] for i in range(options['workers'])]
+        debut = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            for futur in [executor.submit(travailler, part) for part in parts]:
+                futur.result()
+        duree = time.perf_counter() - debut
+
+        # Colonnes de solde : projections écrites après commit, en arrière-plan
+        grand_livre.tampon().arreter()
+        try:
+            self.verifier(rapports, enterprise, hackers, options)
+        finally:
+            enterprise.delete()
+            UserHacker.objects.filter(pk__in=[h.pk for h in hackers]).delete()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(rapports)} paiements en {duree:.2f}s avec {options['workers']} worker(s), "
+            f"lot de {options['lot']} : {len(rapports) / duree:.0f} paiements/s. "
+            "Aucune mise à jour perdue."
+        ))
+
+    @transaction.atomic
+    def preparer(self, options):
+        suffixe = str(time.time_ns())
+        enterprise = Enterprise.objects.create(
+            nom_legal="Bench paiements", email_entreprise=f"bench{suffixe}@bench.dz", mot_de_passe_hash="!",
+        )
+        program = Program.objects.create(
+            enterprise=enterprise, nom="Bench", budget_total=options['montant'] * options['rapports'],
+        )
+        hackers = [
+            UserHacker.objects.create(
+                email=f"bench{suffixe}-{n}@bench.dz", telephone=f"b{suffixe[-10:]}{n}", nom="Bench",
+                prenom=str(n), date_naissance=date(2000, 1, 1), adresse="-", cni_numero=f"b{suffixe}{n}",
+                mot_de_passe_hash="!",
+            )
+            for n in range(options['hackers'])
+        ]
+        rapports = Report.objects.bulk_create([
+            Report(
+                program=program, hacker=hackers[n % len(hackers)], titre=f"Bench {n}", description="-",
+                statut='accepte', montant_final=options['montant'],
+            )
+            for n in range(options['rapports'])
+        ])
+        if rapports[0].pk is None:
+            rapports = list(Report.objects.filter(program=program).order_by('pk'))
+        return [rapport.pk for rapport in rapports], enterprise, hackers
+
+    def verifier(self, rapports, enterprise, hackers, options):
+        attendu = options['montant'] * len(rapports)
+        program = Program.objects.get(enterprise=enterprise)
+        enterprise.refresh_from_db()
+        erreurs = []
+        if program.budget_depense != attendu:
+            erreurs.append(f"budget_depense {program.budget_depense} ≠ {attendu}")
+        if program.budget_restant != program.budget_total - attendu:
+            erreurs.append(f"budget_restant {program.budget_restant}")
+        if enterprise.solde_depense != attendu:
+            erreurs.append(f"solde_depense {enterprise.solde_depense} ≠ {attendu}")
+        if Transaction.objects.filter(report_id__in=rapports).count() != len(rapports):
+            erreurs.append("nombre de transactions incorrect")
+        net = Transaction.objects.filter(report_id__in=rapports).aggregate(total=Sum('montant_net'))['total']
+        credit = UserHacker.objects.filter(pk__in=[h.pk for h in hackers]).aggregate(total=Sum('solde_credit'))['total']
+        if net != credit:
+            erreurs.append(f"solde_credit {credit} ≠ {net}")
+        if erreurs:
+            raise CommandError("Mises à jour perdues : " + " ; ".join(erreurs))
@@ -0,0 +1,104 @@
+import fnmatch
+import ipaddress
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.perimetre import Perimetre
+
+
+class Command(BaseCommand):
+    help = (
+        "Micro-banc d'essai du périmètre compilé : portée synthétique (domaines, "
+        "jokers, plages CIDR, préfixes d'URL, exclusions), temps de compilation "
+        "puis temps par actif, unitaire et par lot, comparé à une vérification "
+        "linéaire (fnmatch et ipaddress entrée par entrée)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--entrees', type=int, default=2000, help="Entrées de la portée.")
+        parser.add_argument('--actifs', type=int, default=20000, help="Actifs vérifiés.")
+        parser.add_argument('--graine', type=int, default=1)
+
+    def handle(self, *args, **options):
+        hasard = random.Random(options['graine'])
+        entrees = self.portee(hasard, options['entrees'])
+        actifs = self.actifs(hasard, entrees, options['actifs'])
+
+        debut = time.perf_counter()
+        perimetre = Perimetre(entrees)
+        compilation = time.perf_counter() - debut
+
+        debut = time.perf_counter()
+        unitaires = [perimetre.contient(actif) for actif in actifs]
+        unitaire = time.perf_counter() - debut
+
+        debut = time.perf_counter()
+        lot = perimetre.classer(actifs)
+        duree_lot = time.perf_counter() - debut
+
+        echantillon = actifs[:max(len(actifs) // 20, 1)]
+        debut = time.perf_counter()
+        lineaires = [self.lineaire(entrees, actif) for actif in echantillon]
+        lineaire = time.perf_counter() - debut
+
+        ecarts = sum(a != b for a, b in zip(unitaires, lineaires))
+        self.stdout.write(f"{len(entrees)} entrée(s), {len(actifs)} actif(s), {sum(unitaires)} dans le périmètre")
+        self.stdout.write(f"compilation            {compilation * 1000:10.2f} ms")
+        self.stdout.write(f"compilé, unitaire      {unitaire / len(actifs) * 1e6:10.2f} µs/actif")
+        self.stdout.write(f"compilé, lot           {duree_lot / len(lot) * 1e6:10.2f} µs/actif")
+        self.stdout.write(f"linéaire               {lineaire / len(echantillon) * 1e6:10.2f} µs/actif "
+                          f"(échantillon de {len(echantillon)}, {ecarts} écart(s))")
+
+    def portee(self, hasard, nombre):
+        entrees = []
+        for n in range(nombre):
+            tirage = hasard.random()
+            racine = f"client{n % 200}.dz"
+            if tirage < 0.4:
+                entrees.append(f"svc{n}.{racine}")
+            elif tirage < 0.6:
+                entrees.append(f"*.{racine}")
+            elif tirage < 0.75:
+                entrees.append(f"10.{n % 256}.{hasard.randrange(256)}.0/24")
+            elif tirage < 0.9:
+                entrees.append(f"https://app{n % 50}.{racine}/api/v{n % 3}")
+            else:
+                entrees.append(f"- admin{n}.{racine}")
+        return entrees
+
+    def actifs(self, hasard, entrees, nombre):
+        actifs = []
+        for n in range(nombre):
+            tirage = hasard.random()
+            racine = f"client{hasard.randrange(400)}.dz"
+            if tirage < 0.4:
+                actifs.append(f"svc{hasard.randrange(len(entrees))}.{racine}")
+            elif tirage < 0.6:
+                actifs.append(f"x{n}.{racine}")
+            elif tirage < 0.8:
+                actifs.append(f"10.{hasard.randrange(256)}.{hasard.randrange(256)}.{hasard.randrange(256)}")
+            else:
+                actifs.append(f"https://app{hasard.randrange(60)}.{racine}/api/v{hasard.randrange(4)}/users")
+        return actifs
+
+    def lineaire(self, entrees, actif):
+        """Référence : chaque entrée relue et comparée à l'actif"""
+        inclus = exclu = False
+        hote = actif.split('://', 1)[-1].split('/', 1)[0]
+        for entree in entrees:
+            exclusion = entree.startswith('-')
+            motif = entree.lstrip('-! ')
+            if '://' in motif:
+                trouve = '://' in actif and actif.startswith(motif)
+            elif '/' in motif:
+                try:
+                    trouve = ipaddress.ip_address(hote) in ipaddress.ip_network(motif)
+                except ValueError:
+                    trouve = False
+            else:
+                trouve = hote == motif or (motif.startswith('*.') and fnmatch.fnmatch(hote, motif))
+            if trouve:
+                exclu, inclus = exclu or exclusion, inclus or not exclusion
+        return inclus and not exclu
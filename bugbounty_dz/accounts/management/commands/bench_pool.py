@@ -0,0 +1,83 @@
+import copy
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from accounts.db import pool
+from accounts.db.pool import ConnexionsPooleesMixin
+
+
+class Command(BaseCommand):
+    help = (
+        "Test de charge des connexions à la base : chaque worker enchaîne des "
+        "requêtes HTTP simulées (ouverture à la première requête SQL, fermeture "
+        "de fin de requête comme request_finished) sans pool (CONN_MAX_AGE=0), "
+        "avec connexions persistantes, puis avec le pool. À lancer contre un "
+        "MySQL ou MariaDB local."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--requetes', type=int, default=200, help="Requêtes HTTP simulées par worker.")
+        parser.add_argument('--sql', type=int, default=3, help="Requêtes SQL par requête HTTP.")
+        parser.add_argument('--taille-pool', type=int, default=4)
+
+    def handle(self, *args, **options):
+        connexion = connections[options['database']]
+        natif = next(classe for classe in type(connexion).__mro__ if not issubclass(classe, ConnexionsPooleesMixin))
+        poole = type('DatabaseWrapper', (ConnexionsPooleesMixin, natif), {})
+        reglages = connexion.settings_dict
+
+        scenarios = (
+            ("sans pool", natif, {'CONN_MAX_AGE': 0}),
+            ("persistantes", natif, {'CONN_MAX_AGE': 600}),
+            ("pool", poole, {'CONN_MAX_AGE': 0, 'POOL': {'TAILLE': options['taille_pool']}}),
+        )
+        self.stdout.write(
+            f"{connexion.vendor}, {options['workers']} worker(s) × {options['requetes']} requête(s), "
+            f"{options['sql']} requête(s) SQL chacune"
+        )
+        for libelle, classe, surcharge in scenarios:
+            alias = f"bench-{libelle.replace(' ', '-')}"
+            settings_dict = {**copy.deepcopy(reglages), **surcharge}
+            etat = None
+            try:
+                durees = self.charger(classe, settings_dict, alias, options)
+            finally:
+                existant = pool.oublier(alias)
+                if existant is not None:
+                    etat = existant.metriques()
+                    existant.vider(lambda c: c.close())
+            durees.sort()
+            self.stdout.write(
+                f"{libelle:<14} moyenne {statistics.mean(durees) * 1000:7.3f} ms, "
+                f"p50 {durees[len(durees) // 2] * 1000:7.3f} ms, "
+                f"p95 {durees[int(len(durees) * 0.95)] * 1000:7.3f} ms par requête HTTP"
+            )
+            if etat is not None:
+                self.stdout.write(f"{'':<14} {etat}")
+
+    def charger(self, classe, settings_dict, alias, options):
+        def worker(_):
+            connexion = classe(settings_dict, alias)
+            durees = []
+            try:
+                for _ in range(options['requetes']):
+                    debut = time.perf_counter()
+                    for _ in range(options['sql']):
+                        with connexion.cursor() as curseur:
+                            curseur.execute("SELECT 1")
+                            curseur.fetchone()
+                    # Fin de requête (django.db.close_old_connections)
+                    connexion.close_if_unusable_or_obsolete()
+                    durees.append(time.perf_counter() - debut)
+            finally:
+                connexion.close()
+            return durees
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            return [duree for durees in executor.map(worker, range(options['workers'])) for duree in durees]
@@ -0,0 +1,73 @@
+import time
+
+from django.conf import settings
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+
+from accounts import sessions
+
+
+MOTEURS = ('django.contrib.sessions.backends.db', 'accounts.sessions')
+
+
+class Command(BaseCommand):
+    help = (
+        "Banc d'essai du coût des sessions par requête : moteur base de données de "
+        "Django contre accounts.sessions, pour des requêtes qui lisent la session "
+        "et des requêtes qui la modifient. Affiche requêtes SQL et temps par requête HTTP."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requetes', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        for moteur in MOTEURS:
+            with override_settings(SESSION_ENGINE=moteur):
+                cle = self.connecter()
+                for scenario, ecrire in (("lecture", False), ("modification", True)):
+                    requetes_sql, duree = self.mesurer(cle, ecrire, options['requetes'])
+                    self.stdout.write(
+                        f"{moteur:<40} {scenario:<13} "
+                        f"{requetes_sql / options['requetes']:.2f} requête(s) SQL, "
+                        f"{duree / options['requetes'] * 1e6:.0f} µs par requête HTTP"
+                    )
+                SessionMiddleware(lambda request: None).SessionStore(cle).delete()
+        sessions.vider()
+
+    def connecter(self):
+        def vue(request):
+            request.session['hacker_id'] = 1
+            request.session['hacker_nom'] = "Bench"
+            return HttpResponse()
+
+        request = RequestFactory().get('/')
+        reponse = SessionMiddleware(vue)(request)
+        return reponse.cookies[settings.SESSION_COOKIE_NAME].value
+
+    def mesurer(self, cle, ecrire, nombre):
+        def vue(request):
+            request.session.get('hacker_id')
+            if ecrire:
+                request.session['derniere_page'] = request.path
+            return HttpResponse()
+
+        requetes_sql = []
+
+        def compter(execute, sql, params, many, context):
+            requetes_sql.append(sql)
+            return execute(sql, params, many, context)
+
+        middleware = SessionMiddleware(vue)
+        fabrique = RequestFactory()
+        # Requêtes du thread de la requête HTTP (l'écriture différée n'y figure pas)
+        with connection.execute_wrapper(compter):
+            debut = time.perf_counter()
+            for n in range(nombre):
+                request = fabrique.get(f'/page/{n}/')
+                request.COOKIES[settings.SESSION_COOKIE_NAME] = cle
+                middleware(request)
+            duree = time.perf_counter() - debut
+        return len(requetes_sql), duree
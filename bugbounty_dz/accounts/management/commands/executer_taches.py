@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from accounts import taches
+from accounts.models import TacheMasse
+
+
+class Command(BaseCommand):
+    help = (
+        "Exécute dans ce processus les actions en masse en attente ou "
+        "interrompues (redémarrage du serveur : bail TACHES_BAIL expiré) ; "
+        "chacune reprend au premier lot non traité. Une tâche prise par un "
+        "autre worker n'est pas exécutée."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tache', type=int, action='append', help="Id de tâche (répétable).")
+
+    def handle(self, *args, **options):
+        restantes = TacheMasse.objects.filter(statut__in=('en_attente', 'en_cours')).order_by('pk')
+        if options['tache']:
+            restantes = restantes.filter(pk__in=options['tache'])
+
+        nombre = 0
+        for tache_id in restantes.values_list('pk', flat=True):
+            tache = taches.executer(tache_id)
+            nombre += 1
+            self.stdout.write(
+                f"Tâche {tache.pk} ({tache.action}) : {tache.statut}, "
+                f"{tache.reussis} réussi(s), {tache.echecs} échec(s) sur {tache.total}."
+            )
+        self.stdout.write(self.style.SUCCESS(f"{nombre} tâche(s) exécutée(s)."))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.exports import EXPORTS, FORMATS, TAILLE_LOT, exporter
+
+
+class Command(BaseCommand):
+    help = (
+        "Exporte les rapports ou les transactions en CSV ou NDJSON, écrits au "
+        "fil de l'eau (pages de clé sur id, mémoire constante)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('nom', choices=sorted(EXPORTS))
+        parser.add_argument('--format', choices=sorted(FORMATS), default='csv')
+        parser.add_argument('--sortie', help="Fichier de sortie (sortie standard par défaut).")
+        parser.add_argument('--entreprise', type=int, help="Limiter à une entreprise.")
+        parser.add_argument('--taille-lot', type=int, default=TAILLE_LOT)
+
+    def handle(self, *args, **options):
+        if options['taille_lot'] < 1:
+            raise CommandError("--taille-lot doit être positif.")
+        morceaux = exporter(
+            options['nom'], options['format'],
+            enterprise_id=options['entreprise'], taille_lot=options['taille_lot'],
+        )
+        if options['sortie']:
+            with open(options['sortie'], 'w', encoding='utf-8', newline='') as fichier:
+                for morceau in morceaux:
+                    fichier.write(morceau)
+            self.stderr.write(self.style.SUCCESS(f"Export écrit dans {options['sortie']}."))
+        else:
+            for morceau in morceaux:
+                self.stdout.write(morceau, ending='')
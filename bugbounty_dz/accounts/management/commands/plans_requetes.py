@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts import requetes
+
+
+class Command(BaseCommand):
+    help = (
+        "Affiche le plan d'exécution (EXPLAIN) de chaque requête critique du "
+        "registre accounts.requetes et échoue si l'une d'elles parcourt une "
+        "table entière ou trie sans index."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('noms', nargs='*', help="Requêtes à analyser (toutes par défaut).")
+        parser.add_argument('--database', default='default', help="Alias de base de données.")
+
+    def handle(self, *args, **options):
+        noms = options['noms'] or sorted(requetes.REQUETES)
+        inconnus = set(noms) - set(requetes.REQUETES)
+        if inconnus:
+            raise CommandError(f"Requête(s) inconnue(s) : {', '.join(sorted(inconnus))}")
+
+        en_echec = []
+        for nom in noms:
+            etapes, problemes = requetes.problemes(nom, using=options['database'])
+            style = self.style.ERROR if problemes else self.style.SUCCESS
+            self.stdout.write(style(nom))
+            for etape in etapes:
+                self.stdout.write(f"  {etape['detail']}")
+            for probleme in problemes:
+                self.stdout.write(self.style.ERROR(f"  ! {probleme}"))
+            if problemes:
+                en_echec.append(nom)
+
+        if en_echec:
+            raise CommandError(f"Plan dégradé pour : {', '.join(en_echec)}")
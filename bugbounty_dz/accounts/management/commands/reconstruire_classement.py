@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts import leaderboard
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcule entièrement le classement depuis les rapports et les "
+        "transactions, signale les écarts avec l'état incrémental puis réécrit "
+        "la table leaderboard."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verifier',
+            action='store_true',
+            help="Compare seulement, sans rien écrire (code de sortie non nul en cas d'écart).",
+        )
+        parser.add_argument(
+            '--details',
+            type=int,
+            default=20,
+            help="Nombre maximum d'écarts affichés.",
+        )
+
+    def handle(self, *args, **options):
+        etat = leaderboard.calculer_classement_complet()
+        ecarts = leaderboard.comparer_classement(etat)
+
+        if ecarts:
+            self.stdout.write(self.style.WARNING(
+                f"{len(ecarts)} écart(s) entre l'état incrémental et le recalcul complet :"
+            ))
+            for hacker_id, champ, actuel, attendu in ecarts[:options['details']]:
+                self.stdout.write(f"  hacker {hacker_id} · {champ} : {actuel!r} ≠ {attendu!r}")
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"État incrémental conforme au recalcul complet ({len(etat)} hacker(s))."
+            ))
+
+        if options['verifier']:
+            if ecarts:
+                raise CommandError("Classement incrémental désynchronisé.")
+            return
+
+        crees, modifies = leaderboard.reconstruire_classement(etat)
+        self.stdout.write(self.style.SUCCESS(
+            f"Classement reconstruit : {crees} ligne(s) créée(s), {modifies} mise(s) à jour."
+        ))
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts import statistiques
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcule les statistiques des programmes depuis les rapports et les "
+        "participants, signale les écarts avec la table program_stats puis la "
+        "réécrit."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verifier',
+            action='store_true',
+            help="Compare seulement, sans rien écrire (code de sortie non nul en cas d'écart).",
+        )
+        parser.add_argument(
+            '--details',
+            type=int,
+            default=20,
+            help="Nombre maximum d'écarts affichés.",
+        )
+
+    def handle(self, *args, **options):
+        etat = statistiques.calculer_statistiques()
+        ecarts = statistiques.comparer_statistiques(etat)
+
+        if ecarts:
+            self.stdout.write(self.style.WARNING(
+                f"{len(ecarts)} écart(s) entre program_stats et le recalcul complet :"
+            ))
+            for program_id, champ, actuel, attendu in ecarts[:options['details']]:
+                self.stdout.write(f"  programme {program_id} · {champ} : {actuel!r} ≠ {attendu!r}")
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"Statistiques conformes au recalcul complet ({len(etat)} programme(s))."
+            ))
+
+        if options['verifier']:
+            if ecarts:
+                raise CommandError("Statistiques des programmes désynchronisées.")
+            return
+
+        crees, modifies = statistiques.reconstruire_statistiques(etat)
+        self.stdout.write(self.style.SUCCESS(
+            f"Statistiques reconstruites : {crees} ligne(s) créée(s), {modifies} mise(s) à jour."
+        ))
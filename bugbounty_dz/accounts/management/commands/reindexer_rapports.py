@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from accounts import recherche
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruit l'index plein texte des rapports (table FTS5 sous SQLite). "
+        "Sous MySQL, l'index FULLTEXT est maintenu par InnoDB : rien à faire."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help="Alias de base de données.")
+
+    def handle(self, *args, **options):
+        connexion = connections[options['database']]
+        if connexion.vendor != 'sqlite' or not recherche.fts_disponible(connexion):
+            self.stdout.write(f"Aucun index à reconstruire pour {connexion.vendor}.")
+            return
+        nombre = recherche.reconstruire_index(using=options['database'])
+        self.stdout.write(self.style.SUCCESS(f"{nombre} rapport(s) réindexé(s)."))
@@ -0,0 +1,181 @@
+"""
+Service des fichiers de MEDIA_ROOT (pièces justificatives) après contrôle
+d'accès.
+
+- Accès : le staff voit tout ; un hacker ne voit que sa CNI (et sa
+  miniature), une entreprise que son registre de commerce. Les autres
+  dossiers sont réservés au staff.
+- Transfert (réglage MEDIAS_ENVOI) :
+  - 'x-accel-redirect' : nginx envoie le fichier depuis une location
+    `internal` qui pointe sur MEDIA_ROOT (MEDIAS_PREFIXE_INTERNE) ;
+  - 'x-sendfile' : Apache (mod_xsendfile) ou lighttpd envoient le chemin
+    absolu ;
+  - None : FileResponse, que le serveur WSGI transmet par sendfile() quand
+    il fournit wsgi.file_wrapper (gunicorn, uWSGI), en morceaux de
+    TAILLE_BLOC sinon. Les requêtes Range à une plage sont servies en 206.
+
+Configuration nginx correspondante :
+
+    location /media-protege/ {
+        internal;
+        alias /chemin/vers/media/;
+    }
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.db.models import Q
+from django.http import FileResponse, HttpResponse
+
+from .models import Enterprise, UserHacker
+from .sessions import identite
+
+
+TAILLE_BLOC = 64 * 1024
+
+_PLAGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class MediaIntrouvable(Exception):
+    pass
+
+
+# ---------------------------------------------------------------------------
+# Contrôle d'accès
+# ---------------------------------------------------------------------------
+
+def _hacker_proprietaire(nom, compte_id):
+    return UserHacker.objects.filter(Q(cni_image=nom) | Q(cni_miniature=nom), pk=compte_id).exists()
+
+
+def _entreprise_proprietaire(nom, compte_id):
+    return Enterprise.objects.filter(pk=compte_id, registre_commerce_pdf=nom).exists()
+
+
+# Dossier → (type de compte, vérification de propriété)
+PROPRIETAIRES = {
+    'cni/': ('hacker', _hacker_proprietaire),
+    'registre_commerce/': ('enterprise', _entreprise_proprietaire),
+}
+
+
+def autorise(request, nom):
+    if request.user.is_authenticated and request.user.is_staff:
+        return True
+    compte_id, type_compte = identite(request.session)
+    for prefixe, (type_proprietaire, proprietaire) in PROPRIETAIRES.items():
+        if nom.startswith(prefixe):
+            return type_compte == type_proprietaire and proprietaire(nom, compte_id)
+    return False
+
+
+# ---------------------------------------------------------------------------
+# Transfert
+# ---------------------------------------------------------------------------
+
+def chemin_media(nom):
+    try:
+        chemin = default_storage.path(nom)
+    except SuspiciousFileOperation:
+        raise MediaIntrouvable(nom)
+    if not os.path.isfile(chemin):
+        raise MediaIntrouvable(nom)
+    return chemin
+
+
+def plage(entete, taille):
+    """
+    (début, fin incluse) de l'en-tête Range ; None pour servir tout le
+    fichier (absent, plusieurs plages, syntaxe inconnue) ; ValueError si la
+    plage est hors du fichier.
+    """
+    correspondance = _PLAGE.match(entete or '')
+    if correspondance is None:
+        return None
+    debut, fin = correspondance.groups()
+    if not debut and not fin:
+        return None
+    if not debut:
+        # bytes=-N : les N derniers octets
+        debut, fin = max(taille - int(fin), 0), taille - 1
+    else:
+        debut, fin = int(debut), min(int(fin), taille - 1) if fin else taille - 1
+    if debut >= taille or debut > fin:
+        raise ValueError(entete)
+    return debut, fin
+
+
+class _Plage:
+    """Lecture bornée d'une plage d'un fichier (sans fileno : pas de sendfile au-delà)"""
+    def __init__(self, fichier, debut, longueur):
+        fichier.seek(debut)
+        self.fichier = fichier
+        self.restant = longueur
+
+    def read(self, taille=-1):
+        if self.restant <= 0:
+            return b''
+        taille = self.restant if taille is None or taille < 0 else min(taille, self.restant)
+        donnees = self.fichier.read(taille)
+        self.restant -= len(donnees)
+        return donnees
+
+    def close(self):
+        self.fichier.close()
+
+
+def _type_contenu(nom):
+    return mimetypes.guess_type(nom)[0] or 'application/octet-stream'
+
+
+def reponse_media(request, nom):
+    """Réponse qui transmet le fichier `nom` (accès déjà vérifié)"""
+    chemin = chemin_media(nom)
+    envoi = getattr(settings, 'MEDIAS_ENVOI', None)
+
+    if envoi == 'x-accel-redirect':
+        response = HttpResponse(content_type=_type_contenu(nom))
+        prefixe = getattr(settings, 'MEDIAS_PREFIXE_INTERNE', '/media-protege/')
+        response['X-Accel-Redirect'] = prefixe + quote(nom)
+    elif envoi == 'x-sendfile':
+        response = HttpResponse(content_type=_type_contenu(nom))
+        response['X-Sendfile'] = chemin
+    else:
+        response = _reponse_fichier(request, chemin, nom)
+
+    response['Cache-Control'] = 'private, max-age=3600'
+    response['X-Content-Type-Options'] = 'nosniff'
+    return response
+
+
+def _reponse_fichier(request, chemin, nom):
+    taille = os.path.getsize(chemin)
+    try:
+        demandee = plage(request.headers.get('Range'), taille)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{taille}'
+        return response
+
+    fichier = open(chemin, 'rb')
+    if demandee is None:
+        response = FileResponse(fichier, content_type=_type_contenu(nom))
+    else:
+        debut, fin = demandee
+        longueur = fin - debut + 1
+        if fin == taille - 1:
+            # Jusqu'à la fin : le fichier reste transmissible par sendfile()
+            fichier.seek(debut)
+            response = FileResponse(fichier, status=206, content_type=_type_contenu(nom))
+        else:
+            response = FileResponse(_Plage(fichier, debut, longueur), status=206, content_type=_type_contenu(nom))
+        response['Content-Length'] = longueur
+        response['Content-Range'] = f'bytes {debut}-{fin}/{taille}'
+    response.block_size = TAILLE_BLOC
+    response['Accept-Ranges'] = 'bytes'
+    return response
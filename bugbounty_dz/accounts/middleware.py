@@ -0,0 +1,172 @@
+"""
+Compte connecté de la requête : `request.account`.
+
+CompteCourantMiddleware (après SessionMiddleware) expose le UserHacker ou
+l'Enterprise de la session, None sinon. Le compte est chargé à la première
+lecture de `request.account`, au plus une fois par requête, avec les
+relations déclarées dans PRECHARGEMENTS : un tableau de bord qui les
+affiche s'exécute en un nombre fixe de requêtes.
+
+Les comptes chargés sont gardés en mémoire du processus, au plus
+COMPTE_COURANT_DUREE secondes, sous la clé (type, id, version). La version
+de chaque compte est un compteur du cache partagé, lu avant le chargement
+et incrémenté (cache.incr) après commit par `invalider_compte` : save() du
+compte, participations, projection des soldes (accounts.grand_livre),
+tâches en masse, fichiers traités (voir accounts.signals). Une invalidation
+atteint donc la copie de tous les processus, même quand l'écriture ne
+touche pas date_modification. Les autres relations préchargées
+(classement, mis à jour par UPDATE) peuvent rester en retard de
+COMPTE_COURANT_DUREE secondes. Chaque requête reçoit sa propre copie du
+compte et de ses relations préchargées.
+
+Réglages (settings) :
+    COMPTE_COURANT_DUREE     durée en mémoire d'un compte, en secondes (30)
+    COMPTE_COURANT_TAILLE    comptes gardés en mémoire par processus (1024)
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.functional import SimpleLazyObject
+
+from .models import Enterprise, UserHacker
+from .sessions import identite
+
+
+PRECHARGEMENTS = {
+    'hacker': {
+        'modele': UserHacker,
+        'select_related': ('leaderboard',),
+        'prefetch_related': ('programmes_participation__program',),
+    },
+    'enterprise': {
+        'modele': Enterprise,
+        'select_related': (),
+        'prefetch_related': ('programmes',),
+    },
+}
+
+
+def _cle_version(type_compte, compte_id):
+    return f"compte:version:{type_compte}:{compte_id}"
+
+
+def version_compte(type_compte, compte_id):
+    cle = _cle_version(type_compte, compte_id)
+    version = cache.get(cle)
+    if version is None:
+        # Départ horodaté : un cache vidé ne réutilise pas d'anciens numéros
+        cache.add(cle, time.time_ns() // 1000, timeout=None)
+        version = cache.get(cle)
+    return version
+
+
+def _incrementer(type_compte, compte_id):
+    try:
+        cache.incr(_cle_version(type_compte, compte_id))
+    except ValueError:
+        version_compte(type_compte, compte_id)
+
+
+def invalider_compte(type_compte, compte_id):
+    """Nouvelle version du compte, après commit : tous les processus le rechargent"""
+    # Avant commit, un autre processus relirait l'ancienne ligne sous la nouvelle version
+    transaction.on_commit(lambda: _incrementer(type_compte, compte_id))
+
+
+class _Comptes:
+    """Comptes chargés, LRU par (type, id, version) avec expiration"""
+    def __init__(self):
+        self._cache = OrderedDict()
+        self._verrou = threading.Lock()
+
+    def obtenir(self, cle):
+        with self._verrou:
+            entree = self._cache.get(cle)
+            if entree is None:
+                return None
+            if entree[0] < time.monotonic():
+                del self._cache[cle]
+                return None
+            self._cache.move_to_end(cle)
+            return entree[1]
+
+    def ajouter(self, cle, compte):
+        expiration = time.monotonic() + getattr(settings, 'COMPTE_COURANT_DUREE', 30)
+        with self._verrou:
+            self._cache[cle] = (expiration, compte)
+            while len(self._cache) > getattr(settings, 'COMPTE_COURANT_TAILLE', 1024):
+                self._cache.popitem(last=False)
+
+    def vider(self):
+        with self._verrou:
+            self._cache.clear()
+
+
+_comptes = _Comptes()
+
+
+def _copie(objet, memo):
+    """
+    Copie d'une instance et de ses relations chargées (select_related,
+    prefetch_related) : rien n'est partagé entre requêtes, même les objets
+    liés. `memo` garde les références croisées (participation → hacker).
+    """
+    if id(objet) in memo:
+        return memo[id(objet)]
+    copie = copy.copy(objet)
+    memo[id(objet)] = copie
+    copie._state.fields_cache = {
+        nom: None if lie is None else _copie(lie, memo) for nom, lie in objet._state.fields_cache.items()
+    }
+    precharges = objet.__dict__.get('_prefetched_objects_cache')
+    if precharges is not None:
+        copie._prefetched_objects_cache = {}
+        for nom, queryset in precharges.items():
+            clone = copy.copy(queryset)
+            clone._result_cache = [_copie(lie, memo) for lie in queryset]
+            copie._prefetched_objects_cache[nom] = clone
+    return copie
+
+
+def charger_compte(type_compte, compte_id):
+    """Compte avec ses relations préchargées, None s'il n'existe plus"""
+    declaration = PRECHARGEMENTS[type_compte]
+    # Lue avant la ligne : une invalidation pendant le chargement périme cette copie
+    version = version_compte(type_compte, compte_id)
+    compte = _comptes.obtenir((type_compte, compte_id, version))
+    if compte is not None:
+        # Copie : les modifications faites par une vue restent dans la requête
+        return _copie(compte, {})
+
+    compte = (
+        declaration['modele'].objects
+        .select_related(*declaration['select_related'])
+        .prefetch_related(*declaration['prefetch_related'])
+        .filter(pk=compte_id)
+        .first()
+    )
+    if compte is None:
+        return None
+    _comptes.ajouter((type_compte, compte_id, version), compte)
+    return _copie(compte, {})
+
+
+def compte_courant(request):
+    compte_id, type_compte = identite(request.session)
+    if type_compte not in PRECHARGEMENTS:
+        return None
+    return charger_compte(type_compte, compte_id)
+
+
+class CompteCourantMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.account = SimpleLazyObject(lambda: compte_courant(request))
+        return self.get_response(request)
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_rename_registre_commerce_pdf_enterprise_registre_commerce'),
+    ]
+
+    operations = [
+        # La colonne s'appelle déjà `registre_commerce` (0002) : on réaligne
+        # seulement l'état des migrations sur le modèle (db_column).
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.RemoveField(
+                    model_name='enterprise',
+                    name='registre_commerce',
+                ),
+                migrations.AddField(
+                    model_name='enterprise',
+                    name='registre_commerce_pdf',
+                    field=models.FileField(blank=True, db_column='registre_commerce', null=True, upload_to='registre_commerce/'),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='leaderboard',
+            name='bugs_soumis',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='leaderboard',
+            index=models.Index(fields=['-points_total', 'hacker'], name='leaderboard_points__82e414_idx'),
+        ),
+    ]
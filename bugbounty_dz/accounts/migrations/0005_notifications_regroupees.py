@@ -0,0 +1,36 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_leaderboard_position_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='membre',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='accounts.enterprisemember'),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='occurrences',
+            field=models.IntegerField(default=1),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['hacker', 'lu'], name='notificatio_hacker__4abf83_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['enterprise', 'lu'], name='notificatio_enterpr_331764_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['membre', 'lu'], name='notificatio_membre__068276_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:05
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_notifications_regroupees'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LogActiviteArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('user_id', models.IntegerField(blank=True, null=True)),
+                ('user_type', models.CharField(blank=True, max_length=50, null=True)),
+                ('action', models.CharField(blank=True, max_length=100, null=True)),
+                ('description', models.TextField(blank=True, null=True)),
+                ('entite_type', models.CharField(blank=True, max_length=50, null=True)),
+                ('entite_id', models.IntegerField(blank=True, null=True)),
+                ('ip_address', models.CharField(blank=True, max_length=50, null=True)),
+                ('date_action', models.DateTimeField()),
+                ('date_archivage', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Log Activité archivé',
+                'verbose_name_plural': 'Logs Activité archivés',
+                'db_table': 'logs_activite_archive',
+            },
+        ),
+        migrations.AlterField(
+            model_name='logactivite',
+            name='date_action',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='logactivite',
+            index=models.Index(fields=['date_action'], name='logs_activi_date_ac_dcfe28_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='logactivitearchive',
+            index=models.Index(fields=['date_action'], name='logs_activi_date_ac_b6b2fa_idx'),
+        ),
+    ]
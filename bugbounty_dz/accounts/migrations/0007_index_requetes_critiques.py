@@ -0,0 +1,57 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_journal_activite_archive'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='report',
+            name='reports_program_be3f89_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='report',
+            name='reports_hacker__f0994a_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='session',
+            name='sessions_user_id_7acd24_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='transaction',
+            name='transaction_hacker__8887b8_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='transaction',
+            name='transaction_statut_6de8d1_idx',
+        ),
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(fields=['program', 'statut', '-date_soumission'], name='reports_program_4f0118_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(fields=['hacker', 'statut'], name='reports_hacker__bad80a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(condition=models.Q(('statut', 'soumis')), fields=['program', 'date_soumission'], name='reports_a_trier_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='session',
+            index=models.Index(fields=['user_id', 'user_type', 'actif'], name='sessions_user_id_8f947b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['hacker', 'statut'], name='transaction_hacker__e205f0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['statut', 'date_creation'], name='transaction_statut_84c640_idx'),
+        ),
+    ]
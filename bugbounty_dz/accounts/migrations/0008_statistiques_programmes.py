@@ -0,0 +1,49 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:11
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_index_requetes_critiques'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='report',
+            name='date_tri',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='ProgramStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rapports_total', models.IntegerField(default=0)),
+                ('rapports_soumis', models.IntegerField(default=0)),
+                ('rapports_en_revision', models.IntegerField(default=0)),
+                ('rapports_acceptes', models.IntegerField(default=0)),
+                ('rapports_rejetes', models.IntegerField(default=0)),
+                ('rapports_en_correction', models.IntegerField(default=0)),
+                ('rapports_corriges', models.IntegerField(default=0)),
+                ('rapports_payes', models.IntegerField(default=0)),
+                ('rapports_publies', models.IntegerField(default=0)),
+                ('rapports_critiques', models.IntegerField(default=0)),
+                ('rapports_eleves', models.IntegerField(default=0)),
+                ('rapports_moyens', models.IntegerField(default=0)),
+                ('rapports_bas', models.IntegerField(default=0)),
+                ('rapports_tries', models.IntegerField(default=0)),
+                ('delai_tri_total', models.BigIntegerField(default=0)),
+                ('montant_paye_total', models.DecimalField(decimal_places=2, default=0.0, max_digits=15)),
+                ('participants', models.IntegerField(default=0)),
+                ('date_maj', models.DateTimeField(auto_now=True)),
+                ('program', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to='accounts.program')),
+            ],
+            options={
+                'verbose_name': 'Statistiques Programme',
+                'verbose_name_plural': 'Statistiques Programmes',
+                'db_table': 'program_stats',
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+from django.db import migrations
+from django.db.utils import OperationalError
+
+
+def creer_index(apps, schema_editor):
+    connexion = schema_editor.connection
+    if connexion.vendor == 'mysql':
+        schema_editor.execute(
+            "ALTER TABLE reports ADD FULLTEXT INDEX reports_texte_ft "
+            "(titre, description, etapes_reproduction)"
+        )
+    elif connexion.vendor == 'sqlite':
+        try:
+            schema_editor.execute(
+                "CREATE VIRTUAL TABLE reports_fts USING fts5("
+                "programme, titre, description, etapes_reproduction, "
+                "tokenize = 'unicode61 remove_diacritics 2')"
+            )
+        except OperationalError:
+            # SQLite compilé sans FTS5 : recherche sur les rapports récents
+            return
+        schema_editor.execute(
+            "INSERT INTO reports_fts (rowid, programme, titre, description, etapes_reproduction) "
+            "SELECT id, 'p' || program_id, titre, description, etapes_reproduction FROM reports"
+        )
+
+
+def supprimer_index(apps, schema_editor):
+    connexion = schema_editor.connection
+    if connexion.vendor == 'mysql':
+        schema_editor.execute("ALTER TABLE reports DROP INDEX reports_texte_ft")
+    elif connexion.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS reports_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0008_statistiques_programmes'),
+    ]
+
+    operations = [
+        migrations.RunPython(creer_index, supprimer_index),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0009_recherche_plein_texte'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='enterprise',
+            name='date_derniere_connexion',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='userhacker',
+            name='date_derniere_connexion',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0010_date_derniere_connexion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='session',
+            name='cle_session',
+            field=models.CharField(blank=True, max_length=40, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='session',
+            name='donnees',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='session',
+            name='token_jwt',
+            field=models.CharField(blank=True, default='', max_length=500),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0011_sessions_web'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='enterprise',
+            name='registre_metadonnees',
+            field=models.JSONField(blank=True, default=dict, null=True),
+        ),
+        migrations.AddField(
+            model_name='enterprise',
+            name='registre_texte',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='userhacker',
+            name='cni_miniature',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+    ]
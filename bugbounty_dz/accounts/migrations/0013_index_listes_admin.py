@@ -0,0 +1,41 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0012_pieces_justificatives'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='enterprise',
+            index=models.Index(fields=['nom_legal'], name='enterprises_nom_leg_d0071f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='enterprise',
+            index=models.Index(fields=['telephone_entreprise'], name='enterprises_telepho_2129ac_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='enterprise',
+            index=models.Index(fields=['statut', 'verifiee'], name='enterprises_statut_4bf307_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='enterprise',
+            index=models.Index(fields=['date_creation'], name='enterprises_date_cr_d405bd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userhacker',
+            index=models.Index(fields=['nom'], name='users_hacke_nom_c8e262_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userhacker',
+            index=models.Index(fields=['prenom'], name='users_hacke_prenom_cc442b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userhacker',
+            index=models.Index(fields=['date_creation'], name='users_hacke_date_cr_a90c8c_idx'),
+        ),
+    ]
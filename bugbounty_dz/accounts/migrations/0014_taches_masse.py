@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0013_index_listes_admin'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TacheMasse',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.CharField(max_length=100)),
+                ('ids', models.JSONField(default=list)),
+                ('total', models.IntegerField(default=0)),
+                ('traites', models.IntegerField(default=0)),
+                ('reussis', models.IntegerField(default=0)),
+                ('echecs', models.IntegerField(default=0)),
+                ('erreurs', models.JSONField(blank=True, default=dict)),
+                ('statut', models.CharField(choices=[('en_attente', 'En attente'), ('en_cours', 'En cours'), ('terminee', 'Terminée'), ('echouee', 'Échouée')], default='en_attente', max_length=50)),
+                ('demandeur_id', models.IntegerField(blank=True, null=True)),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+                ('date_debut', models.DateTimeField(blank=True, null=True)),
+                ('date_fin', models.DateTimeField(blank=True, null=True)),
+                ('date_modification', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Tâche en masse',
+                'verbose_name_plural': 'Tâches en masse',
+                'db_table': 'taches_masse',
+                'indexes': [models.Index(fields=['statut', 'date_creation'], name='taches_mass_statut_538656_idx')],
+            },
+        ),
+    ]
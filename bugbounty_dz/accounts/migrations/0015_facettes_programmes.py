@@ -0,0 +1,149 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:42
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Normalisation figée à la date de la migration (voir accounts.catalogue)
+CHAMPS = {
+    'types_vulnerabilites_acceptees': 'vulnerabilite',
+    'domaines_acceptes': 'domaine',
+    'severites_acceptees': 'severite',
+}
+
+SEVERITES = {
+    'critique': 'Critique', 'critical': 'Critique',
+    'elevee': 'Élevée', 'haute': 'Élevée', 'high': 'Élevée',
+    'moyenne': 'Moyenne', 'medium': 'Moyenne',
+    'basse': 'Basse', 'faible': 'Basse', 'low': 'Basse',
+}
+
+
+def _slug(texte):
+    sans_accents = ''.join(c for c in unicodedata.normalize('NFKD', texte) if not unicodedata.combining(c))
+    return re.sub(r'[^a-z0-9]+', '-', sans_accents.lower()).strip('-')
+
+
+def _normaliser(type_facette, texte):
+    libelle = ' '.join(texte.split())
+    if type_facette == 'domaine':
+        # Entrée entière : sans schéma, port ni chemin, la portée serait élargie
+        domaine = libelle.lower()
+        if '/' not in domaine and ':' not in domaine:
+            domaine = domaine.rstrip('.')
+        return (domaine, domaine) if domaine else None
+    if type_facette == 'severite' and SEVERITES.get(_slug(libelle)):
+        return SEVERITES[_slug(libelle)], SEVERITES[_slug(libelle)]
+    valeur = _slug(libelle)
+    return (valeur, libelle) if valeur else None
+
+
+def decouper_chaines(apps, schema_editor):
+    Program = apps.get_model('accounts', 'Program')
+    Facette = apps.get_model('accounts', 'Facette')
+    ProgrammeFacette = apps.get_model('accounts', 'ProgrammeFacette')
+    base = schema_editor.connection.alias
+
+    facettes = {}
+    liens = set()
+    for program in Program.objects.using(base).only('id', *CHAMPS).iterator(chunk_size=1000):
+        for champ, type_facette in CHAMPS.items():
+            for morceau in re.split(r'[,;|\n]+', getattr(program, champ) or ''):
+                facette = _normaliser(type_facette, morceau)
+                if facette is None:
+                    continue
+                facettes.setdefault((type_facette, facette[0]), facette[1])
+                liens.add((program.pk, type_facette, facette[0]))
+
+    Facette.objects.using(base).bulk_create(
+        [Facette(type_facette=t, valeur=v, libelle=libelle) for (t, v), libelle in facettes.items()],
+        batch_size=1000,
+    )
+    ids = {(t, v): pk for pk, t, v in Facette.objects.using(base).values_list('pk', 'type_facette', 'valeur')}
+    ProgrammeFacette.objects.using(base).bulk_create(
+        [ProgrammeFacette(program_id=program_id, facette_id=ids[(t, v)]) for program_id, t, v in liens],
+        batch_size=1000,
+    )
+
+
+def recomposer_chaines(apps, schema_editor):
+    Program = apps.get_model('accounts', 'Program')
+    ProgrammeFacette = apps.get_model('accounts', 'ProgrammeFacette')
+    base = schema_editor.connection.alias
+
+    chaines = {}
+    liens = ProgrammeFacette.objects.using(base).order_by('pk').values_list(
+        'program_id', 'facette__type_facette', 'facette__libelle',
+    )
+    for program_id, type_facette, libelle in liens:
+        chaines.setdefault(program_id, {}).setdefault(type_facette, []).append(libelle)
+    for program_id, par_type in chaines.items():
+        Program.objects.using(base).filter(pk=program_id).update(**{
+            champ: ', '.join(par_type[type_facette])[:500]
+            for champ, type_facette in CHAMPS.items() if type_facette in par_type
+        })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0014_taches_masse'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Facette',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type_facette', models.CharField(choices=[('vulnerabilite', 'Type de vulnérabilité'), ('domaine', 'Domaine'), ('severite', 'Sévérité')], max_length=20)),
+                ('valeur', models.CharField(max_length=255)),
+                ('libelle', models.CharField(max_length=255)),
+            ],
+            options={
+                'verbose_name': 'Facette',
+                'verbose_name_plural': 'Facettes',
+                'db_table': 'facettes',
+                'unique_together': {('type_facette', 'valeur')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ProgrammeFacette',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('facette', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='liens_programmes', to='accounts.facette')),
+                ('program', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='liens_facettes', to='accounts.program')),
+            ],
+            options={
+                'db_table': 'programs_facettes',
+            },
+        ),
+        migrations.AddField(
+            model_name='program',
+            name='facettes',
+            field=models.ManyToManyField(blank=True, related_name='programmes', through='accounts.ProgrammeFacette', to='accounts.facette'),
+        ),
+        migrations.AddIndex(
+            model_name='programmefacette',
+            index=models.Index(fields=['facette', 'program'], name='programs_fa_facette_e93922_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='programmefacette',
+            unique_together={('program', 'facette')},
+        ),
+        migrations.RunPython(decouper_chaines, recomposer_chaines),
+        migrations.RemoveField(
+            model_name='program',
+            name='domaines_acceptes',
+        ),
+        migrations.RemoveField(
+            model_name='program',
+            name='severites_acceptees',
+        ),
+        migrations.RemoveField(
+            model_name='program',
+            name='types_vulnerabilites_acceptees',
+        ),
+    ]
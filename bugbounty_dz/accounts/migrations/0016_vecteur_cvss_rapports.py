@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0015_facettes_programmes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='report',
+            name='vecteur_cvss',
+            field=models.CharField(blank=True, max_length=200, null=True),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0016_vecteur_cvss_rapports'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SequenceReference',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cle', models.CharField(max_length=50, unique=True)),
+                ('prochain', models.BigIntegerField(default=1)),
+            ],
+            options={
+                'verbose_name': 'Séquence de références',
+                'verbose_name_plural': 'Séquences de références',
+                'db_table': 'sequences_references',
+            },
+        ),
+    ]
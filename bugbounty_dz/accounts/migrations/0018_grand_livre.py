@@ -0,0 +1,100 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:56
+
+import uuid
+from decimal import Decimal
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def _mouvements(compte, entrees, sorties):
+    """Reprise d'un compte : entrées puis sorties cumulées, contrepartie externe:reprise"""
+    return [
+        [(compte, montant), ('externe:reprise', -montant)]
+        for montant in (entrees, -sorties) if montant
+    ]
+
+
+def reprendre_soldes(apps, schema_editor):
+    """Ouvre le grand livre avec les soldes des colonnes existantes"""
+    base = schema_editor.connection.alias
+    UserHacker = apps.get_model('accounts', 'UserHacker')
+    Enterprise = apps.get_model('accounts', 'Enterprise')
+    Program = apps.get_model('accounts', 'Program')
+    Ecriture = apps.get_model('accounts', 'EcritureGrandLivre')
+    zero = Decimal('0.00')
+
+    mouvements = []
+    for pk, solde, revenus in UserHacker.objects.using(base).values_list('pk', 'solde_credit', 'revenus_totaux'):
+        solde, revenus = solde or zero, revenus or zero
+        entrees = max(revenus, solde)
+        mouvements += _mouvements(f'hacker:{pk}', entrees, entrees - solde)
+    for pk, solde, depense in Enterprise.objects.using(base).values_list('pk', 'solde_budget', 'solde_depense'):
+        solde, depense = solde or zero, depense or zero
+        mouvements += _mouvements(f'entreprise:{pk}', solde + depense, depense)
+    for pk, total, restant, depense in Program.objects.using(base).values_list(
+        'pk', 'budget_total', 'budget_restant', 'budget_depense',
+    ):
+        depense = depense or zero
+        restant = restant if restant is not None else (total or zero) - depense
+        mouvements += _mouvements(f'programme:{pk}', restant + depense, depense)
+
+    maintenant = django.utils.timezone.now()
+    ecritures = []
+    for lignes in mouvements:
+        identifiant = uuid.uuid4()
+        ecritures += [
+            Ecriture(mouvement=identifiant, compte=compte, montant=montant, nature='reprise', date_ecriture=maintenant)
+            for compte, montant in lignes
+        ]
+    Ecriture.objects.using(base).bulk_create(ecritures, batch_size=1000)
+
+
+def supprimer_reprise(apps, schema_editor):
+    apps.get_model('accounts', 'EcritureGrandLivre').objects.using(schema_editor.connection.alias).all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0017_sequences_references'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SoldeGrandLivre',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('compte', models.CharField(max_length=50)),
+                ('date_arret', models.DateTimeField()),
+                ('solde', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('entrees', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('sorties', models.DecimalField(decimal_places=2, max_digits=15)),
+            ],
+            options={
+                'verbose_name': 'Solde arrêté',
+                'verbose_name_plural': 'Soldes arrêtés',
+                'db_table': 'grand_livre_soldes',
+                'unique_together': {('compte', 'date_arret')},
+            },
+        ),
+        migrations.CreateModel(
+            name='EcritureGrandLivre',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('mouvement', models.UUIDField()),
+                ('compte', models.CharField(max_length=50)),
+                ('montant', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('nature', models.CharField(max_length=50)),
+                ('report_id', models.IntegerField(blank=True, null=True)),
+                ('date_ecriture', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Écriture du grand livre',
+                'verbose_name_plural': 'Écritures du grand livre',
+                'db_table': 'grand_livre',
+                'indexes': [models.Index(fields=['compte', 'date_ecriture'], name='grand_livre_compte_6b344d_idx'), models.Index(fields=['mouvement'], name='grand_livre_mouveme_f16de0_idx')],
+            },
+        ),
+        migrations.RunPython(reprendre_soldes, supprimer_reprise),
+    ]
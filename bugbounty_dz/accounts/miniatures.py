@@ -0,0 +1,236 @@
+"""
+Images dérivées (miniatures) des pièces justificatives, pour l'admin.
+
+- Générées à la première demande, aux seules tailles de TAILLES (côté max,
+  en pixels), puis gardées dans MINIATURES_DOSSIER sous
+  `<empreinte[:2]>/<empreinte>-<taille>.jpg`, l'empreinte étant le SHA-256
+  de l'original (lue dans son nom pour les fichiers rangés par contenu,
+  voir accounts.televersements, calculée et mémorisée sinon).
+- Servies avec ETag (empreinte et taille) et Cache-Control privé longue
+  durée : le contenu d'une URL ne change jamais.
+- Éviction LRU (date de dernier accès = mtime, mise à jour à chaque
+  lecture) dès que le dossier dépasse MINIATURES_BUDGET octets ; on
+  redescend à 90 % du budget.
+
+`reduire()` est la seule réduction d'image du projet : elle sert aussi à
+la miniature enregistrée au téléversement (UserHacker.cni_miniature, voir
+accounts.televersements), que l'admin affiche quand elle existe. Une image
+corrompue, tronquée ou trop grande lève ImageIllisible.
+
+Sans Pillow, pas de miniature : l'admin n'affiche qu'un lien vers l'original.
+
+Réglages (settings) :
+    MINIATURES_DOSSIER    dossier du cache (BASE_DIR/cache/miniatures)
+    MINIATURES_BUDGET     taille max du dossier, en octets (256 Mo)
+"""
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+TAILLES = (80, 160, 320, 640)
+# Originaux dont on peut demander une miniature
+SOURCES = ('cni/',)
+QUALITE = 80
+
+_EMPREINTE = re.compile(r'^[0-9a-f]{64}$')
+
+
+class MiniatureIntrouvable(Exception):
+    pass
+
+
+class ImageIllisible(Exception):
+    """Original corrompu, tronqué ou trop grand (bombe de décompression)"""
+
+
+def disponible():
+    return Image is not None
+
+
+def dossier():
+    return getattr(settings, 'MINIATURES_DOSSIER', None) or os.path.join(settings.BASE_DIR, 'cache', 'miniatures')
+
+
+def budget():
+    return getattr(settings, 'MINIATURES_BUDGET', 256 * 1024 * 1024)
+
+
+# ---------------------------------------------------------------------------
+# Empreinte de l'original
+# ---------------------------------------------------------------------------
+
+class _Empreintes:
+    """Empreintes des originaux non rangés par contenu, LRU par (nom, mtime, taille)"""
+    def __init__(self, taille=4096):
+        self.taille = taille
+        self._cache = OrderedDict()
+        self._verrou = threading.Lock()
+
+    def obtenir(self, nom):
+        chemin = default_storage.path(nom)
+        etat = os.stat(chemin)
+        cle = (nom, etat.st_mtime_ns, etat.st_size)
+        with self._verrou:
+            if cle in self._cache:
+                self._cache.move_to_end(cle)
+                return self._cache[cle]
+        empreinte = hashlib.sha256()
+        with open(chemin, 'rb') as source:
+            for morceau in iter(lambda: source.read(1024 * 1024), b''):
+                empreinte.update(morceau)
+        with self._verrou:
+            self._cache[cle] = empreinte.hexdigest()
+            while len(self._cache) > self.taille:
+                self._cache.popitem(last=False)
+        return self._cache[cle]
+
+
+_empreintes = _Empreintes()
+
+
+def empreinte_source(nom):
+    nom_base = os.path.splitext(os.path.basename(nom))[0]
+    if _EMPREINTE.match(nom_base):
+        return nom_base
+    return _empreintes.obtenir(nom)
+
+
+# ---------------------------------------------------------------------------
+# Cache disque
+# ---------------------------------------------------------------------------
+
+_verrou = threading.Lock()
+_occupation = None
+
+
+def _fichiers():
+    for racine, _, noms in os.walk(dossier()):
+        for nom in noms:
+            chemin = os.path.join(racine, nom)
+            try:
+                etat = os.stat(chemin)
+            except FileNotFoundError:
+                continue
+            yield chemin, etat.st_size, etat.st_mtime
+
+
+def occupation():
+    """Taille du dossier, en octets (calculée au premier appel puis suivie)"""
+    global _occupation
+    with _verrou:
+        if _occupation is None:
+            _occupation = sum(taille for _, taille, _ in _fichiers())
+        return _occupation
+
+
+@receiver(setting_changed)
+def _reinitialiser(setting, **kwargs):
+    global _occupation
+    if setting in ('MINIATURES_DOSSIER', 'BASE_DIR'):
+        with _verrou:
+            _occupation = None
+
+
+def _ajouter(taille):
+    global _occupation
+    occupation()
+    with _verrou:
+        _occupation += taille
+        return _occupation
+
+
+def evincer(cible=None):
+    """Supprime les miniatures les moins récemment lues jusqu'à `cible` octets"""
+    global _occupation
+    cible = int(budget() * 0.9) if cible is None else cible
+    with _verrou:
+        fichiers = sorted(_fichiers(), key=lambda fichier: fichier[2])
+        total = sum(taille for _, taille, _ in fichiers)
+        supprimes = 0
+        for chemin, taille, _ in fichiers:
+            if total <= cible:
+                break
+            try:
+                os.remove(chemin)
+            except FileNotFoundError:
+                pass
+            total -= taille
+            supprimes += 1
+        _occupation = total
+    return supprimes
+
+
+def vider():
+    global _occupation
+    evincer(cible=0)
+    with _verrou:
+        _occupation = None
+
+
+def reduire(source, taille, sortie):
+    """
+    Écrit dans `sortie` (fichier binaire) l'image stockée `source` réduite en
+    JPEG au côté `taille` ; ImageIllisible si Pillow ne peut pas la lire.
+    """
+    try:
+        with default_storage.open(source, 'rb') as fichier:
+            image = Image.open(fichier)
+            image.draft('RGB', (taille, taille))
+            image = image.convert('RGB')
+            image.thumbnail((taille, taille))
+            image.save(sortie, 'JPEG', quality=QUALITE, optimize=True)
+    except FileNotFoundError:
+        raise
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        # UnidentifiedImageError et fichier tronqué : OSError
+        raise ImageIllisible(source) from e
+
+
+def _generer(source, destination, taille):
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    # Écriture atomique : une lecture concurrente ne voit jamais un fichier partiel
+    descripteur, temporaire = tempfile.mkstemp(dir=os.path.dirname(destination), suffix='.tmp')
+    try:
+        with os.fdopen(descripteur, 'wb') as sortie:
+            reduire(source, taille, sortie)
+        os.replace(temporaire, destination)
+    except BaseException:
+        os.unlink(temporaire)
+        raise
+    return os.path.getsize(destination)
+
+
+def miniature(nom, taille):
+    """
+    (chemin sur disque, etag) de la miniature de `nom` au côté `taille` ;
+    MiniatureIntrouvable si l'original, la taille ou Pillow manquent,
+    ImageIllisible si l'original n'est pas une image lisible.
+    """
+    if taille not in TAILLES or not disponible():
+        raise MiniatureIntrouvable(nom)
+    if not nom.startswith(SOURCES) or '..' in nom.split('/') or not default_storage.exists(nom):
+        raise MiniatureIntrouvable(nom)
+
+    empreinte = empreinte_source(nom)
+    chemin = os.path.join(dossier(), empreinte[:2], f"{empreinte}-{taille}.jpg")
+    try:
+        # Accès = date de dernière lecture pour l'éviction LRU
+        os.utime(chemin)
+    except FileNotFoundError:
+        if _ajouter(_generer(nom, chemin, taille)) > budget():
+            evincer()
+    return chemin, f'"{empreinte}-{taille}"'
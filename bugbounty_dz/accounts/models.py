@@ -1,5 +1,6 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 import json
@@ -31,6 +32,14 @@ class AdminConfig(models.Model):
     def __str__(self):
         return self.cle
 
+    def clean(self):
+        from .configuration import ValeurInvalide, convertir
+
+        try:
+            convertir(self.valeur, self.type_valeur)
+        except ValeurInvalide as e:
+            raise ValidationError({'valeur': str(e)})
+
 
 # Utilisateurs Admin
 class AdminUser(models.Model):
@@ -79,6 +88,7 @@ class UserHacker(models.Model):
     adresse = models.TextField()
     photo_profil = models.CharField(max_length=255, null=True, blank=True)
     cni_image = models.CharField(max_length=255, null=True, blank=True)
+    cni_miniature = models.CharField(max_length=255, null=True, blank=True)
     cni_numero = models.CharField(max_length=50, unique=True, null=True, blank=True)
     cni_verifiee = models.BooleanField(default=False)
     nationalite = models.CharField(max_length=50, default='Algérie')
@@ -93,6 +103,7 @@ class UserHacker(models.Model):
     github_url = models.CharField(max_length=255, null=True, blank=True)
     date_creation = models.DateTimeField(auto_now_add=True)
     date_activation = models.DateTimeField(null=True, blank=True)
+    date_derniere_connexion = models.DateTimeField(null=True, blank=True)
     date_modification = models.DateTimeField(auto_now=True)
 
     class Meta:
@@ -103,6 +114,10 @@ class UserHacker(models.Model):
             models.Index(fields=['email']),
             models.Index(fields=['telephone']),
             models.Index(fields=['statut']),
+            # Recherche par préfixe et filtre par date de l'admin
+            models.Index(fields=['nom']),
+            models.Index(fields=['prenom']),
+            models.Index(fields=['date_creation']),
         ]
 
     def __str__(self):
@@ -129,6 +144,8 @@ class Enterprise(models.Model):
         null=True,
         blank=True
     )
+    registre_texte = models.TextField(null=True, blank=True)
+    registre_metadonnees = models.JSONField(default=dict, null=True, blank=True)
     registre_image = models.CharField(max_length=255, null=True, blank=True)
     contact_principal_nom = models.CharField(max_length=100, null=True, blank=True)
     contact_principal_poste = models.CharField(max_length=100, null=True, blank=True)
@@ -145,12 +162,20 @@ class Enterprise(models.Model):
     verifiee = models.BooleanField(default=False)
     date_creation = models.DateTimeField(auto_now_add=True)
     date_activation = models.DateTimeField(null=True, blank=True)
+    date_derniere_connexion = models.DateTimeField(null=True, blank=True)
     date_modification = models.DateTimeField(auto_now=True)
 
     class Meta:
         db_table = 'enterprises'
         verbose_name = 'Entreprise'
         verbose_name_plural = 'Entreprises'
+        indexes = [
+            # Recherche par préfixe et filtres de l'admin
+            models.Index(fields=['nom_legal']),
+            models.Index(fields=['telephone_entreprise']),
+            models.Index(fields=['statut', 'verifiee']),
+            models.Index(fields=['date_creation']),
+        ]
 
     def __str__(self):
         return self.nom_legal
@@ -207,9 +232,8 @@ class Program(models.Model):
     budget_restant = models.DecimalField(max_digits=15, decimal_places=2, null=True, blank=True)
     budget_depense = models.DecimalField(max_digits=15, decimal_places=2, default=0.00)
     montant_minimum_bug = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
-    types_vulnerabilites_acceptees = models.CharField(max_length=500, null=True, blank=True)
-    domaines_acceptes = models.CharField(max_length=500, null=True, blank=True)
-    severites_acceptees = models.CharField(max_length=500, null=True, blank=True)
+    # Types de vulnérabilités, domaines et sévérités acceptés (voir accounts.catalogue)
+    facettes = models.ManyToManyField('Facette', through='ProgrammeFacette', related_name='programmes', blank=True)
     recompenses_config = models.JSONField(default=dict, null=True, blank=True)
     visibilite = models.CharField(max_length=50, choices=VISIBILITY_CHOICES, default='public')
     hackers_invites = models.TextField(null=True, blank=True)
@@ -230,6 +254,48 @@ class Program(models.Model):
     def __str__(self):
         return self.nom
 
+    def clean(self):
+        from .cvss import BaremeInvalide, bareme
+
+        try:
+            bareme(self.recompenses_config, self.montant_minimum_bug)
+        except BaremeInvalide as e:
+            raise ValidationError({'recompenses_config': str(e)})
+
+
+# Facettes des programmes, valeurs normalisées (filtres du catalogue)
+class Facette(models.Model):
+    TYPE_CHOICES = [
+        ('vulnerabilite', 'Type de vulnérabilité'),
+        ('domaine', 'Domaine'),
+        ('severite', 'Sévérité'),
+    ]
+
+    type_facette = models.CharField(max_length=20, choices=TYPE_CHOICES)
+    valeur = models.CharField(max_length=255)
+    libelle = models.CharField(max_length=255)
+
+    class Meta:
+        db_table = 'facettes'
+        verbose_name = 'Facette'
+        verbose_name_plural = 'Facettes'
+        unique_together = ('type_facette', 'valeur')
+
+    def __str__(self):
+        return f"{self.get_type_facette_display()} : {self.libelle}"
+
+
+class ProgrammeFacette(models.Model):
+    program = models.ForeignKey(Program, on_delete=models.CASCADE, related_name='liens_facettes')
+    facette = models.ForeignKey(Facette, on_delete=models.CASCADE, related_name='liens_programmes')
+
+    class Meta:
+        db_table = 'programs_facettes'
+        unique_together = ('program', 'facette')
+        indexes = [
+            models.Index(fields=['facette', 'program']),
+        ]
+
 
 # Participants du Programme
 class ProgramParticipant(models.Model):
@@ -276,6 +342,9 @@ class Report(models.Model):
     titre = models.CharField(max_length=255)
     description = models.TextField()
     type_vulnerabilite = models.CharField(max_length=100, null=True, blank=True)
+    # Vecteur CVSS v3 : severite_cvss, severite_label et montant_propose en
+    # sont déduits (voir accounts.cvss)
+    vecteur_cvss = models.CharField(max_length=200, null=True, blank=True)
     severite_cvss = models.DecimalField(max_digits=3, decimal_places=1, null=True, blank=True)
     severite_label = models.CharField(max_length=50, choices=SEVERITE_CHOICES, null=True, blank=True)
     etapes_reproduction = models.TextField(null=True, blank=True)
@@ -285,6 +354,7 @@ class Report(models.Model):
     montant_propose = models.DecimalField(max_digits=15, decimal_places=2, null=True, blank=True)
     montant_final = models.DecimalField(max_digits=15, decimal_places=2, null=True, blank=True)
     date_soumission = models.DateTimeField(auto_now_add=True)
+    date_tri = models.DateTimeField(null=True, blank=True)
     date_acceptance = models.DateTimeField(null=True, blank=True)
     date_correction = models.DateTimeField(null=True, blank=True)
     date_paiement = models.DateTimeField(null=True, blank=True)
@@ -297,17 +367,45 @@ class Report(models.Model):
         db_table = 'reports'
         verbose_name = 'Rapport'
         verbose_name_plural = 'Rapports'
+        # Requêtes critiques : voir accounts.requetes
         indexes = [
-            models.Index(fields=['program']),
-            models.Index(fields=['hacker']),
+            models.Index(fields=['program', 'statut', '-date_soumission']),
+            models.Index(fields=['hacker', 'statut']),
             models.Index(fields=['statut']),
             models.Index(fields=['severite_label']),
             models.Index(fields=['date_soumission']),
+            # File de tri : index partiel (ignoré par MySQL, qui utilise
+            # alors l'index composite program/statut/date_soumission)
+            models.Index(
+                fields=['program', 'date_soumission'],
+                condition=models.Q(statut='soumis'),
+                name='reports_a_trier_idx',
+            ),
         ]
 
     def __str__(self):
         return f"{self.titre} ({self.numero_reference})"
 
+    def clean(self):
+        from .cvss import VecteurInvalide, analyser
+
+        if self.vecteur_cvss:
+            try:
+                analyser(self.vecteur_cvss)
+            except VecteurInvalide as e:
+                raise ValidationError({'vecteur_cvss': str(e)})
+
+    def save(self, *args, **kwargs):
+        if self._state.adding and not self.numero_reference:
+            from .references import attribuer
+
+            # Hors de la transaction du rapport : bloc de numéros du processus
+            attribuer([self], using=kwargs.get('using'))
+        # Les tables dérivées (classement, statistiques) sont mises à jour par
+        # les signaux post_save : même transaction que le rapport
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
 
 # Sessions
 class Session(models.Model):
@@ -320,7 +418,10 @@ class Session(models.Model):
 
     user_id = models.IntegerField(null=True, blank=True)
     user_type = models.CharField(max_length=50, choices=USER_TYPE_CHOICES, null=True, blank=True)
-    token_jwt = models.CharField(max_length=500)
+    # Sessions web (moteur accounts.sessions) : clé du cookie et données encodées
+    cle_session = models.CharField(max_length=40, unique=True, null=True, blank=True)
+    donnees = models.TextField(null=True, blank=True)
+    token_jwt = models.CharField(max_length=500, blank=True, default='')
     token_refresh = models.CharField(max_length=500, null=True, blank=True)
     ip_address = models.CharField(max_length=50, null=True, blank=True)
     user_agent = models.TextField(null=True, blank=True)
@@ -334,7 +435,7 @@ class Session(models.Model):
         verbose_name = 'Session'
         verbose_name_plural = 'Sessions'
         indexes = [
-            models.Index(fields=['user_id']),
+            models.Index(fields=['user_id', 'user_type', 'actif']),
             models.Index(fields=['user_type']),
             models.Index(fields=['actif']),
         ]
@@ -379,8 +480,8 @@ class Transaction(models.Model):
         verbose_name = 'Transaction'
         verbose_name_plural = 'Transactions'
         indexes = [
-            models.Index(fields=['hacker']),
-            models.Index(fields=['statut']),
+            models.Index(fields=['hacker', 'statut']),
+            models.Index(fields=['statut', 'date_creation']),
             models.Index(fields=['type_transaction']),
             models.Index(fields=['date_creation']),
         ]
@@ -389,6 +490,48 @@ class Transaction(models.Model):
         return f"Transaction {self.id} - {self.hacker.email}"
 
 
+# Grand livre (partie double, ajout seul)
+class EcritureGrandLivre(models.Model):
+    """Ligne d'un mouvement du grand livre ; les lignes d'un mouvement s'annulent (accounts.grand_livre)"""
+    id = models.BigAutoField(primary_key=True)
+    mouvement = models.UUIDField()
+    compte = models.CharField(max_length=50)  # 'hacker:<id>', 'programme:<id>', 'plateforme:commissions'…
+    montant = models.DecimalField(max_digits=15, decimal_places=2)  # signé : > 0 entrée, < 0 sortie
+    nature = models.CharField(max_length=50)
+    report_id = models.IntegerField(null=True, blank=True)
+    date_ecriture = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'grand_livre'
+        verbose_name = 'Écriture du grand livre'
+        verbose_name_plural = 'Écritures du grand livre'
+        indexes = [
+            models.Index(fields=['compte', 'date_ecriture']),
+            models.Index(fields=['mouvement']),
+        ]
+
+    def __str__(self):
+        return f"{self.compte} {self.montant:+} ({self.nature})"
+
+
+class SoldeGrandLivre(models.Model):
+    """Solde d'un compte arrêté à une date : toutes ses écritures jusqu'à date_arret incluse"""
+    compte = models.CharField(max_length=50)
+    date_arret = models.DateTimeField()
+    solde = models.DecimalField(max_digits=15, decimal_places=2)
+    entrees = models.DecimalField(max_digits=15, decimal_places=2)  # cumul des montants positifs
+    sorties = models.DecimalField(max_digits=15, decimal_places=2)  # cumul des montants négatifs, en valeur absolue
+
+    class Meta:
+        db_table = 'grand_livre_soldes'
+        verbose_name = 'Solde arrêté'
+        verbose_name_plural = 'Soldes arrêtés'
+        unique_together = ('compte', 'date_arret')
+
+    def __str__(self):
+        return f"{self.compte} au {self.date_arret} : {self.solde}"
+
+
 # Disputes
 class Dispute(models.Model):
     """Litiges entre hackers et entreprises"""
@@ -470,10 +613,12 @@ class Notification(models.Model):
     hacker = models.ForeignKey(UserHacker, on_delete=models.CASCADE, null=True, blank=True, related_name='notifications')
     enterprise = models.ForeignKey(Enterprise, on_delete=models.CASCADE, null=True, blank=True, related_name='notifications')
     admin = models.ForeignKey(AdminUser, on_delete=models.CASCADE, null=True, blank=True, related_name='notifications')
+    membre = models.ForeignKey(EnterpriseMember, on_delete=models.CASCADE, null=True, blank=True, related_name='notifications')
     type_notification = models.CharField(max_length=100, choices=TYPE_NOTIFICATION_CHOICES, null=True, blank=True)
     titre = models.CharField(max_length=255, null=True, blank=True)
     contenu = models.TextField(null=True, blank=True)
     lien_cible = models.CharField(max_length=255, null=True, blank=True)
+    occurrences = models.IntegerField(default=1)  # événements regroupés dans cette notification
     lu = models.BooleanField(default=False)
     date_creation = models.DateTimeField(auto_now_add=True)
     date_lecture = models.DateTimeField(null=True, blank=True)
@@ -482,6 +627,11 @@ class Notification(models.Model):
         db_table = 'notifications'
         verbose_name = 'Notification'
         verbose_name_plural = 'Notifications'
+        indexes = [
+            models.Index(fields=['hacker', 'lu']),
+            models.Index(fields=['enterprise', 'lu']),
+            models.Index(fields=['membre', 'lu']),
+        ]
 
     def __str__(self):
         return f"{self.type_notification} - {self.titre}"
@@ -498,6 +648,7 @@ class Leaderboard(models.Model):
     ]
 
     hacker = models.OneToOneField(UserHacker, on_delete=models.CASCADE, related_name='leaderboard')
+    bugs_soumis = models.IntegerField(default=0)
     bugs_acceptes = models.IntegerField(default=0)
     bugs_critiques = models.IntegerField(default=0)
     bugs_eleves = models.IntegerField(default=0)
@@ -514,11 +665,47 @@ class Leaderboard(models.Model):
         db_table = 'leaderboard'
         verbose_name = 'Leaderboard'
         verbose_name_plural = 'Leaderboards'
+        indexes = [
+            models.Index(fields=['-points_total', 'hacker']),
+            models.Index(fields=['position']),
+        ]
 
     def __str__(self):
         return f"{self.hacker.prenom} {self.hacker.nom} - Position {self.position}"
 
 
+# Statistiques des Programmes
+class ProgramStats(models.Model):
+    """Compteurs par programme maintenus à l'écriture (voir accounts.statistiques)"""
+    program = models.OneToOneField(Program, on_delete=models.CASCADE, related_name='stats')
+    rapports_total = models.IntegerField(default=0)
+    rapports_soumis = models.IntegerField(default=0)
+    rapports_en_revision = models.IntegerField(default=0)
+    rapports_acceptes = models.IntegerField(default=0)
+    rapports_rejetes = models.IntegerField(default=0)
+    rapports_en_correction = models.IntegerField(default=0)
+    rapports_corriges = models.IntegerField(default=0)
+    rapports_payes = models.IntegerField(default=0)
+    rapports_publies = models.IntegerField(default=0)
+    rapports_critiques = models.IntegerField(default=0)
+    rapports_eleves = models.IntegerField(default=0)
+    rapports_moyens = models.IntegerField(default=0)
+    rapports_bas = models.IntegerField(default=0)
+    rapports_tries = models.IntegerField(default=0)
+    delai_tri_total = models.BigIntegerField(default=0)  # secondes
+    montant_paye_total = models.DecimalField(max_digits=15, decimal_places=2, default=0.00)
+    participants = models.IntegerField(default=0)
+    date_maj = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'program_stats'
+        verbose_name = 'Statistiques Programme'
+        verbose_name_plural = 'Statistiques Programmes'
+
+    def __str__(self):
+        return f"Statistiques - {self.program.nom}"
+
+
 # Logs d'Activité
 class LogActivite(models.Model):
     """Logs de toutes les actions du système"""
@@ -542,17 +729,98 @@ class LogActivite(models.Model):
     entite_type = models.CharField(max_length=50, choices=ENTITE_TYPE_CHOICES, null=True, blank=True)
     entite_id = models.IntegerField(null=True, blank=True)
     ip_address = models.CharField(max_length=50, null=True, blank=True)
-    date_action = models.DateTimeField(auto_now_add=True)
+    # Horodatage fixé à l'appel : l'écriture est différée (accounts.journal)
+    date_action = models.DateTimeField(default=timezone.now, editable=False)
 
     class Meta:
         db_table = 'logs_activite'
         verbose_name = 'Log Activité'
         verbose_name_plural = 'Logs Activité'
+        indexes = [
+            models.Index(fields=['date_action']),
+        ]
 
     def __str__(self):
         return f"{self.user_type} - {self.action} - {self.date_action}"
 
 
+# Archive des Logs d'Activité
+class LogActiviteArchive(models.Model):
+    """Logs d'activité anciens, déplacés hors de la table principale"""
+    id = models.BigIntegerField(primary_key=True)  # id d'origine dans logs_activite
+    user_id = models.IntegerField(null=True, blank=True)
+    user_type = models.CharField(max_length=50, null=True, blank=True)
+    action = models.CharField(max_length=100, null=True, blank=True)
+    description = models.TextField(null=True, blank=True)
+    entite_type = models.CharField(max_length=50, null=True, blank=True)
+    entite_id = models.IntegerField(null=True, blank=True)
+    ip_address = models.CharField(max_length=50, null=True, blank=True)
+    date_action = models.DateTimeField()
+    date_archivage = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'logs_activite_archive'
+        verbose_name = 'Log Activité archivé'
+        verbose_name_plural = 'Logs Activité archivés'
+        indexes = [
+            models.Index(fields=['date_action']),
+        ]
+
+    def __str__(self):
+        return f"{self.user_type} - {self.action} - {self.date_action}"
+
+
+# Tâches de modération en masse
+class TacheMasse(models.Model):
+    """Actions en masse lancées depuis l'admin, exécutées en arrière-plan (accounts.taches)"""
+    STATUT_CHOICES = [
+        ('en_attente', 'En attente'),
+        ('en_cours', 'En cours'),
+        ('terminee', 'Terminée'),
+        ('echouee', 'Échouée'),
+    ]
+
+    action = models.CharField(max_length=100)
+    ids = models.JSONField(default=list)
+    total = models.IntegerField(default=0)
+    traites = models.IntegerField(default=0)
+    reussis = models.IntegerField(default=0)
+    echecs = models.IntegerField(default=0)
+    erreurs = models.JSONField(default=dict, blank=True)  # {id: motif}, borné
+    statut = models.CharField(max_length=50, choices=STATUT_CHOICES, default='en_attente')
+    demandeur_id = models.IntegerField(null=True, blank=True)  # utilisateur Django de l'admin
+    date_creation = models.DateTimeField(auto_now_add=True)
+    date_debut = models.DateTimeField(null=True, blank=True)
+    date_fin = models.DateTimeField(null=True, blank=True)
+    date_modification = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'taches_masse'
+        verbose_name = 'Tâche en masse'
+        verbose_name_plural = 'Tâches en masse'
+        indexes = [
+            models.Index(fields=['statut', 'date_creation']),
+        ]
+
+    def __str__(self):
+        return f"{self.action} ({self.traites}/{self.total})"
+
+
+# Séquences des numéros de référence des rapports
+class SequenceReference(models.Model):
+    """Prochain numéro libre par séquence, réservé par blocs (accounts.references)"""
+    cle = models.CharField(max_length=50, unique=True)  # 'global' ou 'programme:<id>'
+    prochain = models.BigIntegerField(default=1)
+
+    class Meta:
+        db_table = 'sequences_references'
+        verbose_name = 'Séquence de références'
+        verbose_name_plural = 'Séquences de références'
+
+    def __str__(self):
+        return f"{self.cle} : {self.prochain}"
+
+
 # Tokens de Vérification
 class VerificationToken(models.Model):
     """Tokens pour vérification d'email et réinitialisation de mot de passe"""
@@ -0,0 +1,306 @@
+"""
+Diffusion des notifications.
+
+- Les destinataires d'un événement sont résolus en une requête
+  (ProgramParticipant pour les hackers, EnterpriseMember pour l'entreprise).
+- Les lignes sont écrites par bulk_create découpé en lots ; dans un bloc
+  `regroupees()`, toutes les notifications émises sont écrites d'un coup à
+  la sortie du bloc.
+- Les rafales de messages sur un même rapport sont regroupées dans une seule
+  notification non lue (champ `occurrences`) pendant une fenêtre de temps.
+- Le nombre de non lues est servi par un compteur en cache, incrémenté à
+  l'écriture et recalculé seulement s'il est absent. Une écriture qui
+  trouve le compteur absent le marque périmé : un recalcul concurrent
+  n'installe alors pas une valeur comptée avant elle.
+- La boîte d'une entreprise regroupe ses notifications et celles de ses
+  membres : son compteur est incrémenté avec celui du membre.
+
+Un destinataire est un dict de clés étrangères de Notification, par exemple
+{'hacker_id': 3} ou {'enterprise_id': 2, 'membre_id': 7}.
+"""
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Notification, Program, ProgramParticipant
+
+
+CLE_COMPTEUR = 'notifications:non_lues:{}:{}'
+DUREE_COMPTEUR = 3600
+
+TYPES_STATUT_RAPPORT = {
+    'accepte': ('bug_accepte', "Rapport accepté"),
+    'rejete': ('bug_rejete', "Rapport rejeté"),
+    'paye': ('paiement', "Prime versée"),
+}
+
+_en_attente = ContextVar('notifications_en_attente', default=None)
+
+
+def taille_lot():
+    return getattr(settings, 'NOTIFICATIONS_TAILLE_LOT', 500)
+
+
+def fenetre_regroupement():
+    return timedelta(seconds=getattr(settings, 'NOTIFICATIONS_FENETRE_REGROUPEMENT', 300))
+
+
+def lien_rapport(report_id):
+    return f"/rapports/{report_id}/"
+
+
+# ---------------------------------------------------------------------------
+# Destinataires
+# ---------------------------------------------------------------------------
+
+def _compte(destinataire):
+    """(type, id) du compte dont le compteur de non lues est concerné"""
+    for champ in ('membre_id', 'hacker_id', 'admin_id', 'enterprise_id'):
+        if destinataire.get(champ):
+            return champ[:-3], destinataire[champ]
+
+
+def _filtre(destinataire):
+    type_compte, compte_id = _compte(destinataire)
+    if type_compte == 'enterprise':
+        return Q(enterprise_id=compte_id, membre__isnull=True)
+    return Q(**{f"{type_compte}_id": compte_id})
+
+
+def _filtre_boite(destinataire):
+    """Notifications visibles par la session du destinataire"""
+    type_compte, compte_id = _compte(destinataire)
+    if type_compte == 'enterprise':
+        return Q(enterprise_id=compte_id)
+    return _filtre(destinataire)
+
+
+def _comptes(destinataire):
+    """Compteurs concernés par une notification : le sien et celui de l'entreprise"""
+    comptes = [_compte(destinataire)]
+    if destinataire.get('membre_id') and destinataire.get('enterprise_id'):
+        comptes.append(('enterprise', destinataire['enterprise_id']))
+    return comptes
+
+
+def destinataires_entreprise(program_id):
+    """Membres de l'entreprise du programme, ou l'entreprise elle-même"""
+    lignes = list(
+        Program.objects.filter(pk=program_id).values_list('enterprise_id', 'enterprise__membres__id')
+    )
+    destinataires = [
+        {'enterprise_id': enterprise_id, 'membre_id': membre_id}
+        for enterprise_id, membre_id in lignes if membre_id
+    ]
+    if not destinataires and lignes:
+        destinataires = [{'enterprise_id': lignes[0][0]}]
+    return destinataires
+
+
+def destinataires_participants(program_id):
+    return [
+        {'hacker_id': hacker_id}
+        for hacker_id in ProgramParticipant.objects.filter(program_id=program_id).values_list('hacker_id', flat=True)
+    ]
+
+
+# ---------------------------------------------------------------------------
+# Écriture
+# ---------------------------------------------------------------------------
+
+@contextmanager
+def regroupees():
+    """Diffère toutes les notifications émises dans le bloc à un seul bulk_create"""
+    if _en_attente.get() is not None:
+        yield
+        return
+    jeton = _en_attente.set([])
+    try:
+        yield
+        notifications = _en_attente.get()
+    finally:
+        _en_attente.reset(jeton)
+    _ecrire(notifications)
+
+
+def diffuser(destinataires, type_notification, titre, contenu=None, lien_cible=None):
+    notifications = [
+        Notification(
+            type_notification=type_notification, titre=titre, contenu=contenu,
+            lien_cible=lien_cible, **destinataire
+        )
+        for destinataire in destinataires
+    ]
+    en_attente = _en_attente.get()
+    if en_attente is not None:
+        en_attente.extend(notifications)
+    else:
+        _ecrire(notifications)
+    return len(notifications)
+
+
+def _ecrire(notifications):
+    if not notifications:
+        return
+    with transaction.atomic():
+        Notification.objects.bulk_create(notifications, batch_size=taille_lot())
+        comptes = Counter(
+            compte
+            for n in notifications
+            for compte in _comptes({
+                champ: getattr(n, champ) for champ in ('membre_id', 'hacker_id', 'admin_id', 'enterprise_id')
+            })
+        )
+        transaction.on_commit(lambda: _incrementer(comptes))
+
+
+# ---------------------------------------------------------------------------
+# Événements
+# ---------------------------------------------------------------------------
+
+def notifier_lancement_programme(program):
+    return diffuser(
+        destinataires_participants(program.pk),
+        'autre',
+        f"Programme lancé : {program.nom}",
+        lien_cible=f"/programmes/{program.pk}/",
+    )
+
+
+def notifier_transition_rapport(report, avant, apres):
+    if apres is None:
+        return
+    if avant is None:
+        diffuser(
+            destinataires_entreprise(report.program_id),
+            'autre',
+            f"Nouveau rapport : {report.titre}",
+            lien_cible=lien_rapport(report.pk),
+        )
+    elif avant[0] != apres[0] and apres[0] in TYPES_STATUT_RAPPORT:
+        type_notification, titre = TYPES_STATUT_RAPPORT[apres[0]]
+        diffuser(
+            [{'hacker_id': report.hacker_id}],
+            type_notification,
+            f"{titre} : {report.titre}",
+            lien_cible=lien_rapport(report.pk),
+        )
+
+
+def notifier_message(message):
+    """
+    Nouveau message sur un rapport : les destinataires ayant déjà une
+    notification non lue récente pour ce rapport voient son compteur
+    `occurrences` incrémenté au lieu de recevoir une nouvelle ligne.
+    """
+    report = message.report
+    destinataires = []
+    if message.type_auteur != 'hacker':
+        destinataires.append({'hacker_id': report.hacker_id})
+    if message.type_auteur != 'enterprise':
+        destinataires.extend(destinataires_entreprise(report.program_id))
+    if not destinataires:
+        return
+
+    lien = lien_rapport(report.pk)
+    recentes = Notification.objects.filter(
+        Q(*[_filtre(d) for d in destinataires], _connector=Q.OR),
+        type_notification='nouveau_message',
+        lien_cible=lien,
+        lu=False,
+        date_creation__gte=timezone.now() - fenetre_regroupement(),
+    ).values_list('id', 'hacker_id', 'enterprise_id', 'membre_id', 'admin_id')
+
+    regroupees_ids, deja_notifies = [], set()
+    for notification_id, hacker_id, enterprise_id, membre_id, admin_id in recentes:
+        compte = _compte({
+            'hacker_id': hacker_id, 'enterprise_id': enterprise_id,
+            'membre_id': membre_id, 'admin_id': admin_id,
+        })
+        if compte not in deja_notifies:
+            deja_notifies.add(compte)
+            regroupees_ids.append(notification_id)
+    if regroupees_ids:
+        Notification.objects.filter(pk__in=regroupees_ids).update(
+            occurrences=F('occurrences') + 1,
+            contenu=message.contenu[:500],
+        )
+
+    diffuser(
+        [d for d in destinataires if _compte(d) not in deja_notifies],
+        'nouveau_message',
+        f"Nouveau message : {report.titre}",
+        contenu=message.contenu[:500],
+        lien_cible=lien,
+    )
+
+
+# ---------------------------------------------------------------------------
+# Compteur de non lues
+# ---------------------------------------------------------------------------
+
+def _cle(compte):
+    return CLE_COMPTEUR.format(*compte)
+
+
+def _cle_perime(compte):
+    return _cle(compte) + ':perime'
+
+
+def _perimer(comptes):
+    for compte in comptes:
+        cache.set(_cle_perime(compte), True, DUREE_COMPTEUR)
+        cache.delete(_cle(compte))
+
+
+def _incrementer(comptes):
+    for compte, nombre in comptes.items():
+        try:
+            cache.incr(_cle(compte), nombre)
+        except ValueError:
+            # Compteur absent, peut-être en cours de recalcul : le marquer
+            # périmé pour que ce recalcul ne soit pas conservé
+            cache.set(_cle_perime(compte), True, DUREE_COMPTEUR)
+
+
+def invalider_compteur(**destinataire):
+    _perimer(_comptes(destinataire))
+
+
+def nombre_non_lues(**destinataire):
+    """
+    Non lues de la session : un membre voit les siennes, une entreprise
+    les siennes et celles de ses membres.
+    """
+    compte = _compte(destinataire)
+    cle = _cle(compte)
+    nombre = cache.get(cle)
+    if nombre is None:
+        cache.delete(_cle_perime(compte))
+        nombre = Notification.objects.filter(_filtre_boite(destinataire), lu=False).count()
+        if cache.add(cle, nombre, DUREE_COMPTEUR) and cache.get(_cle_perime(compte)):
+            # Écriture pendant le comptage : la valeur est déjà dépassée
+            cache.delete(cle)
+    return nombre
+
+
+def marquer_lues(ids=None, **destinataire):
+    notifications = Notification.objects.filter(_filtre_boite(destinataire), lu=False)
+    if ids is not None:
+        notifications = notifications.filter(pk__in=ids)
+    # Compteurs de toutes les lignes touchées : membres d'une entreprise, et
+    # entreprise d'un membre
+    comptes = set(_comptes(destinataire))
+    for ligne in notifications.values('hacker_id', 'enterprise_id', 'membre_id', 'admin_id').distinct():
+        comptes.update(_comptes(ligne))
+    nombre = notifications.update(lu=True, date_lecture=timezone.now())
+    if nombre:
+        transaction.on_commit(lambda: _perimer(comptes))
+    return nombre
@@ -0,0 +1,145 @@
+"""
+Paiement des primes : Report.montant_final → nouvelle Transaction et un
+mouvement du grand livre par rapport (accounts.grand_livre) :
+
+    programme:<id>          − brut    (budget consommé)
+    entreprise:<id>         + brut, − brut   (dépense de l'entreprise)
+    hacker:<id>             + net
+    plateforme:commissions  + commission
+
+Tout se fait dans une seule transaction. Le budget restant est lu dans le
+grand livre sous le verrou des programmes payés ; les soldes des hackers et
+des entreprises ne sont plus des lignes mises à jour (simples INSERT), leurs
+colonnes sont projetées après commit. Les verrous sont toujours pris dans
+le même ordre pour éviter les interblocages entre paiements concurrents :
+
+    reports → programs → transactions (INSERT) → grand_livre (INSERT)
+"""
+from collections import defaultdict
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import configuration, grand_livre, leaderboard, notifications, statistiques
+from .journal import journaliser
+from .models import Program, Report, Transaction
+from .signals import rapport_modifie
+
+
+STATUTS_PAYABLES = ('accepte', 'en_correction', 'corrige')
+CENTIME = Decimal('0.01')
+
+
+class PaiementErreur(Exception):
+    """Paiement refusé : aucune écriture n'a été faite"""
+
+
+def taux_commission_defaut():
+    """AdminConfig 'taux_commission_defaut', sinon settings.COMMISSION_PLATEFORME"""
+    taux = configuration.valeur('taux_commission_defaut', getattr(settings, 'COMMISSION_PLATEFORME', '0.00'))
+    return Decimal(str(taux))
+
+
+def payer_rapport(report_id, taux_commission=None):
+    """Paie un rapport accepté ; renvoie la Transaction créée"""
+    return payer_rapports([report_id], taux_commission)[0]
+
+
+@transaction.atomic
+def payer_rapports(report_ids, taux_commission=None):
+    """
+    Paie un lot de rapports acceptés en une requête par table.
+    Tout ou rien : PaiementErreur annule l'ensemble du lot.
+    """
+    report_ids = sorted(set(report_ids))
+    if not report_ids:
+        return []
+    taux = taux_commission_defaut() if taux_commission is None else Decimal(taux_commission)
+    maintenant = timezone.now()
+
+    # 1. Rapports : verrou dans l'ordre des id, puis validation
+    rapports = list(
+        Report.objects.select_for_update()
+        .filter(pk__in=report_ids)
+        .order_by('pk')
+        .values(
+            'id', 'program_id', 'program__enterprise_id', 'hacker_id', 'titre',
+            'statut', 'severite_label', 'montant_final',
+        )
+    )
+    erreurs = [f"Rapport {pk} introuvable" for pk in set(report_ids) - {r['id'] for r in rapports}]
+    for rapport in rapports:
+        if rapport['statut'] not in STATUTS_PAYABLES:
+            erreurs.append(f"Rapport {rapport['id']} non payable (statut {rapport['statut']})")
+        elif not rapport['montant_final'] or rapport['montant_final'] <= 0:
+            erreurs.append(f"Rapport {rapport['id']} sans montant final")
+    if erreurs:
+        raise PaiementErreur(" ; ".join(sorted(erreurs)))
+
+    par_programme = defaultdict(Decimal)
+    par_hacker = defaultdict(Decimal)
+    transactions, mouvements = [], []
+    for rapport in rapports:
+        brut = rapport['montant_final']
+        commission = (brut * taux).quantize(CENTIME, rounding=ROUND_HALF_UP)
+        net = brut - commission
+        par_programme[rapport['program_id']] += brut
+        par_hacker[rapport['hacker_id']] += net
+        transactions.append(Transaction(
+            hacker_id=rapport['hacker_id'],
+            report_id=rapport['id'],
+            type_transaction='paiement_bug',
+            montant_brut=brut,
+            commission_plateforme=commission,
+            montant_net=net,
+            statut='completee',
+            date_completion=maintenant,
+        ))
+        entreprise = grand_livre.compte('entreprise', rapport['program__enterprise_id'])
+        mouvements.append(grand_livre.mouvement('paiement_bug', [
+            (grand_livre.compte('programme', rapport['program_id']), -brut),
+            (entreprise, brut),
+            (entreprise, -brut),
+            (grand_livre.compte('hacker', rapport['hacker_id']), net),
+            (grand_livre.COMMISSIONS, commission),
+        ], report_id=rapport['id']))
+
+    # 2. Programmes : verrou (sérialise les paiements d'un même programme),
+    #    puis budget restant lu dans le grand livre
+    list(Program.objects.select_for_update().filter(pk__in=par_programme).order_by('pk').values_list('pk'))
+    restants = grand_livre.soldes(grand_livre.compte('programme', pk) for pk in par_programme)
+    if any(restants[grand_livre.compte('programme', pk)].solde < montant for pk, montant in par_programme.items()):
+        raise PaiementErreur("Budget du programme insuffisant")
+
+    # 3. Transactions
+    Transaction.objects.bulk_create(transactions, batch_size=500)
+
+    # 4. Grand livre (colonnes de solde projetées après commit)
+    grand_livre.passer(mouvements)
+
+    # 5. Rapports payés
+    Report.objects.filter(pk__in=report_ids).update(statut='paye', date_paiement=maintenant)
+
+    for rapport in rapports:
+        journaliser(
+            'paiement', rapport['hacker_id'], 'hacker', entite_type='report', entite_id=rapport['id'],
+            description=f"Prime de {rapport['montant_final']} DA",
+        )
+
+    # Tables dérivées (les écritures en masse ne déclenchent pas les signaux)
+    leaderboard.appliquer_revenus(par_hacker)
+    with notifications.regroupees(), statistiques.regroupees():
+        for rapport in rapports:
+            rapport_modifie(
+                Report(
+                    id=rapport['id'], program_id=rapport['program_id'],
+                    hacker_id=rapport['hacker_id'], titre=rapport['titre'],
+                    montant_final=rapport['montant_final'],
+                ),
+                (rapport['statut'], rapport['severite_label']),
+                ('paye', rapport['severite_label']),
+            )
+
+    return transactions
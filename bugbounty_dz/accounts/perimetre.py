@@ -0,0 +1,298 @@
+"""
+Périmètre d'un programme compilé : un actif (domaine, IP, URL) est-il dans
+le périmètre ?
+
+Sources : chaque ligne de Program.portee (une entrée par ligne, ou séparées
+par des virgules) et les facettes 'domaine' du programme (accounts.catalogue),
+entrées entières avec schéma, port et chemin.
+Une entrée préfixée par '-' ou '!' est une exclusion ; une exclusion
+l'emporte toujours sur une inclusion.
+
+    api.exemple.dz          le domaine exactement
+    *.exemple.dz            ses sous-domaines (pas exemple.dz lui-même)
+    10.0.0.0/8, 192.0.2.7   plages CIDR et adresses, IPv4 ou IPv6
+    exemple.dz:8443         l'hôte (domaine, *.domaine, adresse) sur ce port seulement
+    https://exemple.dz/api  URL de ce schéma, hôte et port, sous ce chemin (segments
+                            entiers : /api et /api/v1, pas /apiadmin)
+    exemple.dz/api          idem en http et en https
+    - admin.exemple.dz      exclusion
+
+Compilation :
+- domaines dans un trie de labels inversés (dz → exemple → api) : une
+  vérification suit au plus autant de nœuds que le domaine a de labels ;
+- plages IP fusionnées en intervalles disjoints triés, cherchés par
+  bisection ;
+- préfixes d'URL rangés par (schéma, hôte, port) ;
+- entrées hôte:port compilées en un sous-périmètre par port.
+
+Le périmètre compilé est gardé en mémoire par processus sous
+(programme, date_modification) : toute modification du programme (portée,
+facettes de domaine) change la clé. Taille : PERIMETRE_TAILLE_CACHE (1024).
+"""
+import ipaddress
+import re
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+from django.conf import settings
+
+from .models import Program, ProgrammeFacette
+
+
+INCLUS = 1
+EXCLU = 2
+
+# Marqueurs d'un nœud du trie (clé vide : jamais un label)
+_EXACT = ''
+_JOKER = '*'
+
+_SEPARATEURS = re.compile(r'[\n,]+')
+_PORTS_DEFAUT = {'http': 80, 'https': 443}
+# hôte:port, hôte entre crochets pour IPv6 ([2001:db8::1]:8443)
+_HOTE_PORT = re.compile(r'^(\[[^\]]+\]|[^:/\[\]]+):(\d{1,5})$')
+
+
+def _domaine(texte):
+    domaine = texte.strip().lower().rstrip('.')
+    return domaine or None
+
+
+def _hote_port(texte):
+    """(hôte, port) d'un « hôte:port », None sinon"""
+    correspondance = _HOTE_PORT.match(texte)
+    if correspondance is None:
+        return None
+    port = int(correspondance.group(2))
+    return (correspondance.group(1).strip('[]'), port) if 0 < port < 65536 else None
+
+
+def _adresse(texte):
+    # Un nom de domaine ne passe pas par ipaddress (ValueError coûteuse)
+    if not texte or not (texte[0].isdigit() or texte[0] == '[' or ':' in texte):
+        return None
+    try:
+        return ipaddress.ip_address(texte.strip('[]'))
+    except ValueError:
+        return None
+
+
+class _Plages:
+    """Intervalles d'entiers disjoints triés (une table par version d'IP)"""
+    def __init__(self, reseaux):
+        intervalles = sorted((int(r.network_address), int(r.broadcast_address)) for r in reseaux)
+        fusionnes = []
+        for debut, fin in intervalles:
+            if fusionnes and debut <= fusionnes[-1][1] + 1:
+                fusionnes[-1][1] = max(fusionnes[-1][1], fin)
+            else:
+                fusionnes.append([debut, fin])
+        self.debuts = [debut for debut, _ in fusionnes]
+        self.fins = [fin for _, fin in fusionnes]
+
+    def contient(self, valeur):
+        rang = bisect_right(self.debuts, valeur) - 1
+        return rang >= 0 and valeur <= self.fins[rang]
+
+
+class Perimetre:
+    def __init__(self, entrees=()):
+        self.trie = {}
+        self.urls = {}
+        reseaux = {(INCLUS, 4): [], (INCLUS, 6): [], (EXCLU, 4): [], (EXCLU, 6): []}
+        par_port = {}
+        self.nombre = 0
+        for entree in entrees:
+            self.nombre += self._ajouter(entree, reseaux, par_port)
+        self.plages = {cle: _Plages(liste) for cle, liste in reseaux.items()}
+        self.ports = {port: Perimetre(hotes) for port, hotes in par_port.items()}
+        for prefixes in self.urls.values():
+            prefixes.sort(key=lambda prefixe: -len(prefixe[0]))
+
+    def _ajouter(self, entree, reseaux, par_port):
+        entree = entree.strip()
+        sens = INCLUS
+        if entree[:1] in '-!':
+            sens, entree = EXCLU, entree[1:].strip()
+        if not entree:
+            return 0
+
+        if '://' in entree:
+            return self._ajouter_url(entree, sens)
+
+        try:
+            reseau = ipaddress.ip_network(entree, strict=False)
+        except ValueError:
+            pass
+        else:
+            reseaux[(sens, reseau.version)].append(reseau)
+            return 1
+
+        if '/' in entree:
+            # hôte/chemin sans schéma : ce chemin en http comme en https
+            return min(self._ajouter_url(f"{schema}://{entree}", sens) for schema in _PORTS_DEFAUT)
+
+        hote_port = _hote_port(entree)
+        if hote_port is not None:
+            hote, port = hote_port
+            par_port.setdefault(port, []).append(hote if sens == INCLUS else '-' + hote)
+            return 1
+
+        domaine = _domaine(entree)
+        if domaine is None or ' ' in domaine:
+            return 0
+        joker = domaine.startswith('*.')
+        labels = domaine[2:].split('.') if joker else domaine.split('.')
+        noeud = self.trie
+        for label in reversed(labels):
+            noeud = noeud.setdefault(label, {})
+        marqueur = _JOKER if joker else _EXACT
+        noeud[marqueur] = noeud.get(marqueur, 0) | sens
+        return 1
+
+    def _ajouter_url(self, entree, sens):
+        try:
+            url = urlsplit(entree.lower())
+            port = url.port or _PORTS_DEFAUT.get(url.scheme)
+        except ValueError:
+            return 0
+        if not url.hostname:
+            return 0
+        chemin = url.path or '/'
+        # Segments entiers : /api couvre /api et /api/..., pas /apiadmin
+        self.urls.setdefault((url.scheme, url.hostname, port), []).append(
+            (chemin, chemin.rstrip('/') + '/', sens)
+        )
+        return 1
+
+    # -----------------------------------------------------------------------
+
+    def _sens_domaine(self, domaine):
+        labels = domaine.split('.')
+        noeud = self.trie
+        sens = 0
+        dernier = len(labels) - 1
+        for rang in range(dernier, -1, -1):
+            noeud = noeud.get(labels[rang])
+            if noeud is None:
+                break
+            if rang == 0:
+                sens |= noeud.get(_EXACT, 0)
+            else:
+                # *.x couvre tout ce qui est strictement sous x
+                sens |= noeud.get(_JOKER, 0)
+        return sens
+
+    def _sens_adresse(self, adresse):
+        valeur = int(adresse)
+        sens = 0
+        if self.plages[(INCLUS, adresse.version)].contient(valeur):
+            sens |= INCLUS
+        if self.plages[(EXCLU, adresse.version)].contient(valeur):
+            sens |= EXCLU
+        return sens
+
+    def _sens_hote(self, hote, port=None):
+        adresse = _adresse(hote)
+        sens = self._sens_adresse(adresse) if adresse is not None else self._sens_domaine(hote)
+        if port in self.ports:
+            sens |= self.ports[port]._sens_hote(hote)
+        return sens
+
+    def _sens_url(self, actif):
+        try:
+            url = urlsplit(actif.lower())
+            port = url.port or _PORTS_DEFAUT.get(url.scheme)
+        except ValueError:
+            return 0
+        if not url.hostname:
+            return 0
+        sens = self._sens_hote(url.hostname, port)
+        chemin = url.path or '/'
+        for prefixe, dossier, sens_prefixe in self.urls.get((url.scheme, url.hostname, port), ()):
+            if chemin == prefixe or chemin.startswith(dossier):
+                sens |= sens_prefixe
+        return sens
+
+    def contient(self, actif):
+        """True si l'actif est couvert par une inclusion et par aucune exclusion"""
+        actif = actif.strip().lower()
+        if '://' in actif:
+            sens = self._sens_url(actif)
+        else:
+            adresse = _adresse(actif)
+            if adresse is not None:
+                sens = self._sens_adresse(adresse)
+            else:
+                # hôte, hôte:port ou hôte/chemin sans schéma : le chemin ne compte pas
+                hote = actif.split('/', 1)[0]
+                hote, port = _hote_port(hote) or (hote, None)
+                sens = self._sens_hote(hote.rstrip('.'), port)
+        return sens == INCLUS
+
+    def classer(self, actifs):
+        """{actif: dans le périmètre} pour un lot"""
+        contient = self.contient
+        return {actif: contient(actif) for actif in actifs}
+
+
+def entrees_portee(texte):
+    return [entree for entree in _SEPARATEURS.split(texte or '') if entree.strip()]
+
+
+# ---------------------------------------------------------------------------
+# Cache par programme
+# ---------------------------------------------------------------------------
+
+class _Compiles:
+    """Périmètres compilés, LRU par programme, valables pour une date_modification"""
+    def __init__(self):
+        self._cache = OrderedDict()
+        self._verrou = threading.Lock()
+
+    def obtenir(self, program_id, date_modification):
+        with self._verrou:
+            entree = self._cache.get(program_id)
+            if entree is None or entree[0] != date_modification:
+                return None
+            self._cache.move_to_end(program_id)
+            return entree[1]
+
+    def ajouter(self, program_id, date_modification, perimetre):
+        with self._verrou:
+            self._cache[program_id] = (date_modification, perimetre)
+            self._cache.move_to_end(program_id)
+            while len(self._cache) > getattr(settings, 'PERIMETRE_TAILLE_CACHE', 1024):
+                self._cache.popitem(last=False)
+
+    def vider(self):
+        with self._verrou:
+            self._cache.clear()
+
+
+_compiles = _Compiles()
+
+
+def compiler(program):
+    # Facettes 'domaine' : entrées entières (ports et préfixes d'URL compris)
+    domaines = ProgrammeFacette.objects.filter(
+        program_id=program.pk, facette__type_facette='domaine',
+    ).values_list('facette__valeur', flat=True)
+    return Perimetre([*entrees_portee(program.portee), *domaines])
+
+
+def perimetre_programme(program):
+    """Périmètre compilé d'un Program (ou de son id), recompilé si le programme a changé"""
+    if not isinstance(program, Program):
+        # Portée (texte) chargée seulement s'il faut compiler
+        program = Program.objects.only('id', 'date_modification').get(pk=program)
+    perimetre = _compiles.obtenir(program.pk, program.date_modification)
+    if perimetre is None:
+        perimetre = compiler(program)
+        _compiles.ajouter(program.pk, program.date_modification, perimetre)
+    return perimetre
+
+
+def dans_perimetre(program, actif):
+    return perimetre_programme(program).contient(actif)
@@ -0,0 +1,272 @@
+"""
+Recherche plein texte sur les rapports pour détecter les doublons.
+
+Deux étapes :
+
+1. Candidats : l'index plein texte de la base renvoie les rapports du
+   programme les plus proches du texte soumis (titre, description, étapes
+   de reproduction).
+   - MySQL : index FULLTEXT sur `reports`, maintenu par InnoDB.
+   - SQLite : table virtuelle FTS5 `reports_fts` (rowid = id du rapport),
+     maintenue à chaque save / delete par les signaux (accounts.signals).
+   - Autres bases, ou FTS5 indisponible : rapports les plus récents du
+     programme.
+2. Score : les candidats sont reclassés par un scoreur de similarité
+   interchangeable (réglage RECHERCHE_SCOREUR, chemin d'une classe ayant
+   `signature(texte)` et `similarite(a, b)`), par défaut un MinHash bottom-k
+   sur des 3-grammes de mots. Les signatures des candidats sont gardées en
+   mémoire par (id, date_modification).
+
+Les rapports créés par bulk_create ne passent pas par les signaux :
+`reconstruire_index()` (commande reindexer_rapports) réindexe tout.
+"""
+import re
+import threading
+import unicodedata
+import zlib
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import connections
+from django.utils.module_loading import import_string
+
+from .models import Report
+
+
+TABLE_FTS = 'reports_fts'
+CHAMPS_TEXTE = ('titre', 'description', 'etapes_reproduction')
+# Candidats examinés par le scoreur pour chaque résultat demandé
+FACTEUR_CANDIDATS = 4
+# Termes retenus dans la requête plein texte
+TERMES_MAX = 32
+
+_MOT = re.compile(r'\w+')
+
+
+def normaliser(texte):
+    """Mots en minuscules, sans accents"""
+    texte = unicodedata.normalize('NFKD', texte or '').encode('ascii', 'ignore').decode()
+    return _MOT.findall(texte.lower())
+
+
+def texte_rapport(titre, description='', etapes_reproduction=''):
+    return '\n'.join(partie for partie in (titre, description, etapes_reproduction) if partie)
+
+
+# ---------------------------------------------------------------------------
+# Scoreurs
+# ---------------------------------------------------------------------------
+
+class ScoreurShingles:
+    """Jaccard exact sur les ensembles de n-grammes de mots"""
+    def __init__(self, taille_ngramme=3):
+        self.taille_ngramme = taille_ngramme
+
+    def ngrammes(self, texte):
+        mots = normaliser(texte)
+        n = min(self.taille_ngramme, len(mots)) or 1
+        return {' '.join(mots[i:i + n]) for i in range(max(len(mots) - n + 1, 0))}
+
+    def signature(self, texte):
+        return frozenset(zlib.crc32(ngramme.encode()) for ngramme in self.ngrammes(texte))
+
+    def similarite(self, a, b):
+        if not a or not b:
+            return 0.0
+        return len(a & b) / len(a | b)
+
+
+class ScoreurMinHash(ScoreurShingles):
+    """
+    MinHash bottom-k : la signature garde les `taille` plus petites
+    empreintes des n-grammes ; Jaccard estimé sur les `taille` plus petites
+    empreintes de l'union. Taille de signature bornée quel que soit le texte.
+    """
+    def __init__(self, taille_ngramme=3, taille=128):
+        super().__init__(taille_ngramme)
+        self.taille = taille
+
+    def signature(self, texte):
+        return frozenset(sorted(super().signature(texte))[:self.taille])
+
+    def similarite(self, a, b):
+        if not a or not b:
+            return 0.0
+        union = sorted(a | b)[:self.taille]
+        return sum(1 for empreinte in union if empreinte in a and empreinte in b) / len(union)
+
+
+_scoreur = {}
+
+
+def scoreur():
+    chemin = getattr(settings, 'RECHERCHE_SCOREUR', 'accounts.recherche.ScoreurMinHash')
+    if chemin not in _scoreur:
+        _scoreur[chemin] = import_string(chemin)()
+    return _scoreur[chemin]
+
+
+class _Signatures:
+    """Signatures des rapports candidats, LRU par (id, date_modification)"""
+    def __init__(self, taille=4096):
+        self.taille = taille
+        self._cache = OrderedDict()
+        self._verrou = threading.Lock()
+
+    def obtenir(self, cle, texte, scoreur):
+        cle = (type(scoreur), cle)
+        with self._verrou:
+            if cle in self._cache:
+                self._cache.move_to_end(cle)
+                return self._cache[cle]
+        signature = scoreur.signature(texte)
+        with self._verrou:
+            self._cache[cle] = signature
+            while len(self._cache) > self.taille:
+                self._cache.popitem(last=False)
+        return signature
+
+
+_signatures = _Signatures()
+
+
+# ---------------------------------------------------------------------------
+# Index plein texte
+# ---------------------------------------------------------------------------
+
+_fts_disponible = {}
+
+
+def fts_disponible(connexion):
+    """Table FTS5 présente (SQLite compilé sans FTS5 : pas de table)"""
+    if connexion.alias not in _fts_disponible:
+        _fts_disponible[connexion.alias] = TABLE_FTS in connexion.introspection.table_names()
+    return _fts_disponible[connexion.alias]
+
+
+def _requete_fts(mots):
+    termes = list(dict.fromkeys(mot for mot in mots if len(mot) > 2))[:TERMES_MAX]
+    return ' OR '.join(f'"{terme}"' for terme in termes)
+
+
+def _candidats_sqlite(connexion, program_id, mots, limite, exclure):
+    if not fts_disponible(connexion):
+        return None
+    requete = _requete_fts(mots)
+    if not requete:
+        return []
+    with connexion.cursor() as curseur:
+        curseur.execute(
+            f"SELECT rowid FROM {TABLE_FTS} WHERE {TABLE_FTS} MATCH %s AND rowid != %s "
+            f"ORDER BY bm25({TABLE_FTS}) LIMIT %s",
+            [f'programme:p{program_id} AND ({requete})', exclure or 0, limite],
+        )
+        return [ligne[0] for ligne in curseur.fetchall()]
+
+
+def _candidats_mysql(connexion, program_id, mots, limite, exclure):
+    texte = ' '.join(mots[:TERMES_MAX * 4])
+    if not texte:
+        return []
+    correspondance = "MATCH(titre, description, etapes_reproduction) AGAINST (%s IN NATURAL LANGUAGE MODE)"
+    with connexion.cursor() as curseur:
+        curseur.execute(
+            f"SELECT id FROM reports WHERE program_id = %s AND id != %s AND {correspondance} "
+            f"ORDER BY {correspondance} DESC LIMIT %s",
+            [program_id, exclure or 0, texte, texte, limite],
+        )
+        return [ligne[0] for ligne in curseur.fetchall()]
+
+
+MOTEURS = {
+    'sqlite': _candidats_sqlite,
+    'mysql': _candidats_mysql,
+}
+
+
+def candidats(program_id, texte, limite, exclure=None, using='default'):
+    """Ids des rapports du programme les plus proches de `texte`"""
+    connexion = connections[using]
+    moteur = MOTEURS.get(connexion.vendor)
+    ids = moteur(connexion, program_id, normaliser(texte), limite, exclure) if moteur else None
+    if ids is None:
+        ids = list(
+            Report.objects.using(using).filter(program_id=program_id).exclude(pk=exclure)
+            .order_by('-date_soumission').values_list('pk', flat=True)[:limite]
+        )
+    return ids
+
+
+def indexer_rapport(report, using='default'):
+    """Insère ou remplace le rapport dans l'index FTS5 (SQLite uniquement)"""
+    connexion = connections[using]
+    if connexion.vendor != 'sqlite' or not fts_disponible(connexion):
+        return
+    with connexion.cursor() as curseur:
+        curseur.execute(f"DELETE FROM {TABLE_FTS} WHERE rowid = %s", [report.pk])
+        curseur.execute(
+            f"INSERT INTO {TABLE_FTS} (rowid, programme, titre, description, etapes_reproduction) "
+            "VALUES (%s, %s, %s, %s, %s)",
+            [report.pk, f'p{report.program_id}', report.titre, report.description, report.etapes_reproduction],
+        )
+
+
+def desindexer_rapport(report_id, using='default'):
+    connexion = connections[using]
+    if connexion.vendor != 'sqlite' or not fts_disponible(connexion):
+        return
+    with connexion.cursor() as curseur:
+        curseur.execute(f"DELETE FROM {TABLE_FTS} WHERE rowid = %s", [report_id])
+
+
+def reconstruire_index(using='default'):
+    """Réindexe tous les rapports (SQLite) ; renvoie le nombre indexé"""
+    connexion = connections[using]
+    if connexion.vendor != 'sqlite' or not fts_disponible(connexion):
+        return 0
+    with connexion.cursor() as curseur:
+        curseur.execute(f"DELETE FROM {TABLE_FTS}")
+        curseur.execute(
+            f"INSERT INTO {TABLE_FTS} (rowid, programme, titre, description, etapes_reproduction) "
+            "SELECT id, 'p' || program_id, titre, description, etapes_reproduction FROM reports"
+        )
+        return curseur.rowcount
+
+
+# ---------------------------------------------------------------------------
+# Rapports similaires
+# ---------------------------------------------------------------------------
+
+def rapports_similaires(program_id, titre, description='', etapes_reproduction='', k=5, exclure=None):
+    """
+    Les `k` rapports du programme les plus similaires au texte donné :
+    [{'id', 'numero_reference', 'titre', 'statut', 'score'}], score décroissant
+    (les candidats de score nul sont écartés).
+    """
+    texte = texte_rapport(titre, description, etapes_reproduction)
+    ids = candidats(program_id, texte, k * FACTEUR_CANDIDATS, exclure)
+    if not ids:
+        return []
+
+    score = scoreur()
+    reference = score.signature(texte)
+    resultats = []
+    lignes = Report.objects.filter(pk__in=ids).values_list(
+        'id', 'numero_reference', 'statut', 'date_modification', *CHAMPS_TEXTE
+    )
+    for pk, numero, statut, date_modification, titre_c, description_c, etapes_c in lignes:
+        signature = _signatures.obtenir(
+            (pk, date_modification), texte_rapport(titre_c, description_c, etapes_c), score,
+        )
+        similarite = score.similarite(reference, signature)
+        if not similarite:
+            continue
+        resultats.append({
+            'id': pk,
+            'numero_reference': numero,
+            'titre': titre_c,
+            'statut': statut,
+            'score': round(similarite, 4),
+        })
+    resultats.sort(key=lambda resultat: (-resultat['score'], resultat['id']))
+    return resultats[:k]
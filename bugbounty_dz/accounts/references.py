@@ -0,0 +1,133 @@
+"""
+Numéros de référence des rapports (Report.numero_reference), sans
+COUNT(*) + 1 ni MAX() + 1 : ni sérialisation des soumissions concurrentes,
+ni IntegrityError à rejouer.
+
+- Une ligne de `sequences_references` par séquence : globale, ou par
+  programme (REFERENCES_PAR_PROGRAMME). Chaque processus réserve un bloc
+  de REFERENCES_TAILLE_BLOC numéros en une transaction courte
+  (UPDATE prochain = prochain + n, puis relecture) et le distribue ensuite
+  en mémoire à ses threads. Le verrou de la ligne n'est tenu que le temps
+  de cet UPDATE, sous MySQL comme sous SQLite.
+- Dans une transaction déjà ouverte, un bloc réservé serait annulé avec
+  elle alors que le processus en distribuerait encore les numéros : on n'y
+  réserve que les numéros nécessaires, rendus avec la transaction en cas
+  d'annulation (verrou de la ligne jusqu'au commit).
+- Après un fork, le processus enfant repart sans bloc.
+
+Les numéros sont uniques et croissants dans chaque processus, pas dans
+l'ordre des soumissions entre processus ; les numéros d'un bloc non
+épuisé au redémarrage sont perdus (trous dans la séquence).
+
+Format : REFERENCES_PREFIXE, l'id du programme puis le compteur
+(« BB-12-00042 »), ou le seul compteur en séquence globale (« BB-0000042 »).
+
+Réglages (settings) :
+    REFERENCES_PREFIXE          préfixe des numéros ('BB')
+    REFERENCES_PAR_PROGRAMME    une séquence par programme (True)
+    REFERENCES_TAILLE_BLOC      numéros réservés à la fois par processus (50)
+"""
+import os
+import threading
+from collections import defaultdict, deque
+
+from django.conf import settings
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models import F
+
+from .models import Report, SequenceReference
+
+
+def taille_bloc():
+    return getattr(settings, 'REFERENCES_TAILLE_BLOC', 50)
+
+
+def cle_sequence(program_id):
+    if getattr(settings, 'REFERENCES_PAR_PROGRAMME', True):
+        return f'programme:{program_id}'
+    return 'global'
+
+
+def formater(cle, numero):
+    prefixe = getattr(settings, 'REFERENCES_PREFIXE', 'BB')
+    if cle == 'global':
+        return f"{prefixe}-{numero:07d}"
+    return f"{prefixe}-{cle.split(':', 1)[1]}-{numero:05d}"
+
+
+def reserver(cle, nombre, using):
+    """Réserve `nombre` numéros consécutifs de la séquence ; renvoie le premier"""
+    sequences = SequenceReference.objects.using(using).filter(cle=cle)
+    with transaction.atomic(using=using):
+        if not sequences.update(prochain=F('prochain') + nombre):
+            try:
+                with transaction.atomic(using=using):
+                    SequenceReference.objects.using(using).create(cle=cle, prochain=1 + nombre)
+                return 1
+            except IntegrityError:
+                # Créée entre-temps par un autre processus
+                sequences.update(prochain=F('prochain') + nombre)
+        return sequences.values_list('prochain', flat=True).get() - nombre
+
+
+class Allocateur:
+    """Blocs de numéros réservés par ce processus, par (base, séquence)"""
+    def __init__(self):
+        self.pid = os.getpid()
+        self._blocs = defaultdict(deque)
+        self._verrou = threading.Lock()
+        self.reservations = 0
+
+    def _prendre(self, cle, nombre):
+        with self._verrou:
+            if self.pid != os.getpid():
+                self.pid = os.getpid()
+                self._blocs.clear()
+            blocs = self._blocs[cle]
+            numeros = []
+            while blocs and len(numeros) < nombre:
+                debut, fin = blocs[0]
+                prises = min(fin - debut, nombre - len(numeros))
+                numeros.extend(range(debut, debut + prises))
+                if debut + prises == fin:
+                    blocs.popleft()
+                else:
+                    blocs[0] = (debut + prises, fin)
+            return numeros
+
+    def numeros(self, cle, nombre, using):
+        """`nombre` numéros libres de la séquence `cle`"""
+        if connections[using].in_atomic_block:
+            debut = reserver(cle, nombre, using)
+            return list(range(debut, debut + nombre))
+
+        numeros = self._prendre((using, cle), nombre)
+        manquants = nombre - len(numeros)
+        if manquants:
+            taille = max(taille_bloc(), manquants)
+            debut = reserver(cle, taille, using)
+            with self._verrou:
+                self.reservations += 1
+                if taille > manquants:
+                    self._blocs[(using, cle)].append((debut + manquants, debut + taille))
+            numeros.extend(range(debut, debut + manquants))
+        return numeros
+
+    def attribuer(self, rapports, using=None):
+        """Donne un numero_reference aux rapports qui n'en ont pas"""
+        par_cle = defaultdict(list)
+        for rapport in rapports:
+            if not rapport.numero_reference:
+                par_cle[cle_sequence(rapport.program_id)].append(rapport)
+        for cle, sans_numero in par_cle.items():
+            base = using or router.db_for_write(Report, instance=sans_numero[0])
+            for rapport, numero in zip(sans_numero, self.numeros(cle, len(sans_numero), base)):
+                rapport.numero_reference = formater(cle, numero)
+        return rapports
+
+
+_allocateur = Allocateur()
+
+
+def attribuer(rapports, using=None):
+    return _allocateur.attribuer(rapports, using)
@@ -0,0 +1,134 @@
+"""
+Registre des requêtes critiques (chemins chauds) et analyse de leur plan
+d'exécution.
+
+Chaque requête est déclarée par `@requete_critique` avec des paramètres
+d'exemple ; `plan()` exécute EXPLAIN sur la base courante et signale les
+parcours complets de table et les tris non servis par un index. Les tests
+(accounts.tests.PlansRequetesTests) et la commande `plans_requetes` vérifient
+que chaque requête du registre reste indexée.
+
+Backends pris en charge : SQLite (EXPLAIN QUERY PLAN) et MySQL (EXPLAIN).
+"""
+from django.db import connections
+
+from .leaderboard import STATUTS_ACCEPTES
+from .models import Leaderboard, Notification, Report, Session, Transaction
+
+
+REQUETES = {}
+
+
+def requete_critique(nom, tri_indexe=False, **exemple):
+    """
+    Enregistre une fonction qui renvoie le QuerySet d'une requête critique.
+    `tri_indexe` : l'ORDER BY doit être servi par un index (pas de tri).
+    `exemple` : paramètres utilisés pour construire la requête analysée.
+    """
+    def decorateur(fonction):
+        REQUETES[nom] = {'requete': fonction, 'tri_indexe': tri_indexe, 'exemple': exemple}
+        return fonction
+    return decorateur
+
+
+# ---------------------------------------------------------------------------
+# Requêtes
+# ---------------------------------------------------------------------------
+
+@requete_critique('rapports_a_trier', tri_indexe=True, program_id=1)
+def rapports_a_trier(program_id):
+    return Report.objects.filter(program_id=program_id, statut='soumis').order_by('-date_soumission')
+
+
+@requete_critique('rapports_programme_par_statut', tri_indexe=True, program_id=1, statut='accepte')
+def rapports_programme_par_statut(program_id, statut):
+    return Report.objects.filter(program_id=program_id, statut=statut).order_by('-date_soumission')
+
+
+@requete_critique('rapports_acceptes_hacker', hacker_id=1)
+def rapports_acceptes_hacker(hacker_id):
+    return Report.objects.filter(hacker_id=hacker_id, statut__in=STATUTS_ACCEPTES)
+
+
+@requete_critique('transactions_hacker_par_statut', hacker_id=1, statut='completee')
+def transactions_hacker_par_statut(hacker_id, statut):
+    return Transaction.objects.filter(hacker_id=hacker_id, statut=statut)
+
+
+@requete_critique('transactions_en_attente', tri_indexe=True)
+def transactions_en_attente():
+    return Transaction.objects.filter(statut='en_attente').order_by('date_creation')
+
+
+@requete_critique('sessions_actives', user_id=1, user_type='hacker')
+def sessions_actives(user_id, user_type):
+    return Session.objects.filter(user_id=user_id, user_type=user_type, actif=True)
+
+
+@requete_critique('notifications_non_lues', hacker_id=1)
+def notifications_non_lues(hacker_id):
+    return Notification.objects.filter(hacker_id=hacker_id, lu=False)
+
+
+@requete_critique('classement_page', tri_indexe=True, apres=0)
+def classement_page(apres):
+    return Leaderboard.objects.filter(position__gt=apres).order_by('position')
+
+
+# ---------------------------------------------------------------------------
+# Plans d'exécution
+# ---------------------------------------------------------------------------
+
+def _plan_sqlite(curseur, sql, params):
+    curseur.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+    etapes = []
+    for ligne in curseur.fetchall():
+        detail = ligne[-1]
+        etapes.append({
+            'detail': detail,
+            'parcours_complet': detail.startswith('SCAN ') and 'COVERING INDEX' not in detail,
+            'tri': 'TEMP B-TREE' in detail,
+        })
+    return etapes
+
+
+def _plan_mysql(curseur, sql, params):
+    curseur.execute(f"EXPLAIN {sql}", params)
+    colonnes = [colonne[0].lower() for colonne in curseur.description]
+    etapes = []
+    for ligne in curseur.fetchall():
+        ligne = dict(zip(colonnes, ligne))
+        extra = ligne.get('extra') or ''
+        etapes.append({
+            'detail': f"{ligne.get('table')} type={ligne.get('type')} key={ligne.get('key')} {extra}".strip(),
+            'parcours_complet': ligne.get('type') in ('ALL', 'index'),
+            'tri': 'Using filesort' in extra,
+        })
+    return etapes
+
+
+ANALYSEURS = {
+    'sqlite': _plan_sqlite,
+    'mysql': _plan_mysql,
+}
+
+
+def plan(queryset):
+    """Étapes du plan d'exécution : [{'detail', 'parcours_complet', 'tri'}]"""
+    connexion = connections[queryset.db]
+    analyseur = ANALYSEURS.get(connexion.vendor)
+    if analyseur is None:
+        raise NotImplementedError(f"Plans d'exécution non pris en charge pour {connexion.vendor}")
+    sql, params = queryset.query.get_compiler(using=queryset.db).as_sql()
+    with connexion.cursor() as curseur:
+        return analyseur(curseur, sql, params)
+
+
+def problemes(nom, using='default'):
+    """Régressions du plan de la requête `nom` : (plan, liste de problèmes)"""
+    entree = REQUETES[nom]
+    etapes = plan(entree['requete'](**entree['exemple']).using(using))
+    resultat = [f"parcours complet : {etape['detail']}" for etape in etapes if etape['parcours_complet']]
+    if entree['tri_indexe']:
+        resultat += [f"tri non indexé : {etape['detail']}" for etape in etapes if etape['tri']]
+    return etapes, resultat
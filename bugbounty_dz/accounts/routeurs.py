@@ -0,0 +1,131 @@
+"""
+Routage des lectures vers une réplique (réglage BASE_REPLIQUE).
+
+- Par défaut tout va au primaire. Seuls les chemins de lecture déclarés
+  par `lecture_replique()` (bloc `with` ou décorateur) lisent sur la
+  réplique : classement, statistiques de programme, exports, listes de
+  l'admin.
+- Les écritures vont toujours au primaire. Après une écriture, et dans
+  une transaction ouverte sur le primaire, les lectures suivantes du même
+  contexte restent sur le primaire : on relit ce qu'on vient d'écrire.
+- Collant après écriture : RepliqueMiddleware pose un cookie après une
+  requête qui a écrit (ou de méthode non sûre) ; pendant
+  REPLIQUE_DELAI_COLLANT secondes, les requêtes de ce navigateur lisent au
+  primaire, le temps que la réplique rattrape son retard.
+
+Sans BASE_REPLIQUE, le routeur ne change rien.
+
+Réglages (settings) :
+    BASE_REPLIQUE             alias de la réplique (None)
+    REPLIQUE_DELAI_COLLANT    lecture au primaire après une écriture, en secondes (5)
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+COOKIE_COLLANT = 'primaire_jusqua'
+METHODES_SURES = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+
+def replique():
+    return getattr(settings, 'BASE_REPLIQUE', None)
+
+
+def delai_collant():
+    return getattr(settings, 'REPLIQUE_DELAI_COLLANT', 5)
+
+
+class _Etat:
+    """Routage du contexte courant (une requête, ou un bloc hors requête)"""
+    __slots__ = ('replique', 'collant', 'ecrit')
+
+    def __init__(self, collant=False, ecrit=False):
+        self.replique = False
+        self.collant = collant
+        self.ecrit = ecrit
+
+
+_etat = ContextVar('routage', default=None)
+
+
+@contextmanager
+def lecture_replique():
+    """Les lectures du bloc vont à la réplique (sauf écriture ou collant)"""
+    etat = _etat.get()
+    jeton = None
+    if etat is None:
+        etat = _Etat()
+        jeton = _etat.set(etat)
+    precedent, etat.replique = etat.replique, True
+    try:
+        yield
+    finally:
+        etat.replique = precedent
+        if jeton is not None:
+            _etat.reset(jeton)
+
+
+def base_lecture():
+    """Alias où iraient les lectures dans le contexte courant"""
+    etat = _etat.get()
+    alias = replique()
+    if (
+        alias is None or etat is None or not etat.replique or etat.collant or etat.ecrit
+        or connections[DEFAULT_DB_ALIAS].in_atomic_block
+    ):
+        return DEFAULT_DB_ALIAS
+    return alias
+
+
+class RouteurLectureEcriture:
+    def db_for_read(self, model, **hints):
+        alias = base_lecture()
+        return None if alias == DEFAULT_DB_ALIAS else alias
+
+    def db_for_write(self, model, **hints):
+        if replique() is None:
+            return None
+        etat = _etat.get()
+        if etat is not None:
+            etat.ecrit = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        alias = replique()
+        if alias is None:
+            return None
+        bases = (DEFAULT_DB_ALIAS, alias)
+        if obj1._state.db in bases and obj2._state.db in bases:
+            return True
+        return None
+
+
+class RepliqueMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if replique() is None:
+            return self.get_response(request)
+
+        try:
+            collant = float(request.COOKIES.get(COOKIE_COLLANT, 0)) > time.time()
+        except ValueError:
+            collant = False
+        etat = _Etat(collant=collant, ecrit=request.method not in METHODES_SURES)
+        jeton = _etat.set(etat)
+        try:
+            response = self.get_response(request)
+        finally:
+            _etat.reset(jeton)
+
+        if etat.ecrit:
+            delai = delai_collant()
+            response.set_cookie(
+                COOKIE_COLLANT, str(int(time.time() + delai)), max_age=delai, httponly=True, samesite='Lax',
+            )
+        return response
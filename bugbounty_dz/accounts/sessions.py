@@ -0,0 +1,261 @@
+"""
+Moteur de sessions Django (SESSION_ENGINE = 'accounts.sessions') pour les
+sessions hacker, entreprise et admin, stockées dans la table `sessions`
+(modèle accounts.Session) avec un cache devant.
+
+- Lecture : cache (SESSION_CACHE_ALIAS) puis, en cas d'absence, la table.
+- Écriture :
+  - création et changement d'identité (connexion, déconnexion) : écriture
+    immédiate, pour que la révocation par utilisateur les voie ; une
+    session révoquée entre-temps reçoit une nouvelle clé ;
+  - autres modifications : cache immédiatement, table en différé (après
+    commit, par lots, voir accounts.tampon) ; une écriture différée plus
+    ancienne que la dernière écriture de la ligne est ignorée ;
+  - données inchangées depuis le chargement : aucune écriture.
+- `revoquer_sessions(user_ids, user_type)` désactive d'un coup toutes les
+  sessions (web et JWT) d'un ou plusieurs comptes ; après commit, les
+  retire du cache et y laisse une marque de révocation, vérifiée à chaque
+  lecture en cache pendant SESSIONS_DUREE_CACHE : une requête en cours qui
+  remet la session en cache ne la ranime pas.
+
+Réglages (settings) :
+    SESSIONS_DUREE_CACHE     durée max d'une session en cache, en secondes (300)
+    SESSIONS_TAILLE_LOT      sessions par lot d'écriture différée (200)
+    SESSIONS_INTERVALLE      délai max avant écriture différée, en secondes (1.0)
+    SESSIONS_ARRIERE_PLAN    False pour écrire dans le thread appelant (tests)
+"""
+import threading
+
+from django.conf import settings
+from django.contrib.sessions.backends.base import CreateError, SessionBase
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Session
+from .tampon import TamponEcriture
+
+
+PREFIXE_CACHE = 'accounts.sessions:'
+CHAMPS_ECRITS = ('donnees', 'date_expiration', 'user_id', 'user_type', 'date_derniere_activite')
+
+_tampon = None
+_verrou = threading.Lock()
+
+
+def duree_cache():
+    return getattr(settings, 'SESSIONS_DUREE_CACHE', 300)
+
+
+def _cache():
+    return caches[settings.SESSION_CACHE_ALIAS]
+
+
+def cle_revocation(session_key):
+    return PREFIXE_CACHE + 'revoquee:' + session_key
+
+
+def identite(donnees):
+    """(user_id, user_type) du compte connecté dans la session"""
+    if donnees.get('hacker_id'):
+        return donnees['hacker_id'], 'hacker'
+    if donnees.get('enterprise_id'):
+        return donnees['enterprise_id'], 'enterprise'
+    if donnees.get('_auth_user_id'):
+        return int(donnees['_auth_user_id']), 'admin'
+    return None, None
+
+
+# ---------------------------------------------------------------------------
+# Écriture différée
+# ---------------------------------------------------------------------------
+
+def _ecrire(lignes):
+    dernieres = {ligne['cle_session']: ligne for ligne in lignes}
+    # Sessions supprimées, révoquées ou réécrites depuis (connexion) : ignorées
+    plus_anciennes = Q()
+    for cle, ligne in dernieres.items():
+        plus_anciennes |= Q(cle_session=cle, date_derniere_activite__lt=ligne['date_derniere_activite'])
+    sessions = Session.objects.filter(plus_anciennes, actif=True)
+    ids = dict(sessions.values_list('cle_session', 'id'))
+    # Condition répétée dans l'UPDATE : une connexion écrite entre-temps l'emporte
+    sessions.bulk_update(
+        [Session(id=ids[cle], **ligne) for cle, ligne in dernieres.items() if cle in ids],
+        CHAMPS_ECRITS,
+        batch_size=getattr(settings, 'SESSIONS_TAILLE_LOT', 200),
+    )
+
+
+def tampon():
+    global _tampon
+    if _tampon is None:
+        with _verrou:
+            if _tampon is None:
+                _tampon = TamponEcriture(
+                    _ecrire,
+                    nom='sessions',
+                    taille_lot=getattr(settings, 'SESSIONS_TAILLE_LOT', 200),
+                    intervalle=getattr(settings, 'SESSIONS_INTERVALLE', 1.0),
+                    arriere_plan=getattr(settings, 'SESSIONS_ARRIERE_PLAN', True),
+                )
+    return _tampon
+
+
+@receiver(setting_changed)
+def _reinitialiser(setting, **kwargs):
+    global _tampon
+    if setting.startswith('SESSIONS_') and _tampon is not None:
+        _tampon.arreter()
+        _tampon = None
+
+
+def vider():
+    return tampon().vider()
+
+
+# ---------------------------------------------------------------------------
+# Moteur
+# ---------------------------------------------------------------------------
+
+class SessionStore(SessionBase):
+    def __init__(self, session_key=None):
+        self._cache = _cache()
+        # (données sérialisées, identité) au chargement : écriture évitée si inchangées
+        self._charge = None
+        super().__init__(session_key)
+
+    @property
+    def cache_key(self):
+        return PREFIXE_CACHE + self._get_or_create_session_key()
+
+    def _duree_cache(self, expiry=None):
+        return min(self.get_expiry_age(expiry=expiry), duree_cache())
+
+    def _etat(self, donnees):
+        return self.serializer().dumps(donnees), identite(donnees)
+
+    def load(self):
+        try:
+            valeurs = self._cache.get_many([self.cache_key, cle_revocation(self.session_key)])
+        except Exception:
+            # Clé invalide pour le backend de cache (memcached)
+            valeurs = {}
+        if cle_revocation(self.session_key) in valeurs:
+            self._session_key = None
+            return {}
+        donnees = valeurs.get(self.cache_key)
+
+        if donnees is None:
+            ligne = (
+                Session.objects
+                .filter(cle_session=self.session_key, actif=True, date_expiration__gt=timezone.now())
+                .values_list('donnees', 'date_expiration')
+                .first()
+            )
+            if ligne is None:
+                self._session_key = None
+                return {}
+            donnees = self.decode(ligne[0] or '')
+            self._cache.set(self.cache_key, donnees, self._duree_cache(expiry=ligne[1]))
+
+        self._charge = self._etat(donnees)
+        return donnees
+
+    def exists(self, session_key):
+        return bool(session_key) and (
+            PREFIXE_CACHE + session_key in self._cache
+            or Session.objects.filter(cle_session=session_key).exists()
+        )
+
+    def create(self):
+        while True:
+            self._session_key = self._get_new_session_key()
+            try:
+                self.save(must_create=True)
+            except CreateError:
+                continue
+            self.modified = True
+            return
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+        donnees = self._get_session(no_load=must_create)
+        etat = self._etat(donnees)
+        if not must_create and etat == self._charge:
+            return
+
+        user_id, user_type = etat[1]
+        ligne = {
+            'cle_session': self.session_key,
+            'donnees': self.encode(donnees),
+            'date_expiration': self.get_expiry_date(),
+            'user_id': user_id,
+            'user_type': user_type,
+            'date_derniere_activite': timezone.now(),
+        }
+        if must_create:
+            try:
+                with transaction.atomic():
+                    Session.objects.create(actif=True, **ligne)
+            except IntegrityError:
+                raise CreateError
+        elif self._charge is None or etat[1] != self._charge[1]:
+            # Connexion / déconnexion : visible tout de suite pour la révocation
+            cle = ligne.pop('cle_session')
+            if not Session.objects.filter(cle_session=cle, actif=True).update(**ligne):
+                # Session révoquée ou supprimée : nouvelle clé, jamais la ligne révoquée
+                self._session_key = None
+                return self.create()
+        else:
+            transaction.on_commit(lambda: tampon().ajouter(ligne))
+            if self._cache.get(cle_revocation(self.session_key)) is not None:
+                # Révoquée pendant la requête : pas de retour en cache
+                self._charge = etat
+                return
+
+        self._cache.set(self.cache_key, donnees, self._duree_cache())
+        self._charge = etat
+
+    def delete(self, session_key=None):
+        if session_key is None:
+            if self.session_key is None:
+                return
+            session_key = self.session_key
+        self._cache.delete(PREFIXE_CACHE + session_key)
+        Session.objects.filter(cle_session=session_key).delete()
+
+    def flush(self):
+        self.clear()
+        self.delete(self.session_key)
+        self._session_key = None
+        self._charge = None
+
+    @classmethod
+    def clear_expired(cls):
+        Session.objects.filter(cle_session__isnull=False, date_expiration__lt=timezone.now()).delete()
+        Session.objects.filter(cle_session__isnull=False, actif=False).delete()
+
+
+def revoquer_sessions(user_ids, user_type):
+    """
+    Désactive toutes les sessions d'un compte (id) ou de plusieurs (liste
+    d'id) ; renvoie leur nombre. Cache mis à jour après commit.
+    """
+    if isinstance(user_ids, int):
+        user_ids = [user_ids]
+    sessions = Session.objects.filter(user_id__in=user_ids, user_type=user_type, actif=True)
+    cles = [cle for cle in sessions.values_list('cle_session', flat=True) if cle]
+    nombre = sessions.update(actif=False)
+    if cles:
+        transaction.on_commit(lambda: _retirer_du_cache(cles))
+    return nombre
+
+
+def _retirer_du_cache(cles):
+    cache = _cache()
+    cache.set_many({cle_revocation(cle): True for cle in cles}, duree_cache())
+    cache.delete_many([PREFIXE_CACHE + cle for cle in cles])
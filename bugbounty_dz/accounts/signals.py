@@ -0,0 +1,266 @@
+"""
+Signaux du modèle : propagation des changements de rapports, de
+transactions et de programmes vers les tables dérivées (classement,
+statistiques des programmes, dotations au grand livre) et les notifications.
+
+L'état initial de chaque instance est mémorisé au chargement (post_init) pour
+ne calculer que des deltas au moment du save(), sans relire la base.
+Les mises à jour en masse (queryset.update, bulk_update) ne déclenchent pas
+ces signaux : les services concernés appellent directement les moteurs.
+"""
+import logging
+from decimal import Decimal
+
+from django.db.models.signals import (
+    post_delete, post_init, post_save, pre_delete, pre_save,
+)
+from django.db import transaction
+from django.dispatch import receiver
+
+from . import catalogue, configuration, cvss, grand_livre, leaderboard, notifications, recherche, statistiques
+from .authentification import BACKENDS
+from .journal import journaliser
+from .middleware import invalider_compte
+from .models import (
+    AdminConfig, Enterprise, MessageChat, Notification, Program, ProgrammeFacette, ProgramParticipant, Report,
+    Transaction, UserHacker,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+def _etat(instance, champs):
+    valeurs = instance.__dict__
+    if any(champ not in valeurs for champ in champs):
+        # Champ différé (.only / .defer) : état inconnu, relu au besoin
+        return None
+    return tuple(valeurs[champ] for champ in champs)
+
+
+def _completer_etat(instance, champs):
+    if instance._etat_initial is None and instance.pk and not instance._state.adding:
+        instance._etat_initial = (
+            type(instance).objects.filter(pk=instance.pk).values_list(*champs).first()
+        )
+
+
+# Rapports ------------------------------------------------------------------
+
+CHAMPS_RAPPORT = ('statut', 'severite_label')
+
+
+@receiver(post_init, sender=Report)
+def memoriser_rapport(sender, instance, **kwargs):
+    instance._etat_initial = _etat(instance, CHAMPS_RAPPORT) if instance.pk else None
+    # Références aux chaînes chargées (pas de copie) : réindexation si modifiées
+    instance._texte_initial = _etat(instance, recherche.CHAMPS_TEXTE) if instance.pk else None
+    instance._vecteur_initial = instance.__dict__.get('vecteur_cvss') if instance.pk else None
+
+
+@receiver(pre_save, sender=Report)
+@receiver(pre_delete, sender=Report)
+def completer_rapport(sender, instance, **kwargs):
+    _completer_etat(instance, CHAMPS_RAPPORT)
+
+
+@receiver(pre_save, sender=Report)
+def noter_rapport(sender, instance, update_fields=None, **kwargs):
+    # Nouveau vecteur : sévérité et prime proposée recalculées avant
+    # l'écriture, propagées ensuite par propager_rapport
+    if update_fields is not None and 'vecteur_cvss' not in update_fields:
+        return
+    vecteur = instance.__dict__.get('vecteur_cvss')
+    if vecteur and vecteur != instance._vecteur_initial:
+        try:
+            cvss.tarifer([instance], instance.program)
+        except cvss.BaremeInvalide as e:
+            # Grille du programme mal formée : sévérité notée, prime proposée
+            # laissée telle quelle
+            logger.error("Rapport %s : grille des primes invalide : %s", instance.pk, e)
+            resultat = cvss.evaluer([vecteur], (None,) * 101)[0]
+            if resultat is not None:
+                instance.severite_cvss, instance.severite_label = resultat[:2]
+        instance._vecteur_initial = vecteur
+
+
+@receiver(post_save, sender=Report)
+def indexer_rapport(sender, instance, created, using, update_fields=None, **kwargs):
+    if update_fields is not None and not set(recherche.CHAMPS_TEXTE) & set(update_fields):
+        return
+    texte = _etat(instance, recherche.CHAMPS_TEXTE)
+    if created or texte is None or texte != instance._texte_initial:
+        recherche.indexer_rapport(instance, using=using)
+    instance._texte_initial = texte
+
+
+@receiver(post_delete, sender=Report)
+def desindexer_rapport(sender, instance, using, **kwargs):
+    recherche.desindexer_rapport(instance.pk, using=using)
+
+
+@receiver(post_save, sender=Report)
+def propager_rapport(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and not set(CHAMPS_RAPPORT) & set(update_fields):
+        return
+    avant = None if created else instance._etat_initial
+    apres = (instance.statut, instance.severite_label)
+    if avant != apres:
+        rapport_modifie(instance, avant, apres)
+    instance._etat_initial = apres
+
+
+@receiver(post_delete, sender=Report)
+def retirer_rapport(sender, instance, **kwargs):
+    if instance._etat_initial:
+        rapport_modifie(instance, instance._etat_initial, None)
+
+
+def rapport_modifie(report, avant, apres):
+    """
+    Point d'entrée unique des transitions de rapport (None = création /
+    suppression). Les services qui modifient des rapports en masse
+    l'appellent directement.
+    """
+    leaderboard.appliquer_rapport(report.hacker_id, avant, apres)
+    statistiques.appliquer_rapport(report, avant, apres)
+    notifications.notifier_transition_rapport(report, avant, apres)
+    if avant is None and apres is not None:
+        journaliser('soumission', report.hacker_id, 'hacker', entite_type='report', entite_id=report.pk)
+
+
+# Transactions ---------------------------------------------------------------
+
+CHAMPS_TRANSACTION = ('statut', 'type_transaction', 'montant_net')
+
+
+@receiver(post_init, sender=Transaction)
+def memoriser_transaction(sender, instance, **kwargs):
+    instance._etat_initial = _etat(instance, CHAMPS_TRANSACTION) if instance.pk else None
+
+
+@receiver(pre_save, sender=Transaction)
+@receiver(pre_delete, sender=Transaction)
+def completer_transaction(sender, instance, **kwargs):
+    _completer_etat(instance, CHAMPS_TRANSACTION)
+
+
+@receiver(post_save, sender=Transaction)
+def propager_transaction(sender, instance, created, **kwargs):
+    avant = None if created else instance._etat_initial
+    apres = (instance.statut, instance.type_transaction, instance.montant_net)
+    revenu = leaderboard.contribution_transaction(*apres)
+    if avant:
+        revenu -= leaderboard.contribution_transaction(*avant)
+    if revenu:
+        leaderboard.appliquer_revenus({instance.hacker_id: revenu})
+    instance._etat_initial = apres
+
+
+@receiver(post_delete, sender=Transaction)
+def retirer_transaction(sender, instance, **kwargs):
+    avant = instance._etat_initial
+    revenu = leaderboard.contribution_transaction(*avant) if avant else 0
+    if revenu:
+        leaderboard.appliquer_revenus({instance.hacker_id: -revenu})
+
+
+# Programmes -----------------------------------------------------------------
+
+@receiver(post_init, sender=Program)
+def memoriser_programme(sender, instance, **kwargs):
+    instance._statut_initial = instance.__dict__.get('statut') if instance.pk else None
+    instance._budget_initial = instance.__dict__.get('budget_total') if instance.pk else None
+
+
+@receiver(post_save, sender=Program)
+def propager_programme(sender, instance, created, using, **kwargs):
+    if created:
+        statistiques.creer_statistiques(instance.pk)
+    # Budget du programme : dotation (ou ajustement) passée au grand livre
+    budget = instance.__dict__.get('budget_total')
+    if budget is not None and (created or instance._budget_initial is not None):
+        ecart = Decimal(str(budget)) - Decimal(str(instance._budget_initial or 0))
+        if ecart:
+            grand_livre.doter_programme(instance, ecart, using=using)
+    instance._budget_initial = budget
+    if instance.statut == 'actif' and instance._statut_initial != 'actif':
+        notifications.notifier_lancement_programme(instance)
+    instance._statut_initial = instance.statut
+    invalider_compte('enterprise', instance.enterprise_id)
+    transaction.on_commit(catalogue.invalider_catalogue)
+
+
+# Soldes projetés ---------------------------------------------------------------
+
+@receiver(post_save, sender=UserHacker)
+@receiver(post_save, sender=Enterprise)
+@receiver(post_save, sender=Program)
+def reprojeter_soldes(sender, instance, created, using, update_fields=None, **kwargs):
+    # Un save() complet réécrit les colonnes de solde avec les valeurs chargées,
+    # peut-être périmées : projection refaite depuis le grand livre après commit
+    if created or (update_fields is not None and not grand_livre.colonnes_projetees(sender) & set(update_fields)):
+        return
+    comptes = {grand_livre.compte_instance(instance)}
+    transaction.on_commit(lambda: grand_livre.projeter(comptes), using=using)
+
+
+@receiver(post_delete, sender=Program)
+@receiver(post_save, sender=ProgrammeFacette)
+@receiver(post_delete, sender=ProgrammeFacette)
+def invalider_catalogue(sender, instance, **kwargs):
+    transaction.on_commit(catalogue.invalider_catalogue)
+
+
+@receiver(post_save, sender=ProgramParticipant)
+def ajouter_participant(sender, instance, created, **kwargs):
+    if created:
+        statistiques.appliquer_participants(instance.program_id, 1)
+    invalider_compte('hacker', instance.hacker_id)
+
+
+@receiver(post_delete, sender=ProgramParticipant)
+def retirer_participant(sender, instance, **kwargs):
+    statistiques.appliquer_participants(instance.program_id, -1)
+    invalider_compte('hacker', instance.hacker_id)
+
+
+# Messages et notifications --------------------------------------------------
+
+@receiver(post_save, sender=MessageChat)
+def notifier_message(sender, instance, created, **kwargs):
+    if created:
+        notifications.notifier_message(instance)
+
+
+@receiver(post_save, sender=Notification)
+@receiver(post_delete, sender=Notification)
+def invalider_compteur_notifications(sender, instance, **kwargs):
+    # Écriture unitaire hors du service de diffusion : compteur recalculé
+    notifications.invalider_compteur(
+        hacker_id=instance.hacker_id, enterprise_id=instance.enterprise_id,
+        membre_id=instance.membre_id, admin_id=instance.admin_id,
+    )
+
+
+# Comptes ---------------------------------------------------------------------
+
+@receiver(post_save, sender=UserHacker)
+def oublier_hacker_inconnu(sender, instance, **kwargs):
+    BACKENDS['hacker'].oublier_inconnu(instance.email)
+    invalider_compte('hacker', instance.pk)
+
+
+@receiver(post_save, sender=Enterprise)
+def oublier_entreprise_inconnue(sender, instance, **kwargs):
+    BACKENDS['enterprise'].oublier_inconnu(instance.email_entreprise)
+    invalider_compte('enterprise', instance.pk)
+
+
+# Configuration ---------------------------------------------------------------
+
+@receiver(post_save, sender=AdminConfig)
+@receiver(post_delete, sender=AdminConfig)
+def publier_configuration(sender, instance, **kwargs):
+    # Après commit : un autre processus ne doit pas recharger l'ancienne valeur sous la nouvelle version
+    transaction.on_commit(configuration.invalider_configuration)
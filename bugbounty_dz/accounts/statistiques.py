@@ -0,0 +1,300 @@
+"""
+Statistiques des programmes (table ProgramStats) maintenues à l'écriture.
+
+Chaque transition de rapport (accounts.signals.rapport_modifie) et chaque
+arrivée / départ de participant est traduite en delta appliqué par un seul
+UPDATE à base de F() sur la ligne du programme. La lecture
+(`statistiques_programme`) ne touche jamais `reports`.
+
+- Délai de tri : temps entre la soumission et la première sortie du statut
+  'soumis', horodatée dans Report.date_tri.
+- Dans un bloc `regroupees()` (paiements en lot), les deltas sont cumulés
+  par programme et appliqués en un seul UPDATE à la sortie du bloc.
+- Montant payé : montant_final des rapports payés ou publiés. Une
+  modification du montant d'un rapport déjà payé n'est pas propagée ; la
+  commande `reconstruire_statistiques` corrige ce type d'écart.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import BigIntegerField, Count, DecimalField, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .expressions import valeur_par_ligne
+from .leaderboard import difference
+from .models import Program, ProgramParticipant, ProgramStats, Report
+
+
+CHAMPS_STATUT = {
+    'soumis': 'rapports_soumis',
+    'en_revision': 'rapports_en_revision',
+    'accepte': 'rapports_acceptes',
+    'rejete': 'rapports_rejetes',
+    'en_correction': 'rapports_en_correction',
+    'corrige': 'rapports_corriges',
+    'paye': 'rapports_payes',
+    'publie': 'rapports_publies',
+}
+CHAMPS_SEVERITE = {
+    'Critique': 'rapports_critiques',
+    'Élevée': 'rapports_eleves',
+    'Moyenne': 'rapports_moyens',
+    'Basse': 'rapports_bas',
+}
+STATUTS_PAYES = ('paye', 'publie')
+
+COMPTEURS = ('rapports_total',) + tuple(CHAMPS_STATUT.values()) + tuple(CHAMPS_SEVERITE.values())
+CHAMPS_COMPARES = COMPTEURS + ('rapports_tries', 'delai_tri_total', 'montant_paye_total', 'participants')
+
+ZERO = Decimal('0.00')
+
+_en_attente = ContextVar('statistiques_en_attente', default=None)
+
+
+# ---------------------------------------------------------------------------
+# Mises à jour incrémentales
+# ---------------------------------------------------------------------------
+
+def contribution_rapport(statut, severite, montant=None):
+    """Compteurs apportés par un rapport dans l'état (statut, severite)"""
+    delta = {'rapports_total': 1}
+    for champ in (CHAMPS_STATUT.get(statut), CHAMPS_SEVERITE.get(severite)):
+        if champ:
+            delta[champ] = 1
+    if statut in STATUTS_PAYES and montant:
+        delta['montant_paye_total'] = montant
+    return delta
+
+
+def creer_statistiques(program_id):
+    ProgramStats.objects.get_or_create(program_id=program_id)
+
+
+def appliquer_rapport(report, avant, apres):
+    """
+    Applique la transition d'un rapport aux statistiques de son programme.
+    `avant` / `apres` : tuples (statut, severite_label) ou None.
+    """
+    # montant_final peut être différé (.only) : il n'intervient alors pas
+    montant = report.__dict__.get('montant_final')
+    delta = difference(
+        contribution_rapport(*avant, montant) if avant else {},
+        contribution_rapport(*apres, montant) if apres else {},
+    )
+    if avant and apres and avant[0] == 'soumis' and apres[0] != 'soumis':
+        delta.update(_trier(report))
+    elif apres is None:
+        delta.update(_delai_tri(report, signe=-1))
+    if delta:
+        _ajouter(report.program_id, delta, creer=apres is not None)
+
+
+def _trier(report):
+    """Horodate la première sortie du statut 'soumis' (une seule fois)"""
+    date_soumission = report.__dict__.get('date_soumission')
+    if date_soumission is None:
+        return {}
+    maintenant = timezone.now()
+    if not Report.objects.filter(pk=report.pk, date_tri__isnull=True).update(date_tri=maintenant):
+        return {}
+    report.date_tri = maintenant
+    return _delai_tri(report)
+
+
+def _delai_tri(report, signe=1):
+    date_soumission = report.__dict__.get('date_soumission')
+    date_tri = report.__dict__.get('date_tri')
+    if date_soumission is None or date_tri is None:
+        return {}
+    return {
+        'rapports_tries': signe,
+        'delai_tri_total': signe * int((date_tri - date_soumission).total_seconds()),
+    }
+
+
+def appliquer_participants(program_id, nombre):
+    _ajouter(program_id, {'participants': nombre}, creer=nombre > 0)
+
+
+@contextmanager
+def regroupees():
+    """Cumule les deltas émis dans le bloc et les applique en un seul UPDATE"""
+    if _en_attente.get() is not None:
+        yield
+        return
+    jeton = _en_attente.set({})
+    try:
+        yield
+        en_attente = _en_attente.get()
+    finally:
+        _en_attente.reset(jeton)
+    if en_attente:
+        _appliquer(
+            {program_id: delta for program_id, (delta, _) in en_attente.items()},
+            creer={program_id for program_id, (_, creer) in en_attente.items() if creer},
+        )
+
+
+def _ajouter(program_id, delta, creer):
+    en_attente = _en_attente.get()
+    if en_attente is None:
+        _appliquer({program_id: delta}, creer={program_id} if creer else set())
+        return
+    cumul, creer_avant = en_attente.get(program_id, ({}, False))
+    for champ, valeur in delta.items():
+        cumul[champ] = cumul.get(champ, 0) + valeur
+    en_attente[program_id] = (cumul, creer or creer_avant)
+
+
+def _appliquer(deltas, creer):
+    """
+    deltas : {program_id: {champ: delta}} ; `creer` : programmes dont la
+    ligne doit être créée si elle est absente.
+    """
+    champs = set().union(*deltas.values())
+    modifies = ProgramStats.objects.filter(program_id__in=deltas).update(
+        date_maj=timezone.now(),
+        **{
+            champ: F(champ) + valeur_par_ligne(
+                'program_id',
+                {program_id: delta.get(champ, 0) for program_id, delta in deltas.items()},
+                output_field=None if champ == 'montant_paye_total' else BigIntegerField(),
+            )
+            for champ in champs
+        }
+    )
+    if modifies == len(deltas) or not creer:
+        return
+    # Programme antérieur à la table : ligne initialisée par un calcul
+    # complet, qui inclut déjà les transitions en cours
+    absents = creer - set(
+        ProgramStats.objects.filter(program_id__in=creer).values_list('program_id', flat=True)
+    )
+    for program_id in absents:
+        with transaction.atomic():
+            ProgramStats.objects.get_or_create(
+                program_id=program_id,
+                defaults=calculer_statistiques([program_id]).get(program_id, {}),
+            )
+
+
+# ---------------------------------------------------------------------------
+# Lecture
+# ---------------------------------------------------------------------------
+
+def _presenter(ligne):
+    return {
+        'program_id': ligne['program_id'],
+        'rapports_total': ligne['rapports_total'],
+        'par_statut': {statut: ligne[champ] for statut, champ in CHAMPS_STATUT.items()},
+        'par_severite': {severite: ligne[champ] for severite, champ in CHAMPS_SEVERITE.items()},
+        'delai_tri_moyen': (
+            ligne['delai_tri_total'] / ligne['rapports_tries'] if ligne['rapports_tries'] else None
+        ),
+        'montant_paye_total': ligne['montant_paye_total'],
+        'participants': ligne['participants'],
+        'date_maj': ligne['date_maj'],
+    }
+
+
+def statistiques_programmes(program_ids):
+    """{program_id: statistiques} en une requête sur program_stats"""
+    lignes = ProgramStats.objects.filter(program_id__in=program_ids).values(
+        'program_id', 'date_maj', *CHAMPS_COMPARES
+    )
+    return {ligne['program_id']: _presenter(ligne) for ligne in lignes}
+
+
+def statistiques_programme(program_id):
+    """Statistiques d'un programme (délai de tri moyen en secondes), ou None"""
+    return statistiques_programmes([program_id]).get(program_id)
+
+
+# ---------------------------------------------------------------------------
+# Recalcul complet et réconciliation
+# ---------------------------------------------------------------------------
+
+def calculer_statistiques(program_ids=None):
+    """Recalcule les statistiques depuis `reports` : {program_id: champs}"""
+    programmes = Program.objects.order_by()
+    rapports = Report.objects.order_by()
+    participants = ProgramParticipant.objects.order_by()
+    if program_ids is not None:
+        programmes = programmes.filter(pk__in=program_ids)
+        rapports = rapports.filter(program_id__in=program_ids)
+        participants = participants.filter(program_id__in=program_ids)
+
+    agregats = {
+        'rapports_total': Count('id'),
+        'montant_paye_total': Coalesce(
+            Sum('montant_final', filter=Q(statut__in=STATUTS_PAYES)),
+            Value(ZERO), output_field=DecimalField(),
+        ),
+    }
+    for statut, champ in CHAMPS_STATUT.items():
+        agregats[champ] = Count('id', filter=Q(statut=statut))
+    for severite, champ in CHAMPS_SEVERITE.items():
+        agregats[champ] = Count('id', filter=Q(severite_label=severite))
+
+    etat = {program_id: {} for program_id in programmes.values_list('pk', flat=True)}
+    for ligne in rapports.values('program_id').annotate(**agregats):
+        etat[ligne.pop('program_id')] = ligne
+
+    # Délai de tri calculé rapport par rapport, comme à l'écriture
+    tries = rapports.filter(date_tri__isnull=False).values_list('program_id', 'date_soumission', 'date_tri')
+    for program_id, date_soumission, date_tri in tries.iterator(chunk_size=2000):
+        champs = etat[program_id]
+        champs['rapports_tries'] = champs.get('rapports_tries', 0) + 1
+        champs['delai_tri_total'] = (
+            champs.get('delai_tri_total', 0) + int((date_tri - date_soumission).total_seconds())
+        )
+
+    for ligne in participants.values('program_id').annotate(nombre=Count('id')):
+        etat[ligne['program_id']]['participants'] = ligne['nombre']
+
+    for champs in etat.values():
+        for champ in CHAMPS_COMPARES:
+            champs.setdefault(champ, 0)
+        champs['montant_paye_total'] = Decimal(champs['montant_paye_total']).quantize(Decimal('0.01'))
+    return etat
+
+
+def comparer_statistiques(etat=None):
+    """Écarts entre la table program_stats et un recalcul complet"""
+    if etat is None:
+        etat = calculer_statistiques()
+    actuel = {
+        ligne['program_id']: ligne
+        for ligne in ProgramStats.objects.values('program_id', *CHAMPS_COMPARES)
+    }
+    ecarts = []
+    for program_id, attendu in etat.items():
+        ligne = actuel.get(program_id)
+        for champ in CHAMPS_COMPARES:
+            valeur = ligne[champ] if ligne else None
+            if valeur != attendu[champ]:
+                ecarts.append((program_id, champ, valeur, attendu[champ]))
+    return ecarts
+
+
+@transaction.atomic
+def reconstruire_statistiques(etat=None):
+    """Réécrit la table program_stats à partir d'un recalcul complet"""
+    if etat is None:
+        etat = calculer_statistiques()
+    existants = {ligne.program_id: ligne for ligne in ProgramStats.objects.select_for_update()}
+    a_creer, a_modifier = [], []
+    for program_id, champs in etat.items():
+        ligne = existants.get(program_id)
+        if ligne is None:
+            a_creer.append(ProgramStats(program_id=program_id, **champs))
+            continue
+        for champ, valeur in champs.items():
+            setattr(ligne, champ, valeur)
+        a_modifier.append(ligne)
+    ProgramStats.objects.bulk_create(a_creer, batch_size=500)
+    ProgramStats.objects.bulk_update(a_modifier, CHAMPS_COMPARES, batch_size=500)
+    return len(a_creer), len(a_modifier)
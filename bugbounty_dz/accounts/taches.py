@@ -0,0 +1,357 @@
+"""
+Actions de modération en masse (admin), exécutées hors de la requête.
+
+- `lancer(action, ids)` enregistre une TacheMasse avec les ids
+  sélectionnés et la confie, après commit, à un pool de threads.
+- La tâche est traitée par lots de TACHES_TAILLE_LOT ids, chacun dans sa
+  transaction : verrou des lignes, bulk_update, puis journal
+  (LogActivite) et notifications par bulk_create. L'avancement
+  (traites / reussis / echecs) et les motifs d'échec par id sont écrits
+  après chaque lot ; l'admin les affiche.
+- Un lot qui lève une exception est compté en échec (même motif pour tous
+  ses ids) ; les lots suivants continuent.
+- `retarifer_programmes` recalcule, depuis vecteur_cvss et la grille du
+  programme (accounts.cvss), la sévérité et la prime proposée des rapports
+  non encore payés ; lancée par l'admin quand la grille change.
+- Une tâche n'est exécutée que par le worker qui l'a prise : passage
+  conditionnel de 'en_attente' à 'en_cours' (un seul UPDATE réussit). Le
+  bail est renouvelé après chaque lot (date_modification) ; une tâche
+  'en_cours' dont le bail a expiré depuis TACHES_BAIL secondes est
+  considérée comme interrompue (redémarrage) et peut être reprise au
+  premier lot non traité : commande `executer_taches`.
+
+Chaque action, déclarée par `@action_masse`, reçoit les ids d'un lot et
+la tâche, et renvoie {id: motif} pour les ids non traités.
+
+Réglages (settings) :
+    TACHES_TAILLE_LOT      ids par lot (500)
+    TACHES_WORKERS         threads d'exécution (1)
+    TACHES_ARRIERE_PLAN    False pour exécuter dans le thread appelant (tests)
+    TACHES_BAIL            délai sans avancement avant reprise d'une tâche en cours, en secondes (600)
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.db.models.functions import Coalesce
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import catalogue, cvss, notifications, statistiques
+from .middleware import invalider_compte
+from .models import Enterprise, LogActivite, Program, Report, TacheMasse, UserHacker
+from .sessions import revoquer_sessions
+from .signals import rapport_modifie
+
+
+logger = logging.getLogger(__name__)
+
+# Motifs d'échec gardés par tâche
+ERREURS_MAX = 1000
+
+ACTIONS = {}
+
+
+def action_masse(nom, modele, libelle):
+    def decorateur(fonction):
+        ACTIONS[nom] = {'modele': modele, 'libelle': libelle, 'traiter': fonction}
+        return fonction
+    return decorateur
+
+
+def taille_lot():
+    return getattr(settings, 'TACHES_TAILLE_LOT', 500)
+
+
+# ---------------------------------------------------------------------------
+# Actions
+# ---------------------------------------------------------------------------
+
+def _verrouiller(modele, ids, champs):
+    """Lignes du lot verrouillées, et motifs pour les ids disparus"""
+    objets = list(modele.objects.select_for_update().filter(pk__in=ids).order_by('pk').only('id', *champs))
+    trouves = {objet.pk for objet in objets}
+    return objets, {pk: "Introuvable" for pk in ids if pk not in trouves}
+
+
+def _journaliser(tache, action, entite_type, ids, description):
+    LogActivite.objects.bulk_create([
+        LogActivite(
+            action=action, user_id=tache.demandeur_id, user_type='admin', entite_type=entite_type,
+            entite_id=pk, description=description,
+        )
+        for pk in ids
+    ])
+
+
+def _valider_comptes(tache, ids, modele, type_compte, champs_valides, titre):
+    maintenant = timezone.now()
+    comptes, erreurs = _verrouiller(modele, ids, ('statut', 'verifiee', 'date_activation', *champs_valides))
+    a_valider = []
+    for compte in comptes:
+        if compte.statut == 'actif' and compte.verifiee:
+            erreurs[compte.pk] = "Déjà validé"
+            continue
+        compte.statut = 'actif'
+        compte.verifiee = True
+        compte.date_activation = compte.date_activation or maintenant
+        compte.date_modification = maintenant
+        for champ in champs_valides:
+            setattr(compte, champ, True)
+        a_valider.append(compte)
+
+    modele.objects.bulk_update(
+        a_valider, ['statut', 'verifiee', 'date_activation', 'date_modification', *champs_valides],
+    )
+    valides = [compte.pk for compte in a_valider]
+    _journaliser(tache, 'validation', 'user', valides, f"Compte {type_compte} validé")
+    notifications.diffuser([{f'{type_compte}_id': pk} for pk in valides], 'autre', titre)
+    transaction.on_commit(lambda: [invalider_compte(type_compte, pk) for pk in valides])
+    return erreurs
+
+
+@action_masse('valider_entreprises', Enterprise, "Valider les comptes sélectionnés")
+def valider_entreprises(tache, ids):
+    return _valider_comptes(tache, ids, Enterprise, 'enterprise', (), "Votre compte entreprise a été validé")
+
+
+@action_masse('valider_hackers', UserHacker, "Valider les comptes et CNI sélectionnés")
+def valider_hackers(tache, ids):
+    return _valider_comptes(tache, ids, UserHacker, 'hacker', ('cni_verifiee',), "Votre compte a été validé")
+
+
+@action_masse('suspendre_hackers', UserHacker, "Suspendre les comptes sélectionnés")
+def suspendre_hackers(tache, ids):
+    maintenant = timezone.now()
+    hackers, erreurs = _verrouiller(UserHacker, ids, ('statut',))
+    a_suspendre = []
+    for hacker in hackers:
+        if hacker.statut == 'suspendu':
+            erreurs[hacker.pk] = "Déjà suspendu"
+            continue
+        hacker.statut = 'suspendu'
+        hacker.date_modification = maintenant
+        a_suspendre.append(hacker)
+
+    UserHacker.objects.bulk_update(a_suspendre, ['statut', 'date_modification'])
+    suspendus = [hacker.pk for hacker in a_suspendre]
+    _journaliser(tache, 'suspension', 'user', suspendus, "Compte hacker suspendu")
+    # Une requête pour tout le lot ; cache des sessions vidé après commit
+    revoquer_sessions(suspendus, 'hacker')
+    transaction.on_commit(lambda: [invalider_compte('hacker', pk) for pk in suspendus])
+    return erreurs
+
+
+@action_masse('suspendre_programmes', Program, "Suspendre les programmes sélectionnés")
+def suspendre_programmes(tache, ids):
+    maintenant = timezone.now()
+    programmes, erreurs = _verrouiller(Program, ids, ('statut', 'nom', 'enterprise_id'))
+    a_suspendre = []
+    for program in programmes:
+        if program.statut != 'actif':
+            erreurs[program.pk] = f"Programme non actif (statut {program.statut})"
+            continue
+        program.statut = 'suspendu'
+        program.date_modification = maintenant
+        a_suspendre.append(program)
+
+    Program.objects.bulk_update(a_suspendre, ['statut', 'date_modification'])
+    _journaliser(tache, 'suspension', 'program', [p.pk for p in a_suspendre], "Programme suspendu")
+    for program in a_suspendre:
+        notifications.diffuser(
+            [{'enterprise_id': program.enterprise_id}], 'autre', f"Programme suspendu : {program.nom}",
+            lien_cible=f"/programmes/{program.pk}/",
+        )
+    entreprises = {program.enterprise_id for program in a_suspendre}
+    transaction.on_commit(lambda: [invalider_compte('enterprise', pk) for pk in entreprises])
+    if a_suspendre:
+        transaction.on_commit(catalogue.invalider_catalogue)
+    return erreurs
+
+
+STATUTS_REJETABLES = ('soumis', 'en_revision')
+
+
+@action_masse('rejeter_rapports', Report, "Rejeter les rapports sélectionnés")
+def rejeter_rapports(tache, ids):
+    maintenant = timezone.now()
+    rapports, erreurs = _verrouiller(
+        Report, ids,
+        ('statut', 'severite_label', 'program_id', 'hacker_id', 'titre', 'montant_final',
+         'date_soumission', 'date_tri'),
+    )
+    a_rejeter = []
+    for rapport in rapports:
+        if rapport.statut not in STATUTS_REJETABLES:
+            erreurs[rapport.pk] = f"Rapport non rejetable (statut {rapport.statut})"
+            continue
+        a_rejeter.append((rapport, (rapport.statut, rapport.severite_label)))
+        rapport.statut = 'rejete'
+        rapport.date_modification = maintenant
+
+    Report.objects.bulk_update([rapport for rapport, _ in a_rejeter], ['statut', 'date_modification'])
+    _journaliser(tache, 'rejet', 'report', [rapport.pk for rapport, _ in a_rejeter], "Rapport rejeté")
+    # Tables dérivées (bulk_update ne déclenche pas les signaux)
+    for rapport, avant in a_rejeter:
+        rapport_modifie(rapport, avant, ('rejete', rapport.severite_label))
+    return erreurs
+
+
+# Rapports dont la prime proposée suit la grille du programme
+STATUTS_TARIFABLES = ('soumis', 'en_revision', 'accepte', 'en_correction', 'corrige')
+
+
+@action_masse('retarifer_programmes', Program, "Recalculer sévérités CVSS et primes proposées")
+def retarifer_programmes(tache, ids):
+    maintenant = timezone.now()
+    # Grille verrouillée avec les rapports : une modification concurrente
+    # attend la fin du lot au lieu d'être écrasée par l'ancienne grille
+    programmes = list(
+        Program.objects.select_for_update().filter(pk__in=ids).order_by('pk')
+        .only('id', 'recompenses_config', 'montant_minimum_bug')
+    )
+    trouves = {program.pk for program in programmes}
+    erreurs = {pk: "Introuvable" for pk in ids if pk not in trouves}
+    retarifes = []
+    for program in programmes:
+        rapports = list(
+            Report.objects.select_for_update()
+            .filter(program=program, statut__in=STATUTS_TARIFABLES, vecteur_cvss__isnull=False)
+            .order_by('pk')
+            .only('id', 'program_id', 'hacker_id', 'titre', 'statut', 'vecteur_cvss', *cvss.CHAMPS)
+        )
+        avant = {rapport.pk: (rapport.statut, rapport.severite_label) for rapport in rapports}
+        try:
+            modifies = cvss.tarifer(rapports, program)
+        except cvss.BaremeInvalide as e:
+            erreurs[program.pk] = f"Grille des primes invalide : {e}"
+            continue
+        for rapport in modifies:
+            rapport.date_modification = maintenant
+        Report.objects.bulk_update(modifies, [*cvss.CHAMPS, 'date_modification'], batch_size=1000)
+        # Tables dérivées (bulk_update ne déclenche pas les signaux)
+        for rapport in modifies:
+            apres = (rapport.statut, rapport.severite_label)
+            if apres != avant[rapport.pk]:
+                rapport_modifie(rapport, avant[rapport.pk], apres)
+        retarifes.append(program.pk)
+    _journaliser(tache, 'retarification', 'program', retarifes, "Sévérités et primes proposées recalculées")
+    return erreurs
+
+
+# ---------------------------------------------------------------------------
+# Exécution
+# ---------------------------------------------------------------------------
+
+def lancer(action, ids, demandeur_id=None):
+    """Crée la tâche et la met en file après commit ; renvoie la TacheMasse"""
+    if action not in ACTIONS:
+        raise KeyError(action)
+    ids = sorted({int(pk) for pk in ids})
+    tache = TacheMasse.objects.create(action=action, ids=ids, total=len(ids), demandeur_id=demandeur_id)
+    transaction.on_commit(lambda: soumettre(tache.pk))
+    return tache
+
+
+def _traiter_lot(tache, traiter, lot):
+    try:
+        with transaction.atomic(), notifications.regroupees(), statistiques.regroupees():
+            return traiter(tache, lot)
+    except Exception as e:
+        logger.exception("Tâche %s : échec du lot %s…", tache.pk, lot[:3])
+        return {pk: f"Erreur : {e}" for pk in lot}
+
+
+def prendre(tache_id):
+    """Prend la tâche (en attente, ou en cours au bail expiré) ; False si un autre worker l'a"""
+    maintenant = timezone.now()
+    expire = maintenant - timedelta(seconds=getattr(settings, 'TACHES_BAIL', 600))
+    return bool(
+        TacheMasse.objects
+        .filter(Q(statut='en_attente') | Q(statut='en_cours', date_modification__lt=expire), pk=tache_id)
+        .update(statut='en_cours', date_debut=Coalesce('date_debut', maintenant), date_modification=maintenant)
+    )
+
+
+def executer(tache_id):
+    """
+    Traite les lots restants de la tâche si ce worker la prend ; renvoie la
+    TacheMasse à jour.
+    """
+    if not prendre(tache_id):
+        return TacheMasse.objects.get(pk=tache_id)
+    tache = TacheMasse.objects.get(pk=tache_id)
+    traiter = ACTIONS[tache.action]['traiter']
+
+    taille = taille_lot()
+    while tache.traites < tache.total:
+        lot = tache.ids[tache.traites:tache.traites + taille]
+        erreurs = {int(pk): motif for pk, motif in _traiter_lot(tache, traiter, lot).items()}
+        tache.traites += len(lot)
+        tache.echecs += len(erreurs)
+        tache.reussis += len(lot) - len(erreurs)
+        for pk, motif in erreurs.items():
+            if len(tache.erreurs) >= ERREURS_MAX:
+                break
+            tache.erreurs[str(pk)] = motif
+        TacheMasse.objects.filter(pk=tache.pk).update(
+            traites=tache.traites, reussis=tache.reussis, echecs=tache.echecs,
+            erreurs=tache.erreurs, date_modification=timezone.now(),
+        )
+
+    tache.statut = 'terminee' if tache.reussis or not tache.total else 'echouee'
+    tache.date_fin = timezone.now()
+    TacheMasse.objects.filter(pk=tache.pk).update(
+        statut=tache.statut, date_fin=tache.date_fin, date_modification=tache.date_fin,
+    )
+    return tache
+
+
+_executeur = None
+_verrou = threading.Lock()
+
+
+def executeur():
+    global _executeur
+    if _executeur is None:
+        with _verrou:
+            if _executeur is None:
+                _executeur = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'TACHES_WORKERS', 1),
+                    thread_name_prefix='taches',
+                )
+    return _executeur
+
+
+@receiver(setting_changed)
+def _reinitialiser(setting, **kwargs):
+    global _executeur
+    if setting.startswith('TACHES_') and _executeur is not None:
+        _executeur.shutdown(wait=True)
+        _executeur = None
+
+
+def _executer(tache_id):
+    close_old_connections()
+    try:
+        executer(tache_id)
+    except Exception:
+        logger.exception("Tâche %s interrompue", tache_id)
+    finally:
+        close_old_connections()
+
+
+def soumettre(tache_id):
+    if getattr(settings, 'TACHES_ARRIERE_PLAN', True):
+        return executeur().submit(_executer, tache_id)
+    executer(tache_id)
+
+
+def progression(tache):
+    """Avancement en pourcentage"""
+    return round(100 * tache.traites / tache.total) if tache.total else 100
@@ -0,0 +1,143 @@
+"""
+Tampon d'écriture en arrière-plan : les éléments sont mis en file dans le
+processus et écrits par lots (taille ou délai atteint) depuis un thread
+dédié, hors du chemin des requêtes.
+
+- File bornée : quand elle est pleine, l'appelant attend au plus
+  `attente_max` secondes puis l'élément est abandonné (compteur `abandons`).
+- Vidage garanti à l'arrêt du processus (atexit) ou via `arreter()`.
+- Sans thread (`arriere_plan=False`), les lots sont écrits dans le thread
+  appelant dès que la taille est atteinte ; `vider()` écrit le reste.
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+import weakref
+
+from django.db import close_old_connections, connection
+
+
+logger = logging.getLogger(__name__)
+
+# Tampons vivants, arrêtés par un seul gestionnaire atexit
+_tampons = weakref.WeakSet()
+
+
+@atexit.register
+def _arreter_tous():
+    for tampon in list(_tampons):
+        tampon.arreter()
+
+
+class TamponEcriture:
+    def __init__(self, ecrire, nom, taille_lot=500, intervalle=1.0, capacite=10000,
+                 attente_max=0.0, arriere_plan=True):
+        self.ecrire = ecrire
+        self.nom = nom
+        self.taille_lot = taille_lot
+        self.intervalle = intervalle
+        self.attente_max = attente_max
+        self.arriere_plan = arriere_plan
+        self._file = queue.Queue(maxsize=capacite)
+        self._verrou = threading.Lock()
+        self._arret = threading.Event()
+        self._thread = None
+        self._stats = {'recus': 0, 'ecrits': 0, 'abandons': 0, 'erreurs': 0, 'lots': 0}
+        _tampons.add(self)
+
+    # -- Producteurs ------------------------------------------------------
+
+    def ajouter(self, element):
+        """Met un élément en file ; False s'il a été abandonné (file pleine)"""
+        try:
+            if self.attente_max:
+                self._file.put(element, timeout=self.attente_max)
+            else:
+                self._file.put_nowait(element)
+        except queue.Full:
+            self._compter('abandons')
+            return False
+        self._compter('recus')
+
+        if self.arriere_plan:
+            self._demarrer()
+        elif self._file.qsize() >= self.taille_lot:
+            self.vider()
+        return True
+
+    # -- Consommateur -----------------------------------------------------
+
+    def vider(self):
+        """Écrit tout ce qui est en file, par lots ; renvoie le nombre écrit"""
+        total = 0
+        while True:
+            lot = self._prendre(self.taille_lot)
+            if not lot:
+                return total
+            total += self._ecrire(lot)
+
+    def _prendre(self, nombre, delai=None):
+        lot = []
+        limite = None if delai is None else time.monotonic() + delai
+        while len(lot) < nombre:
+            try:
+                if limite is None:
+                    lot.append(self._file.get_nowait())
+                else:
+                    lot.append(self._file.get(timeout=max(limite - time.monotonic(), 0)))
+            except queue.Empty:
+                break
+        return lot
+
+    def _ecrire(self, lot):
+        try:
+            self.ecrire(lot)
+        except Exception:
+            logger.exception("Tampon %s : échec d'écriture d'un lot de %d élément(s)", self.nom, len(lot))
+            self._compter('erreurs', len(lot))
+            return 0
+        self._compter('ecrits', len(lot))
+        self._compter('lots')
+        return len(lot)
+
+    def _boucle(self):
+        try:
+            while not self._arret.is_set():
+                lot = self._prendre(self.taille_lot, delai=self.intervalle)
+                if lot:
+                    close_old_connections()
+                    self._ecrire(lot)
+        finally:
+            self.vider()
+            connection.close()
+
+    def _demarrer(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._verrou:
+            if self._thread is None or not self._thread.is_alive():
+                self._arret.clear()
+                self._thread = threading.Thread(target=self._boucle, name=f"tampon-{self.nom}", daemon=True)
+                self._thread.start()
+
+    def arreter(self, timeout=10):
+        """Arrête le thread après un dernier vidage"""
+        self._arret.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout)
+        else:
+            self.vider()
+
+    # -- Métriques --------------------------------------------------------
+
+    def _compter(self, cle, nombre=1):
+        with self._verrou:
+            self._stats[cle] += nombre
+
+    def statistiques(self):
+        with self._verrou:
+            stats = dict(self._stats)
+        stats['en_file'] = self._file.qsize()
+        return stats
@@ -0,0 +1,355 @@
+"""
+Téléversement des pièces justificatives : image de la CNI des hackers et
+registre de commerce (PDF) des entreprises.
+
+- TeleversementHandler (premier de FILE_UPLOAD_HANDLERS) reçoit les champs
+  déclarés dans CHAMPS morceau par morceau : le type est reconnu sur les
+  premiers octets (signature du fichier, pas le nom ni l'en-tête du client)
+  et la taille vérifiée à chaque morceau. Un fichier refusé est abandonné
+  sans être lu en entier ; le motif est dans `erreurs_televersement(request)`.
+  Le contenu est écrit dans un fichier temporaire en calculant son SHA-256.
+- `enregistrer()` range le fichier sous un nom dérivé de son empreinte
+  (`cni/ab/abcd….jpg`) : un fichier identique déjà stocké n'est pas réécrit.
+  Le fichier est mis en place par lien dur (os.link, exclusif) : deux
+  envois identiques simultanés donnent un seul fichier, sans doublon
+  suffixé.
+- `traiter_apres_commit()` confie à un pool de threads la miniature de la
+  CNI (Pillow) ou l'extraction du texte et des métadonnées du registre
+  (pypdf), puis écrit le résultat sur le compte. Sans Pillow, pas de
+  miniature ; sans pypdf, seules les métadonnées de base sont extraites.
+
+Réglages (settings) :
+    TELEVERSEMENTS_TAILLE_MAX      tailles max par catégorie, en octets
+                                   ({'cni': 5 Mo, 'registre': 10 Mo})
+    TELEVERSEMENTS_WORKERS         threads de traitement (2)
+    TELEVERSEMENTS_ARRIERE_PLAN    False pour traiter dans le thread appelant (tests)
+"""
+import errno
+import hashlib
+import io
+import logging
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile, StopFutureHandlers
+from django.core.signals import setting_changed
+from django.db import close_old_connections, transaction
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import miniatures
+from .middleware import invalider_compte
+from .models import Enterprise, UserHacker
+
+try:
+    import pypdf
+except ImportError:
+    pypdf = None
+
+
+logger = logging.getLogger(__name__)
+
+# Signatures reconnues : type → (préfixe, extension)
+SIGNATURES = {
+    'image/jpeg': (b'\xff\xd8\xff', '.jpg'),
+    'image/png': (b'\x89PNG\r\n\x1a\n', '.png'),
+    'image/webp': (b'RIFF', '.webp'),
+    'application/pdf': (b'%PDF-', '.pdf'),
+}
+
+CATEGORIES = {
+    'cni': {
+        'dossier': 'cni',
+        'types': ('image/jpeg', 'image/png', 'image/webp'),
+        'taille_max': 5 * 1024 * 1024,
+    },
+    'registre': {
+        'dossier': 'registre_commerce',
+        'types': ('application/pdf',),
+        'taille_max': 10 * 1024 * 1024,
+    },
+}
+
+# Champ de formulaire → catégorie
+CHAMPS = {
+    'cni_image': 'cni',
+    'registre_commerce_pdf': 'registre',
+}
+
+TAILLE_MINIATURE = 320
+TEXTE_MAX = 20000
+
+
+def taille_max(categorie):
+    tailles = getattr(settings, 'TELEVERSEMENTS_TAILLE_MAX', {})
+    return tailles.get(categorie, CATEGORIES[categorie]['taille_max'])
+
+
+def detecter_type(debut):
+    """Type reconnu d'après les premiers octets, None sinon"""
+    for type_contenu, (signature, _) in SIGNATURES.items():
+        if debut.startswith(signature):
+            if type_contenu == 'image/webp' and debut[8:12] != b'WEBP':
+                continue
+            return type_contenu
+    return None
+
+
+def erreurs_televersement(request):
+    """Fichiers refusés à la réception : {champ: motif}"""
+    return request.__dict__.get('erreurs_televersement', {})
+
+
+# ---------------------------------------------------------------------------
+# Réception
+# ---------------------------------------------------------------------------
+
+class TeleversementHandler(FileUploadHandler):
+    """
+    Prend en charge les champs de CHAMPS (les autres passent aux handlers
+    suivants). Le fichier reçu est un TemporaryUploadedFile complété de
+    `categorie`, `empreinte` (SHA-256) et du type reconnu.
+    """
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None,
+                 content_type_extra=None):
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+        # Le fichier précédent a été rendu : ne pas le fermer si celui-ci est refusé
+        self.__dict__.pop('file', None)
+        self.categorie = CHAMPS.get(field_name)
+        if self.categorie is None:
+            return
+        if content_length is not None and content_length > taille_max(self.categorie):
+            self._refuser("Fichier trop volumineux")
+        self.file = TemporaryUploadedFile(file_name, content_type, 0, charset, content_type_extra)
+        self.empreinte = hashlib.sha256()
+        self.type_reconnu = None
+        raise StopFutureHandlers()
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.categorie is None:
+            return raw_data
+        if start == 0:
+            self.type_reconnu = detecter_type(raw_data[:16])
+            if self.type_reconnu not in CATEGORIES[self.categorie]['types']:
+                self._refuser("Type de fichier non accepté")
+        if start + len(raw_data) > taille_max(self.categorie):
+            self._refuser("Fichier trop volumineux")
+        self.empreinte.update(raw_data)
+        self.file.write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        if self.categorie is None:
+            return None
+        if not file_size:
+            # Trop tard pour SkipFile : le fichier est rendu mais signalé
+            self._signaler("Fichier vide")
+        self.file.seek(0)
+        self.file.size = file_size
+        self.file.content_type = self.type_reconnu
+        self.file.categorie = self.categorie
+        self.file.empreinte = self.empreinte.hexdigest()
+        return self.file
+
+    def _signaler(self, motif):
+        if self.request is not None:
+            self.request.__dict__.setdefault('erreurs_televersement', {})[self.field_name] = motif
+
+    def _refuser(self, motif):
+        self._signaler(motif)
+        raise SkipFile(motif)
+
+
+# ---------------------------------------------------------------------------
+# Stockage
+# ---------------------------------------------------------------------------
+
+def nom_stockage(categorie, empreinte, type_contenu):
+    extension = SIGNATURES[type_contenu][1]
+    return f"{CATEGORIES[categorie]['dossier']}/{empreinte[:2]}/{empreinte}{extension}"
+
+
+def _lier(source, chemin):
+    """Crée `chemin` (lien dur) ; False s'il existe déjà"""
+    try:
+        os.link(source, chemin)
+    except FileExistsError:
+        return False
+    return True
+
+
+def placer(nom, contenu):
+    """
+    Stocke `contenu` sous `nom`, dérivé du contenu : un fichier déjà présent,
+    même écrit à l'instant par une requête concurrente, est identique et
+    n'est pas réécrit. Renvoie `nom`.
+    """
+    try:
+        chemin = default_storage.path(nom)
+    except NotImplementedError:
+        # Stockage distant, sans création exclusive : le doublon suffixé
+        # d'une requête concurrente est retiré
+        if not default_storage.exists(nom):
+            enregistre = default_storage.save(nom, contenu)
+            if enregistre != nom:
+                default_storage.delete(enregistre)
+        contenu.close()
+        return nom
+
+    if not os.path.exists(chemin):
+        dossier = os.path.dirname(chemin)
+        os.makedirs(dossier, exist_ok=True)
+        # Fichier temporaire du téléversement lié en place (pas de recopie),
+        # sinon recopié à côté puis lié : os.link échoue si `chemin` existe
+        source = getattr(contenu, 'temporary_file_path', None)
+        cree = None
+        if source is not None:
+            try:
+                cree = _lier(source(), chemin)
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+        if cree is None:
+            with tempfile.NamedTemporaryFile(dir=dossier, delete=False) as temporaire:
+                for morceau in contenu.chunks():
+                    temporaire.write(morceau)
+            try:
+                cree = _lier(temporaire.name, chemin)
+            finally:
+                os.unlink(temporaire.name)
+        if cree and default_storage.file_permissions_mode is not None:
+            os.chmod(chemin, default_storage.file_permissions_mode)
+    contenu.close()
+    return nom
+
+
+def enregistrer(fichier):
+    """Stocke un fichier reçu par TeleversementHandler ; renvoie son nom"""
+    return placer(nom_stockage(fichier.categorie, fichier.empreinte, fichier.content_type), fichier)
+
+
+# ---------------------------------------------------------------------------
+# Traitements
+# ---------------------------------------------------------------------------
+
+def creer_miniature(nom):
+    """Miniature JPEG d'une image stockée ; None sans Pillow ou si l'image est illisible"""
+    if not miniatures.disponible():
+        return None
+    empreinte = os.path.splitext(os.path.basename(nom))[0]
+    nom_miniature = f"{CATEGORIES['cni']['dossier']}/miniatures/{empreinte[:2]}/{empreinte}.jpg"
+    if default_storage.exists(nom_miniature):
+        return nom_miniature
+    sortie = io.BytesIO()
+    try:
+        miniatures.reduire(nom, TAILLE_MINIATURE, sortie)
+    except miniatures.ImageIllisible:
+        logger.warning("CNI %s illisible : pas de miniature", nom)
+        return None
+    return placer(nom_miniature, ContentFile(sortie.getvalue()))
+
+
+_PAGE_PDF = re.compile(rb'/Type\s*/Page(?![a-zA-Z])')
+
+
+def extraire_pdf(nom):
+    """(texte, métadonnées) d'un PDF stocké ; texte vide sans pypdf"""
+    metadonnees = {'taille': default_storage.size(nom)}
+    with default_storage.open(nom, 'rb') as source:
+        if pypdf is None:
+            # Sans pypdf : nombre de pages approximatif
+            metadonnees['pages'] = len(_PAGE_PDF.findall(source.read()))
+            return '', metadonnees
+
+        lecteur = pypdf.PdfReader(source)
+        metadonnees['pages'] = len(lecteur.pages)
+        infos = lecteur.metadata or {}
+        for cle, champ in (('titre', '/Title'), ('auteur', '/Author'), ('producteur', '/Producer'),
+                           ('date_creation', '/CreationDate')):
+            if infos.get(champ):
+                metadonnees[cle] = str(infos[champ])
+        morceaux = []
+        longueur = 0
+        for page in lecteur.pages:
+            texte = page.extract_text() or ''
+            morceaux.append(texte)
+            longueur += len(texte)
+            if longueur >= TEXTE_MAX:
+                break
+    return '\n'.join(morceaux)[:TEXTE_MAX], metadonnees
+
+
+def traiter_cni(hacker_id, nom):
+    miniature = creer_miniature(nom)
+    if miniature is None:
+        return
+    UserHacker.objects.filter(pk=hacker_id, cni_image=nom).update(
+        cni_miniature=miniature, date_modification=timezone.now(),
+    )
+    invalider_compte('hacker', hacker_id)
+
+
+def traiter_registre(enterprise_id, nom):
+    texte, metadonnees = extraire_pdf(nom)
+    Enterprise.objects.filter(pk=enterprise_id, registre_commerce_pdf=nom).update(
+        registre_texte=texte, registre_metadonnees=metadonnees, date_modification=timezone.now(),
+    )
+    invalider_compte('enterprise', enterprise_id)
+
+
+TRAITEMENTS = {
+    'cni': traiter_cni,
+    'registre': traiter_registre,
+}
+
+
+_executeur = None
+_verrou = threading.Lock()
+
+
+def executeur():
+    global _executeur
+    if _executeur is None:
+        with _verrou:
+            if _executeur is None:
+                _executeur = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'TELEVERSEMENTS_WORKERS', 2),
+                    thread_name_prefix='televersements',
+                )
+    return _executeur
+
+
+@receiver(setting_changed)
+def _reinitialiser(setting, **kwargs):
+    global _executeur
+    if setting.startswith('TELEVERSEMENTS_') and _executeur is not None:
+        _executeur.shutdown(wait=True)
+        _executeur = None
+
+
+def _executer(categorie, compte_id, nom):
+    close_old_connections()
+    try:
+        TRAITEMENTS[categorie](compte_id, nom)
+    except Exception:
+        logger.exception("Traitement %s de %s échoué", categorie, nom)
+    finally:
+        close_old_connections()
+
+
+def traiter(categorie, compte_id, nom):
+    if getattr(settings, 'TELEVERSEMENTS_ARRIERE_PLAN', True):
+        return executeur().submit(_executer, categorie, compte_id, nom)
+    TRAITEMENTS[categorie](compte_id, nom)
+
+
+def traiter_apres_commit(categorie, compte_id, nom):
+    """Traitement en arrière-plan une fois le compte enregistré"""
+    transaction.on_commit(lambda: traiter(categorie, compte_id, nom))
@@ -1,3 +1,1844 @@
-from django.test import TestCase
+import csv
+import gc
+import hashlib
+import importlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import weakref
+from unittest import mock
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.admin.sites import site
+from django.contrib.auth.models import User
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, make_password
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile, TemporaryUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import (
+    authentification, catalogue, classement, configuration, cvss, exports, grand_livre, journal, leaderboard, middleware,
+    miniatures, notifications, paiements, perimetre, recherche, references, requetes, routeurs, sessions, statistiques, taches, televersements,
+)
+from .models import (
+    AdminConfig, EcritureGrandLivre, Enterprise, EnterpriseMember, Facette, Leaderboard, LogActivite, LogActiviteArchive, MessageChat,
+    Notification, Program, ProgramParticipant, ProgramStats, Report, SequenceReference, Session, SoldeGrandLivre,
+    TacheMasse, Transaction,
+    UserHacker,
+)
+from .db import pool
+from .paiements import PaiementErreur, payer_rapport, payer_rapports
+from .tampon import TamponEcriture, _arreter_tous
+
+
+def creer_hacker(n, **champs):
+    return UserHacker.objects.create(**{
+        'email': f"hacker{n}@exemple.dz",
+        'telephone': f"0550{n:06d}",
+        'nom': f"Nom{n}",
+        'prenom': f"Prenom{n}",
+        'date_naissance': date(1995, 1, 1),
+        'adresse': "Alger",
+        'cni_numero': f"CNI{n}",
+        'mot_de_passe_hash': "!",
+        **champs
+    })
+
+
+def creer_programme(nom="Programme", **champs):
+    enterprise = champs.pop('enterprise', None) or Enterprise.objects.create(
+        nom_legal=f"Entreprise {nom}",
+        email_entreprise=f"{nom.lower().replace(' ', '')}@entreprise.dz",
+        mot_de_passe_hash="!",
+    )
+    champs.setdefault('budget_total', Decimal('100000.00'))
+    return Program.objects.create(enterprise=enterprise, nom=nom, **champs)
+
+
+def creer_rapport(program, hacker, **champs):
+    champs.setdefault('titre', "XSS stockée")
+    champs.setdefault('description', "Description")
+    return Report.objects.create(program=program, hacker=hacker, **champs)
+
+
+@override_settings(
+    JOURNAL_ARRIERE_PLAN=False, SESSIONS_ARRIERE_PLAN=False, TELEVERSEMENTS_ARRIERE_PLAN=False,
+    GRAND_LIVRE_ARRIERE_PLAN=False,
+)
+class EcrituresSynchronesTestCase(TestCase):
+    """
+    Pour les tests qui exécutent les callbacks on_commit : le journal
+    d'activité, les sessions, les projections du grand livre et les
+    traitements de fichiers sont exécutés dans le thread du test, les files
+    vidées avant le rollback.
+    """
+    def tearDown(self):
+        journal.vider()
+        sessions.vider()
+        grand_livre.vider()
+        super().tearDown()
+
+
+class LeaderboardIncrementalTests(TestCase):
+    def setUp(self):
+        self.program = creer_programme()
+        self.alice = creer_hacker(1)
+        self.bob = creer_hacker(2)
+        self.carol = creer_hacker(3)
+
+    def ligne(self, hacker):
+        return Leaderboard.objects.get(hacker=hacker)
+
+    def assertConforme(self):
+        self.assertEqual(leaderboard.comparer_classement(), [])
+
+    def test_soumission_puis_acceptation(self):
+        rapport = creer_rapport(self.program, self.alice, severite_label='Critique')
+        ligne = self.ligne(self.alice)
+        self.assertEqual((ligne.bugs_soumis, ligne.bugs_acceptes, ligne.points_total), (1, 0, 0))
+
+        rapport.statut = 'accepte'
+        rapport.save()
+        ligne = self.ligne(self.alice)
+        self.assertEqual(ligne.bugs_acceptes, 1)
+        self.assertEqual(ligne.bugs_critiques, 1)
+        self.assertEqual(ligne.points_total, 50)
+        self.assertEqual(ligne.taux_acceptation, Decimal('100.00'))
+        self.assertConforme()
+
+    def test_changement_de_severite_sur_rapport_accepte(self):
+        rapport = creer_rapport(self.program, self.alice, statut='accepte', severite_label='Basse')
+        rapport.severite_label = 'Élevée'
+        rapport.save()
+        ligne = self.ligne(self.alice)
+        self.assertEqual((ligne.bugs_bas, ligne.bugs_eleves, ligne.points_total), (0, 1, 20))
+        self.assertConforme()
+
+    def test_positions_reattribuees_sur_la_plage(self):
+        creer_rapport(self.program, self.alice, statut='accepte', severite_label='Moyenne')
+        creer_rapport(self.program, self.bob, statut='accepte', severite_label='Élevée')
+        creer_rapport(self.program, self.carol)
+        self.assertEqual(
+            list(Leaderboard.objects.order_by('position').values_list('hacker_id', flat=True)),
+            [self.bob.id, self.alice.id, self.carol.id],
+        )
+
+        rapport = creer_rapport(self.program, self.carol, severite_label='Critique')
+        rapport.statut = 'corrige'
+        rapport.save()
+        self.assertEqual(
+            list(Leaderboard.objects.order_by('position').values_list('hacker_id', flat=True)),
+            [self.carol.id, self.bob.id, self.alice.id],
+        )
+        self.assertConforme()
+
+    def test_rejet_et_suppression(self):
+        rapport = creer_rapport(self.program, self.alice, statut='accepte')
+        rapport.statut = 'rejete'
+        rapport.save()
+        self.assertEqual(self.ligne(self.alice).points_total, 0)
+        Report.objects.get(pk=rapport.pk).delete()
+        self.assertEqual(self.ligne(self.alice).bugs_soumis, 0)
+        self.assertConforme()
+
+    def test_transaction_completee(self):
+        operation = Transaction.objects.create(
+            hacker=self.bob, type_transaction='paiement_bug', montant_net=Decimal('1500.00'),
+        )
+        self.assertFalse(Leaderboard.objects.filter(hacker=self.bob).exists())
+        operation.statut = 'completee'
+        operation.save()
+        self.assertEqual(self.ligne(self.bob).revenu_total, Decimal('1500.00'))
+        operation.statut = 'annulee'
+        operation.save()
+        self.assertEqual(self.ligne(self.bob).revenu_total, Decimal('0.00'))
+        self.assertConforme()
+
+    def test_commande_detecte_et_corrige_les_ecarts(self):
+        creer_rapport(self.program, self.alice, statut='accepte', severite_label='Critique')
+        creer_rapport(self.program, self.bob, statut='accepte')
+        # Modification hors signaux : l'état incrémental dérive
+        Report.objects.filter(hacker=self.bob).update(severite_label='Critique')
+
+        sortie = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('reconstruire_classement', '--verifier', stdout=sortie)
+
+        call_command('reconstruire_classement', stdout=sortie)
+        self.assertConforme()
+        self.assertEqual(self.ligne(self.bob).points_total, 50)
+
+
+class ClassementLectureTests(EcrituresSynchronesTestCase):
+    def setUp(self):
+        cache.clear()
+        self.program = creer_programme()
+        self.hackers = [creer_hacker(n) for n in range(1, 7)]
+        # hacker n obtient n rapports critiques acceptés : le dernier est premier
+        for n, hacker in enumerate(self.hackers, start=1):
+            for _ in range(n):
+                creer_rapport(self.program, hacker, statut='accepte', severite_label='Critique')
+
+    def ids(self, entrees):
+        return [entree['hacker_id'] for entree in entrees]
+
+    def test_pagination_par_curseur_depuis_l_instantane(self):
+        page = classement.page_classement(limite=4)
+        self.assertEqual(self.ids(page['entrees']), [h.id for h in reversed(self.hackers)][:4])
+        self.assertEqual(page['suivant'], 4)
+
+        with self.assertNumQueries(0):
+            suite = classement.page_classement(apres=page['suivant'], limite=4)
+        self.assertEqual(self.ids(suite['entrees']), [self.hackers[1].id, self.hackers[0].id])
+        self.assertIsNone(suite['suivant'])
+
+    @override_settings(CLASSEMENT_TOP_N=3)
+    def test_au_dela_du_top_n(self):
+        page = classement.page_classement(apres=2, limite=3)
+        self.assertEqual([e['position'] for e in page['entrees']], [3, 4, 5])
+
+        rang = classement.rang_hacker(self.hackers[0].id, voisins=1)
+        self.assertEqual(rang['moi']['position'], 6)
+        self.assertEqual([e['position'] for e in rang['voisins']], [5, 6])
+
+    def test_rang_et_voisins(self):
+        with self.assertNumQueries(1):
+            classement.rang_hacker(self.hackers[2].id)
+        with self.assertNumQueries(0):
+            rang = classement.rang_hacker(self.hackers[2].id)
+        self.assertEqual(rang['moi']['position'], 4)
+        self.assertEqual([e['position'] for e in rang['voisins']], [2, 3, 4, 5, 6])
+
+    def test_invalidation_seulement_sur_nouvelles_positions(self):
+        version = classement.instantane()[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            creer_rapport(self.program, self.hackers[0])  # soumis : aucun point
+        self.assertEqual(classement.version_classement(), version)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(6):
+                creer_rapport(self.program, self.hackers[0], statut='accepte', severite_label='Critique')
+        self.assertGreater(classement.version_classement(), version)
+        self.assertEqual(classement.page_classement(limite=1)['entrees'][0]['hacker_id'], self.hackers[0].id)
+
+    def test_vues(self):
+        reponse = self.client.get(reverse('classement'), {'limite': 2})
+        self.assertEqual(reponse.json()['suivant'], 2)
+        self.assertEqual(self.client.get(reverse('classement_moi')).status_code, 401)
+
+        session = self.client.session
+        session['hacker_id'] = self.hackers[5].id
+        session.save()
+        self.assertEqual(self.client.get(reverse('classement_moi')).json()['moi']['position'], 1)
+
+
+@override_settings(GRAND_LIVRE_ARRIERE_PLAN=False)
+class PaiementTests(TestCase):
+    def setUp(self):
+        self.program = creer_programme(budget_total=Decimal('10000.00'))
+        self.autre_programme = creer_programme("Autre", budget_total=Decimal('5000.00'))
+        self.hacker = creer_hacker(1)
+        self.rapports = [
+            creer_rapport(self.program, self.hacker, statut='accepte', montant_final=Decimal('1000.00')),
+            creer_rapport(self.program, self.hacker, statut='corrige', montant_final=Decimal('500.00')),
+            creer_rapport(self.autre_programme, creer_hacker(2), statut='accepte', montant_final=Decimal('200.00')),
+        ]
+
+    def tearDown(self):
+        grand_livre.vider()
+        super().tearDown()
+
+    def test_paiement_unitaire(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            operation = payer_rapport(self.rapports[0].pk, taux_commission='0.10')
+        self.assertEqual(operation.montant_net, Decimal('900.00'))
+        grand_livre.vider()
+
+        self.program.refresh_from_db()
+        self.assertEqual(self.program.budget_depense, Decimal('1000.00'))
+        self.assertEqual(self.program.budget_restant, Decimal('9000.00'))
+        self.assertEqual(Enterprise.objects.get(pk=self.program.enterprise_id).solde_depense, Decimal('1000.00'))
+        self.hacker.refresh_from_db()
+        self.assertEqual(self.hacker.solde_credit, Decimal('900.00'))
+        self.assertEqual(self.hacker.revenus_totaux, Decimal('900.00'))
+        self.assertEqual(grand_livre.solde(grand_livre.COMMISSIONS).solde, Decimal('100.00'))
+        self.assertEqual(Report.objects.get(pk=self.rapports[0].pk).statut, 'paye')
+        self.assertEqual(Leaderboard.objects.get(hacker=self.hacker).revenu_total, Decimal('900.00'))
+        self.assertEqual(leaderboard.comparer_classement(), [])
+
+    def test_lot_une_requete_par_table(self):
+        # savepoint, verrou rapports, programmes (verrou + soldes arrêtés +
+        # écritures), transactions, grand livre, rapports payés, classement
+        # (lecture + mise à jour), notifications (savepoint, insert, release),
+        # statistiques, release
+        with self.assertNumQueries(15):
+            transactions = payer_rapports([r.pk for r in self.rapports])
+        self.assertEqual(len(transactions), 3)
+        self.assertEqual(Transaction.objects.filter(statut='completee').count(), 3)
+        # Sans commission (taux par défaut nul) : quatre lignes par rapport
+        self.assertEqual(EcritureGrandLivre.objects.filter(nature='paiement_bug').count(), 12)
+        soldes = grand_livre.soldes([
+            grand_livre.compte('programme', self.program.pk), grand_livre.compte('programme', self.autre_programme.pk),
+        ])
+        self.assertEqual(soldes[grand_livre.compte('programme', self.program.pk)].solde, Decimal('8500.00'))
+        self.assertEqual(soldes[grand_livre.compte('programme', self.autre_programme.pk)].sorties, Decimal('200.00'))
+        self.assertEqual(leaderboard.comparer_classement(), [])
+        self.assertEqual(statistiques.comparer_statistiques(), [])
+
+    def test_double_paiement_refuse(self):
+        payer_rapport(self.rapports[0].pk)
+        with self.assertRaises(PaiementErreur):
+            payer_rapport(self.rapports[0].pk)
+        self.assertEqual(grand_livre.solde(grand_livre.compte('hacker', self.hacker.pk)).solde, Decimal('1000.00'))
+
+    def test_lot_annule_si_budget_insuffisant(self):
+        grand_livre.doter_programme(self.autre_programme, Decimal('-4900.00'))
+        with self.assertRaises(PaiementErreur):
+            payer_rapports([r.pk for r in self.rapports])
+        self.assertFalse(Transaction.objects.exists())
+        self.assertFalse(EcritureGrandLivre.objects.filter(nature='paiement_bug').exists())
+        self.assertEqual(Report.objects.filter(statut='paye').count(), 0)
+
+
+@override_settings(NOTIFICATIONS_TAILLE_LOT=2)
+class NotificationTests(EcrituresSynchronesTestCase):
+    def setUp(self):
+        cache.clear()
+        self.program = creer_programme()
+        self.membres = [
+            EnterpriseMember.objects.create(enterprise=self.program.enterprise, email=f"m{n}@entreprise.dz")
+            for n in range(2)
+        ]
+        self.hackers = [creer_hacker(n) for n in range(5)]
+        for hacker in self.hackers:
+            ProgramParticipant.objects.create(program=self.program, hacker=hacker)
+
+    def test_lancement_programme_en_lots(self):
+        # UPDATE du programme, destinataires, savepoint, 3 INSERT (lots de 2), release
+        with self.assertNumQueries(7):
+            self.program.statut = 'actif'
+            self.program.save(update_fields=['statut'])
+        self.assertEqual(Notification.objects.filter(hacker__isnull=False).count(), 5)
+
+    def test_regroupement_des_messages(self):
+        rapport = creer_rapport(self.program, self.hackers[0])
+        Notification.objects.all().delete()
+        for n in range(4):
+            MessageChat.objects.create(report=rapport, type_auteur='hacker', contenu=f"message {n}")
+
+        notifications_membres = Notification.objects.filter(membre__isnull=False)
+        self.assertEqual(notifications_membres.count(), 2)
+        self.assertEqual(set(notifications_membres.values_list('occurrences', flat=True)), {4})
+        self.assertFalse(Notification.objects.filter(hacker__isnull=False).exists())
+
+        notifications.marquer_lues(membre_id=self.membres[0].pk)
+        MessageChat.objects.create(report=rapport, type_auteur='hacker', contenu="encore")
+        self.assertEqual(Notification.objects.filter(membre=self.membres[0]).count(), 2)
+
+    def test_compteur_de_non_lues(self):
+        hacker = self.hackers[0]
+        self.assertEqual(notifications.nombre_non_lues(hacker_id=hacker.pk), 0)
+        rapport = creer_rapport(self.program, hacker)
+        with self.captureOnCommitCallbacks(execute=True):
+            rapport.statut = 'accepte'
+            rapport.save()
+            notifications.diffuser([{'hacker_id': hacker.pk}], 'autre', "Info")
+        with self.assertNumQueries(0):
+            self.assertEqual(notifications.nombre_non_lues(hacker_id=hacker.pk), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            notifications.marquer_lues(hacker_id=hacker.pk)
+        self.assertEqual(notifications.nombre_non_lues(hacker_id=hacker.pk), 0)
+
+    def test_boite_entreprise_compte_les_membres(self):
+        entreprise = self.program.enterprise
+        with self.captureOnCommitCallbacks(execute=True):
+            creer_rapport(self.program, self.hackers[1])
+        self.assertEqual(notifications.nombre_non_lues(enterprise_id=entreprise.pk), 2)
+        self.assertEqual(notifications.nombre_non_lues(membre_id=self.membres[0].pk), 1)
+
+        session = self.client.session
+        session['enterprise_id'] = entreprise.pk
+        session.save()
+        self.assertEqual(self.client.get(reverse('notifications_non_lues')).json(), {'non_lues': 2})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            notifications.marquer_lues(membre_id=self.membres[1].pk)
+        self.assertEqual(notifications.nombre_non_lues(enterprise_id=entreprise.pk), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            notifications.marquer_lues(enterprise_id=entreprise.pk)
+        self.assertEqual(notifications.nombre_non_lues(enterprise_id=entreprise.pk), 0)
+        self.assertEqual(notifications.nombre_non_lues(membre_id=self.membres[0].pk), 0)
+
+    def test_ecriture_pendant_le_recalcul(self):
+        hacker = self.hackers[0]
+        compter = Notification.objects.filter
+
+        def compter_puis_ecrire(*args, **kwargs):
+            # Notification validée entre le COUNT et la mise en cache
+            nombre = compter(*args, **kwargs).count()
+            Notification.objects.bulk_create([Notification(hacker=hacker, type_notification='autre', titre="Info")])
+            notifications._incrementer({('hacker', hacker.pk): 1})
+            return mock.Mock(count=mock.Mock(return_value=nombre))
+
+        with mock.patch.object(Notification.objects, 'filter', side_effect=compter_puis_ecrire):
+            self.assertEqual(notifications.nombre_non_lues(hacker_id=hacker.pk), 0)
+        self.assertEqual(notifications.nombre_non_lues(hacker_id=hacker.pk), 1)
+
+    def test_nouveau_rapport_notifie_les_membres(self):
+        creer_rapport(self.program, self.hackers[1])
+        self.assertEqual(
+            set(Notification.objects.values_list('membre_id', flat=True)),
+            {membre.pk for membre in self.membres},
+        )
+
+
+@override_settings(JOURNAL_TAILLE_LOT=3, JOURNAL_CAPACITE=10)
+class JournalActiviteTests(EcrituresSynchronesTestCase):
+    def test_ecriture_par_lots_au_commit(self):
+        debut = timezone.now()
+        with self.captureOnCommitCallbacks(execute=True):
+            for n in range(5):
+                journal.journaliser('connexion', user_id=n, user_type='hacker', ip_address='10.0.0.1')
+            self.assertFalse(LogActivite.objects.exists())
+        self.assertEqual(LogActivite.objects.count(), 3)
+
+        self.assertEqual(journal.vider(), 2)
+        self.assertEqual(LogActivite.objects.count(), 5)
+        self.assertEqual(LogActivite.objects.filter(date_action__gte=debut).count(), 5)
+
+    def test_action_annulee_non_journalisee(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    journal.journaliser('paiement', user_id=1, user_type='hacker')
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        journal.vider()
+        self.assertFalse(LogActivite.objects.exists())
+
+    def test_file_pleine_abandonne(self):
+        tampon = TamponEcriture(lambda lot: None, 'test', taille_lot=10, capacite=2, arriere_plan=False)
+        self.assertEqual([tampon.ajouter(n) for n in range(3)], [True, True, False])
+        self.assertEqual(tampon.statistiques()['abandons'], 1)
+
+    def test_thread_vide_a_l_arret(self):
+        ecrits = []
+        tampon = TamponEcriture(ecrits.extend, 'test', taille_lot=4, intervalle=0.05)
+        for n in range(10):
+            tampon.ajouter(n)
+        tampon.arreter()
+        self.assertEqual(sorted(ecrits), list(range(10)))
+        self.assertEqual(tampon.statistiques()['ecrits'], 10)
+
+    def test_arret_du_processus(self):
+        ecrits = []
+        tampon = TamponEcriture(ecrits.extend, 'test', taille_lot=10, arriere_plan=False)
+        tampon.ajouter(1)
+        _arreter_tous()
+        self.assertEqual(ecrits, [1])
+
+        # Pas de référence forte gardée pour atexit
+        reference = weakref.ref(tampon)
+        del tampon
+        gc.collect()
+        self.assertIsNone(reference())
+
+    def test_archivage(self):
+        ancien = timezone.now() - timedelta(days=120)
+        LogActivite.objects.bulk_create(
+            [LogActivite(action='connexion', date_action=ancien) for _ in range(5)]
+            + [LogActivite(action='connexion')]
+        )
+        call_command('archiver_journal', '--jours', '90', '--lot', '2', stdout=StringIO())
+        self.assertEqual(LogActivite.objects.count(), 1)
+        self.assertEqual(LogActiviteArchive.objects.count(), 5)
+        self.assertEqual(LogActiviteArchive.objects.first().date_action, ancien)
+
+
+class StatistiquesProgrammeTests(EcrituresSynchronesTestCase):
+    def setUp(self):
+        self.program = creer_programme()
+        self.alice = creer_hacker(1)
+        self.bob = creer_hacker(2)
+
+    def assertConforme(self):
+        self.assertEqual(statistiques.comparer_statistiques(), [])
+
+    def test_transitions_et_participants(self):
+        ProgramParticipant.objects.create(program=self.program, hacker=self.alice)
+        rapport = creer_rapport(self.program, self.alice, severite_label='Critique')
+        creer_rapport(self.program, self.bob, statut='rejete')
+        rapport.statut = 'accepte'
+        rapport.montant_final = Decimal('300.00')
+        rapport.save()
+        payer_rapport(rapport.pk)
+
+        stats = statistiques.statistiques_programme(self.program.pk)
+        self.assertEqual(stats['rapports_total'], 2)
+        self.assertEqual(stats['par_statut']['paye'], 1)
+        self.assertEqual(stats['par_statut']['rejete'], 1)
+        self.assertEqual(stats['par_statut']['accepte'], 0)
+        self.assertEqual(stats['par_severite']['Critique'], 1)
+        self.assertEqual(stats['montant_paye_total'], Decimal('300.00'))
+        self.assertEqual(stats['participants'], 1)
+        self.assertIsNotNone(stats['delai_tri_moyen'])
+        self.assertIsNotNone(Report.objects.get(pk=rapport.pk).date_tri)
+        self.assertConforme()
+
+        Report.objects.get(pk=rapport.pk).delete()
+        ProgramParticipant.objects.all().delete()
+        self.assertConforme()
+
+    def test_lecture_sans_requete_sur_les_rapports(self):
+        creer_rapport(self.program, self.alice)
+        with self.assertNumQueries(1) as requetes_executees:
+            statistiques.statistiques_programme(self.program.pk)
+        self.assertNotIn('reports', requetes_executees.captured_queries[0]['sql'])
+
+    def test_ligne_absente_initialisee_par_calcul_complet(self):
+        creer_rapport(self.program, self.alice, statut='accepte')
+        ProgramStats.objects.all().delete()
+        creer_rapport(self.program, self.bob)
+        self.assertEqual(statistiques.statistiques_programme(self.program.pk)['rapports_total'], 2)
+        self.assertConforme()
+
+    def test_commande_corrige_les_ecarts(self):
+        creer_rapport(self.program, self.alice)
+        ProgramStats.objects.update(rapports_total=7)
+        with self.assertRaises(CommandError):
+            call_command('reconstruire_statistiques', '--verifier', stdout=StringIO())
+        call_command('reconstruire_statistiques', stdout=StringIO())
+        self.assertConforme()
+
+    def test_vue(self):
+        session = self.client.session
+        session['enterprise_id'] = self.program.enterprise_id
+        session.save()
+        reponse = self.client.get(reverse('statistiques_programme', args=[self.program.pk]))
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual(reponse.json()['rapports_total'], 0)
+        autre = creer_programme("Autre")
+        reponse = self.client.get(reverse('statistiques_programme', args=[autre.pk]))
+        self.assertEqual(reponse.status_code, 404)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.program = creer_programme()
+        self.autre = creer_programme("Autre")
+        hacker = creer_hacker(1)
+        self.rapports = [creer_rapport(self.program, hacker, titre=f"Rapport {n}") for n in range(5)]
+        creer_rapport(self.autre, hacker, titre="Hors périmètre")
+
+    def test_csv_par_pages_de_cle(self):
+        # 5 lignes par pages de 2 : 3 pages, une requête chacune
+        with self.assertNumQueries(3):
+            contenu = ''.join(exports.exporter(
+                'rapports', enterprise_id=self.program.enterprise_id, taille_lot=2,
+            ))
+        lignes = contenu.splitlines()
+        self.assertEqual(lignes[0].split(',')[:3], ['id', 'numero_reference', 'program_id'])
+        self.assertEqual([int(ligne.split(',')[0]) for ligne in lignes[1:]], [r.pk for r in self.rapports])
+
+    def test_csv_sans_formules(self):
+        Report.objects.filter(pk=self.rapports[0].pk).update(titre="=HYPERLINK(\"http://x\")")
+        Report.objects.filter(pk=self.rapports[1].pk).update(titre="-2+3")
+        lignes = list(csv.reader(StringIO(''.join(exports.exporter('rapports', id__in=[r.pk for r in self.rapports])))))
+        titres = [ligne[5] for ligne in lignes[1:]]
+        self.assertEqual(titres[:3], ["'=HYPERLINK(\"http://x\")", "'-2+3", "Rapport 2"])
+
+    def test_ndjson(self):
+        lignes = ''.join(exports.exporter('rapports', 'ndjson', taille_lot=4)).splitlines()
+        self.assertEqual(len(lignes), 6)
+        self.assertEqual(json.loads(lignes[-1])['titre'], "Hors périmètre")
+
+    def test_vue_en_flux(self):
+        reponse = self.client.get(reverse('export', args=['rapports']))
+        self.assertEqual(reponse.status_code, 401)
+
+        session = self.client.session
+        session['enterprise_id'] = self.program.enterprise_id
+        session.save()
+        reponse = self.client.get(reverse('export', args=['rapports']), {'format': 'ndjson'})
+        self.assertTrue(reponse.streaming)
+        self.assertEqual(reponse['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(len(b''.join(reponse.streaming_content).splitlines()), 5)
+        self.assertEqual(self.client.get(reverse('export', args=['inconnu'])).status_code, 400)
+
+    def test_commande(self):
+        sortie = StringIO()
+        call_command('exporter_donnees', 'transactions', stdout=sortie)
+        self.assertEqual(sortie.getvalue().splitlines()[0].split(',')[0], 'id')
+
+
+class RapportsSimilairesTests(TestCase):
+    def setUp(self):
+        self.program = creer_programme()
+        self.hacker = creer_hacker(1)
+        self.original = creer_rapport(
+            self.program, self.hacker, titre="Injection SQL dans le formulaire de connexion",
+            description="Le paramètre email du formulaire de connexion est injectable en SQL aveugle.",
+        )
+        creer_rapport(
+            self.program, self.hacker, titre="XSS réfléchie sur la recherche",
+            description="Le paramètre q de la page de recherche est renvoyé sans échappement.",
+        )
+        creer_rapport(
+            creer_programme("Autre"), self.hacker, titre="Injection SQL dans le formulaire de connexion",
+            description="Le paramètre email du formulaire de connexion est injectable en SQL aveugle.",
+        )
+
+    def similaires(self, **kwargs):
+        return recherche.rapports_similaires(
+            self.program.pk, "Injection SQL formulaire de connexion",
+            description="Le champ email du formulaire de connexion est injectable (SQL aveugle).", **kwargs
+        )
+
+    def test_doublon_en_tete_dans_le_programme(self):
+        resultats = self.similaires()
+        self.assertEqual(resultats[0]['id'], self.original.pk)
+        self.assertGreater(resultats[0]['score'], 0.2)
+        self.assertTrue(all(
+            Report.objects.get(pk=resultat['id']).program_id == self.program.pk for resultat in resultats
+        ))
+        self.assertNotIn(self.original.pk, [r['id'] for r in self.similaires(exclure=self.original.pk)])
+
+    def test_index_maintenu_au_save_et_au_delete(self):
+        self.original.titre = "Contournement de l'authentification"
+        self.original.description = "Jeton JWT accepté sans signature."
+        self.original.save()
+        resultats = recherche.rapports_similaires(self.program.pk, "JWT accepté sans signature")
+        self.assertEqual(resultats[0]['id'], self.original.pk)
+
+        self.original.delete()
+        self.assertEqual(recherche.rapports_similaires(self.program.pk, "JWT accepté sans signature"), [])
+
+    @override_settings(RECHERCHE_SCOREUR='accounts.recherche.ScoreurShingles')
+    def test_scoreur_interchangeable(self):
+        self.assertIsInstance(recherche.scoreur(), recherche.ScoreurShingles)
+        self.assertEqual(self.similaires()[0]['id'], self.original.pk)
+
+    def test_minhash_proche_du_jaccard_exact(self):
+        exact, minhash = recherche.ScoreurShingles(), recherche.ScoreurMinHash(taille=256)
+        a = " ".join(f"mot{n}" for n in range(300))
+        b = " ".join(f"mot{n}" for n in range(100, 400))
+        self.assertAlmostEqual(
+            minhash.similarite(minhash.signature(a), minhash.signature(b)),
+            exact.similarite(exact.signature(a), exact.signature(b)),
+            delta=0.1,
+        )
+
+    def test_vue(self):
+        session = self.client.session
+        session['enterprise_id'] = self.program.enterprise_id
+        session.save()
+        url = reverse('rapports_similaires', args=[self.program.pk])
+        reponse = self.client.get(url, {'titre': "Injection SQL formulaire de connexion", 'k': 1})
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual([r['id'] for r in reponse.json()['resultats']], [self.original.pk])
+        self.assertEqual(self.client.get(url).status_code, 400)
+
+
+class PBKDF2Rapide(PBKDF2PasswordHasher):
+    algorithm = 'pbkdf2_rapide'
+    iterations = 1000
+
+
+@override_settings(PASSWORD_HASHERS=[
+    'accounts.tests.PBKDF2Rapide', 'django.contrib.auth.hashers.MD5PasswordHasher',
+])
+class AuthentificationTests(EcrituresSynchronesTestCase):
+    def setUp(self):
+        cache.clear()
+        self.hacker = creer_hacker(
+            1, statut='actif', verifiee=True, mot_de_passe_hash=make_password("secret", hasher='pbkdf2_rapide'),
+        )
+        self.backend = authentification.BACKENDS['hacker']
+
+    def connecter(self, mot_de_passe="secret", email="hacker1@exemple.dz"):
+        return self.backend.verifier(None, email=email, mot_de_passe=mot_de_passe)
+
+    def test_une_lecture_et_une_mise_a_jour_ciblee(self):
+        with self.assertNumQueries(2) as requetes_executees:
+            compte, erreur = self.connecter()
+        self.assertIsNone(erreur)
+        self.assertEqual(compte.pk, self.hacker.pk)
+        self.assertNotIn('adresse', requetes_executees.captured_queries[0]['sql'])
+        self.assertRegex(requetes_executees.captured_queries[1]['sql'], r'SET "date_derniere_connexion" = [^,]+ WHERE')
+        self.hacker.refresh_from_db()
+        self.assertIsNotNone(self.hacker.date_derniere_connexion)
+
+    def test_rehachage_vers_le_hasher_prefere(self):
+        UserHacker.objects.filter(pk=self.hacker.pk).update(mot_de_passe_hash=make_password("secret", hasher='md5'))
+        self.assertIsNone(self.connecter()[1])
+        self.hacker.refresh_from_db()
+        self.assertTrue(self.hacker.mot_de_passe_hash.startswith('pbkdf2_rapide$'))
+        with override_settings(AUTH_HASHER_COMPTES='md5'):
+            self.assertIsNone(self.connecter()[1])
+        self.hacker.refresh_from_db()
+        self.assertTrue(self.hacker.mot_de_passe_hash.startswith('md5$'))
+
+    def test_echecs_limites_sans_requete(self):
+        for _ in range(5):
+            self.assertEqual(self.connecter("faux")[1], 'mot_de_passe')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.connecter()[1], 'bloque')
+
+    def test_email_inconnu_memorise_puis_oublie_a_la_creation(self):
+        self.assertEqual(self.connecter(email="nouveau@exemple.dz")[1], 'inconnu')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.connecter(email="nouveau@exemple.dz")[1], 'inconnu')
+        creer_hacker(2, email="nouveau@exemple.dz", statut='actif', verifiee=True,
+                     mot_de_passe_hash=make_password("secret"))
+        self.assertIsNone(self.connecter(email="nouveau@exemple.dz")[1])
+
+    def test_vues(self):
+        reponse = self.client.post(reverse('hacker_login'), {'email': "hacker1@exemple.dz", 'mot_de_passe': "secret"})
+        self.assertRedirects(reponse, reverse('hacker_home'), fetch_redirect_response=False)
+        self.assertEqual(self.client.session['hacker_id'], self.hacker.pk)
+
+        UserHacker.objects.filter(pk=self.hacker.pk).update(statut='suspendu')
+        reponse = self.client.post(reverse('hacker_login'), {'email': "hacker1@exemple.dz", 'mot_de_passe': "secret"})
+        self.assertContains(reponse, "Votre compte est suspendu")
+
+
+class SessionsTests(EcrituresSynchronesTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def ouvrir(self, **donnees):
+        store = sessions.SessionStore()
+        store.update(donnees)
+        store.create()
+        store.save()
+        return store.session_key
+
+    def test_connexion_ecrite_immediatement(self):
+        cle = self.ouvrir(hacker_id=7, hacker_nom="Alice")
+        ligne = Session.objects.get(cle_session=cle)
+        self.assertEqual((ligne.user_id, ligne.user_type, ligne.actif), (7, 'hacker', True))
+
+    def test_session_inchangee_sans_ecriture(self):
+        cle = self.ouvrir(hacker_id=7)
+        store = sessions.SessionStore(cle)
+        store['hacker_id'] = 7
+        with self.assertNumQueries(0):
+            store.save()
+
+    def test_modification_differee_apres_commit(self):
+        cle = self.ouvrir(hacker_id=7)
+        store = sessions.SessionStore(cle)
+        store['derniere_page'] = '/classement/'
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertNumQueries(0):
+                store.save()
+        self.assertEqual(sessions.SessionStore(cle)['derniere_page'], '/classement/')
+        self.assertNotIn('derniere_page', sessions.SessionStore().decode(Session.objects.get(cle_session=cle).donnees))
+        sessions.vider()
+        self.assertIn('derniere_page', sessions.SessionStore().decode(Session.objects.get(cle_session=cle).donnees))
+
+        cache.clear()
+        self.assertEqual(sessions.SessionStore(cle)['derniere_page'], '/classement/')
+
+    def test_revocation_par_utilisateur(self):
+        cles = [self.ouvrir(hacker_id=7), self.ouvrir(hacker_id=7)]
+        autre = self.ouvrir(hacker_id=8)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(sessions.revoquer_sessions(7, 'hacker'), 2)
+        for cle in cles:
+            store = sessions.SessionStore(cle)
+            self.assertNotIn('hacker_id', store)
+            self.assertIsNone(store.session_key)
+        self.assertEqual(sessions.SessionStore(autre)['hacker_id'], 8)
+
+    def test_requete_en_cours_ne_ranime_pas_la_session(self):
+        cle = self.ouvrir(hacker_id=7)
+        en_cours = sessions.SessionStore(cle)
+        en_cours['derniere_page'] = '/programmes/'
+        with self.captureOnCommitCallbacks(execute=True):
+            sessions.revoquer_sessions([7], 'hacker')
+        with self.captureOnCommitCallbacks(execute=True):
+            en_cours.save()
+        sessions.vider()
+        self.assertNotIn('hacker_id', sessions.SessionStore(cle))
+        # Remise en cache par une requête en cours : la marque de révocation l'emporte
+        cache.set(sessions.PREFIXE_CACHE + cle, {'hacker_id': 7})
+        self.assertNotIn('hacker_id', sessions.SessionStore(cle))
+        self.assertFalse(Session.objects.get(cle_session=cle).actif)
+
+    def test_connexion_sur_session_revoquee_change_de_cle(self):
+        cle = self.ouvrir(visite=1)
+        store = sessions.SessionStore(cle)
+        self.assertEqual(store.get('visite'), 1)
+        Session.objects.filter(cle_session=cle).update(actif=False)
+        store['hacker_id'] = 7
+        store.save()
+        self.assertNotEqual(store.session_key, cle)
+        self.assertEqual(Session.objects.get(cle_session=store.session_key).user_id, 7)
+        self.assertFalse(Session.objects.get(cle_session=cle).actif)
+
+    def test_ecriture_differee_perimee_ignoree(self):
+        cle = self.ouvrir(visite=1)
+        ancienne, connexion = sessions.SessionStore(cle), sessions.SessionStore(cle)
+        self.assertEqual(connexion.get('visite'), 1)
+        ancienne['derniere_page'] = '/ancienne/'
+        with self.captureOnCommitCallbacks(execute=True):
+            ancienne.save()
+        # Connexion concurrente, écrite immédiatement après la mise en file
+        connexion['hacker_id'] = 7
+        connexion.save()
+        sessions.vider()
+        ligne = Session.objects.get(cle_session=cle)
+        self.assertEqual(ligne.user_id, 7)
+        self.assertNotIn('derniere_page', sessions.SessionStore().decode(ligne.donnees))
+
+    def test_deconnexion(self):
+        creer_hacker(1, statut='actif', verifiee=True, mot_de_passe_hash=make_password("secret"))
+        self.client.post(reverse('hacker_login'), {'email': "hacker1@exemple.dz", 'mot_de_passe': "secret"})
+        self.assertEqual(Session.objects.get().user_type, 'hacker')
+        self.client.get(reverse('hacker_logout'))
+        self.assertFalse(Session.objects.filter(user_type='hacker').exists())
+
+
+@unittest.skipUnless(connection.vendor in requetes.ANALYSEURS, "EXPLAIN non pris en charge")
+class CompteCourantTests(EcrituresSynchronesTestCase):
+    def setUp(self):
+        cache.clear()
+        middleware._comptes.vider()
+        self.hacker = creer_hacker(1, statut='actif', verifiee=True)
+        Leaderboard.objects.create(hacker=self.hacker, bugs_soumis=4, position=2)
+        self.programmes = [creer_programme(f"Programme {n}") for n in range(3)]
+        session = self.client.session
+        session['hacker_id'] = self.hacker.id
+        session.save()
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = session.session_key
+
+    def requetes_tableau_de_bord(self):
+        with CaptureQueriesContext(connection) as requetes:
+            reponse = self.client.get(reverse('hacker_home'))
+        self.assertEqual(reponse.status_code, 200)
+        return reponse, len(requetes)
+
+    def test_nombre_de_requetes_fixe(self):
+        self.requetes_tableau_de_bord()
+        with self.captureOnCommitCallbacks(execute=True):
+            ProgramParticipant.objects.create(program=self.programmes[0], hacker=self.hacker)
+        _, une = self.requetes_tableau_de_bord()
+        with self.captureOnCommitCallbacks(execute=True):
+            for program in self.programmes[1:]:
+                ProgramParticipant.objects.create(program=program, hacker=self.hacker)
+        reponse, trois = self.requetes_tableau_de_bord()
+        self.assertEqual(une, trois)
+        self.assertContains(reponse, "Programme 2")
+        self.assertContains(reponse, "#2")
+
+    def test_compte_garde_en_memoire(self):
+        _, premiere = self.requetes_tableau_de_bord()
+        _, seconde = self.requetes_tableau_de_bord()
+        # Compte, classement et participations : plus lus
+        self.assertEqual(premiere - seconde, 3)
+
+    def test_modification_du_compte_visible(self):
+        self.requetes_tableau_de_bord()
+        self.hacker.prenom = "Nadia"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.hacker.save()
+        reponse, _ = self.requetes_tableau_de_bord()
+        self.assertContains(reponse, "Bienvenue, Nadia")
+
+    def test_solde_projete_visible_sans_date_modification(self):
+        self.requetes_tableau_de_bord()
+        with self.captureOnCommitCallbacks(execute=True):
+            grand_livre.passer([grand_livre.mouvement('bonus', [
+                (grand_livre.compte('hacker', self.hacker.pk), Decimal('750.00')), ('externe:bonus', Decimal('-750.00')),
+            ])])
+        with self.captureOnCommitCallbacks(execute=True):
+            grand_livre.vider()
+        # Un autre processus recharge le compte en premier ; la copie de celui-ci reste périmée
+        with mock.patch.object(middleware, '_comptes', middleware._Comptes()):
+            self.assertEqual(middleware.charger_compte('hacker', self.hacker.pk).solde_credit, Decimal('750.00'))
+        self.assertEqual(middleware.charger_compte('hacker', self.hacker.pk).solde_credit, Decimal('750.00'))
+
+    def test_copie_par_requete(self):
+        compte = middleware.charger_compte('hacker', self.hacker.id)
+        compte.prenom = "Modifie"
+        self.assertEqual(middleware.charger_compte('hacker', self.hacker.id).prenom, self.hacker.prenom)
+
+    def test_relations_copiees_par_requete(self):
+        ProgramParticipant.objects.create(program=self.programmes[0], hacker=self.hacker)
+        compte = middleware.charger_compte('hacker', self.hacker.id)
+        compte.leaderboard.position = 99
+        compte.programmes_participation.all()[0].program.nom = "Modifie"
+        with self.assertNumQueries(0):
+            autre = middleware.charger_compte('hacker', self.hacker.id)
+            participation = autre.programmes_participation.all()[0]
+            self.assertEqual(autre.leaderboard.position, 2)
+            self.assertEqual(participation.program.nom, "Programme 0")
+            self.assertIs(participation.hacker, autre)
+
+    def test_non_connecte(self):
+        self.client.cookies.clear()
+        self.assertRedirects(self.client.get(reverse('hacker_home')), reverse('hacker_login'))
+        self.assertIsNone(middleware.charger_compte('hacker', 999))
+
+
+PNG = (
+    b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\x01\x00\x00\x00\x01\x08\x02\x00\x00\x00\x90wS\xde'
+    b'\x00\x00\x00\x0cIDATx\x9cc\xf8\xff\xff?\x00\x05\xfe\x02\xfe\r\xefF\xb8\x00\x00\x00\x00IEND\xaeB`\x82'
+)
+PDF = (
+    b'%PDF-1.4\n1 0 obj << /Type /Catalog /Pages 2 0 R >> endobj\n'
+    b'2 0 obj << /Type /Pages /Kids [3 0 R] /Count 1 >> endobj\n'
+    b'3 0 obj << /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] >> endobj\n'
+    b'trailer << /Root 1 0 R >>\n%%EOF\n'
+)
+
+
+class TeleversementsTests(EcrituresSynchronesTestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        reglages = self.settings(MEDIA_ROOT=self.media)
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+
+    def inscrire(self, n, contenu, nom="cni.png"):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('hacker_register'), {
+                'prenom': "Amine", 'nom': "B", 'email': f"h{n}@exemple.dz", 'telephone': f"0661{n:06d}",
+                'date_naissance': "1995-01-01", 'adresse': "Oran", 'cni_numero': f"TV{n}",
+                'mot_de_passe': "x", 'mot_de_passe_confirm': "x",
+                'cni_image': SimpleUploadedFile(nom, contenu, content_type="image/png"),
+            })
+
+    def fichiers(self):
+        return sorted(
+            os.path.relpath(os.path.join(dossier, nom), self.media)
+            for dossier, _, noms in os.walk(self.media) for nom in noms
+        )
+
+    def test_stockage_par_contenu_dedoublonne(self):
+        self.inscrire(1, PNG, nom="../../scan.png")
+        self.inscrire(2, PNG, nom="autre.png")
+        self.assertEqual(UserHacker.objects.count(), 2)
+        chemins = set(UserHacker.objects.values_list('cni_image', flat=True))
+        self.assertEqual(len(chemins), 1)
+        chemin = chemins.pop()
+        self.assertRegex(chemin, r'^cni/[0-9a-f]{2}/[0-9a-f]{64}\.png$')
+        self.assertIn(chemin, self.fichiers())
+
+    def test_envois_identiques_simultanes(self):
+        def recu():
+            fichier = TemporaryUploadedFile("cni.png", "image/png", len(PNG), None)
+            fichier.write(PNG)
+            fichier.seek(0)
+            fichier.categorie, fichier.empreinte = 'cni', hashlib.sha256(PNG).hexdigest()
+            return fichier
+
+        nom = televersements.enregistrer(recu())
+        # Le second envoi ne voit pas encore le fichier du premier
+        with mock.patch('os.path.exists', return_value=False):
+            self.assertEqual(televersements.enregistrer(recu()), nom)
+            self.assertEqual(televersements.placer(nom, ContentFile(PNG)), nom)
+        self.assertEqual(self.fichiers(), [nom])
+
+    def test_type_reconnu_sur_le_contenu(self):
+        reponse = self.inscrire(1, b"<?php system($_GET['c']); ?>", nom="cni.png")
+        self.assertContains(reponse, "Type de fichier non accepté")
+        self.assertFalse(UserHacker.objects.exists())
+        self.assertEqual(self.fichiers(), [])
+
+    @override_settings(TELEVERSEMENTS_TAILLE_MAX={'cni': 64})
+    def test_taille_max(self):
+        reponse = self.inscrire(1, PNG)
+        self.assertContains(reponse, "Fichier trop volumineux")
+        self.assertFalse(UserHacker.objects.exists())
+
+    @unittest.skipUnless(miniatures.disponible(), "Pillow non installé")
+    def test_miniature_cni(self):
+        self.inscrire(1, PNG)
+        hacker = UserHacker.objects.get()
+        self.assertRegex(hacker.cni_miniature, r'^cni/miniatures/.+\.jpg$')
+        self.assertIn(hacker.cni_miniature, self.fichiers())
+
+    def test_metadonnees_registre(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('enterprise_register'), {
+                'nom_legal': "Sonatrach", 'email_entreprise': "contact@sonatrach.dz", 'mot_de_passe': "x",
+                'registre_commerce_pdf': SimpleUploadedFile("registre.pdf", PDF, content_type="application/pdf"),
+            })
+        enterprise = Enterprise.objects.get()
+        self.assertTrue(enterprise.registre_commerce_pdf.name.startswith('registre_commerce/'))
+        self.assertEqual(enterprise.registre_metadonnees['pages'], 1)
+        self.assertEqual(enterprise.registre_metadonnees['taille'], len(PDF))
+
+
+class MiniaturesTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.cache = tempfile.mkdtemp()
+        for dossier in (self.media, self.cache):
+            self.addCleanup(shutil.rmtree, dossier, ignore_errors=True)
+        reglages = self.settings(MEDIA_ROOT=self.media, MINIATURES_DOSSIER=self.cache)
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+        self.staff = User.objects.create_user("moderateur", password="x", is_staff=True)
+        os.makedirs(os.path.join(self.media, 'cni'))
+        with open(os.path.join(self.media, 'cni', 'scan.png'), 'wb') as fichier:
+            fichier.write(PNG)
+
+    def test_eviction_lru(self):
+        for n, acces in enumerate((300, 100, 200)):
+            chemin = os.path.join(self.cache, f"m{n}.jpg")
+            with open(chemin, 'wb') as fichier:
+                fichier.write(b'x' * 100)
+            os.utime(chemin, (acces, acces))
+        with override_settings(MINIATURES_BUDGET=150):
+            self.assertEqual(miniatures.evincer(), 2)
+        self.assertEqual(os.listdir(self.cache), ['m0.jpg'])
+        self.assertEqual(miniatures.occupation(), 100)
+
+    def test_acces_reserve_au_staff(self):
+        url = reverse('miniature', args=(160, 'cni/scan.png'))
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get(reverse('miniature', args=(161, 'cni/scan.png'))).status_code, 404)
+        self.assertEqual(self.client.get(reverse('miniature', args=(160, 'registre_commerce/x.pdf'))).status_code, 404)
+
+    @unittest.skipIf(miniatures.Image is None, "Pillow non installé")
+    def test_etag_et_cache(self):
+        self.client.force_login(self.staff)
+        url = reverse('miniature', args=(160, 'cni/scan.png'))
+        reponse = self.client.get(url)
+        self.assertEqual(reponse.status_code, 200)
+        self.assertIn('private', reponse['Cache-Control'])
+        self.assertEqual(len(os.listdir(self.cache)), 1)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=reponse['ETag']).status_code, 304)
+
+    def test_admin_sans_original_dans_la_liste(self):
+        hacker = creer_hacker(1, cni_image='cni/scan.png')
+        apercu = site._registry[UserHacker].cni_preview(hacker)
+        self.assertIn('href="/media/cni/scan.png"', apercu)
+        self.assertNotIn('src="/media/', apercu)
+
+    def test_admin_reutilise_la_miniature_enregistree(self):
+        hacker = creer_hacker(1, cni_image='cni/scan.png', cni_miniature='cni/miniatures/ab/ab.jpg')
+        apercu = site._registry[UserHacker].cni_preview(hacker)
+        self.assertIn('src="/media/cni/miniatures/ab/ab.jpg"', apercu)
+
+    def test_image_illisible(self):
+        self.client.force_login(self.staff)
+        with open(os.path.join(self.media, 'cni', 'tronque.png'), 'wb') as fichier:
+            fichier.write(PNG[:20])
+        url = reverse('miniature', args=(160, 'cni/tronque.png'))
+        if miniatures.Image is None:
+            with mock.patch('accounts.views.miniature', side_effect=miniatures.ImageIllisible('cni/tronque.png')):
+                self.assertEqual(self.client.get(url).status_code, 415)
+        else:
+            self.assertEqual(self.client.get(url).status_code, 415)
+
+
+class MediasProtegesTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        reglages = self.settings(MEDIA_ROOT=self.media)
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+        os.makedirs(os.path.join(self.media, 'cni'))
+        self.contenu = bytes(range(256)) * 4
+        with open(os.path.join(self.media, 'cni', 'scan.png'), 'wb') as fichier:
+            fichier.write(self.contenu)
+        self.hacker = creer_hacker(1, cni_image='cni/scan.png')
+        self.url = reverse('media', args=('cni/scan.png',))
+
+    def connecter(self, **donnees):
+        session = self.client.session
+        session.update(donnees)
+        session.save()
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = session.session_key
+
+    def lire(self, reponse):
+        return b''.join(reponse.streaming_content)
+
+    def test_acces_proprietaire_seulement(self):
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.connecter(hacker_id=creer_hacker(2).id)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.connecter(hacker_id=self.hacker.id)
+        reponse = self.client.get(self.url)
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual(self.lire(reponse), self.contenu)
+        self.assertIn('private', reponse['Cache-Control'])
+
+    def test_staff_et_chemins_hors_media(self):
+        self.client.force_login(User.objects.create_user("moderateur", password="x", is_staff=True))
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.assertEqual(self.client.get('/media/cni/../../settings.py').status_code, 404)
+        self.assertEqual(self.client.get(reverse('media', args=('cni/absent.png',))).status_code, 404)
+
+    def test_requetes_range(self):
+        self.connecter(hacker_id=self.hacker.id)
+        reponse = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(reponse.status_code, 206)
+        self.assertEqual(reponse['Content-Range'], f'bytes 10-19/{len(self.contenu)}')
+        self.assertEqual(self.lire(reponse), self.contenu[10:20])
+        reponse = self.client.get(self.url, HTTP_RANGE='bytes=-100')
+        self.assertEqual(self.lire(reponse), self.contenu[-100:])
+        self.assertEqual(int(reponse['Content-Length']), 100)
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE='bytes=5000-').status_code, 416)
+
+    @override_settings(MEDIAS_ENVOI='x-accel-redirect')
+    def test_x_accel_redirect(self):
+        self.connecter(hacker_id=self.hacker.id)
+        reponse = self.client.get(self.url)
+        self.assertEqual(reponse['X-Accel-Redirect'], '/media-protege/cni/scan.png')
+        self.assertEqual(reponse.content, b'')
+
+
+class AdminListesTests(TestCase):
+    BUDGET_DEFAUT = 6
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_superuser("admin", "admin@exemple.dz", "x")
+        cls.hackers = [creer_hacker(n) for n in range(1, 26)]
+        for n in range(3):
+            creer_programme(f"Programme {n}")
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def liste(self, modele, **parametres):
+        url = reverse(f'admin:{modele._meta.app_label}_{modele._meta.model_name}_changelist')
+        with CaptureQueriesContext(connection) as requetes:
+            reponse = self.client.get(url, parametres)
+        self.assertEqual(reponse.status_code, 200)
+        return reponse, requetes
+
+    def test_budget_de_requetes(self):
+        for modele, model_admin in site._registry.items():
+            with self.subTest(modele._meta.label):
+                _, requetes = self.liste(modele)
+                budget = getattr(model_admin, 'budget_requetes', self.BUDGET_DEFAUT)
+                self.assertLessEqual(len(requetes), budget, "\n".join(q['sql'] for q in requetes))
+
+    def test_pagination_par_curseur(self):
+        with mock.patch.object(site._registry[UserHacker], 'list_per_page', 10):
+            reponse, _ = self.liste(UserHacker)
+            premiere = list(reponse.context['cl'].result_list)
+            suivante = reponse.context['cl'].url_page_suivante
+            self.assertEqual(suivante, f"?apres={premiere[-1].pk}")
+            reponse, requetes = self.liste(UserHacker, apres=premiere[-1].pk)
+        seconde = list(reponse.context['cl'].result_list)
+        self.assertEqual([h.pk for h in premiere + seconde], sorted((h.pk for h in self.hackers), reverse=True)[:20])
+        self.assertFalse(any('OFFSET' in q['sql'] for q in requetes))
+        self.assertContains(reponse, "Première page")
+
+    def test_compte_estime(self):
+        with connection.cursor() as curseur:
+            curseur.execute("ANALYZE")
+        with override_settings(ADMIN_SEUIL_ESTIMATION=20):
+            reponse, requetes = self.liste(UserHacker)
+            self.assertTrue(reponse.context['cl'].compte_estime)
+            self.assertFalse(any('COUNT(' in q['sql'] for q in requetes))
+            reponse, _ = self.liste(UserHacker, statut__exact='en_attente')
+            self.assertEqual(reponse.context['cl'].result_count, 20)
+        reponse, _ = self.liste(UserHacker, statut__exact='en_attente')
+        self.assertEqual(reponse.context['cl'].result_count, 25)
+        self.assertFalse(reponse.context['cl'].compte_estime)
+
+    def test_recherche_par_prefixe(self):
+        creer_hacker(99, nom="XNom1")
+        reponse, _ = self.liste(UserHacker, q="Nom1")
+        noms = {h.nom for h in reponse.context['cl'].result_list}
+        self.assertEqual(noms, {"Nom1", *(f"Nom{n}" for n in range(10, 20))})
+
+
+@override_settings(TACHES_ARRIERE_PLAN=False, TACHES_TAILLE_LOT=2)
+class TachesMasseTests(EcrituresSynchronesTestCase):
+    def setUp(self):
+        self.staff = User.objects.create_superuser("admin", "admin@exemple.dz", "x")
+        self.hackers = [creer_hacker(n) for n in range(1, 6)]
+
+    def lancer(self, action, ids):
+        with self.captureOnCommitCallbacks(execute=True):
+            tache = taches.lancer(action, ids, demandeur_id=self.staff.pk)
+        return TacheMasse.objects.get(pk=tache.pk)
+
+    def test_validation_par_lots_avec_erreurs(self):
+        UserHacker.objects.filter(pk=self.hackers[0].pk).update(statut='actif', verifiee=True)
+        tache = self.lancer('valider_hackers', [h.pk for h in self.hackers] + [999999])
+
+        self.assertEqual(tache.statut, 'terminee')
+        self.assertEqual((tache.total, tache.traites, tache.reussis, tache.echecs), (6, 6, 4, 2))
+        self.assertEqual(tache.erreurs, {str(self.hackers[0].pk): "Déjà validé", '999999': "Introuvable"})
+        self.assertEqual(taches.progression(tache), 100)
+        self.assertEqual(UserHacker.objects.filter(statut='actif', verifiee=True, cni_verifiee=True).count(), 4)
+        self.assertEqual(LogActivite.objects.filter(action='validation').count(), 4)
+        self.assertEqual(Notification.objects.filter(hacker__isnull=False).count(), 4)
+
+    def test_lot_en_erreur_et_reprise(self):
+        tache = TacheMasse.objects.create(
+            action='suspendre_hackers', ids=[h.pk for h in self.hackers], total=5, traites=2, statut='en_cours',
+        )
+        # Interrompue : plus d'avancement depuis le bail
+        TacheMasse.objects.filter(pk=tache.pk).update(date_modification=timezone.now() - timedelta(hours=1))
+        with mock.patch.object(taches, 'revoquer_sessions', side_effect=[RuntimeError("panne"), None]), \
+                self.assertLogs('accounts.taches', 'ERROR'):
+            call_command('executer_taches', stdout=StringIO())
+        tache.refresh_from_db()
+        self.assertEqual((tache.traites, tache.reussis, tache.echecs), (5, 1, 2))
+        self.assertEqual(set(tache.erreurs), {str(h.pk) for h in self.hackers[2:4]})
+        # Lot en échec annulé, lots déjà traités non rejoués
+        statuts = list(UserHacker.objects.order_by('pk').values_list('statut', flat=True))
+        self.assertEqual(statuts, ['en_attente', 'en_attente', 'en_attente', 'en_attente', 'suspendu'])
+
+    def test_tache_prise_par_un_seul_worker(self):
+        tache = TacheMasse.objects.create(action='suspendre_hackers', ids=[self.hackers[0].pk], total=1)
+        self.assertTrue(taches.prendre(tache.pk))
+        self.assertFalse(taches.prendre(tache.pk))
+        # Bail en cours : ni le pool ni executer_taches ne la rejouent
+        self.assertEqual(taches.executer(tache.pk).traites, 0)
+        self.assertEqual(UserHacker.objects.get(pk=self.hackers[0].pk).statut, 'en_attente')
+
+    def test_suspension_revoque_les_sessions_du_lot(self):
+        for hacker in self.hackers[:2]:
+            Session.objects.create(user_id=hacker.pk, user_type='hacker', cle_session=f"cle{hacker.pk}")
+        with mock.patch.object(taches, 'revoquer_sessions', wraps=sessions.revoquer_sessions) as revoquer:
+            tache = self.lancer('suspendre_hackers', [h.pk for h in self.hackers[:2]])
+        self.assertEqual(tache.reussis, 2)
+        self.assertEqual(revoquer.call_count, 1)
+        self.assertFalse(Session.objects.filter(actif=True).exists())
+
+    def test_rejet_de_rapports_met_a_jour_les_statistiques(self):
+        program = creer_programme()
+        rapports = [creer_rapport(program, self.hackers[0]), creer_rapport(program, self.hackers[1], statut='accepte')]
+        tache = self.lancer('rejeter_rapports', [r.pk for r in rapports])
+
+        self.assertEqual((tache.reussis, tache.echecs), (1, 1))
+        self.assertEqual(Report.objects.get(pk=rapports[0].pk).statut, 'rejete')
+        stats = statistiques.statistiques_programme(program.pk)
+        self.assertEqual(stats['par_statut']['rejete'], 1)
+        self.assertIsNotNone(stats['delai_tri_moyen'])
+        self.assertEqual(statistiques.comparer_statistiques(), [])
+
+    def test_action_admin(self):
+        self.client.force_login(self.staff)
+        with self.captureOnCommitCallbacks(execute=True):
+            reponse = self.client.post(reverse('admin:accounts_userhacker_changelist'), {
+                'action': 'suspendre_hackers', '_selected_action': [h.pk for h in self.hackers[:3]],
+            }, follow=True)
+        tache = TacheMasse.objects.get()
+        self.assertContains(reponse, reverse('admin:accounts_tachemasse_change', args=[tache.pk]))
+        self.assertEqual(tache.statut, 'terminee')
+        self.assertEqual(UserHacker.objects.filter(statut='suspendu').count(), 3)
+        reponse = self.client.get(reverse('admin:accounts_tachemasse_change', args=[tache.pk]))
+        self.assertContains(reponse, "100 %")
+
+
+class FausseConnexion:
+    def __init__(self):
+        self.fermee = False
+
+    def close(self):
+        self.fermee = True
+
+
+class PoolConnexionsTests(SimpleTestCase):
+    def acquerir(self, p, valide=True):
+        return p.acquerir(FausseConnexion, lambda c: valide, FausseConnexion.close)
+
+    def test_reutilisation_et_taille_bornee(self):
+        p = pool.Pool('test', taille=2, attente=0.05)
+        a, reprise = self.acquerir(p)
+        self.assertFalse(reprise)
+        b, _ = self.acquerir(p)
+        with self.assertRaises(pool.PoolEpuise):
+            self.acquerir(p)
+        p.rendre(a)
+        self.assertEqual(self.acquerir(p), (a, True))
+        p.jeter(b, FausseConnexion.close)
+        self.assertTrue(b.fermee)
+        etat = p.metriques()
+        self.assertEqual((etat['en_cours'], etat['creees'], etat['reutilisees'], etat['epuisements']), (1, 2, 1, 1))
+
+    def test_verification_apres_inactivite_et_renouvellement(self):
+        p = pool.Pool('test', verifier_apres=0, duree_max=3600)
+        a, _ = self.acquerir(p)
+        p.rendre(a)
+        b, reprise = self.acquerir(p, valide=False)
+        self.assertTrue(a.fermee)
+        self.assertFalse(reprise)
+        p.rendre(b)
+        p.duree_max = 0
+        c, _ = self.acquerir(p)
+        self.assertTrue(b.fermee)
+        self.assertIsNot(c, b)
+        self.assertEqual(p.metriques()['echecs_verification'], 1)
+
+    def test_backend_rend_la_connexion_en_fin_de_requete(self):
+        from django.db.backends.sqlite3.base import DatabaseWrapper
+
+        classe = type('DatabaseWrapper', (pool.ConnexionsPooleesMixin, DatabaseWrapper), {})
+        dossier = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, dossier)
+        reglages = {
+            **connection.settings_dict, 'NAME': os.path.join(dossier, 'pool.sqlite3'), 'CONN_MAX_AGE': 0,
+            'POOL': {'TAILLE': 1},
+        }
+        self.addCleanup(lambda: pool.oublier('test-pool').vider(lambda c: c.close()))
+        wrapper = classe(reglages, 'test-pool')
+
+        brutes = []
+        with mock.patch.object(DatabaseWrapper, 'init_connection_state') as init:
+            for _ in range(3):
+                with wrapper.cursor() as curseur:
+                    curseur.execute("SELECT 1")
+                brutes.append(wrapper.connection)
+                wrapper.close_if_unusable_or_obsolete()
+        self.assertIsNone(wrapper.connection)
+        self.assertEqual(len({id(brute) for brute in brutes}), 1)
+        self.assertEqual(init.call_count, 1)
+
+        # Fermée au milieu d'une transaction : jetée, pas rendue
+        wrapper.ensure_connection()
+        wrapper.set_autocommit(False)
+        wrapper.close()
+        self.assertEqual(wrapper.pool.metriques()['inactives'], 0)
+        self.assertEqual(wrapper.pool.metriques()['en_cours'], 0)
+
+
+REPLIQUE_TESTS = 'replique' in settings.DATABASES
+
+
+@unittest.skipUnless(REPLIQUE_TESTS, "réglages sans réplique (voir bugbounty_dz.settings_test)")
+@override_settings(BASE_REPLIQUE='replique', JOURNAL_ARRIERE_PLAN=False, SESSIONS_ARRIERE_PLAN=False, GRAND_LIVRE_ARRIERE_PLAN=False)
+class RepliqueTests(TransactionTestCase):
+    # Sans transaction englobante : lectures hors transaction comme en production
+    databases = {'default', 'replique'} if REPLIQUE_TESTS else {'default'}
+
+    def tearDown(self):
+        journal.vider()
+        sessions.vider()
+        grand_livre.vider()
+        super().tearDown()
+
+    def setUp(self):
+        self.staff = User.objects.create_superuser("admin", "admin@exemple.dz", "x")
+        program = creer_programme()
+        for n in range(3):
+            creer_rapport(program, creer_hacker(n))
+
+    def exporter(self, **cookies):
+        self.client.cookies.load(cookies)
+        reponse = self.client.get(reverse('export', args=['rapports']), {'format': 'ndjson'})
+        return len(b''.join(reponse.streaming_content).splitlines())
+
+    def test_routage(self):
+        self.assertEqual(Report.objects.all().db, 'default')
+        with routeurs.lecture_replique():
+            self.assertEqual(Report.objects.all().db, 'replique')
+            self.assertEqual(Report.objects.count(), 0)
+            Report.objects.filter(statut='soumis').update(statut='en_revision')
+            # Relit ses propres écritures
+            self.assertEqual(Report.objects.all().db, 'default')
+        with transaction.atomic(), routeurs.lecture_replique():
+            self.assertEqual(Report.objects.all().db, 'default')
+        with override_settings(BASE_REPLIQUE=None), routeurs.lecture_replique():
+            self.assertEqual(Report.objects.all().db, 'default')
+
+    def test_lecture_collante_apres_ecriture(self):
+        self.client.force_login(self.staff)
+        # Réplique non alimentée : l'export y lit 0 ligne
+        self.assertEqual(self.exporter(), 0)
+        reponse = self.client.post(reverse('notifications_non_lues'))
+        self.assertIn(routeurs.COOKIE_COLLANT, reponse.cookies)
+        self.assertEqual(self.exporter(), 3)
+        self.assertEqual(self.exporter(**{routeurs.COOKIE_COLLANT: '0'}), 0)
+
+    def test_liste_admin_sur_la_replique(self):
+        self.client.force_login(self.staff)
+        reponse = self.client.get(reverse('admin:accounts_report_changelist'))
+        self.assertEqual(reponse.context['cl'].result_count, 0)
+
+
+class ConfigurationTests(TestCase):
+    def setUp(self):
+        configuration.vider()
+        self.addCleanup(configuration.vider)
+        AdminConfig.objects.bulk_create([
+            AdminConfig(cle='taux_commission_defaut', valeur='0.15', type_valeur='decimal'),
+            AdminConfig(cle='rapports_par_jour', valeur='20', type_valeur='integer'),
+            AdminConfig(cle='severites', valeur='["Critique", "Haute"]', type_valeur='json'),
+            AdminConfig(cle='nom', valeur='BugBounty DZ', type_valeur=None),
+        ])
+
+    def test_valeurs_typees_sans_requete(self):
+        AdminConfig.objects.create(cle='casse', valeur='{', type_valeur='json')
+        with self.assertLogs('accounts.configuration', 'WARNING'):
+            self.assertEqual(configuration.valeur('taux_commission_defaut'), Decimal('0.15'))
+        with self.assertNumQueries(0):
+            self.assertEqual(configuration.valeur('rapports_par_jour'), 20)
+            self.assertEqual(configuration.valeur('severites'), ["Critique", "Haute"])
+            self.assertEqual(configuration.valeur('nom'), "BugBounty DZ")
+            self.assertEqual(configuration.valeur('casse', {}), {})
+            self.assertEqual(paiements.taux_commission_defaut(), Decimal('0.15'))
+
+    @override_settings(CONFIGURATION_INTERVALLE=0)
+    def test_invalidation_apres_commit(self):
+        configuration.valeur('rapports_par_jour')
+        ligne = AdminConfig.objects.get(cle='rapports_par_jour')
+        ligne.valeur = '50'
+        with self.captureOnCommitCallbacks(execute=True):
+            ligne.save()
+            # Pas encore commité : l'ancienne version reste servie
+            with self.assertNumQueries(0):
+                self.assertEqual(configuration.valeur('rapports_par_jour'), 20)
+        self.assertEqual(configuration.valeur('rapports_par_jour'), 50)
+
+        # Autre processus : seule la version du cache partagé change
+        AdminConfig.objects.filter(cle='rapports_par_jour').update(valeur='60')
+        cache.incr(configuration.CLE_VERSION)
+        self.assertEqual(configuration.valeur('rapports_par_jour'), 60)
+
+    def test_validation_admin(self):
+        with self.assertRaises(ValidationError):
+            AdminConfig(cle='x', valeur='abc', type_valeur='decimal').full_clean()
+
+
+class CatalogueTests(TestCase):
+    def setUp(self):
+        catalogue.invalider_catalogue()
+        self.web = creer_programme("Web", statut='actif')
+        self.mobile = creer_programme("Mobile", statut='actif')
+        self.brouillon = creer_programme("Brouillon")
+        catalogue.definir_facettes(self.web, 'vulnerabilite', "XSS, SQL injection ; xss")
+        catalogue.definir_facettes(self.web, 'domaine', ["https://app.exemple.dz/login", "*.dz"])
+        catalogue.definir_facettes(self.web, 'severite', "critical, Haute")
+        catalogue.definir_facettes(self.mobile, 'vulnerabilite', "IDOR|XSS")
+        catalogue.definir_facettes(self.brouillon, 'vulnerabilite', "XSS")
+
+    def test_facettes_normalisees(self):
+        self.assertEqual(
+            set(Facette.objects.values_list('type_facette', 'valeur')),
+            {('vulnerabilite', 'xss'), ('vulnerabilite', 'sql-injection'), ('vulnerabilite', 'idor'),
+             ('domaine', 'https://app.exemple.dz/login'), ('domaine', '*.dz'), ('severite', 'Critique'), ('severite', 'Élevée')},
+        )
+        catalogue.definir_facettes(self.web, 'vulnerabilite', "SQL Injection")
+        self.assertEqual(list(self.web.facettes.filter(type_facette='vulnerabilite').values_list('valeur', flat=True)),
+                         ['sql-injection'])
+
+    def test_domaines_sans_elargissement(self):
+        migration = importlib.import_module('accounts.migrations.0015_facettes_programmes')
+        for texte, attendu in (("HTTPS://Api.X.dz/v1", 'https://api.x.dz/v1'), ("x.dz:8443", 'x.dz:8443'),
+                               ("x.dz.", 'x.dz')):
+            self.assertEqual(catalogue.normaliser('domaine', texte), (attendu, attendu))
+            self.assertEqual(migration._normaliser('domaine', texte), (attendu, attendu))
+
+    def test_filtres_et_comptes_sans_requete(self):
+        catalogue.catalogue()
+        with self.assertNumQueries(0):
+            tout = catalogue.catalogue()
+            xss_dz = catalogue.catalogue({'vulnerabilite': ['xss'], 'domaine': ['*.DZ']})
+        self.assertEqual(tout['total'], 2)
+        self.assertEqual(tout['facettes']['vulnerabilite']['xss']['programmes'], 2)
+        self.assertEqual([p['id'] for p in xss_dz['programmes']], [self.web.pk])
+        self.assertEqual(xss_dz['facettes']['vulnerabilite'], {
+            'xss': {'libelle': "XSS", 'programmes': 1},
+            'sql-injection': {'libelle': "SQL injection", 'programmes': 1},
+        })
+        self.assertEqual(xss_dz['programmes'][0]['facettes']['severite'], ['Critique', 'Élevée'])
+        self.assertEqual(catalogue.catalogue({'vulnerabilite': ['inconnue']})['total'], 0)
+
+    def test_invalidation_et_vue(self):
+        version = catalogue.catalogue()['version']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.mobile.statut = 'suspendu'
+            self.mobile.save()
+        reponse = self.client.get(reverse('catalogue_programmes'), {'vulnerabilite': 'XSS'})
+        self.assertEqual(reponse.status_code, 200)
+        donnees = reponse.json()
+        self.assertNotEqual(donnees['version'], version)
+        self.assertEqual([p['nom'] for p in donnees['programmes']], ["Web"])
+        self.assertEqual(self.client.get(reverse('catalogue_programmes'), {'limite': 'x'}).status_code, 400)
+
+
+class PerimetreTests(TestCase):
+    PORTEE = """
+        api.exemple.dz
+        *.exemple.dz, - admin.exemple.dz
+        10.0.0.0/8
+        ! 10.0.5.0/24
+        2001:db8::/32
+        https://portail.dz/api/
+    """
+
+    def test_regles(self):
+        regles = perimetre.Perimetre(perimetre.entrees_portee(self.PORTEE))
+        self.assertEqual(regles.nombre, 7)
+        attendus = {
+            'api.exemple.dz': True, 'API.Exemple.dz.': True, 'a.b.exemple.dz': True, 'exemple.dz': False,
+            'admin.exemple.dz': False, 'autre.dz': False, 'api.exemple.dz:8443': True,
+            '10.1.2.3': True, '10.0.5.7': False, '11.0.0.1': False, '2001:db8::1': True,
+            'https://portail.dz/api/v1/users': True, 'https://portail.dz/admin': False,
+            'http://portail.dz/api/': False, 'https://portail.dz:443/api/x': True,
+            'https://www.exemple.dz/n-importe': True, 'https://admin.exemple.dz/': False,
+        }
+        self.assertEqual(regles.classer(attendus), attendus)
+
+    def test_segments_et_ports(self):
+        regles = perimetre.Perimetre([
+            'https://exemple.dz/api', 'exemple.dz:8443', '- *.interne.dz:8443', '*.interne.dz:9000', '[2001:db8::1]:8443',
+        ])
+        self.assertEqual(regles.nombre, 5)
+        attendus = {
+            'https://exemple.dz/api': True, 'https://exemple.dz/api/v1': True, 'https://exemple.dz/apiadmin': False,
+            'https://exemple.dz/api2': False, 'https://exemple.dz/': False,
+            'exemple.dz:8443': True, 'https://exemple.dz:8443/admin': True, 'exemple.dz': False, 'exemple.dz:8080': False,
+            'a.interne.dz:9000': True, 'http://a.interne.dz:9000/': True, 'a.interne.dz:8443': False,
+            '[2001:db8::1]:8443': True, 'https://[2001:db8::1]:8443/': True, '2001:db8::1': False,
+        }
+        self.assertEqual(regles.classer(attendus), attendus)
+
+    def test_cache_par_date_de_modification(self):
+        perimetre._compiles.vider()
+        program = creer_programme(portee="api.exemple.dz")
+        catalogue.definir_facettes(program, 'domaine', "*.portail.dz")
+        program = Program.objects.get(pk=program.pk)
+        self.assertTrue(perimetre.dans_perimetre(program, 'www.portail.dz'))
+        with self.assertNumQueries(0):
+            self.assertTrue(perimetre.dans_perimetre(program, 'api.exemple.dz'))
+
+        program.portee = "- www.portail.dz"
+        program.save()
+        self.assertFalse(perimetre.dans_perimetre(program.pk, 'www.portail.dz'))
+        catalogue.definir_facettes(program, 'domaine', "")
+        self.assertFalse(perimetre.dans_perimetre(program.pk, 'autre.portail.dz'))
+
+    def test_facettes_ports_et_chemins(self):
+        program = creer_programme()
+        catalogue.definir_facettes(program, 'domaine', ["https://api.x.dz/v1", "x.dz:8443", "portail.dz/api"])
+        attendus = {
+            'https://api.x.dz/v1/users': True, 'https://api.x.dz/admin': False, 'api.x.dz': False,
+            'x.dz:8443': True, 'x.dz': False, 'x.dz:443': False,
+            'http://portail.dz/api/v1': True, 'https://portail.dz/api': True, 'https://portail.dz/': False,
+        }
+        self.assertEqual(perimetre.perimetre_programme(program.pk).classer(attendus), attendus)
+
+    def test_vue(self):
+        program = creer_programme(portee="*.exemple.dz")
+        url = reverse('perimetre_programme', args=[program.pk])
+        self.assertEqual(self.client.get(url, {'actif': 'a.exemple.dz'}).status_code, 401)
+        session = self.client.session
+        session['enterprise_id'] = program.enterprise_id
+        session.save()
+        reponse = self.client.get(url, {'actif': ['a.exemple.dz', '10.0.0.1']})
+        self.assertEqual(reponse.json(), {'perimetre': {'a.exemple.dz': True, '10.0.0.1': False}})
+        self.assertEqual(self.client.get(url).status_code, 400)
+
+
+class CvssTests(TestCase):
+    GRILLE = {'Critique': {'min': 3000, 'max': 5000}, 'high': [1000, 2000], 'Moyenne': 500}
+    VECTEURS = {
+        'CVSS:3.1/AV:N/AC:L/PR:N/UI:N/S:U/C:H/I:H/A:H': ('9.8', 'Critique', '4600.00'),
+        'CVSS:3.1/AV:N/AC:L/PR:N/UI:N/S:C/C:H/I:H/A:H': ('10.0', 'Critique', '5000.00'),
+        'CVSS:3.1/AV:N/AC:L/PR:N/UI:R/S:C/C:L/I:L/A:N': ('6.1', 'Moyenne', '500.00'),
+        'CVSS:3.0/AV:N/AC:L/PR:L/UI:N/S:U/C:H/I:N/A:N/E:P': ('6.5', 'Moyenne', '500.00'),
+        'CVSS:3.1/AV:L/AC:H/PR:H/UI:R/S:U/C:L/I:N/A:N': ('1.8', 'Basse', '50.00'),
+        'CVSS:3.1/AV:N/AC:L/PR:N/UI:N/S:U/C:N/I:N/A:N': ('0.0', None, None),
+        'CVSS:3.1/AV:N/AC:L': None,
+    }
+
+    def attendus(self):
+        return [
+            None if attendu is None else (
+                Decimal(attendu[0]), attendu[1], None if attendu[2] is None else Decimal(attendu[2]),
+            )
+            for attendu in self.VECTEURS.values()
+        ]
+
+    def test_scores_et_grille(self):
+        table = cvss.bareme({**self.GRILLE, 'Basse': 10}, Decimal('50.00'))
+        vecteurs = list(self.VECTEURS) * 2
+        self.assertEqual(cvss.evaluer(vecteurs, table), self.attendus() * 2)
+        with mock.patch.object(cvss, 'np', None):
+            self.assertEqual(cvss.evaluer(vecteurs, table), self.attendus() * 2)
+        with self.assertRaises(cvss.VecteurInvalide):
+            cvss.score('CVSS:3.1/AV:X/AC:L/PR:N/UI:N/S:U/C:H/I:H/A:H')
+        for grille in ({'Urgente': 100}, {'Critique': [500, 100]}, {'Basse': 'beaucoup'}, [100]):
+            with self.assertRaises(cvss.BaremeInvalide):
+                cvss.bareme(grille)
+        program = creer_programme(recompenses_config={'Critique': 'x'})
+        with self.assertRaises(ValidationError):
+            program.clean()
+
+    def test_notation_a_l_enregistrement(self):
+        program = creer_programme(recompenses_config=self.GRILLE)
+        rapport = creer_rapport(
+            program, creer_hacker(1), statut='accepte', vecteur_cvss='CVSS:3.1/AV:N/AC:L/PR:N/UI:R/S:C/C:L/I:L/A:N',
+        )
+        rapport = Report.objects.get(pk=rapport.pk)
+        self.assertEqual((rapport.severite_cvss, rapport.severite_label, rapport.montant_propose),
+                         (Decimal('6.1'), 'Moyenne', Decimal('500.00')))
+        self.assertEqual(statistiques.statistiques_programme(program.pk)['par_severite']['Moyenne'], 1)
+
+        rapport.vecteur_cvss = 'CVSS:3.1/AV:N/AC:L/PR:N/UI:N/S:U/C:H/I:H/A:H'
+        rapport.save()
+        self.assertEqual(Report.objects.get(pk=rapport.pk).severite_label, 'Critique')
+        self.assertEqual(statistiques.comparer_statistiques(), [])
+        self.assertEqual(Leaderboard.objects.get(hacker_id=rapport.hacker_id).bugs_critiques, 1)
+
+    def test_grille_invalide_a_l_enregistrement(self):
+        program = creer_programme()
+        Program.objects.filter(pk=program.pk).update(recompenses_config={'Critique': 'x'})
+        program.refresh_from_db()
+        with self.assertLogs('accounts.signals', 'ERROR'):
+            rapport = creer_rapport(
+                program, creer_hacker(1), vecteur_cvss='CVSS:3.1/AV:N/AC:L/PR:N/UI:N/S:U/C:H/I:H/A:H',
+            )
+        rapport = Report.objects.get(pk=rapport.pk)
+        self.assertEqual((rapport.severite_label, rapport.montant_propose), ('Critique', None))
+
+    @override_settings(TACHES_ARRIERE_PLAN=False)
+    def test_retarification_du_programme(self):
+        program = creer_programme(recompenses_config=self.GRILLE)
+        hacker = creer_hacker(1)
+        vecteurs = list(self.VECTEURS)
+        rapports = [creer_rapport(program, hacker, vecteur_cvss=vecteur) for vecteur in vecteurs[:3]]
+        paye = creer_rapport(program, hacker, statut='paye', vecteur_cvss=vecteurs[0])
+
+        Program.objects.filter(pk=program.pk).update(recompenses_config={'Critique': 8000, 'Moyenne': [100, 400]})
+        with self.captureOnCommitCallbacks(execute=True):
+            tache = taches.lancer('retarifer_programmes', [program.pk, 999999])
+        tache.refresh_from_db()
+        self.assertEqual((tache.reussis, tache.echecs), (1, 1))
+        montants = [Report.objects.get(pk=r.pk).montant_propose for r in rapports]
+        self.assertEqual(montants, [Decimal('8000.00'), Decimal('8000.00'), Decimal('317.24')])
+        self.assertEqual(Report.objects.get(pk=paye.pk).montant_propose, Decimal('4600.00'))
+        self.assertEqual(statistiques.comparer_statistiques(), [])
+
+
+class ReferencesTests(TestCase):
+    def test_sequences_par_programme_et_globale(self):
+        hacker = creer_hacker(1)
+        premier, second = creer_programme("Un"), creer_programme("Deux")
+        numeros = [creer_rapport(program, hacker).numero_reference for program in (premier, premier, second)]
+        self.assertEqual(numeros, [f"BB-{premier.pk}-00001", f"BB-{premier.pk}-00002", f"BB-{second.pk}-00001"])
+        self.assertEqual(creer_rapport(premier, hacker, numero_reference="MANUEL-1").numero_reference, "MANUEL-1")
+
+        with override_settings(REFERENCES_PAR_PROGRAMME=False, REFERENCES_PREFIXE='DZ'):
+            rapports = references.attribuer([Report(program=premier, hacker=hacker) for _ in range(3)])
+        self.assertEqual([r.numero_reference for r in rapports], ["DZ-0000001", "DZ-0000002", "DZ-0000003"])
+        # Dans une transaction : réservation au plus juste, annulée avec elle
+        self.assertEqual(SequenceReference.objects.get(cle='global').prochain, 4)
+
+
+@override_settings(
+    JOURNAL_ARRIERE_PLAN=False, SESSIONS_ARRIERE_PLAN=False, GRAND_LIVRE_ARRIERE_PLAN=False, REFERENCES_TAILLE_BLOC=20,
+)
+class ReferencesConcurrentesTests(TransactionTestCase):
+    WORKERS = 8
+    RAPPORTS = 250
+
+    def tearDown(self):
+        journal.vider()
+        sessions.vider()
+        grand_livre.vider()
+        super().tearDown()
+
+    def test_blocs_hors_transaction(self):
+        allocateur = references.Allocateur()
+        with override_settings(REFERENCES_TAILLE_BLOC=10):
+            numeros = [allocateur.numeros('programme:1', 3, 'default') for _ in range(5)]
+            autre = references.Allocateur().numeros('programme:1', 1, 'default')
+        self.assertEqual(sum(numeros, []), list(range(1, 16)))
+        self.assertEqual(autre, [21])
+        self.assertEqual(allocateur.reservations, 2)
+        self.assertEqual(SequenceReference.objects.get(cle='programme:1').prochain, 31)
+
+    def test_soumissions_paralleles_sans_collision(self):
+        program = creer_programme()
+        hackers = [creer_hacker(n) for n in range(self.WORKERS)]
+        # Un allocateur par « processus » ; deux threads partagent chacun
+        allocateurs = [references.Allocateur() for _ in range(self.WORKERS // 2)]
+        erreurs = []
+
+        def soumettre(n):
+            try:
+                allocateur = allocateurs[n // 2]
+                for i in range(self.RAPPORTS):
+                    rapport = allocateur.attribuer([Report(program=program, hacker=hackers[n])])[0]
+                    rapport.titre, rapport.description = f"Rapport {n}-{i}", "-"
+                    rapport.save()
+            except Exception as e:
+                erreurs.append(e)
+            finally:
+                connection.close()
+
+        fils = [threading.Thread(target=soumettre, args=(n,)) for n in range(self.WORKERS)]
+        for fil in fils:
+            fil.start()
+        for fil in fils:
+            fil.join()
+
+        self.assertEqual(erreurs, [])
+        numeros = list(Report.objects.values_list('numero_reference', flat=True))
+        self.assertEqual(len(numeros), self.WORKERS * self.RAPPORTS)
+        self.assertEqual(len(set(numeros)), len(numeros))
+        self.assertLessEqual(sum(a.reservations for a in allocateurs), len(numeros) // 20 + len(allocateurs))
+
+
+@override_settings(GRAND_LIVRE_ARRIERE_PLAN=False)
+class GrandLivreTests(TestCase):
+    def setUp(self):
+        self.hacker = creer_hacker(1)
+        self.compte = grand_livre.compte('hacker', self.hacker.pk)
+
+    def tearDown(self):
+        grand_livre.vider()
+        super().tearDown()
+
+    def crediter(self, montant):
+        return grand_livre.passer([grand_livre.mouvement('bonus', [(self.compte, montant), ('externe:bonus', -montant)])])
+
+    def test_mouvement_equilibre(self):
+        with self.assertRaises(grand_livre.MouvementDesequilibre):
+            grand_livre.mouvement('bonus', [(self.compte, Decimal('10.00')), ('externe:bonus', Decimal('-9.99'))])
+        lignes = grand_livre.mouvement('bonus', [(self.compte, 5), ('externe:bonus', -5), (grand_livre.COMMISSIONS, 0)])
+        self.assertEqual([ligne.compte for ligne in lignes], [self.compte, 'externe:bonus'])
+        self.assertEqual(len({ligne.mouvement for ligne in lignes}), 1)
+
+    def test_solde_arrete_plus_queue(self):
+        self.crediter(Decimal('100.00'))
+        self.crediter(Decimal('-30.00'))
+        arret = timezone.now()
+        self.assertEqual(grand_livre.arreter_soldes(arret), 2)
+        self.assertEqual(grand_livre.arreter_soldes(arret), 0)
+        self.assertEqual(SoldeGrandLivre.objects.get(compte=self.compte).solde, Decimal('70.00'))
+        self.crediter(Decimal('5.00'))
+
+        # Dernier arrêté (une requête) puis écritures suivantes (une requête)
+        with self.assertNumQueries(2):
+            solde = grand_livre.solde(self.compte)
+        self.assertEqual(solde, grand_livre.Solde(Decimal('75.00'), Decimal('105.00'), Decimal('30.00')))
+        self.assertEqual(grand_livre.solde(self.compte, date=arret).solde, Decimal('70.00'))
+        self.assertEqual(grand_livre.solde('hacker:0'), grand_livre.SOLDE_NUL)
+
+    def test_projection_apres_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.crediter(Decimal('40.00'))
+            self.crediter(Decimal('2.50'))
+        self.hacker.refresh_from_db()
+        self.assertEqual(self.hacker.solde_credit, Decimal('0.00'))
+        self.assertEqual(grand_livre.vider(), 2)
+        self.hacker.refresh_from_db()
+        self.assertEqual((self.hacker.solde_credit, self.hacker.revenus_totaux), (Decimal('42.50'), Decimal('42.50')))
+
+    def test_dotation_sur_changement_de_budget(self):
+        program = creer_programme(budget_total=Decimal('1000.00'))
+        compte = grand_livre.compte('programme', program.pk)
+        program.budget_total = Decimal('1500.00')
+        program.save()
+        program.nom = "Renommé"
+        program.save()
+        self.assertEqual(
+            list(EcritureGrandLivre.objects.filter(compte=compte).values_list('nature', 'montant')),
+            [('dotation', Decimal('1000.00')), ('dotation', Decimal('500.00'))],
+        )
+        self.assertEqual(grand_livre.solde('externe:dotations').solde, Decimal('-1500.00'))
+
+    def test_projection_calculee_dans_l_update(self):
+        self.crediter(Decimal('100.00'))
+        grand_livre.arreter_soldes(timezone.now())
+        self.crediter(Decimal('-25.00'))
+        UserHacker.objects.filter(pk=self.hacker.pk).update(solde_credit=Decimal('1.00'))
+        with self.assertNumQueries(1):
+            self.assertEqual(grand_livre.projeter_maintenant({self.compte, 'externe:bonus'}), 1)
+        self.hacker.refresh_from_db()
+        self.assertEqual((self.hacker.solde_credit, self.hacker.revenus_totaux), (Decimal('75.00'), Decimal('100.00')))
+
+    def test_save_complet_reprojete(self):
+        perime = UserHacker.objects.get(pk=self.hacker.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.crediter(Decimal('30.00'))
+        grand_livre.vider()
+        # Instance chargée avant le crédit : son save() réécrit l'ancien solde...
+        perime.nom = "Renommé"
+        with self.captureOnCommitCallbacks(execute=True):
+            perime.save()
+        grand_livre.vider()
+        # ... aussitôt corrigé par la projection
+        self.hacker.refresh_from_db()
+        self.assertEqual((self.hacker.nom, self.hacker.solde_credit), ("Renommé", Decimal('30.00')))
+
+    def test_soldes_en_lecture_seule_dans_l_admin(self):
+        for modele, colonnes in ((UserHacker, {'solde_credit', 'revenus_totaux'}),
+                                 (Enterprise, {'solde_budget', 'solde_depense'}),
+                                 (Program, {'budget_restant', 'budget_depense'})):
+            self.assertLessEqual(colonnes, set(site._registry[modele].get_readonly_fields(None)))
+
+    def test_commande_arreter(self):
+        self.crediter(Decimal('12.00'))
+        sortie = StringIO()
+        call_command('arreter_grand_livre', '--date', timezone.now().isoformat(), '--projeter', stdout=sortie)
+        self.assertIn("2 solde(s) arrêté(s)", sortie.getvalue())
+        self.hacker.refresh_from_db()
+        self.assertEqual(self.hacker.solde_credit, Decimal('12.00'))
+
+
+class PlansRequetesTests(TestCase):
+    """Chaque requête du registre doit rester servie par un index"""
+    @classmethod
+    def setUpTestData(cls):
+        hackers = [creer_hacker(n) for n in range(1, 6)]
+        for p in range(3):
+            program = creer_programme(f"Programme {p}")
+            for hacker in hackers:
+                for statut in ('soumis', 'accepte', 'rejete'):
+                    creer_rapport(program, hacker, statut=statut)
+        Transaction.objects.bulk_create([
+            Transaction(hacker=hacker, type_transaction='bonus', montant_brut=1, montant_net=1, statut=statut)
+            for hacker in hackers for statut in ('en_attente', 'completee', 'rejetee')
+        ])
+        Session.objects.bulk_create([
+            Session(user_id=hacker.id, user_type='hacker', token_jwt='x', actif=actif)
+            for hacker in hackers for actif in (True, False)
+        ])
+        if connection.vendor == 'mysql':
+            with connection.cursor() as curseur:
+                curseur.execute("ANALYZE TABLE reports, transactions, sessions, notifications, leaderboard")
+
+    def test_requetes_indexees(self):
+        for nom in requetes.REQUETES:
+            with self.subTest(nom):
+                etapes, problemes = requetes.problemes(nom)
+                plan = "\n".join(etape['detail'] for etape in etapes)
+                self.assertEqual(problemes, [], f"Plan de {nom} :\n{plan}")
+
+    def test_detection_parcours_complet(self):
+        etapes = requetes.plan(Report.objects.filter(titre="XSS"))
+        self.assertTrue(any(etape['parcours_complet'] for etape in etapes))
+
+    def test_commande(self):
+        sortie = StringIO()
+        call_command('plans_requetes', 'sessions_actives', stdout=sortie)
+        self.assertIn('sessions_actives', sortie.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('plans_requetes', 'inconnue', stdout=StringIO())
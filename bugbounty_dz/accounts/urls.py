@@ -1,6 +1,9 @@
 from django.urls import path
 from .views import Home, HackerLoginView, HackerRegisterView
 from .views import HackerHomeView, HackerLogoutView,enterprise_register, enterprise_login
+from .views import ClassementView, MonClassementView, NotificationsNonLuesView
+from .views import StatistiquesProgrammeView, ExportView, RapportsSimilairesView, MiniatureView
+from .views import MediaProtegeView, EtatPoolView, CatalogueProgrammesView, PerimetreView
 
 urlpatterns = [
     path('', Home.as_view(), name='home'),
@@ -10,4 +13,15 @@ urlpatterns = [
     path('hacker/logout/', HackerLogoutView.as_view(), name='hacker_logout'),
     path('enterprise/register/', enterprise_register, name='enterprise_register'),
     path("enterprise/login/", enterprise_login, name="enterprise_login"),
+    path('classement/', ClassementView.as_view(), name='classement'),
+    path('classement/moi/', MonClassementView.as_view(), name='classement_moi'),
+    path('notifications/non-lues/', NotificationsNonLuesView.as_view(), name='notifications_non_lues'),
+    path('programmes/<int:program_id>/statistiques/', StatistiquesProgrammeView.as_view(), name='statistiques_programme'),
+    path('exports/<str:nom>/', ExportView.as_view(), name='export'),
+    path('programmes/<int:program_id>/rapports-similaires/', RapportsSimilairesView.as_view(), name='rapports_similaires'),
+    path('miniatures/<int:taille>/<path:chemin>', MiniatureView.as_view(), name='miniature'),
+    path('media/<path:nom>', MediaProtegeView.as_view(), name='media'),
+    path('programmes/catalogue/', CatalogueProgrammesView.as_view(), name='catalogue_programmes'),
+    path('programmes/<int:program_id>/perimetre/', PerimetreView.as_view(), name='perimetre_programme'),
+    path('sante/pool/', EtatPoolView.as_view(), name='etat_pool'),
 ]
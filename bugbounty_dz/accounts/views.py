@@ -5,13 +5,35 @@ from .models import UserHacker
 import hashlib
 import os
 import binascii
-from django.core.files.storage import FileSystemStorage
 from django.contrib.auth.hashers import make_password
-from django.contrib.auth.hashers import check_password
-from .models import UserHacker, Enterprise
+from .models import UserHacker, Enterprise, Program
 from django.views.generic import TemplateView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib import messages
+from django.http import FileResponse, Http404, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.utils.http import parse_etags
+from .classement import page_classement, rang_hacker
+from .notifications import nombre_non_lues
+from .journal import journaliser
+from .statistiques import statistiques_programme
+from .exports import FORMATS, ExportErreur, exporter
+from .recherche import rapports_similaires
+from .authentification import authentifier
+from .medias import MediaIntrouvable, autorise, reponse_media
+from .miniatures import ImageIllisible, MiniatureIntrouvable, miniature
+from .televersements import enregistrer, erreurs_televersement, traiter_apres_commit
+from .db.pool import metriques
+from .routeurs import base_lecture, lecture_replique
+from .catalogue import TYPES as TYPES_FACETTES, catalogue
+from .perimetre import perimetre_programme
+
+
+MESSAGES_CONNEXION = {
+    'bloque': "Trop de tentatives échouées. Réessayez dans quelques minutes.",
+    'inconnu': "Aucun compte trouvé avec cet email",
+    'mot_de_passe': "Mot de passe incorrect",
+    'non_verifie': "Votre compte n'est pas encore vérifié.",
+}
 
 
 class Home(View):
@@ -27,38 +49,30 @@ class HackerLoginView(View):
         email = request.POST.get('email')
         mot_de_passe = request.POST.get('mot_de_passe')
 
-        try:
-            hacker = UserHacker.objects.get(email=email)
-
-            # 🔐 Vérification avec Django
-            if not check_password(mot_de_passe, hacker.mot_de_passe_hash):
-                error = "Mot de passe incorrect"
-
-            elif hacker.statut != 'actif':
-                error = f"Votre compte est {hacker.statut}. Contactez le support."
+        hacker, erreur = authentifier('hacker', request, email, mot_de_passe)
 
-            elif not hacker.verifiee:
-                error = "Votre compte n'est pas encore vérifié."
+        if erreur is None:
+            # Connexion réussie (date de connexion écrite par le backend)
+            request.session['hacker_id'] = hacker.id
+            request.session['hacker_email'] = hacker.email
+            request.session['hacker_nom'] = f"{hacker.prenom} {hacker.nom}"
+            request.session['user_type'] = 'hacker'
+            request.session['logged_in'] = True
 
-            else:
-                # Connexion réussie
-                request.session['hacker_id'] = hacker.id
-                request.session['hacker_email'] = hacker.email
-                request.session['hacker_nom'] = f"{hacker.prenom} {hacker.nom}"
-                request.session['user_type'] = 'hacker'
-                request.session['logged_in'] = True
-
-                hacker.date_derniere_connexion = timezone.now()
-                hacker.save()
+            journaliser('connexion', hacker.id, 'hacker', request=request)
 
-                return redirect('hacker_home')
+            return redirect('hacker_home')
 
-        except UserHacker.DoesNotExist:
-            error = "Aucun compte trouvé avec cet email"
+        if erreur == 'statut':
+            error = f"Votre compte est {hacker.statut}. Contactez le support."
+        else:
+            error = MESSAGES_CONNEXION[erreur]
 
         return render(request, "hackerlogin.html", {
             "error": error
         })
+
+
 class HackerRegisterView(View):
     def get(self, request):
         return render(request, "hackerregister.html")
@@ -75,6 +89,13 @@ class HackerRegisterView(View):
         mot_de_passe_confirm = request.POST.get('mot_de_passe_confirm')
         cni_image_file = request.FILES.get('cni_image')
 
+        # Fichier refusé à la réception (taille, type)
+        erreur_fichier = erreurs_televersement(request).get('cni_image')
+        if erreur_fichier:
+            return render(request, "hackerregister.html", {
+                "error": f"Image CIN : {erreur_fichier}"
+            })
+
         # Vérification des mots de passe
         if mot_de_passe != mot_de_passe_confirm:
             return render(request, "hackerregister.html", {
@@ -97,12 +118,8 @@ class HackerRegisterView(View):
                 "error": "Ce numéro de CIN est déjà utilisé"
             })
 
-        # Sauvegarde de l'image CIN
-        cni_image_path = None
-        if cni_image_file:
-            fs = FileSystemStorage(location='media/cni')
-            filename = fs.save(cni_image_file.name, cni_image_file)
-            cni_image_path = f"cni/{filename}"
+        # Sauvegarde de l'image CIN (nom dérivé du contenu)
+        cni_image_path = enregistrer(cni_image_file) if cni_image_file else None
 
         # 🔐 Hash du mot de passe avec Django
         mot_de_passe_hash = make_password(mot_de_passe)
@@ -125,19 +142,24 @@ class HackerRegisterView(View):
             date_creation=timezone.now()
         )
 
+        if cni_image_path:
+            traiter_apres_commit('cni', hacker.id, cni_image_path)
+
+        journaliser('inscription', hacker.id, 'hacker', entite_type='user', entite_id=hacker.id, request=request)
+
         return redirect('hacker_login')
 
 class HackerHomeView(View):
     def get(self, request):
-        hacker_id = request.session.get("hacker_id")
+        # Compte chargé par CompteCourantMiddleware (classement et participations préchargés)
+        hacker = request.account
 
-        if not hacker_id:
+        if not isinstance(hacker, UserHacker):
             return redirect("hacker_login")
 
-        hacker = UserHacker.objects.get(id=hacker_id)
-
         context = {
-            "hacker": hacker
+            "hacker": hacker,
+            "notifications_non_lues": nombre_non_lues(hacker_id=hacker.id),
         }
 
         return render(request, "hackerhome.html", context)
@@ -159,6 +181,12 @@ def enterprise_register(request):
         password = request.POST.get("mot_de_passe")
         registre_pdf = request.FILES.get("registre_commerce_pdf")  # PDF upload
 
+        # Fichier refusé à la réception (taille, type)
+        erreur_fichier = erreurs_televersement(request).get("registre_commerce_pdf")
+        if erreur_fichier:
+            messages.error(request, f"Registre de commerce : {erreur_fichier}")
+            return redirect("enterprise_register")
+
         # Vérification doublon email
         if Enterprise.objects.filter(email_entreprise=email).exists():
             messages.error(request, "Email déjà utilisé.")
@@ -173,9 +201,14 @@ def enterprise_register(request):
             contact_principal_nom=contact_nom,
             contact_principal_email=contact_email,
             mot_de_passe_hash=make_password(password),
-            registre_commerce_pdf=registre_pdf,  # Stockage du fichier + lien en BDD
+            registre_commerce_pdf=enregistrer(registre_pdf) if registre_pdf else None,  # nom dérivé du contenu
         )
 
+        if enterprise.registre_commerce_pdf:
+            traiter_apres_commit('registre', enterprise.id, enterprise.registre_commerce_pdf.name)
+
+        journaliser('inscription', enterprise.id, 'enterprise', entite_type='user', entite_id=enterprise.id, request=request)
+
         messages.success(request, "Inscription réussie. En attente de validation.")
         return redirect("enterprise_login")
 
@@ -188,22 +221,220 @@ def enterprise_login(request):
         email = request.POST.get("email_entreprise")
         password = request.POST.get("mot_de_passe")
 
-        try:
-            enterprise = Enterprise.objects.get(email_entreprise=email)
-        except Enterprise.DoesNotExist:
-            messages.error(request, "Email ou mot de passe incorrect.")
+        enterprise, erreur = authentifier('enterprise', request, email, password)
+
+        if erreur == 'bloque':
+            messages.error(request, MESSAGES_CONNEXION['bloque'])
             return redirect("enterprise_login")
 
-        if not check_password(password, enterprise.mot_de_passe_hash):
+        if erreur in ('inconnu', 'mot_de_passe'):
             messages.error(request, "Email ou mot de passe incorrect.")
             return redirect("enterprise_login")
 
-        if not enterprise.verifiee:
+        if erreur == 'non_verifie':
             messages.error(request, "Compte non encore validé par l'administration.")
             return redirect("enterprise_login")
 
         # Session entreprise
         request.session["enterprise_id"] = enterprise.id
+        journaliser('connexion', enterprise.id, 'enterprise', request=request)
         return redirect("enterprise_dashboard")  # dashboard à créer
 
     return render(request, "enterprise_login.html")
+
+
+# Classement (lecture depuis l'instantané du top-N)
+class ClassementView(View):
+    @lecture_replique()
+    def get(self, request):
+        try:
+            apres = max(int(request.GET.get('apres', 0)), 0)
+            limite = min(max(int(request.GET.get('limite', 50)), 1), 100)
+        except ValueError:
+            return JsonResponse({"error": "Paramètres de pagination invalides"}, status=400)
+
+        return JsonResponse(page_classement(apres=apres, limite=limite))
+
+
+class MonClassementView(View):
+    @lecture_replique()
+    def get(self, request):
+        hacker_id = request.session.get("hacker_id")
+
+        if not hacker_id:
+            return JsonResponse({"error": "Non connecté"}, status=401)
+
+        rang = rang_hacker(hacker_id)
+        if rang is None:
+            return JsonResponse({"error": "Pas encore classé"}, status=404)
+
+        return JsonResponse(rang)
+
+
+# Nombre de notifications non lues (compteur en cache)
+class NotificationsNonLuesView(View):
+    def get(self, request):
+        if request.session.get("hacker_id"):
+            nombre = nombre_non_lues(hacker_id=request.session["hacker_id"])
+        elif request.session.get("enterprise_id"):
+            nombre = nombre_non_lues(enterprise_id=request.session["enterprise_id"])
+        else:
+            return JsonResponse({"error": "Non connecté"}, status=401)
+
+        return JsonResponse({"non_lues": nombre})
+
+
+# Statistiques d'un programme (table program_stats, sans lecture des rapports)
+class StatistiquesProgrammeView(View):
+    @lecture_replique()
+    def get(self, request, program_id):
+        enterprise_id = request.session.get("enterprise_id")
+
+        if not enterprise_id:
+            return JsonResponse({"error": "Non connecté"}, status=401)
+
+        if not Program.objects.filter(pk=program_id, enterprise_id=enterprise_id).exists():
+            return JsonResponse({"error": "Programme introuvable"}, status=404)
+
+        stats = statistiques_programme(program_id)
+        if stats is None:
+            return JsonResponse({"error": "Statistiques indisponibles"}, status=404)
+
+        return JsonResponse(stats)
+
+
+# Export CSV / NDJSON des rapports et transactions (flux, sans tout charger)
+class ExportView(View):
+    def get(self, request, nom):
+        if request.user.is_authenticated and request.user.is_staff:
+            enterprise_id = None
+        elif request.session.get("enterprise_id"):
+            enterprise_id = request.session["enterprise_id"]
+        else:
+            return JsonResponse({"error": "Non connecté"}, status=401)
+
+        format = request.GET.get('format', 'csv')
+        try:
+            # Base fixée ici : le flux est lu après la sortie de la vue
+            with lecture_replique():
+                morceaux = exporter(nom, format, enterprise_id=enterprise_id, using=base_lecture())
+        except ExportErreur as e:
+            return JsonResponse({"error": str(e)}, status=400)
+
+        response = StreamingHttpResponse(morceaux, content_type=FORMATS[format])
+        response["Content-Disposition"] = f'attachment; filename="{nom}.{format}"'
+        return response
+
+
+# Rapports similaires d'un programme (détection de doublons au tri)
+class RapportsSimilairesView(View):
+    def get(self, request, program_id):
+        enterprise_id = request.session.get("enterprise_id")
+
+        if not enterprise_id:
+            return JsonResponse({"error": "Non connecté"}, status=401)
+
+        if not Program.objects.filter(pk=program_id, enterprise_id=enterprise_id).exists():
+            return JsonResponse({"error": "Programme introuvable"}, status=404)
+
+        titre = request.GET.get('titre', '').strip()
+        if not titre:
+            return JsonResponse({"error": "Titre requis"}, status=400)
+
+        try:
+            k = min(max(int(request.GET.get('k', 5)), 1), 50)
+            exclure = int(request.GET['exclure']) if request.GET.get('exclure') else None
+        except ValueError:
+            return JsonResponse({"error": "Paramètres invalides"}, status=400)
+
+        resultats = rapports_similaires(
+            program_id, titre,
+            description=request.GET.get('description', ''),
+            etapes_reproduction=request.GET.get('etapes_reproduction', ''),
+            k=k, exclure=exclure,
+        )
+        return JsonResponse({"resultats": resultats})
+
+
+# Miniatures des pièces justificatives (admin, générées et gardées en cache disque)
+class MiniatureView(View):
+    def get(self, request, taille, chemin):
+        if not (request.user.is_authenticated and request.user.is_staff):
+            return JsonResponse({"error": "Accès refusé"}, status=403)
+
+        try:
+            fichier, etag = miniature(chemin, taille)
+            if etag in parse_etags(request.headers.get("If-None-Match", "")):
+                response = HttpResponseNotModified()
+            else:
+                response = FileResponse(open(fichier, "rb"), content_type="image/jpeg")
+        except (MiniatureIntrouvable, FileNotFoundError):
+            raise Http404("Miniature introuvable")
+        except ImageIllisible:
+            return JsonResponse({"error": "Image illisible"}, status=415)
+
+        response["ETag"] = etag
+        response["Cache-Control"] = "private, max-age=31536000, immutable"
+        return response
+
+
+# Fichiers de MEDIA_ROOT, après contrôle d'accès (transfert confié au serveur frontal si configuré)
+class MediaProtegeView(View):
+    def get(self, request, nom):
+        if not autorise(request, nom):
+            raise Http404("Fichier introuvable")
+
+        try:
+            return reponse_media(request, nom)
+        except MediaIntrouvable:
+            raise Http404("Fichier introuvable")
+
+
+# État des pools de connexions de ce processus (staff)
+class EtatPoolView(View):
+    def get(self, request):
+        if not (request.user.is_authenticated and request.user.is_staff):
+            return JsonResponse({"error": "Accès refusé"}, status=403)
+
+        return JsonResponse({"pid": os.getpid(), "pools": metriques()})
+
+
+# Catalogue des programmes publics, filtré par facettes (instantané versionné, sans requête)
+class CatalogueProgrammesView(View):
+    def get(self, request):
+        try:
+            apres = int(request.GET['apres']) if request.GET.get('apres') else None
+            limite = min(max(int(request.GET.get('limite', 50)), 1), 100)
+        except ValueError:
+            return JsonResponse({"error": "Paramètres de pagination invalides"}, status=400)
+
+        filtres = {
+            type_facette: request.GET.getlist(type_facette)
+            for type_facette in TYPES_FACETTES if request.GET.getlist(type_facette)
+        }
+        return JsonResponse(catalogue(filtres, apres=apres, limite=limite))
+
+
+# Actifs dans / hors du périmètre d'un programme (tri des rapports ; périmètre compilé en cache)
+class PerimetreView(View):
+    ACTIFS_MAX = 1000
+
+    def get(self, request, program_id):
+        enterprise_id = request.session.get("enterprise_id")
+        staff = request.user.is_authenticated and request.user.is_staff
+
+        if not (enterprise_id or staff):
+            return JsonResponse({"error": "Non connecté"}, status=401)
+
+        programmes = Program.objects.only('id', 'date_modification')
+        if not staff:
+            programmes = programmes.filter(enterprise_id=enterprise_id)
+        program = programmes.filter(pk=program_id).first()
+        if program is None:
+            return JsonResponse({"error": "Programme introuvable"}, status=404)
+
+        actifs = request.GET.getlist("actif")
+        if not actifs or len(actifs) > self.ACTIFS_MAX:
+            return JsonResponse({"error": f"De 1 à {self.ACTIFS_MAX} paramètres 'actif'"}, status=400)
+
+        return JsonResponse({"perimetre": perimetre_programme(program).classer(actifs)})
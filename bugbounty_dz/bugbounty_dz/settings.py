@@ -44,14 +44,19 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'accounts.routeurs.RepliqueMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'accounts.middleware.CompteCourantMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Sessions en cache devant la table `sessions` (voir accounts/sessions.py)
+SESSION_ENGINE = 'accounts.sessions'
+
 ROOT_URLCONF = 'bugbounty_dz.urls'
 
 TEMPLATES = [
@@ -78,12 +83,22 @@ WSGI_APPLICATION = 'bugbounty_dz.wsgi.application'
 
 DATABASES = {
         'default': {
-        'ENGINE': 'django.db.backends.mysql',
+        # Backend MySQL de Django + pool de connexions par processus (accounts/db/pool.py)
+        'ENGINE': 'accounts.db.mysql',
         'NAME': 'bug',         # Nom de ta base dans phpMyAdmin
         'USER': 'root',
         'PASSWORD': '',
         'HOST': '127.0.0.1',
         'PORT': '3306',
+        # 0 : connexion rendue au pool à la fin de chaque requête.
+        # > 0 (secondes) ou None : connexion persistante gardée par chaque thread.
+        'CONN_MAX_AGE': 0,
+        'POOL': {
+            'TAILLE': 10,
+            'ATTENTE': 5,
+            'VERIFIER_APRES': 30,
+            'DUREE_MAX': 3600,
+        },
     }
 
     ,
@@ -93,6 +108,26 @@ DATABASES = {
     }
 }
 
+# Cache partagé entre tous les processus (workers) : versions du classement,
+# de la configuration, du catalogue et des comptes, sessions, compteurs. Un
+# cache local au processus (LocMemCache, le défaut de Django) ne propagerait
+# aucune invalidation aux autres workers. Redis : incr() atomique (client
+# Python `redis` requis).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://127.0.0.1:6379/1',
+        'KEY_PREFIX': 'bugbounty_dz',
+    }
+}
+
+# Lectures lourdes (classement, statistiques, exports, listes de l'admin) sur
+# une réplique : alias de DATABASES, None pour tout lire sur le primaire.
+# Voir accounts/routeurs.py
+DATABASE_ROUTERS = ['accounts.routeurs.RouteurLectureEcriture']
+BASE_REPLIQUE = None
+REPLIQUE_DELAI_COLLANT = 5
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -139,3 +174,11 @@ import os
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# CNI et registres de commerce reçus en flux, avec limites de taille et de type
+# (voir accounts/televersements.py)
+FILE_UPLOAD_HANDLERS = [
+    'accounts.televersements.TeleversementHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
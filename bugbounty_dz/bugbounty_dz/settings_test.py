@@ -0,0 +1,39 @@
+"""
+Réglages des tests : deux fichiers SQLite, primaire (default) et réplique.
+
+    python manage.py test --settings=bugbounty_dz.settings_test
+
+La réplique n'est pas alimentée : un test qui active BASE_REPLIQUE voit
+exactement ce qui a été lu sur l'une ou l'autre base.
+
+Cache local (LocMemCache) : les tests tournent dans un seul processus.
+
+Bases de test en fichiers (et non en mémoire partagée, où les verrous de
+table échouent au lieu d'attendre) : les tests de concurrence écrivent
+depuis plusieurs threads.
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR
+
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'primaire.sqlite3',
+        'OPTIONS': {'timeout': 30},
+        'TEST': {'NAME': BASE_DIR / 'test_primaire.sqlite3'},
+    },
+    'replique': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'replique.sqlite3',
+        'OPTIONS': {'timeout': 30},
+        'TEST': {'NAME': BASE_DIR / 'test_replique.sqlite3'},
+    },
+}
+
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+}
+
+# Activée test par test (override_settings)
+BASE_REPLIQUE = None
@@ -17,10 +17,9 @@ Including another URLconf
 
 from django.contrib import admin
 from django.urls import path, include
-from django.conf import settings
-from django.conf.urls.static import static
 
+# MEDIA_ROOT est servi par accounts (contrôle d'accès, voir accounts/medias.py)
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('accounts.urls')),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+]